@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import re
+import json
+import logging
+import tarfile
+import zipfile
+import posixpath
+from contextlib import contextmanager
+
+from cellmaps_utils import constants
+
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SEPARATOR = '!'
+"""
+Separates path of archive from path of member in references
+such as ``release.zip!/crate/apms.tsv``
+"""
+
+ZIP_SUFFIXES = ('.zip',)
+"""
+Suffixes of zip archives
+"""
+
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+"""
+Suffixes of tar archives, optionally compressed
+"""
+
+URL_BLOCK_SIZE = 8 * 1024 * 1024
+"""
+Default number of bytes read ahead per request when
+streaming from a URL
+"""
+
+URL_RE = re.compile(r'^([A-Za-z][A-Za-z0-9+.\-]*::)*[A-Za-z][A-Za-z0-9+.\-]+://')
+"""
+Matches URLs such as ``s3://bucket/apms.tsv`` including
+fsspec chained URLs such as ``simplecache::s3://bucket/apms.tsv``
+"""
+
+_url_options = {'block_size': URL_BLOCK_SIZE,
+                'cache_dir': None}
+
+_parent_rocrates = {}
+
+
+def set_url_options(block_size=None, cache_dir=None):
+    """
+    Sets how URLs are streamed by :py:func:`open_text`
+
+    :param block_size: bytes read ahead per request, if ``None``
+                       :py:const:`URL_BLOCK_SIZE` is used
+    :type block_size: int
+    :param cache_dir: if set, blocks read from URLs are cached in
+                      this local directory and reused by later reads
+    :type cache_dir: str
+    """
+    if block_size is None:
+        block_size = URL_BLOCK_SIZE
+    if block_size < 1:
+        raise CellMapsPPIDownloaderError('URL block size must be at least 1: ' +
+                                         str(block_size))
+    _url_options['block_size'] = block_size
+    _url_options['cache_dir'] = cache_dir
+
+
+def is_url(path):
+    """
+    Checks if **path** is a URL, such as ``s3://``, ``gs://``
+    or ``file://``, to read via
+    `fsspec <https://filesystem-spec.readthedocs.io>`__
+
+    :param path: path to check
+    :type path: str
+    :return: ``True`` if **path** is a URL
+    :rtype: bool
+    """
+    return path is not None and URL_RE.match(path) is not None
+
+
+@contextmanager
+def _open_url(url):
+    """
+    Opens **url** for reading as bytes via fsspec, with read ahead
+    buffering of the block size set by :py:func:`set_url_options`
+    and, if a cache directory is set, local caching of blocks
+    of remote, not ``file://``, URLs
+    """
+    try:
+        import fsspec
+    except ImportError:
+        raise CellMapsPPIDownloaderError('fsspec is required to read ' + url +
+                                         ', install with: pip install cellmaps_ppidownloader[url]')
+    block_size = _url_options['block_size']
+    cache_dir = _url_options['cache_dir']
+    open_kwargs = {'block_size': block_size}
+    storage_options = {}
+    if cache_dir is not None and '::' not in url and not url.startswith('file://'):
+        url = 'blockcache::' + url
+        storage_options['blockcache'] = {'cache_storage': cache_dir}
+    else:
+        open_kwargs['cache_type'] = 'readahead'
+    logger.debug('Streaming ' + url)
+    try:
+        fs, path = fsspec.core.url_to_fs(url, **storage_options)
+        f = fs.open(path, 'rb', **open_kwargs)
+    except (ImportError, OSError, ValueError) as e:
+        raise CellMapsPPIDownloaderError('Unable to open ' + url + ' : ' + str(e))
+    with f:
+        yield f
+
+
+@contextmanager
+def _open_binary(path):
+    """
+    Opens **path**, a local path or URL, for reading as bytes
+    """
+    if is_url(path):
+        with _open_url(path) as f:
+            yield f
+        return
+    with open(path, 'rb') as f:
+        yield f
+
+
+def split_archive_path(path):
+    """
+    Splits reference to a member of an archive, such as
+    ``release.zip!/crate/apms.tsv``, into archive and member.
+    Only paths whose part before :py:const:`ARCHIVE_SEPARATOR` ends
+    with a suffix in :py:const:`ZIP_SUFFIXES` or :py:const:`TAR_SUFFIXES`
+    are references into an archive
+
+    :param path: path to file or member of archive
+    :type path: str
+    :return: (path to archive, path of member without leading ``/``)
+             or (``None``, **path**) if **path** is not a reference
+             into an archive
+    :rtype: tuple
+    """
+    if path is None or ARCHIVE_SEPARATOR not in path:
+        return None, path
+    archive, member = path.split(ARCHIVE_SEPARATOR, 1)
+    if not archive.lower().endswith(ZIP_SUFFIXES + TAR_SUFFIXES):
+        return None, path
+    return archive, member.lstrip('/')
+
+
+def is_archive_path(path):
+    """
+    Checks if **path** is a reference to a member of an archive
+
+    :param path: path to check
+    :type path: str
+    :return: ``True`` if **path** is a reference into an archive
+    :rtype: bool
+    """
+    return split_archive_path(path)[0] is not None
+
+
+@contextmanager
+def _open_archive(archive):
+    """
+    Opens **archive**, a local path or URL, as
+    :py:class:`zipfile.ZipFile` or :py:class:`tarfile.TarFile`
+    """
+    with _open_binary(archive) as archive_file:
+        if archive.lower().endswith(ZIP_SUFFIXES):
+            with zipfile.ZipFile(archive_file, 'r') as zf:
+                yield zf
+            return
+        with tarfile.open(fileobj=archive_file, mode='r:*') as tf:
+            yield tf
+
+
+def _get_member_names(opened_archive):
+    """
+    Gets names of members of **opened_archive** as returned by
+    :py:func:`_open_archive`
+
+    :rtype: set
+    """
+    if isinstance(opened_archive, zipfile.ZipFile):
+        return set(opened_archive.namelist())
+    return set(opened_archive.getnames())
+
+
+@contextmanager
+def _extract_member(opened_archive, archive, member):
+    """
+    Opens **member** of **opened_archive**, as returned by
+    :py:func:`_open_archive` for **archive**, for reading as bytes
+    """
+    if isinstance(opened_archive, zipfile.ZipFile):
+        try:
+            f = opened_archive.open(member, 'r')
+        except KeyError:
+            raise CellMapsPPIDownloaderError(member + ' not found in ' + archive)
+    else:
+        try:
+            f = opened_archive.extractfile(member)
+        except KeyError:
+            f = None
+        if f is None:
+            raise CellMapsPPIDownloaderError(member + ' not found in ' + archive)
+    with f:
+        yield f
+
+
+@contextmanager
+def _open_member(archive, member):
+    """
+    Opens **member** of **archive**, a local path or URL,
+    for reading as bytes without extracting it
+    """
+    with _open_archive(archive) as opened_archive:
+        with _extract_member(opened_archive, archive, member) as f:
+            yield f
+
+
+@contextmanager
+def open_text(path):
+    """
+    Opens **path** for reading as text. If **path** is a reference
+    into an archive, see :py:func:`split_archive_path`, the member is
+    streamed from the archive without extracting it. If **path**, or
+    the archive, is a URL, see :py:func:`is_url`, it is streamed
+    via fsspec
+
+    :param path: path to file or member of archive
+    :type path: str
+    :raises CellMapsPPIDownloaderError: If member is not in archive
+                                        or URL cannot be read
+    :return: file object
+    """
+    archive, member = split_archive_path(path)
+    if archive is None:
+        if is_url(path):
+            with _open_url(path) as raw:
+                with io.TextIOWrapper(raw, encoding='utf-8') as f:
+                    yield f
+            return
+        with open(path, 'r') as f:
+            yield f
+        return
+    logger.debug('Streaming ' + member + ' from ' + archive)
+    with _open_member(archive, member) as raw:
+        with io.TextIOWrapper(raw, encoding='utf-8') as f:
+            yield f
+
+
+def get_rocrate_metadata(path):
+    """
+    Gets RO-Crate metadata of crate holding member of archive
+    referenced by **path**. The ``ro-crate-metadata.json`` file
+    nearest to the member, looking in its directory and then in
+    each parent directory within the archive, is used. The archive
+    is opened, and for a URL downloaded, once
+
+    :param path: reference into an archive such as
+                 ``release.zip!/crate/apms.tsv``
+    :type path: str
+    :raises CellMapsPPIDownloaderError: If **path** is not a reference
+                                        into an archive or no metadata
+                                        file is found
+    :return: RO-Crate metadata
+    :rtype: dict
+    """
+    archive, member = split_archive_path(path)
+    if archive is None:
+        raise CellMapsPPIDownloaderError(str(path) + ' is not in an archive')
+    with _open_archive(archive) as opened_archive:
+        names = _get_member_names(opened_archive)
+        dirname = posixpath.dirname(member)
+        while True:
+            candidate = posixpath.join(dirname, constants.RO_CRATE_METADATA_FILE)
+            if candidate in names:
+                with _extract_member(opened_archive, archive, candidate) as raw:
+                    with io.TextIOWrapper(raw, encoding='utf-8') as f:
+                        return json.load(f)
+            if dirname == '':
+                break
+            dirname = posixpath.dirname(dirname)
+    raise CellMapsPPIDownloaderError('No ' + constants.RO_CRATE_METADATA_FILE +
+                                     ' found for ' + member + ' in ' + archive)
+
+
+def get_parent_rocrate(path):
+    """
+    Gets RO-Crate holding table at **path**. RO-Crate metadata
+    found in an archive or at a URL is cached per **path**
+
+    :param path: path to file, URL or reference into an archive
+    :type path: str
+    :raises CellMapsPPIDownloaderError: If **path** is a URL without
+                                        RO-Crate metadata next to it
+    :return: RO-Crate metadata if **path** is a reference into an
+             archive or a URL, otherwise absolute path to directory
+             of **path**
+    :rtype: dict or str
+    """
+    if path in _parent_rocrates:
+        return _parent_rocrates[path]
+    if is_archive_path(path):
+        _parent_rocrates[path] = get_rocrate_metadata(path)
+        return _parent_rocrates[path]
+    if is_url(path):
+        metadata_url = posixpath.join(posixpath.dirname(path),
+                                      constants.RO_CRATE_METADATA_FILE)
+        try:
+            with open_text(metadata_url) as f:
+                _parent_rocrates[path] = json.load(f)
+        except CellMapsPPIDownloaderError as e:
+            raise CellMapsPPIDownloaderError('No RO-Crate metadata found for ' +
+                                             path + ' : ' + str(e))
+        return _parent_rocrates[path]
+    return os.path.abspath(os.path.dirname(path))
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import wait
+
+from cellmaps_ppidownloader.cache import ResolutionCache
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+logger = logging.getLogger(__name__)
+
+
+def is_retriable_error(error):
+    """
+    Checks if **error** raised by a query means the service is
+    overloaded or unreachable, namely HTTP 429 or 5xx status,
+    timeouts and connection errors, so the query can be retried
+
+    :param error: error raised by query
+    :type error: Exception
+    :return: ``True`` if query can be retried
+    :rtype: bool
+    """
+    response = getattr(error, 'response', None)
+    status_code = getattr(response, 'status_code', None)
+    if status_code is not None:
+        return status_code == 429 or status_code >= 500
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    # httpx and requests timeout/connection errors
+    name = type(error).__name__
+    return 'Timeout' in name or 'Connect' in name
+
+
+class AdaptiveQueryController(object):
+    """
+    Wraps an object with a mygene style ``querymany`` method and
+    sends queries in batches whose size, and the number of batches
+    in flight, adapt to the service. Both grow while the 90th
+    percentile of recent batch latencies stays under
+    **target_latency** and shrink when it does not or when the
+    service returns 429/5xx errors, which are retried after an
+    exponential backoff.
+
+    After **failure_threshold** failures in a row a circuit breaker
+    opens: no queries are sent for **reset_timeout** seconds, queries
+    found in **cache** are answered from it, and then a single trial
+    batch decides whether to close the breaker again.
+
+    Has the same ``querymany`` interface so it can be passed to
+    :py:class:`~cellmaps_ppidownloader.gene.GeneQuery` as the
+    **mygeneinfo** parameter
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, mygeneinfo=None, cache=None,
+                 initial_batch_size=200, min_batch_size=10,
+                 max_batch_size=1000, max_inflight=4,
+                 target_latency=2.0, failure_threshold=3,
+                 reset_timeout=30.0, max_retries=5,
+                 base_backoff=1.0, latency_window=20,
+                 clock=time.monotonic, sleep=time.sleep):
+        """
+        Constructor
+
+        :param mygeneinfo: object with mygene style ``querymany`` method.
+                           If ``None`` :py:class:`mygene.MyGeneInfo` is used
+        :param cache: If set, successful results are stored here and
+                      used to answer queries while the breaker is open.
+                      Only results stored in this cache are served, so
+                      a new, empty, cache only covers queries resolved
+                      earlier by this controller
+        :type cache: :py:class:`~cellmaps_ppidownloader.cache.ResolutionCache`
+        :param initial_batch_size: number of queries in first batch
+        :type initial_batch_size: int
+        :param min_batch_size: smallest batch size
+        :type min_batch_size: int
+        :param max_batch_size: largest batch size
+        :type max_batch_size: int
+        :param max_inflight: most batches sent at once
+        :type max_inflight: int
+        :param target_latency: desired 90th percentile batch latency
+                               in seconds
+        :type target_latency: float
+        :param failure_threshold: failures in a row that open breaker
+        :type failure_threshold: int
+        :param reset_timeout: seconds breaker stays open
+        :type reset_timeout: float
+        :param max_retries: times a batch is retried before giving up
+        :type max_retries: int
+        :param base_backoff: seconds to wait after first failure,
+                             doubled for each failure in a row
+        :type base_backoff: float
+        :param latency_window: number of recent latencies kept
+        :type latency_window: int
+        :param clock: function returning current time in seconds
+        :type clock: callable
+        :param sleep: function that sleeps for given seconds
+        :type sleep: callable
+        :raises CellMapsPPIDownloaderError: If batch sizes are invalid
+        """
+        if min_batch_size < 1 or max_batch_size < min_batch_size:
+            raise CellMapsPPIDownloaderError('Invalid batch size limits')
+        if max_inflight < 1:
+            raise CellMapsPPIDownloaderError('max_inflight must be at least 1')
+        if mygeneinfo is None:
+            import mygene
+            mygeneinfo = mygene.MyGeneInfo()
+        self._mg = mygeneinfo
+        self._cache = cache
+        self._min_batch_size = min_batch_size
+        self._max_batch_size = max_batch_size
+        self._batch_size = min(max(initial_batch_size, min_batch_size), max_batch_size)
+        self._max_inflight = max_inflight
+        self._inflight = 1
+        self._target_latency = target_latency
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._max_retries = max_retries
+        self._base_backoff = base_backoff
+        self._latencies = deque(maxlen=latency_window)
+        self._clock = clock
+        self._sleep = sleep
+        self._state = AdaptiveQueryController.CLOSED
+        self._consecutive_failures = 0
+        self._next_allowed = 0.0
+
+    def get_batch_size(self):
+        """
+        Gets current batch size
+
+        :return: batch size
+        :rtype: int
+        """
+        return self._batch_size
+
+    def get_inflight(self):
+        """
+        Gets current number of batches allowed in flight
+
+        :return: batches in flight
+        :rtype: int
+        """
+        return self._inflight
+
+    def get_state(self):
+        """
+        Gets state of circuit breaker
+
+        :return: :py:const:`CLOSED`, :py:const:`OPEN` or
+                 :py:const:`HALF_OPEN`
+        :rtype: str
+        """
+        return self._state
+
+    def get_latency_percentile(self, percentile=90):
+        """
+        Gets percentile of recent batch latencies
+
+        :param percentile: percentile between 0 and 100
+        :type percentile: float
+        :return: latency in seconds or ``None`` if no batch completed
+        :rtype: float
+        """
+        if len(self._latencies) == 0:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1,
+                    int(round(percentile / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def _on_success(self, latency):
+        """
+        Updates batch size and concurrency after a successful batch
+        """
+        self._latencies.append(latency)
+        self._consecutive_failures = 0
+        if self._state != AdaptiveQueryController.CLOSED:
+            logger.info('Closing circuit breaker')
+            self._state = AdaptiveQueryController.CLOSED
+        if self.get_latency_percentile() <= self._target_latency:
+            self._batch_size = min(self._max_batch_size,
+                                   self._batch_size + max(1, self._batch_size // 4))
+            self._inflight = min(self._max_inflight, self._inflight + 1)
+        else:
+            self._batch_size = max(self._min_batch_size, self._batch_size // 2)
+            self._inflight = max(1, self._inflight - 1)
+
+    def _on_failure(self, error):
+        """
+        Shrinks batch size and concurrency, backs off and opens
+        breaker after too many failures in a row
+        """
+        self._consecutive_failures += 1
+        self._batch_size = max(self._min_batch_size, self._batch_size // 2)
+        self._inflight = 1
+        backoff = self._base_backoff * (2 ** (self._consecutive_failures - 1))
+        if self._state == AdaptiveQueryController.HALF_OPEN or \
+                self._consecutive_failures >= self._failure_threshold:
+            if self._state != AdaptiveQueryController.OPEN:
+                logger.warning('Opening circuit breaker after ' +
+                               str(self._consecutive_failures) +
+                               ' failures in a row: ' + str(error))
+            self._state = AdaptiveQueryController.OPEN
+            backoff = max(backoff, self._reset_timeout)
+        else:
+            logger.info('Query failed, retrying in ' + str(backoff) +
+                        ' seconds: ' + str(error))
+        self._next_allowed = self._clock() + backoff
+
+    def _query_batch(self, batch, scopes=None, fields=None, species=None):
+        """
+        Queries **batch** returning (hits, latency in seconds)
+        """
+        start = self._clock()
+        hits = self._mg.querymany(batch, scopes=scopes, fields=fields,
+                                  species=species)
+        return hits, self._clock() - start
+
+    def _answer_from_cache(self, remaining, scopes=None, fields=None,
+                           species=None):
+        """
+        Removes queries found in cache from **remaining**
+
+        :return: hits for queries found in cache
+        :rtype: list
+        """
+        if self._cache is None:
+            return []
+        hits = []
+        still_remaining = deque()
+        for query, attempt in remaining:
+            cached = self._cache.get(ResolutionCache.get_key(query, scopes=scopes,
+                                                             species=species,
+                                                             fields=fields))
+            if cached is None:
+                still_remaining.append((query, attempt))
+            else:
+                hits.extend(cached)
+        if len(hits) > 0:
+            logger.info('Answered ' + str(len(remaining) - len(still_remaining)) +
+                        ' queries from cache while circuit breaker is open')
+        remaining.clear()
+        remaining.extend(still_remaining)
+        return hits
+
+    def querymany(self, queries, scopes=None, fields=None, species=None):
+        """
+        Same interface as mygene querymany
+
+        :param queries: gene ids/symbols to query
+        :type queries: list
+        :raises CellMapsPPIDownloaderError: If a batch fails more than
+                                            **max_retries** times or
+                                            with an error that is not
+                                            retriable
+        :return: mygene style hits
+        :rtype: list
+        """
+        remaining = deque((str(q), 0) for q in queries)
+        results = []
+        with ThreadPoolExecutor(max_workers=self._max_inflight) as pool:
+            futures = {}
+            while len(remaining) > 0 or len(futures) > 0:
+                now = self._clock()
+                if self._state == AdaptiveQueryController.OPEN:
+                    results.extend(self._answer_from_cache(remaining, scopes=scopes,
+                                                           fields=fields,
+                                                           species=species))
+                    if now >= self._next_allowed:
+                        logger.info('Circuit breaker half open, sending trial batch')
+                        self._state = AdaptiveQueryController.HALF_OPEN
+
+                if now >= self._next_allowed and self._state != AdaptiveQueryController.OPEN:
+                    limit = self._inflight
+                    if self._state == AdaptiveQueryController.HALF_OPEN:
+                        limit = 1
+                    while len(remaining) > 0 and len(futures) < limit:
+                        batch = [remaining.popleft() for _ in range(min(self._batch_size,
+                                                                        len(remaining)))]
+                        future = pool.submit(self._query_batch, [q for q, _ in batch],
+                                             scopes=scopes, fields=fields,
+                                             species=species)
+                        futures[future] = batch
+
+                if len(futures) == 0:
+                    if len(remaining) > 0:
+                        self._sleep(max(0.0, self._next_allowed - self._clock()))
+                    continue
+
+                done, _ = wait(list(futures.keys()), return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch = futures.pop(future)
+                    try:
+                        hits, latency = future.result()
+                    except Exception as e:
+                        if not is_retriable_error(e):
+                            raise
+                        self._on_failure(e)
+                        retry = [(q, attempt + 1) for q, attempt in batch]
+                        if retry[0][1] > self._max_retries:
+                            raise CellMapsPPIDownloaderError('Query failed ' +
+                                                             str(retry[0][1]) +
+                                                             ' times: ' + str(e))
+                        remaining.extendleft(reversed(retry))
+                        continue
+                    self._on_success(latency)
+                    if self._cache is not None:
+                        self._cache.put_results(hits, scopes=scopes,
+                                                species=species, fields=fields)
+                    results.extend(hits)
+                logger.debug('Batch size ' + str(self._batch_size) +
+                             ', in flight ' + str(self._inflight) +
+                             ', p90 latency ' + str(self.get_latency_percentile()))
+        return results
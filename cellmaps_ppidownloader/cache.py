@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import math
+import time
+import hashlib
+import logging
+import threading
+
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+logger = logging.getLogger(__name__)
+
+
+class ResolutionCache(object):
+    """
+    In-memory table of mygene query results. Each entry is keyed by
+    the query term along with the scopes, species and fields used
+    for the query so results from different lookups are never mixed.
+    Entries expire after **ttl** seconds
+    """
+
+    DEFAULT_TTL = 86400
+    """
+    Default time in seconds an entry stays valid (one day)
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, clock=time.time):
+        """
+        Constructor
+
+        :param ttl: Time in seconds an entry stays valid. If ``None``
+                    entries never expire
+        :type ttl: float
+        :param clock: function returning current time in seconds
+        :type clock: callable
+        """
+        self._ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._table = {}
+
+    @staticmethod
+    def get_key(query, scopes=None, species=None, fields=None):
+        """
+        Builds key used to store **query** in cache
+
+        :param query: gene id/symbol that was queried
+        :type query: str
+        :param scopes: field(s) queried on
+        :type scopes: str or list
+        :param species: species queried
+        :type species: str
+        :param fields: fields requested
+        :type fields: str or list
+        :return: key
+        :rtype: tuple
+        """
+        return (str(query),
+                ResolutionCache._normalize(scopes),
+                ResolutionCache._normalize(species),
+                ResolutionCache._normalize(fields))
+
+    @staticmethod
+    def _normalize(value):
+        """
+        Converts **value** which can be a str, list or ``None`` to
+        a comma delimited str with sorted elements
+
+        :return: normalized value
+        :rtype: str
+        """
+        if value is None:
+            return ''
+        if isinstance(value, str):
+            value = value.split(',')
+        return ','.join(sorted(str(v).strip() for v in value))
+
+    def get(self, key):
+        """
+        Gets hits for **key**
+
+        :param key: key from :py:meth:`get_key`
+        :type key: tuple
+        :return: list of mygene hits (a ``notfound`` hit counts as a
+                 hit) or ``None`` if **key** is not in cache or expired
+        :rtype: list
+        """
+        with self._lock:
+            entry = self._table.get(key)
+            if entry is None:
+                return None
+            stored_time, hits = entry
+            if self._ttl is not None and self._clock() - stored_time > self._ttl:
+                del self._table[key]
+                return None
+            return hits
+
+    def put(self, key, hits):
+        """
+        Stores **hits** under **key**
+
+        :param key: key from :py:meth:`get_key`
+        :type key: tuple
+        :param hits: list of mygene hits for the query
+        :type hits: list
+        """
+        with self._lock:
+            self._table[key] = (self._clock(), hits)
+
+    def put_results(self, results, scopes=None, species=None, fields=None):
+        """
+        Groups **results** returned by mygene querymany by query term
+        and stores them
+
+        :param results: mygene querymany output
+        :type results: list
+        :return: number of query terms stored
+        :rtype: int
+        """
+        grouped = {}
+        for hit in results:
+            grouped.setdefault(str(hit['query']), []).append(hit)
+        for query, hits in grouped.items():
+            self.put(ResolutionCache.get_key(query, scopes=scopes,
+                                             species=species,
+                                             fields=fields), hits)
+        return len(grouped)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._table)
+
+
+class NegativeCache(object):
+    """
+    Persistent set of query terms known not to resolve, backed by a
+    Bloom filter so it stays small however many terms are added.
+    Like :py:class:`ResolutionCache` terms are keyed along with the
+    scopes and species used for the query.
+
+    A Bloom filter can report a term it never saw as present, with
+    probability **error_rate** while fewer than **capacity** terms
+    have been added, so a valid term can very rarely be skipped.
+    To keep that rate, terms past **capacity** are not added. Terms
+    cannot be removed, so a cache poisoned by an upstream outage is
+    reset by deleting its file or rotated by loading it with a
+    **max_age**, see :py:meth:`load`
+    """
+
+    DEFAULT_CAPACITY = 100000
+    DEFAULT_ERROR_RATE = 1e-6
+    DEFAULT_MAX_AGE = 7 * 86400
+
+    def __init__(self, capacity=DEFAULT_CAPACITY,
+                 error_rate=DEFAULT_ERROR_RATE,
+                 clock=time.time):
+        """
+        Constructor
+
+        :param capacity: Expected number of terms
+        :type capacity: int
+        :param error_rate: Desired false positive rate at **capacity**
+        :type error_rate: float
+        :param clock: function returning current time in seconds
+        :type clock: callable
+        :raises CellMapsPPIDownloaderError: If **capacity** or
+                                            **error_rate** is invalid
+        """
+        if capacity is None or capacity < 1:
+            raise CellMapsPPIDownloaderError('capacity must be at least 1')
+        if error_rate is None or not 0 < error_rate < 1:
+            raise CellMapsPPIDownloaderError('error_rate must be between 0 and 1')
+        self._capacity = capacity
+        self._error_rate = error_rate
+        self._num_bits = int(math.ceil(-capacity * math.log(error_rate) /
+                                       (math.log(2) ** 2)))
+        self._num_hashes = max(1, int(round(self._num_bits / capacity * math.log(2))))
+        self._bits = bytearray((self._num_bits + 7) // 8)
+        self._count = 0
+        self._clock = clock
+        self._created = clock()
+        self._warned_full = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_key(query, scopes=None, species=None):
+        """
+        Builds key used to store **query**
+
+        :return: key
+        :rtype: str
+        """
+        return '\t'.join([str(query),
+                          ResolutionCache._normalize(scopes),
+                          ResolutionCache._normalize(species)])
+
+    def get_age(self):
+        """
+        Gets time since cache was first created, kept across
+        :py:meth:`save` and :py:meth:`load`
+
+        :return: age in seconds
+        :rtype: float
+        """
+        return self._clock() - self._created
+
+    def is_full(self):
+        """
+        Checks if **capacity** terms were added
+
+        :return: ``True`` if no more terms are added
+        :rtype: bool
+        """
+        with self._lock:
+            return self._count >= self._capacity
+
+    def _get_positions(self, key):
+        """
+        Gets bit positions for **key** using double hashing
+        """
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self._num_bits for i in range(self._num_hashes)]
+
+    def add(self, query, scopes=None, species=None):
+        """
+        Adds **query** as a term that does not resolve. Once
+        **capacity** new terms were added, terms are no longer
+        added, and a warning is logged, as the false positive rate
+        would grow past **error_rate**
+
+        :param query: gene id/symbol that was queried
+        :type query: str
+        :param scopes: field(s) queried on
+        :type scopes: str or list
+        :param species: species queried
+        :type species: str
+        :return: ``True`` if **query** is in cache
+        :rtype: bool
+        """
+        positions = self._get_positions(NegativeCache.get_key(query, scopes=scopes,
+                                                              species=species))
+        with self._lock:
+            is_new = any(not self._bits[pos >> 3] & (1 << (pos & 7))
+                         for pos in positions)
+            if not is_new:
+                return True
+            if self._count >= self._capacity:
+                if not self._warned_full:
+                    logger.warning('Negative cache is full with ' + str(self._count) +
+                                   ' terms, not adding more. Delete the cache file '
+                                   'to reset it or lower its max age to rotate it')
+                    self._warned_full = True
+                return False
+            for pos in positions:
+                self._bits[pos >> 3] |= 1 << (pos & 7)
+            self._count += 1
+        return True
+
+    def contains(self, query, scopes=None, species=None):
+        """
+        Checks if **query** was added
+
+        :return: ``True`` if **query** was probably added,
+                 ``False`` if it was definitely not
+        :rtype: bool
+        """
+        positions = self._get_positions(NegativeCache.get_key(query, scopes=scopes,
+                                                              species=species))
+        with self._lock:
+            for pos in positions:
+                if not self._bits[pos >> 3] & (1 << (pos & 7)):
+                    return False
+        return True
+
+    def __len__(self):
+        """
+        Gets number of distinct terms added
+        """
+        with self._lock:
+            return self._count
+
+    def save(self, path):
+        """
+        Writes cache to **path**. File is a JSON header line
+        followed by the raw bits of the filter
+
+        :param path: path to file
+        :type path: str
+        """
+        header = {'capacity': self._capacity,
+                  'error_rate': self._error_rate,
+                  'num_bits': self._num_bits,
+                  'num_hashes': self._num_hashes,
+                  'count': len(self),
+                  'created': self._created}
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(json.dumps(header).encode('utf-8') + b'\n')
+            with self._lock:
+                f.write(bytes(self._bits))
+        os.replace(tmp_path, path)
+        logger.debug('Saved negative cache with ' + str(header['count']) +
+                     ' terms to ' + path)
+
+    @staticmethod
+    def load(path, max_age=None, clock=time.time):
+        """
+        Loads cache written by :py:meth:`save`. If the cache is
+        older than **max_age** an empty cache of the same size is
+        returned instead, so terms missed during an upstream outage
+        are queried again
+
+        :param path: path to file
+        :type path: str
+        :param max_age: If set, maximum age in seconds of cache
+        :type max_age: float
+        :param clock: function returning current time in seconds
+        :type clock: callable
+        :raises CellMapsPPIDownloaderError: If file is invalid
+        :return: cache
+        :rtype: :py:class:`NegativeCache`
+        """
+        with open(path, 'rb') as f:
+            try:
+                header = json.loads(f.readline().decode('utf-8'))
+                cache = NegativeCache(capacity=header['capacity'],
+                                      error_rate=header['error_rate'],
+                                      clock=clock)
+                # files written before the creation time was saved
+                # start aging when loaded
+                cache._created = header.get('created', cache._created)
+            except (ValueError, KeyError) as e:
+                raise CellMapsPPIDownloaderError('Invalid negative cache file ' +
+                                                 str(path) + ': ' + str(e))
+            bits = f.read()
+        if cache._num_bits != header['num_bits'] or \
+                cache._num_hashes != header['num_hashes'] or \
+                len(bits) != len(cache._bits):
+            raise CellMapsPPIDownloaderError('Invalid negative cache file ' + str(path))
+        if max_age is not None and cache.get_age() > max_age:
+            logger.info('Negative cache ' + str(path) + ' is older than ' +
+                        str(max_age) + ' seconds, starting with an empty cache')
+            return NegativeCache(capacity=cache._capacity,
+                                 error_rate=cache._error_rate,
+                                 clock=clock)
+        cache._bits = bytearray(bits)
+        cache._count = header['count']
+        if cache._count >= cache._capacity:
+            logger.warning('Negative cache ' + str(path) + ' is full with ' +
+                           str(cache._count) + ' terms. Delete it to reset it')
+            cache._warned_full = True
+        return cache
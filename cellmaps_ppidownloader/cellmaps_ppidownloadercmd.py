@@ -7,12 +7,31 @@ import logging
 import logging.config
 import json
 
+import mygene
 from cellmaps_utils import logutils
 from cellmaps_utils import constants
 import cellmaps_ppidownloader
 from cellmaps_ppidownloader.runner import CellmapsPPIDownloader
 from cellmaps_ppidownloader.gene import APMSGeneNodeAttributeGenerator
 from cellmaps_ppidownloader.gene import CM4AIGeneNodeAttributeGenerator
+from cellmaps_ppidownloader.gene import MultiSourceGeneNodeAttributeGenerator
+from cellmaps_ppidownloader.gene import GeneQuery
+from cellmaps_ppidownloader.cache import ResolutionCache
+from cellmaps_ppidownloader.cache import NegativeCache
+from cellmaps_ppidownloader.batching import AdaptiveQueryController
+from cellmaps_ppidownloader.resolver import GeneResolverService
+from cellmaps_ppidownloader.resolver import ResolverClient
+from cellmaps_ppidownloader.resolver import create_resolver_server
+from cellmaps_ppidownloader.edges import EdgeDeduplicator
+from cellmaps_ppidownloader.mapping import MappingIndex
+from cellmaps_ppidownloader.deadline import Deadline
+from cellmaps_ppidownloader import shard
+from cellmaps_ppidownloader.warm import CacheWarmer
+from cellmaps_ppidownloader.diff import NetworkDiff
+from cellmaps_ppidownloader.sample import EdgeSampler
+from cellmaps_ppidownloader import sources
+from cellmaps_ppidownloader import archive
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
 
 logger = logging.getLogger(__name__)
 
@@ -36,11 +55,27 @@ def _parse_arguments(desc, args):
                         help='apms.tsv TSV file from CM4AI RO-Crate that has '
                              'at least the following columns: '
                              'Bait    Prey    logOddsScore    FoldChange.x    '
-                             'BFDR.x')
+                             'BFDR.x. Can be a member of a zip or tar '
+                             'archive of the RO-Crate, such as '
+                             'release.zip!/apms/apms.tsv, which is read '
+                             'without extracting the archive')
     parser.add_argument('--edgelist',
                         help='APMS edgelist TSV file in format of:\n'
                              'GeneID1\tSymbol1\tGeneID2\tSymbol2\n'
                              '10159\tATP6AP2\t2\tA2M')
+    parser.add_argument('--source', action='append',
+                        help='AP-MS input to combine with others in one run, '
+                             'can be given multiple times in place of '
+                             '--edgelist/--baitlist/--cm4ai_table. Format is '
+                             'KEY=VALUE pairs separated by commas with an '
+                             'optional name, used in source column of '
+                             'ppi_edgelist.tsv, and either edgelist (with '
+                             'optional baitlist) or cm4ai_table plus column '
+                             'mapping of that input. For example: '
+                             'name=hek293t,edgelist=293T.tsv,baitlist=baits.tsv,'
+                             'geneid_one_col=GeneA or '
+                             'name=u2os,cm4ai_table=u2os/apms.tsv,bait_col=Bait. '
+                             'Genes shared by inputs are resolved once')
     parser.add_argument('--edgelist_geneid_one_col', default=APMSGeneNodeAttributeGenerator.GENEID_COL1,
                         help='Name of column containing ensemble Gene ID 1 in --edgelist file')
     parser.add_argument('--edgelist_symbol_one_col', default=APMSGeneNodeAttributeGenerator.SYMBOL_COL1,
@@ -49,6 +84,30 @@ def _parse_arguments(desc, args):
                         help='Name of column containing ensemble Gene ID 2 in --edgelist file')
     parser.add_argument('--edgelist_symbol_two_col', default=APMSGeneNodeAttributeGenerator.SYMBOL_COL2,
                         help='Name of column containing Gene Symbol 2 in --edgelist file')
+    parser.add_argument('--edgelist_ensembl_one_col',
+                        help='If set, name of column containing Ensembl gene '
+                             'id(s) of gene 1 in --edgelist file. Used by '
+                             '--trust_input')
+    parser.add_argument('--edgelist_ensembl_two_col',
+                        help='If set, name of column containing Ensembl gene '
+                             'id(s) of gene 2 in --edgelist file. Used by '
+                             '--trust_input')
+    parser.add_argument('--trust_input', action='store_true',
+                        help='If set, use gene symbols and Ensembl ids in '
+                             '--edgelist file as is. Needs '
+                             '--edgelist_ensembl_one_col/--edgelist_ensembl_two_col '
+                             'as genes without Ensembl ids are still '
+                             'resolved via mygene, as are genes with '
+                             'missing, invalid or conflicting values. '
+                             'Not supported with --cm4ai_table')
+    parser.add_argument('--mapping_from', nargs='+',
+                        help='One or more output directories (RO-Crates) of '
+                             'previous runs of this tool, or paths to their ' +
+                             constants.PPI_GENE_NODE_ATTR_FILE + ' files. '
+                             'Genes in --edgelist file whose symbol was '
+                             'already resolved are taken from these instead '
+                             'of mygene and the RO-Crates are registered as '
+                             'input datasets')
     parser.add_argument('--baitlist',
                         help='APMS baitlist TSV file in format of:\n'
                              'GeneSymbol\tGeneID\t# Interactors\n'
@@ -62,6 +121,164 @@ def _parse_arguments(desc, args):
     parser.add_argument('--baitlist_numinteractors_col',
                         default=APMSGeneNodeAttributeGenerator.BAITLIST_NUM_INTERACTORS,
                         help='Name of column containing # of interactors in --baitlist file')
+    parser.add_argument('--score_cols',
+                        help='Comma delimited list of numeric columns in '
+                             '--cm4ai_table or --edgelist file to carry '
+                             'through as extra columns in ppi_edgelist.tsv. '
+                             'For example: logOddsScore,FoldChange.x,BFDR.x')
+    parser.add_argument('--topk_per_bait', type=int,
+                        help='If set, only keep this many highest scoring '
+                             'preys of each bait in --cm4ai_table, ranked '
+                             'by --topk_col. Selection is done while '
+                             'reading the table. With --sweep_bfdr or '
+                             '--sweep_foldchange selection is done before '
+                             'the cutoffs are applied')
+    parser.add_argument('--topk_col', default='logOddsScore',
+                        help='Name of score column in --cm4ai_table used to '
+                             'rank preys for --topk_per_bait')
+    parser.add_argument('--sweep_bfdr',
+                        help='Comma delimited list of BFDR.x cutoffs, such as '
+                             '0.01,0.05,0.1. If set with --cm4ai_table, the '
+                             'table is read and genes are resolved once and '
+                             'a separate RO-Crate is written under output '
+                             'directory for each cutoff (combined with each '
+                             '--sweep_foldchange cutoff). Edges with BFDR.x '
+                             'less then or equal to cutoff are kept')
+    parser.add_argument('--sweep_foldchange',
+                        help='Comma delimited list of FoldChange.x cutoffs, '
+                             'such as 0,2,4. Works like --sweep_bfdr keeping '
+                             'edges with FoldChange.x greater then cutoff')
+    parser.add_argument('--write_csr', action='store_true',
+                        help='If set, also write network as memory mappable '
+                             'binary CSR adjacency bundle (numpy .npy files) '
+                             'in ' + CellmapsPPIDownloader.PPI_CSR_DIR +
+                             ' directory under output directory. If '
+                             '--score_cols is set, the first score column '
+                             'is stored as edge weights')
+    parser.add_argument('--dedup_edges', action='store_true',
+                        help='If set, collapse edges connecting the same pair '
+                             'of gene symbols, in either direction, into one '
+                             'edge in ppi_edgelist.tsv')
+    parser.add_argument('--self_loops', choices=EdgeDeduplicator.SELF_LOOP_POLICIES,
+                        default=EdgeDeduplicator.KEEP,
+                        help='How to handle edges connecting a gene symbol '
+                             'to itself')
+    parser.add_argument('--score_merge', choices=EdgeDeduplicator.SCORE_MERGE_POLICIES,
+                        default=EdgeDeduplicator.FIRST,
+                        help='How to merge scores of edges collapsed by '
+                             '--dedup_edges')
+    parser.add_argument('--dedup_max_in_memory', type=int,
+                        help='Maximum number of unique edges held in memory by '
+                             '--dedup_edges before spilling to disk and merging '
+                             'with an external sort. If unset, no limit')
+    parser.add_argument('--gene_node_attrs_max_in_memory', type=int,
+                        help='Maximum number of genes whose node attributes '
+                             'are held in memory. Past this, attributes are '
+                             'moved to a temporary SQLite database, under '
+                             'TMPDIR, and looked up from disk while writing '
+                             'the network. If unset, no limit')
+    parser.add_argument('--alias_fallback', action='store_true',
+                        help='If set, genes mygene could not map to an '
+                             'Ensembl id are queried again in one batch '
+                             'against --fallback_scopes')
+    parser.add_argument('--fallback_scopes', default=GeneQuery.DEFAULT_FALLBACK_SCOPES,
+                        help='Comma delimited mygene scopes queried by '
+                             '--alias_fallback')
+    parser.add_argument('--sanitize_queries', action='store_true',
+                        help='If set, empty, NA, decoy/contaminant and '
+                             'malformed ids (not an Entrez id, UniProt '
+                             'accession or gene symbol as expected for the '
+                             'query) are treated as not found without '
+                             'querying mygene')
+    parser.add_argument('--negative_cache',
+                        help='Path to file holding ids known not to resolve. '
+                             'Ids in the file are not sent to mygene and ids '
+                             'mygene does not find are added. File is '
+                             'created if it does not exist. Delete the file '
+                             'to reset it')
+    parser.add_argument('--negative_cache_max_age', type=float,
+                        default=NegativeCache.DEFAULT_MAX_AGE,
+                        help='Maximum age in seconds of --negative_cache. '
+                             'An older cache is replaced by an empty one so '
+                             'ids missed during an outage are queried again')
+    parser.add_argument('--adaptive_batching', action='store_true',
+                        help='If set, send mygene queries in batches whose '
+                             'size and concurrency adapt to observed latency '
+                             'and 429/5xx errors, retrying with backoff and '
+                             'pausing via a circuit breaker when the service '
+                             'degrades. While paused, only genes already '
+                             'resolved earlier in this run are answered, '
+                             'from memory')
+    parser.add_argument('--max_inflight', type=int, default=4,
+                        help='Most batches sent at once by --adaptive_batching')
+    parser.add_argument('--target_latency', type=float, default=2.0,
+                        help='Desired 90th percentile batch latency in '
+                             'seconds for --adaptive_batching')
+    parser.add_argument('--http_pool_size', type=int,
+                        default=GeneQuery.DEFAULT_POOL_SIZE,
+                        help='Most connections to mygene kept open in the '
+                             'HTTP session shared by all queries')
+    parser.add_argument('--http_timeout', type=float,
+                        default=GeneQuery.DEFAULT_TIMEOUT,
+                        help='Seconds to wait on mygene, or --resolver_url, '
+                             'to connect and for each read or write before '
+                             'failing. If --deadline is set, capped by time '
+                             'left for gene queries')
+    parser.add_argument('--http_keepalive', type=float,
+                        default=GeneQuery.DEFAULT_KEEPALIVE,
+                        help='Seconds idle connections to mygene are kept '
+                             'open for reuse by later batches')
+    parser.add_argument('--shard_index', type=int,
+                        help='Zero based index of shard to process when '
+                             'splitting input across --shard_count runs. Edges '
+                             'are assigned to shards by a stable hash of their '
+                             'gene pair and each run only resolves genes of '
+                             'its own edges. Combine the runs with the merge '
+                             'subcommand')
+    parser.add_argument('--shard_count', type=int,
+                        help='Number of shards input is split into, '
+                             'see --shard_index')
+    parser.add_argument('--sample',
+                        help='If set, only process a reproducible sample of '
+                             'edges selected while reading input. Value is '
+                             'a fraction of edges below 1, such as 0.01, or '
+                             'a whole number of edges, such as 5000. 1.0 is '
+                             'rejected, omit --sample to keep all edges. '
+                             'With --source, each source is sampled on its '
+                             'own, so a number of edges is per source. Only '
+                             'genes of sampled edges are resolved')
+    parser.add_argument('--sample_seed', type=int, default=0,
+                        help='Seed selecting edges kept by --sample. Same '
+                             'seed always keeps the same edges')
+    parser.add_argument('--url_block_size', type=int,
+                        default=archive.URL_BLOCK_SIZE,
+                        help='Bytes read ahead per request when input '
+                             'files are URLs such as s3://bucket/apms.tsv, '
+                             'gs:// or file://, which are streamed via '
+                             'fsspec. Requires fsspec and, for s3:// or '
+                             'gs://, s3fs or gcsfs, installed by the url '
+                             'extra: pip install cellmaps_ppidownloader[url]')
+    parser.add_argument('--url_cache_dir',
+                        help='If set, blocks read from input URLs are '
+                             'cached in this local directory and reused '
+                             'by later runs')
+    parser.add_argument('--defer_provenance', action='store_true',
+                        help='If set, only write data outputs and a journal '
+                             'of pending provenance registrations. Run the '
+                             'finalize subcommand on output directories to '
+                             'keep to create the RO-Crate and register '
+                             'provenance')
+    parser.add_argument('--deadline', type=float,
+                        help='Time budget in seconds for the whole run. '
+                             'Gene queries stop when less than a tenth of '
+                             'the budget is left and the run finishes with '
+                             'the genes resolved so far. Genes left '
+                             'unresolved are listed in the task finish file')
+    parser.add_argument('--resolver_url',
+                        help='If set, resolve genes via resolver daemon '
+                             '(see resolver subcommand) at this URL. '
+                             'Format is http://HOST:PORT or '
+                             'unix:///path/to/socket')
     parser.add_argument('--provenance',
                         help='Path to file containing provenance '
                              'information about input files in JSON format. '
@@ -90,6 +307,567 @@ def _parse_arguments(desc, args):
     return parser.parse_args(args)
 
 
+def _parse_resolver_arguments(desc, args):
+    """
+    Parses command line arguments for resolver subcommand
+
+    :param desc: description to display on command line
+    :type desc: str
+    :param args: command line arguments after the subcommand name
+    :type args: list
+    :return: arguments parsed by :py:mod:`argparse`
+    :rtype: :py:class:`argparse.Namespace`
+    """
+    parser = argparse.ArgumentParser(description=desc,
+                                     formatter_class=constants.ArgParseFormatter)
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='Host to listen on')
+    parser.add_argument('--port', type=int, default=8765,
+                        help='Port to listen on')
+    parser.add_argument('--socket',
+                        help='If set, listen on Unix domain socket at this '
+                             'path instead of --host/--port')
+    parser.add_argument('--ttl', type=float, default=ResolutionCache.DEFAULT_TTL,
+                        help='Time in seconds resolved genes are kept in cache')
+    parser.add_argument('--logconf', default=None,
+                        help='Path to python logging configuration file')
+    parser.add_argument('--verbose', '-v', action='count', default=1,
+                        help='Increases verbosity of logger to standard '
+                             'error for log messages in this module.')
+    return parser.parse_args(args)
+
+
+def _parse_warm_cache_arguments(desc, args):
+    """
+    Parses command line arguments of ``warm-cache`` subcommand
+
+    :param desc: description to display on command line
+    :type desc: str
+    :param args: command line arguments after subcommand name
+    :type args: list
+    :return: arguments parsed by :py:mod:`argparse`
+    :rtype: :py:class:`argparse.Namespace`
+    """
+    parser = argparse.ArgumentParser(description=desc,
+                                     formatter_class=constants.ArgParseFormatter)
+    parser.add_argument('--genes',
+                        help='File with genes to resolve in first column')
+    parser.add_argument('--all_genes', action='store_true',
+                        help='If set, resolve all genes matching '
+                             '--gene_query fetched from mygene')
+    parser.add_argument('--gene_query',
+                        default=CacheWarmer.ALL_PROTEIN_CODING_QUERY,
+                        help='mygene query used by --all_genes')
+    parser.add_argument('--species', default='human',
+                        help='Species of genes fetched by --all_genes')
+    parser.add_argument('--scopes',
+                        help='Comma delimited mygene scopes to warm. Each '
+                             'gene of --genes file is resolved in every '
+                             'scope: _id for gene ids of APMS edgelists, '
+                             'symbol for CM4AI baits and uniprot for CM4AI '
+                             'preys. If unset, _id for --genes and ' +
+                             ','.join(CacheWarmer.ALL_GENES_SCOPES) +
+                             ' for --all_genes, which warms each fetched '
+                             'gene by its term in every scope')
+    parser.add_argument('--batch_size', type=int,
+                        default=CacheWarmer.DEFAULT_BATCH_SIZE,
+                        help='Number of genes resolved per query')
+    parser.add_argument('--resolver_url',
+                        help='If set, resolve genes via resolver daemon '
+                             'at this URL, leaving them in its cache')
+    parser.add_argument('--negative_cache',
+                        help='Path to negative cache file to add genes '
+                             'that do not resolve to')
+    parser.add_argument('--negative_cache_max_age', type=float,
+                        default=NegativeCache.DEFAULT_MAX_AGE,
+                        help='Maximum age in seconds of --negative_cache. '
+                             'An older cache is replaced by an empty one')
+    parser.add_argument('--output',
+                        help='If set, write resolved genes to this file in '
+                             'ppi_gene_node_attributes.tsv format for use '
+                             'with --mapping_from')
+    parser.add_argument('--missing',
+                        help='If set, write genes that did not resolve to '
+                             'this file')
+    parser.add_argument('--logconf', default=None,
+                        help='Path to python logging configuration file')
+    parser.add_argument('--verbose', '-v', action='count', default=1,
+                        help='Increases verbosity of logger to standard '
+                             'error for log messages in this module.')
+    return parser.parse_args(args)
+
+
+def warm_cache_main(args):
+    """
+    Bulk resolves a gene universe ahead of production runs and
+    reports coverage
+
+    :param args: arguments passed to command line usually :py:func:`sys.argv[1:]`
+                 where second element is ``warm-cache``
+    :type args: list
+    :return: ``0`` upon success, ``1`` if no genes are given or
+             ``2`` if an exception is raised
+    :rtype: int
+    """
+    desc = """
+Version {version}
+
+Resolves genes listed in --genes file, or all genes matching
+--gene_query via mygene's fetch all paging if --all_genes is set,
+in each of --scopes and reports coverage per scope. Resolved genes
+are left in the cache of the resolver daemon at --resolver_url
+and/or written as a local index via --output. Genes that do not
+resolve are added to --negative_cache.
+    """.format(version=cellmaps_ppidownloader.__version__)
+    theargs = _parse_warm_cache_arguments(desc, args[2:])
+    theargs.program = args[0]
+    theargs.version = cellmaps_ppidownloader.__version__
+    try:
+        logutils.setup_cmd_logging(theargs)
+        if theargs.genes is None and not theargs.all_genes:
+            sys.stderr.write('--genes or --all_genes is required\n')
+            return 1
+        negative_cache = None
+        if theargs.negative_cache is not None:
+            if os.path.isfile(theargs.negative_cache):
+                negative_cache = NegativeCache.load(theargs.negative_cache,
+                                                    max_age=theargs.negative_cache_max_age)
+            else:
+                negative_cache = NegativeCache()
+        mg = GeneQuery.use_shared_session(mygene.MyGeneInfo())
+        mygeneinfo = mg
+        if theargs.resolver_url is not None:
+            mygeneinfo = ResolverClient(theargs.resolver_url)
+        warmer = CacheWarmer(genequery=GeneQuery(mygeneinfo=mygeneinfo,
+                                                 negative_cache=negative_cache),
+                             batch_size=theargs.batch_size)
+        scopes = None
+        if theargs.scopes is not None:
+            scopes = [x.strip() for x in theargs.scopes.split(',') if len(x.strip()) > 0]
+        try:
+            if theargs.genes is not None:
+                genes = CacheWarmer.read_genes(theargs.genes)
+                for scope in scopes or ['_id']:
+                    warmer.warm(genes, scopes=scope)
+            if theargs.all_genes:
+                terms = CacheWarmer.fetch_all_terms(mg, query=theargs.gene_query,
+                                                    species=theargs.species,
+                                                    scopes=scopes or CacheWarmer.ALL_GENES_SCOPES)
+                for scope, scope_terms in terms.items():
+                    warmer.warm(scope_terms, scopes=scope)
+        finally:
+            GeneQuery.close_shared_session()
+            if negative_cache is not None:
+                negative_cache.save(theargs.negative_cache)
+        if theargs.output is not None:
+            warmer.write_gene_node_attributes(theargs.output)
+        if theargs.missing is not None:
+            with open(theargs.missing, 'w') as f:
+                for gene in warmer.get_missing():
+                    f.write(gene + '\n')
+        for scope in warmer.get_scopes():
+            coverage = warmer.get_coverage(scopes=scope)
+            sys.stdout.write('{scope}: Resolved {resolved} of {requested} '
+                             'terms ({percent:.2f}% coverage), {missing} '
+                             'missing\n'.format(scope=scope,
+                                                percent=100.0 * coverage['coverage'],
+                                                **coverage))
+        coverage = warmer.get_coverage()
+        sys.stdout.write('total: Resolved {resolved} of {requested} terms '
+                         '({percent:.2f}% coverage), {missing} '
+                         'missing\n'.format(percent=100.0 * coverage['coverage'],
+                                            **coverage))
+        return 0
+    except Exception as e:
+        logger.exception('Caught exception: ' + str(e))
+        return 2
+    finally:
+        logging.shutdown()
+
+
+def _parse_merge_arguments(desc, args):
+    """
+    Parses command line arguments of ``merge`` subcommand
+
+    :param desc: description to display on command line
+    :type desc: str
+    :param args: command line arguments after subcommand name
+    :type args: list
+    :return: arguments parsed by :py:mod:`argparse`
+    :rtype: :py:class:`argparse.Namespace`
+    """
+    parser = argparse.ArgumentParser(description=desc,
+                                     formatter_class=constants.ArgParseFormatter)
+    parser.add_argument('outdir',
+                        help='Directory to write merged results to')
+    parser.add_argument('shard_dirs', nargs='+',
+                        help='Output directories of runs with --shard_index '
+                             'and --shard_count')
+    parser.add_argument('--provenance', required=True,
+                        help='Path to file containing provenance '
+                             'information in JSON format, same as passed '
+                             'to the runs')
+    parser.add_argument('--dedup_edges', action='store_true',
+                        help='If set, collapse edges of the same pair of '
+                             'gene symbols found in different shards into '
+                             'one edge. Set if the runs used --dedup_edges')
+    parser.add_argument('--score_merge', choices=EdgeDeduplicator.SCORE_MERGE_POLICIES,
+                        default=EdgeDeduplicator.FIRST,
+                        help='How to merge scores of edges collapsed by '
+                             '--dedup_edges, same as passed to the runs')
+    parser.add_argument('--logconf', default=None,
+                        help='Path to python logging configuration file')
+    parser.add_argument('--skip_logging', action='store_true',
+                        help='If set, output.log, error.log '
+                             'files will not be created')
+    parser.add_argument('--verbose', '-v', action='count', default=1,
+                        help='Increases verbosity of logger to standard '
+                             'error for log messages in this module.')
+    return parser.parse_args(args)
+
+
+def merge_main(args):
+    """
+    Merges outputs of runs with ``--shard_index`` and ``--shard_count``
+    into one RO-Crate
+
+    :param args: arguments passed to command line usually :py:func:`sys.argv[1:]`
+                 where second element is ``merge``
+    :type args: list
+    :return: ``0`` upon success or ``2`` if an exception is raised
+    :rtype: int
+    """
+    desc = """
+Version {version}
+
+Merges ppi_gene_node_attributes.tsv and ppi_edgelist.tsv files of
+runs with --shard_index and --shard_count, in a streaming k-way merge,
+into outdir and registers the result in a new RO-Crate. Shards that
+are RO-Crates are registered as input datasets. Pass --dedup_edges
+and --score_merge if the runs used them, so edges of a gene pair
+deduplicated in different shards are collapsed.
+    """.format(version=cellmaps_ppidownloader.__version__)
+    theargs = _parse_merge_arguments(desc, args[2:])
+    theargs.program = args[0]
+    theargs.version = cellmaps_ppidownloader.__version__
+    try:
+        logutils.setup_cmd_logging(theargs)
+        with open(theargs.provenance, 'r') as f:
+            json_prov = json.load(f)
+        return CellmapsPPIDownloader(outdir=theargs.outdir,
+                                     skip_logging=theargs.skip_logging,
+                                     input_data_dict=theargs.__dict__,
+                                     dedup_edges=theargs.dedup_edges,
+                                     score_merge=theargs.score_merge,
+                                     provenance=json_prov).merge(theargs.shard_dirs)
+    except Exception as e:
+        logger.exception('Caught exception: ' + str(e))
+        return 2
+    finally:
+        logging.shutdown()
+
+
+def _parse_diff_arguments(desc, args):
+    """
+    Parses command line arguments of ``diff`` subcommand
+
+    :param desc: description to display on command line
+    :type desc: str
+    :param args: command line arguments after subcommand name
+    :type args: list
+    :return: arguments parsed by :py:mod:`argparse`
+    :rtype: :py:class:`argparse.Namespace`
+    """
+    parser = argparse.ArgumentParser(description=desc,
+                                     formatter_class=constants.ArgParseFormatter)
+    parser.add_argument('old_dir',
+                        help='Output directory of earlier run')
+    parser.add_argument('new_dir',
+                        help='Output directory of later run')
+    parser.add_argument('outdir',
+                        help='Directory to write delta files to')
+    parser.add_argument('--max_in_memory', type=int,
+                        help='If set, compare edgelists with an external '
+                             'sort holding at most this many edges in '
+                             'memory, for very large files')
+    parser.add_argument('--tmpdir',
+                        help='Directory for spill files of '
+                             '--max_in_memory. Default is system temp '
+                             'directory')
+    parser.add_argument('--logconf', default=None,
+                        help='Path to python logging configuration file')
+    parser.add_argument('--verbose', '-v', action='count', default=1,
+                        help='Increases verbosity of logger to standard '
+                             'error for log messages in this module.')
+    return parser.parse_args(args)
+
+
+def diff_main(args):
+    """
+    Writes edges and genes that differ between two output directories
+
+    :param args: arguments passed to command line usually :py:func:`sys.argv[1:]`
+                 where second element is ``diff``
+    :type args: list
+    :return: ``0`` upon success or ``2`` if an exception is raised
+    :rtype: int
+    """
+    desc = """
+Version {version}
+
+Compares ppi_edgelist.tsv and ppi_gene_node_attributes.tsv of
+old_dir and new_dir, such as runs on two releases of BioPlex or
+CM4AI, and writes added and removed edges and added, removed and
+changed genes as TSV files to outdir. Edges are compared as
+undirected gene pairs, ignoring score columns.
+    """.format(version=cellmaps_ppidownloader.__version__)
+    theargs = _parse_diff_arguments(desc, args[2:])
+    theargs.program = args[0]
+    theargs.version = cellmaps_ppidownloader.__version__
+    try:
+        logutils.setup_cmd_logging(theargs)
+        counts = NetworkDiff(max_in_memory=theargs.max_in_memory,
+                             tmpdir=theargs.tmpdir).diff(theargs.old_dir,
+                                                         theargs.new_dir,
+                                                         theargs.outdir)
+        sys.stdout.write('Edges: {edges_added} added, {edges_removed} removed\n'
+                         'Genes: {genes_added} added, {genes_removed} removed, '
+                         '{genes_changed} changed\n'.format(**counts))
+        return 0
+    except Exception as e:
+        logger.exception('Caught exception: ' + str(e))
+        return 2
+    finally:
+        logging.shutdown()
+
+
+def _parse_finalize_arguments(desc, args):
+    """
+    Parses command line arguments of ``finalize`` subcommand
+
+    :param desc: description to display on command line
+    :type desc: str
+    :param args: command line arguments after subcommand name
+    :type args: list
+    :return: arguments parsed by :py:mod:`argparse`
+    :rtype: :py:class:`argparse.Namespace`
+    """
+    parser = argparse.ArgumentParser(description=desc,
+                                     formatter_class=constants.ArgParseFormatter)
+    parser.add_argument('outdirs', nargs='+',
+                        help='Output directories of runs with --defer_provenance')
+    parser.add_argument('--logconf', default=None,
+                        help='Path to python logging configuration file')
+    parser.add_argument('--verbose', '-v', action='count', default=1,
+                        help='Increases verbosity of logger to standard '
+                             'error for log messages in this module.')
+    return parser.parse_args(args)
+
+
+def finalize_main(args):
+    """
+    Registers provenance deferred by runs with ``--defer_provenance``
+
+    :param args: arguments passed to command line usually :py:func:`sys.argv[1:]`
+                 where second element is ``finalize``
+    :type args: list
+    :return: ``0`` upon success or ``2`` if provenance of any
+             output directory could not be registered
+    :rtype: int
+    """
+    desc = """
+Version {version}
+
+Creates the RO-Crate and registers provenance of output directories
+written with --defer_provenance. Input files must still be at the
+paths used by the runs.
+    """.format(version=cellmaps_ppidownloader.__version__)
+    theargs = _parse_finalize_arguments(desc, args[2:])
+    theargs.program = args[0]
+    theargs.version = cellmaps_ppidownloader.__version__
+    try:
+        logutils.setup_cmd_logging(theargs)
+        retval = 0
+        for outdir in theargs.outdirs:
+            try:
+                CellmapsPPIDownloader.finalize(outdir)
+            except Exception as e:
+                logger.exception('Unable to finalize ' + str(outdir) + ': ' + str(e))
+                retval = 2
+        return retval
+    finally:
+        logging.shutdown()
+
+
+def resolver_main(args):
+    """
+    Runs resolver daemon that keeps a warm cache of gene resolutions
+    shared by concurrent runs of this tool
+
+    :param args: arguments passed to command line usually :py:func:`sys.argv[1:]`
+                 where second element is ``resolver``
+    :type args: list
+    :return: ``0`` upon shutdown or ``2`` if an exception is raised
+    :rtype: int
+    """
+    desc = """
+Version {version}
+
+Runs a long lived resolver daemon that keeps resolved genes in memory
+and merges identical queries from concurrent clients so each gene is
+sent to mygene once per --ttl period.
+
+Pass --resolver_url to runs of this tool to use the daemon
+    """.format(version=cellmaps_ppidownloader.__version__)
+    theargs = _parse_resolver_arguments(desc, args[2:])
+    theargs.program = args[0]
+    theargs.version = cellmaps_ppidownloader.__version__
+    try:
+        logutils.setup_cmd_logging(theargs)
+        mygeneinfo = GeneQuery.use_shared_session(mygene.MyGeneInfo())
+        service = GeneResolverService(mygeneinfo=mygeneinfo,
+                                      cache=ResolutionCache(ttl=theargs.ttl))
+        server = create_resolver_server(service, host=theargs.host,
+                                        port=theargs.port,
+                                        socket_path=theargs.socket)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            GeneQuery.close_shared_session()
+        return 0
+    except Exception as e:
+        logger.exception('Caught exception: ' + str(e))
+        return 2
+    finally:
+        logging.shutdown()
+
+
+def _parse_cutoffs(val):
+    """
+    Parses comma delimited list of cutoffs
+
+    :param val: cutoffs such as ``0.01,0.05``
+    :type val: str
+    :return: list of (cutoff as passed in, cutoff as float) or
+             ``[(None, None)]`` if **val** is ``None``
+    :rtype: list
+    """
+    if val is None:
+        return [(None, None)]
+    cutoffs = []
+    for entry in val.split(','):
+        entry = entry.strip()
+        if len(entry) == 0:
+            continue
+        cutoffs.append((entry, float(entry)))
+    return cutoffs
+
+
+def get_sweep_dirname(bfdr_cutoff=None, foldchange_cutoff=None):
+    """
+    Gets name of subdirectory where network for a combination
+    of sweep cutoffs is written
+
+    :param bfdr_cutoff: BFDR cutoff as passed on command line
+    :type bfdr_cutoff: str
+    :param foldchange_cutoff: FoldChange cutoff as passed on command line
+    :type foldchange_cutoff: str
+    :return: name such as ``bfdr_0.05_foldchange_2``
+    :rtype: str
+    """
+    parts = []
+    if bfdr_cutoff is not None:
+        parts.append('bfdr_' + bfdr_cutoff)
+    if foldchange_cutoff is not None:
+        parts.append('foldchange_' + foldchange_cutoff)
+    return '_'.join(parts)
+
+
+def _get_http_timeout(theargs, deadline=None):
+    """
+    Gets timeout for requests to mygene or the resolver daemon, which
+    is ``--http_timeout`` capped by time left for gene queries if
+    **deadline** is set
+
+    :param theargs: parsed command line arguments
+    :type theargs: :py:class:`argparse.Namespace`
+    :param deadline: time budget of run
+    :type deadline: :py:class:`~cellmaps_ppidownloader.deadline.Deadline`
+    :return: timeout in seconds
+    :rtype: float
+    """
+    http_timeout = theargs.http_timeout
+    if deadline is None:
+        return http_timeout
+    query_budget = deadline.get_query_budget()
+    if query_budget > 0:
+        http_timeout = min(http_timeout, query_budget)
+    return http_timeout
+
+
+def _run_sweep(theargs, apmsgen=None, score_cols=None, json_prov=None,
+               deadline=None):
+    """
+    Writes a network in a subdirectory of **theargs.outdir** for
+    each combination of ``--sweep_bfdr`` and ``--sweep_foldchange``
+    cutoffs reusing the genes resolved by **apmsgen**
+
+    :param theargs: parsed command line arguments
+    :type theargs: :py:class:`argparse.Namespace`
+    :param apmsgen: generator for the unfiltered table
+    :type apmsgen: :py:class:`~cellmaps_ppidownloader.gene.CM4AIGeneNodeAttributeGenerator`
+    :param score_cols: score columns requested via ``--score_cols``
+    :type score_cols: list
+    :param json_prov: provenance
+    :type json_prov: dict
+    :param deadline: time budget shared by all runs
+    :type deadline: :py:class:`~cellmaps_ppidownloader.deadline.Deadline`
+    :return: ``0`` if all runs succeeded otherwise largest
+             return code of the runs
+    :rtype: int
+    """
+    if os.path.isdir(theargs.outdir):
+        raise CellMapsPPIDownloaderError(theargs.outdir + ' already exists')
+    retval = 0
+    for bfdr_str, bfdr_cutoff in _parse_cutoffs(theargs.sweep_bfdr):
+        for fc_str, fc_cutoff in _parse_cutoffs(theargs.sweep_foldchange):
+            gen = apmsgen.get_thresholded_generator(bfdr_maxcutoff=bfdr_cutoff,
+                                                    foldchange_cutoff=fc_cutoff,
+                                                    score_cols=score_cols)
+            outdir = os.path.join(theargs.outdir,
+                                  get_sweep_dirname(bfdr_cutoff=bfdr_str,
+                                                    foldchange_cutoff=fc_str))
+            logger.info('Writing network to ' + outdir)
+            res = CellmapsPPIDownloader(outdir=outdir,
+                                        apmsgen=gen,
+                                        skip_logging=theargs.skip_logging,
+                                        write_csr=theargs.write_csr,
+                                        dedup_edges=theargs.dedup_edges,
+                                        self_loops=theargs.self_loops,
+                                        score_merge=theargs.score_merge,
+                                        dedup_max_in_memory=theargs.dedup_max_in_memory,
+                                        deadline=deadline,
+                                        defer_provenance=theargs.defer_provenance,
+                                        sort_outputs=theargs.shard_count is not None,
+                                        input_data_dict=theargs.__dict__,
+                                        provenance=json_prov).run()
+            retval = max(retval, res)
+    return retval
+
+
+SUBCOMMANDS = {'resolver': resolver_main,
+               'finalize': finalize_main,
+               'merge': merge_main,
+               'warm-cache': warm_cache_main,
+               'diff': diff_main}
+"""
+Maps subcommand name, passed as first argument, to function to run
+"""
+
+
 def main(args):
     """
     Main entry point for program
@@ -101,6 +879,9 @@ def main(args):
              or ``2`` if an exception is raised
     :rtype: int
     """
+    if len(args) > 1 and args[1] in SUBCOMMANDS:
+        return SUBCOMMANDS[args[1]](args)
+
     withguids_json = json.dumps(CellmapsPPIDownloader.get_example_provenance(with_ids=True), indent=2)
     register_json = json.dumps(CellmapsPPIDownloader.get_example_provenance(), indent=2)
 
@@ -130,6 +911,14 @@ For CM4AI data:
 
 To use pass in a CM4AI tsv file stored in RO-CRATE via --cm4ai_table flag
 
+Subcommands (run with -h for details):
+
+resolver    runs resolver daemon used via --resolver_url
+finalize    registers provenance of runs with --defer_provenance
+merge       merges runs with --shard_index and --shard_count
+warm-cache  bulk resolves genes ahead of runs and reports coverage
+diff        writes edges and genes changed between two runs
+
 In addition, the --provenance flag is required and must be set to a path
 to a JSON file.
 
@@ -153,7 +942,12 @@ Additional optional fields for registering datasets include
     theargs.version = cellmaps_ppidownloader.__version__
 
     try:
+        deadline = None
+        if theargs.deadline is not None:
+            deadline = Deadline(theargs.deadline)
         logutils.setup_cmd_logging(theargs)
+        archive.set_url_options(block_size=theargs.url_block_size,
+                                cache_dir=theargs.url_cache_dir)
         if theargs.provenance is None:
             sys.stderr.write('\n\n--provenance flag is required to run this tool. '
                              'Please pass '
@@ -169,26 +963,49 @@ Additional optional fields for registering datasets include
         with open(theargs.provenance, 'r') as f:
             json_prov = json.load(f)
 
-        if theargs.cm4ai_table is None:
-            apmsgen = APMSGeneNodeAttributeGenerator(
-                apms_edgelist=APMSGeneNodeAttributeGenerator.get_apms_edgelist_from_tsvfile(theargs.edgelist,
-                                                                                            geneid_one_col=theargs.edgelist_geneid_one_col,
-                                                                                            symbol_one_col=theargs.edgelist_symbol_one_col,
-                                                                                            geneid_two_col=theargs.edgelist_geneid_two_col,
-                                                                                            symbol_two_col=theargs.edgelist_symbol_two_col),
-                apms_baitlist=APMSGeneNodeAttributeGenerator.get_apms_baitlist_from_tsvfile(theargs.baitlist,
-                                                                                            symbol_col=theargs.baitlist_symbol_col,
-                                                                                            geneid_col=theargs.baitlist_geneid_col,
-                                                                                            numinteractors_col=theargs.baitlist_numinteractors_col))
+        fallback_scopes = None
+        if theargs.alias_fallback:
+            fallback_scopes = theargs.fallback_scopes
+        negative_cache = None
+        if theargs.negative_cache is not None:
+            if os.path.isfile(theargs.negative_cache):
+                negative_cache = NegativeCache.load(theargs.negative_cache,
+                                                    max_age=theargs.negative_cache_max_age)
+            else:
+                negative_cache = NegativeCache()
+        http_timeout = _get_http_timeout(theargs, deadline=deadline)
+        if theargs.resolver_url is not None:
+            mygeneinfo = ResolverClient(theargs.resolver_url, timeout=http_timeout)
         else:
-            json_prov[CellmapsPPIDownloader.CM4AI_ROCRATE] = os.path.abspath(os.path.dirname(theargs.cm4ai_table))
-            apmsgen = CM4AIGeneNodeAttributeGenerator(apms_edgelist=CM4AIGeneNodeAttributeGenerator.get_apms_edgelist_from_tsvfile(theargs.cm4ai_table))
-
-        return CellmapsPPIDownloader(outdir=theargs.outdir,
-                                     apmsgen=apmsgen,
-                                     skip_logging=theargs.skip_logging,
-                                     input_data_dict=theargs.__dict__,
-                                     provenance=json_prov).run()
+            mygeneinfo = GeneQuery.use_shared_session(mygene.MyGeneInfo(),
+                                                      pool_size=theargs.http_pool_size,
+                                                      timeout=http_timeout,
+                                                      keepalive=theargs.http_keepalive)
+        if theargs.adaptive_batching:
+            # there is no persistent store of query results to fall back
+            # on, the resolver daemon's cache is behind the same breaker,
+            # so an open breaker can only answer genes resolved earlier
+            # in this process, such as by other --sweep or --source runs
+            mygeneinfo = AdaptiveQueryController(mygeneinfo=mygeneinfo,
+                                                 cache=ResolutionCache(),
+                                                 max_inflight=theargs.max_inflight,
+                                                 target_latency=theargs.target_latency)
+        if theargs.source is not None and len(theargs.source) > 1 and \
+                theargs.resolver_url is None:
+            # resolve genes shared by sources once
+            mygeneinfo = GeneResolverService(mygeneinfo=mygeneinfo)
+        genequery = GeneQuery(mygeneinfo=mygeneinfo,
+                              fallback_scopes=fallback_scopes,
+                              sanitize=theargs.sanitize_queries,
+                              negative_cache=negative_cache,
+                              deadline=deadline)
+        try:
+            return _run(theargs, json_prov=json_prov, genequery=genequery,
+                        deadline=deadline)
+        finally:
+            GeneQuery.close_shared_session()
+            if negative_cache is not None:
+                negative_cache.save(theargs.negative_cache)
     except Exception as e:
         logger.exception('Caught exception: ' + str(e))
         return 2
@@ -196,5 +1013,231 @@ Additional optional fields for registering datasets include
         logging.shutdown()
 
 
+def _get_source_generator(theargs, source, genequery=None, score_cols=None,
+                          mapping_index=None):
+    """
+    Reads input of **source**, applying sample and shard options
+    of **theargs**, and creates gene node attribute generator for it
+
+    :param theargs: parsed command line arguments
+    :type theargs: :py:class:`argparse.Namespace`
+    :param source: source as returned by :py:func:`~cellmaps_ppidownloader.sources.parse_source`
+    :type source: dict
+    :return: generator for **source**
+    :rtype: :py:class:`~cellmaps_ppidownloader.gene.GeneNodeAttributeGenerator`
+    """
+    edge_scores = None
+    if score_cols is not None:
+        edge_scores = {}
+    sampler = None
+    if theargs.sample is not None:
+        sampler = EdgeSampler.from_string(theargs.sample, seed=theargs.sample_seed)
+    if source.get('edgelist') is not None:
+        apms_edgelist = APMSGeneNodeAttributeGenerator.get_apms_edgelist_from_tsvfile(source['edgelist'],
+                                                                                      score_cols=score_cols,
+                                                                                      edge_scores=edge_scores,
+                                                                                      sampler=sampler,
+                                                                                      **sources.get_source_kwargs(source))
+        cols = ('GeneID1', 'GeneID2')
+    else:
+        apms_edgelist = CM4AIGeneNodeAttributeGenerator.get_apms_edgelist_from_tsvfile(source['cm4ai_table'],
+                                                                                       score_cols=score_cols,
+                                                                                       edge_scores=edge_scores,
+                                                                                       topk=theargs.topk_per_bait,
+                                                                                       topk_col=theargs.topk_col,
+                                                                                       sampler=sampler,
+                                                                                       **sources.get_source_kwargs(source))
+        cols = ('Bait', 'Prey')
+    if theargs.shard_count is not None:
+        apms_edgelist, edge_scores = shard.filter_edges_for_shard(apms_edgelist,
+                                                                  theargs.shard_index,
+                                                                  theargs.shard_count,
+                                                                  cols=cols,
+                                                                  edge_scores=edge_scores)
+    if source.get('cm4ai_table') is not None:
+        return CM4AIGeneNodeAttributeGenerator(apms_edgelist=apms_edgelist,
+                                               genequery=genequery,
+                                               edge_scores=edge_scores,
+                                               gene_node_attrs_max_in_memory=theargs.gene_node_attrs_max_in_memory)
+    baitlist_kwargs = sources.get_source_kwargs(source, prefix='baitlist_')
+    baitlist = APMSGeneNodeAttributeGenerator.get_apms_baitlist_from_tsvfile(source.get('baitlist'),
+                                                                             **baitlist_kwargs)
+    return APMSGeneNodeAttributeGenerator(apms_edgelist=apms_edgelist,
+                                          apms_baitlist=baitlist,
+                                          genequery=genequery,
+                                          edge_scores=edge_scores,
+                                          trust_input=theargs.trust_input,
+                                          mapping_index=mapping_index,
+                                          gene_node_attrs_max_in_memory=theargs.gene_node_attrs_max_in_memory)
+
+
+def _run_sources(theargs, json_prov=None, genequery=None, deadline=None,
+                 score_cols=None, mapping_index=None, mapping_rocrates=None):
+    """
+    Combines inputs passed via ``--source`` and runs
+    :py:class:`~cellmaps_ppidownloader.runner.CellmapsPPIDownloader`
+    on them
+
+    :return: return value of :py:meth:`~cellmaps_ppidownloader.runner.CellmapsPPIDownloader.run`
+    :rtype: int
+    """
+    for flag in ['edgelist', 'baitlist', 'cm4ai_table', 'sweep_bfdr', 'sweep_foldchange']:
+        if getattr(theargs, flag) is not None:
+            raise CellMapsPPIDownloaderError('--' + flag + ' cannot be used with --source')
+    source_list = [sources.parse_source(spec) for spec in theargs.source]
+    generators = [(source['name'], _get_source_generator(theargs, source,
+                                                         genequery=genequery,
+                                                         score_cols=score_cols,
+                                                         mapping_index=mapping_index))
+                  for source in source_list]
+    apmsgen = MultiSourceGeneNodeAttributeGenerator(generators=generators,
+                                                    gene_node_attrs_max_in_memory=theargs.gene_node_attrs_max_in_memory)
+    return CellmapsPPIDownloader(outdir=theargs.outdir,
+                                 apmsgen=apmsgen,
+                                 skip_logging=theargs.skip_logging,
+                                 write_csr=theargs.write_csr,
+                                 dedup_edges=theargs.dedup_edges,
+                                 self_loops=theargs.self_loops,
+                                 score_merge=theargs.score_merge,
+                                 dedup_max_in_memory=theargs.dedup_max_in_memory,
+                                 mapping_rocrates=mapping_rocrates,
+                                 deadline=deadline,
+                                 defer_provenance=theargs.defer_provenance,
+                                 sort_outputs=theargs.shard_count is not None,
+                                 sources=source_list,
+                                 input_data_dict=theargs.__dict__,
+                                 provenance=json_prov).run()
+
+
+def _run(theargs, json_prov=None, genequery=None, deadline=None):
+    """
+    Creates gene node attribute generator for input passed on
+    command line and runs :py:class:`~cellmaps_ppidownloader.runner.CellmapsPPIDownloader`
+
+    :param theargs: parsed command line arguments
+    :type theargs: :py:class:`argparse.Namespace`
+    :param json_prov: provenance
+    :type json_prov: dict
+    :param genequery: used to resolve genes
+    :type genequery: :py:class:`~cellmaps_ppidownloader.gene.GeneQuery`
+    :param deadline: time budget of run
+    :type deadline: :py:class:`~cellmaps_ppidownloader.deadline.Deadline`
+    :return: return value of :py:meth:`~cellmaps_ppidownloader.runner.CellmapsPPIDownloader.run`
+    :rtype: int
+    """
+    score_cols = None
+    edge_scores = None
+    if theargs.score_cols is not None:
+        score_cols = [c.strip() for c in theargs.score_cols.split(',') if len(c.strip()) > 0]
+        edge_scores = {}
+
+    if theargs.trust_input and theargs.cm4ai_table is not None:
+        raise CellMapsPPIDownloaderError('--trust_input requires --edgelist')
+
+    mapping_index = None
+    mapping_rocrates = None
+    if theargs.mapping_from is not None:
+        if theargs.cm4ai_table is not None:
+            raise CellMapsPPIDownloaderError('--mapping_from requires --edgelist')
+        mapping_index = MappingIndex()
+        for path in theargs.mapping_from:
+            mapping_index.load(path)
+        mapping_rocrates = mapping_index.get_rocrates()
+
+    shard.check_shard(shard_index=theargs.shard_index,
+                      shard_count=theargs.shard_count)
+    sharded = theargs.shard_count is not None
+
+    if theargs.source is not None:
+        return _run_sources(theargs, json_prov=json_prov, genequery=genequery,
+                            deadline=deadline, score_cols=score_cols,
+                            mapping_index=mapping_index,
+                            mapping_rocrates=mapping_rocrates)
+
+    sampler = None
+    if theargs.sample is not None:
+        sampler = EdgeSampler.from_string(theargs.sample, seed=theargs.sample_seed)
+
+    if theargs.cm4ai_table is None:
+        if theargs.sweep_bfdr is not None or theargs.sweep_foldchange is not None:
+            raise CellMapsPPIDownloaderError('--sweep_bfdr and --sweep_foldchange '
+                                             'require --cm4ai_table')
+        apms_edgelist = APMSGeneNodeAttributeGenerator.get_apms_edgelist_from_tsvfile(theargs.edgelist,
+                                                                                      geneid_one_col=theargs.edgelist_geneid_one_col,
+                                                                                      symbol_one_col=theargs.edgelist_symbol_one_col,
+                                                                                      geneid_two_col=theargs.edgelist_geneid_two_col,
+                                                                                      symbol_two_col=theargs.edgelist_symbol_two_col,
+                                                                                      score_cols=score_cols,
+                                                                                      edge_scores=edge_scores,
+                                                                                      ensembl_one_col=theargs.edgelist_ensembl_one_col,
+                                                                                      ensembl_two_col=theargs.edgelist_ensembl_two_col,
+                                                                                      sampler=sampler)
+        if sharded:
+            apms_edgelist, edge_scores = shard.filter_edges_for_shard(apms_edgelist,
+                                                                      theargs.shard_index,
+                                                                      theargs.shard_count,
+                                                                      cols=('GeneID1', 'GeneID2'),
+                                                                      edge_scores=edge_scores)
+        apmsgen = APMSGeneNodeAttributeGenerator(
+            apms_edgelist=apms_edgelist,
+            apms_baitlist=APMSGeneNodeAttributeGenerator.get_apms_baitlist_from_tsvfile(theargs.baitlist,
+                                                                                        symbol_col=theargs.baitlist_symbol_col,
+                                                                                        geneid_col=theargs.baitlist_geneid_col,
+                                                                                        numinteractors_col=theargs.baitlist_numinteractors_col),
+            genequery=genequery,
+            edge_scores=edge_scores,
+            trust_input=theargs.trust_input,
+            mapping_index=mapping_index,
+            gene_node_attrs_max_in_memory=theargs.gene_node_attrs_max_in_memory)
+    else:
+        json_prov[CellmapsPPIDownloader.CM4AI_ROCRATE] = archive.get_parent_rocrate(theargs.cm4ai_table)
+        sweep = theargs.sweep_bfdr is not None or theargs.sweep_foldchange is not None
+        table_score_cols = score_cols
+        if sweep:
+            # load cutoff columns as scores so the table is only read once
+            table_score_cols = list(score_cols or [])
+            for col, cutoffs in [('BFDR.x', theargs.sweep_bfdr),
+                                 ('FoldChange.x', theargs.sweep_foldchange)]:
+                if cutoffs is not None and col not in table_score_cols:
+                    table_score_cols.append(col)
+            edge_scores = {}
+        apms_edgelist = CM4AIGeneNodeAttributeGenerator.get_apms_edgelist_from_tsvfile(theargs.cm4ai_table,
+                                                                                       score_cols=table_score_cols,
+                                                                                       edge_scores=edge_scores,
+                                                                                       topk=theargs.topk_per_bait,
+                                                                                       topk_col=theargs.topk_col,
+                                                                                       sampler=sampler)
+        if sharded:
+            apms_edgelist, edge_scores = shard.filter_edges_for_shard(apms_edgelist,
+                                                                      theargs.shard_index,
+                                                                      theargs.shard_count,
+                                                                      cols=('Bait', 'Prey'),
+                                                                      edge_scores=edge_scores)
+        apmsgen = CM4AIGeneNodeAttributeGenerator(apms_edgelist=apms_edgelist,
+                                                  genequery=genequery,
+                                                  edge_scores=edge_scores,
+                                                  gene_node_attrs_max_in_memory=theargs.gene_node_attrs_max_in_memory)
+        if sweep:
+            return _run_sweep(theargs, apmsgen=apmsgen,
+                              score_cols=score_cols or [],
+                              json_prov=json_prov,
+                              deadline=deadline)
+
+    return CellmapsPPIDownloader(outdir=theargs.outdir,
+                                 apmsgen=apmsgen,
+                                 skip_logging=theargs.skip_logging,
+                                 write_csr=theargs.write_csr,
+                                 dedup_edges=theargs.dedup_edges,
+                                 self_loops=theargs.self_loops,
+                                 score_merge=theargs.score_merge,
+                                 dedup_max_in_memory=theargs.dedup_max_in_memory,
+                                 mapping_rocrates=mapping_rocrates,
+                                 deadline=deadline,
+                                 defer_provenance=theargs.defer_provenance,
+                                 sort_outputs=sharded,
+                                 input_data_dict=theargs.__dict__,
+                                 provenance=json_prov).run()
+
+
 if __name__ == '__main__':  # pragma: no cover
     sys.exit(main(sys.argv))
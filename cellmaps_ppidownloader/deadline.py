@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+import time
+import logging
+
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+logger = logging.getLogger(__name__)
+
+
+class Deadline(object):
+    """
+    Time budget for a whole run shared by gene resolution, writing
+    of outputs and registration of provenance. Gene queries stop once
+    only **reserve** seconds are left so the run can finish from
+    the genes resolved so far. Genes left unresolved because of
+    the deadline are recorded here
+    """
+
+    DEFAULT_RESERVE_FRACTION = 0.1
+    """
+    Fraction of budget kept for writing outputs and provenance
+    when **reserve** is not set
+    """
+
+    def __init__(self, seconds, reserve=None, clock=time.monotonic):
+        """
+        Constructor
+
+        :param seconds: time budget in seconds starting now
+        :type seconds: float
+        :param reserve: seconds of budget not used by gene queries.
+                        If ``None`` :py:const:`DEFAULT_RESERVE_FRACTION`
+                        of **seconds** is used
+        :type reserve: float
+        :param clock: function returning current time in seconds
+        :type clock: callable
+        :raises CellMapsPPIDownloaderError: If **seconds** is not positive
+                                            or **reserve** is invalid
+        """
+        if seconds is None or seconds <= 0:
+            raise CellMapsPPIDownloaderError('Deadline must be a positive '
+                                             'number of seconds: ' + str(seconds))
+        if reserve is None:
+            reserve = seconds * Deadline.DEFAULT_RESERVE_FRACTION
+        if reserve < 0 or reserve >= seconds:
+            raise CellMapsPPIDownloaderError('Deadline reserve must be at least 0 '
+                                             'and less than ' + str(seconds))
+        self._clock = clock
+        self._seconds = seconds
+        self._reserve = reserve
+        self._end = clock() + seconds
+        self._unresolved = []
+        self._unresolved_set = set()
+
+    def get_seconds(self):
+        """
+        Gets time budget passed to constructor
+
+        :return: time budget in seconds
+        :rtype: float
+        """
+        return self._seconds
+
+    def get_remaining(self):
+        """
+        Gets time left before deadline
+
+        :return: seconds left, ``0`` if deadline has passed
+        :rtype: float
+        """
+        return max(0.0, self._end - self._clock())
+
+    def get_query_budget(self):
+        """
+        Gets time left for gene queries which is time left
+        before deadline minus the reserve
+
+        :return: seconds left for queries, ``0`` if none are left
+        :rtype: float
+        """
+        return max(0.0, self.get_remaining() - self._reserve)
+
+    def is_expired(self):
+        """
+        Checks if deadline has passed
+
+        :return: ``True`` if deadline has passed
+        :rtype: bool
+        """
+        return self.get_remaining() <= 0
+
+    def add_unresolved(self, genes):
+        """
+        Records **genes** as left unresolved because of the deadline
+
+        :param genes: gene ids or symbols
+        :type genes: list
+        """
+        for gene in genes:
+            gene = str(gene)
+            if gene in self._unresolved_set:
+                continue
+            self._unresolved_set.add(gene)
+            self._unresolved.append(gene)
+
+    def is_unresolved(self, gene):
+        """
+        Checks if **gene** was left unresolved because of the deadline
+
+        :param gene: gene id or symbol
+        :type gene: str
+        :return: ``True`` if **gene** was left unresolved
+        :rtype: bool
+        """
+        return str(gene) in self._unresolved_set
+
+    def get_unresolved(self):
+        """
+        Gets genes left unresolved because of the deadline in the
+        order they were recorded
+
+        :return: gene ids or symbols
+        :rtype: list
+        """
+        return list(self._unresolved)
@@ -0,0 +1,405 @@
+# -*- coding: utf-8 -*-
+
+import os
+import csv
+import heapq
+import logging
+import tempfile
+
+from cellmaps_utils import constants
+
+from cellmaps_ppidownloader.edges import canonical_pair
+from cellmaps_ppidownloader.edges import edge_hash
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+logger = logging.getLogger(__name__)
+
+
+class NetworkDiff(object):
+    """
+    Compares ``ppi_edgelist.tsv`` and ``ppi_gene_node_attributes.tsv``
+    of two output directories, such as runs on two releases of
+    BioPlex or CM4AI, and writes added and removed edges and added,
+    removed and changed genes as compact TSV files so downstream work
+    can be limited to the delta
+
+    Edges are compared as undirected gene pairs, ignoring score
+    columns. By default each edgelist is reduced to a set of 64 bit
+    hashes of its canonical pairs and rows are streamed against those
+    sets. If **max_in_memory** is set, both edgelists are instead
+    sorted by pair with an external sort that spills to disk and
+    compared in a single merge pass
+    """
+
+    EDGES_ADDED_FILE = 'ppi_edgelist_added.tsv'
+    """
+    Edges only in new edgelist, with header of new edgelist
+    """
+
+    EDGES_REMOVED_FILE = 'ppi_edgelist_removed.tsv'
+    """
+    Edges only in old edgelist, with header of old edgelist
+    """
+
+    NODES_ADDED_FILE = 'ppi_gene_node_attributes_added.tsv'
+    """
+    Genes only in new gene node attributes
+    """
+
+    NODES_REMOVED_FILE = 'ppi_gene_node_attributes_removed.tsv'
+    """
+    Genes only in old gene node attributes
+    """
+
+    NODES_CHANGED_FILE = 'ppi_gene_node_attributes_changed.tsv'
+    """
+    One row per changed attribute of genes in both
+    """
+
+    NODES_CHANGED_COLS = ['name', 'attribute', 'old', 'new']
+    """
+    Columns of :py:const:`NODES_CHANGED_FILE`
+    """
+
+    GENE_KEY_COLS = ['name', 'represents', 'ambiguous']
+    """
+    Columns pairing genes of old and new gene node attributes when
+    several genes, such as query ids mapping to one symbol, share a name
+    """
+
+    def __init__(self, max_in_memory=None, tmpdir=None):
+        """
+        Constructor
+
+        :param max_in_memory: If set, edgelists are compared with an
+                              external sort holding at most this many
+                              edges in memory
+        :type max_in_memory: int
+        :param tmpdir: directory for spill files, ``None`` uses system
+                       default
+        :type tmpdir: str
+        :raises CellMapsPPIDownloaderError: If **max_in_memory** is
+                                            less than 1
+        """
+        if max_in_memory is not None and max_in_memory < 1:
+            raise CellMapsPPIDownloaderError('max_in_memory must be at least 1')
+        self._max_in_memory = max_in_memory
+        self._tmpdir = tmpdir
+
+    @staticmethod
+    def _read_edges(edgelist_file):
+        """
+        Generator of header, then (canonical pair, row) for each
+        edge of **edgelist_file**
+        """
+        with open(edgelist_file, 'r', newline='') as f:
+            reader = csv.reader(f, delimiter='\t')
+            yield next(reader, [])
+            for row in reader:
+                if len(row) < 2:
+                    continue
+                yield canonical_pair(row[0], row[1]), row
+
+    @staticmethod
+    def _get_edge_header(edgelist_file):
+        """
+        Gets header of **edgelist_file**
+        """
+        edges = NetworkDiff._read_edges(edgelist_file)
+        header = next(edges)
+        edges.close()
+        return header
+
+    @staticmethod
+    def _get_edge_hashes(edgelist_file):
+        """
+        Gets set of hashes of edges in **edgelist_file**
+        """
+        edges = NetworkDiff._read_edges(edgelist_file)
+        next(edges)
+        return set(edge_hash(key[0], key[1]) for key, _ in edges)
+
+    @staticmethod
+    def _write_edges_in(edgelist_file, hashes, writer):
+        """
+        Writes rows of **edgelist_file** whose hash is in **hashes**,
+        each pair once
+
+        :return: number of edges written
+        :rtype: int
+        """
+        hashes = set(hashes)
+        count = 0
+        edges = NetworkDiff._read_edges(edgelist_file)
+        next(edges)
+        for key, row in edges:
+            pair_hash = edge_hash(key[0], key[1])
+            if pair_hash not in hashes:
+                continue
+            hashes.discard(pair_hash)
+            writer.writerow(row)
+            count += 1
+        return count
+
+    def _spill(self, chunk):
+        """
+        Writes **chunk** of (canonical pair, row) sorted by pair
+        to a temporary file
+
+        :return: path to file
+        :rtype: str
+        """
+        fd, spill_file = tempfile.mkstemp(prefix='ppidiff_', suffix='.tsv',
+                                          dir=self._tmpdir)
+        logger.debug('Spilling ' + str(len(chunk)) + ' edges to ' + spill_file)
+        chunk.sort(key=lambda x: x[0])
+        with os.fdopen(fd, 'w', newline='') as f:
+            writer = csv.writer(f, delimiter='\t', lineterminator='\n')
+            for key, row in chunk:
+                writer.writerow([key[0], key[1]] + row)
+        return spill_file
+
+    @staticmethod
+    def _read_spill_file(spill_file):
+        with open(spill_file, 'r', newline='') as f:
+            for row in csv.reader(f, delimiter='\t'):
+                yield (row[0], row[1]), row[2:]
+
+    def _sorted_edges(self, edgelist_file, spill_files):
+        """
+        Generator of (canonical pair, row) of **edgelist_file** sorted
+        by pair with duplicate pairs removed. Spill files created are
+        appended to **spill_files** for caller to remove
+        """
+        edges = NetworkDiff._read_edges(edgelist_file)
+        next(edges)
+        chunk = []
+        for edge in edges:
+            chunk.append(edge)
+            if len(chunk) >= self._max_in_memory:
+                spill_files.append(self._spill(chunk))
+                chunk = []
+        chunk.sort(key=lambda x: x[0])
+        readers = [NetworkDiff._read_spill_file(s) for s in spill_files]
+        prev_key = None
+        for key, row in heapq.merge(iter(chunk), *readers, key=lambda x: x[0]):
+            if key == prev_key:
+                continue
+            prev_key = key
+            yield key, row
+
+    def _diff_sorted_edges(self, old_edgelist, new_edgelist,
+                           added_writer, removed_writer):
+        """
+        Compares edgelists by merging them sorted by pair
+
+        :return: (edges added, edges removed)
+        :rtype: tuple
+        """
+        old_spill = []
+        new_spill = []
+        num_added = 0
+        num_removed = 0
+        try:
+            old_edges = self._sorted_edges(old_edgelist, old_spill)
+            new_edges = self._sorted_edges(new_edgelist, new_spill)
+            old_edge = next(old_edges, None)
+            new_edge = next(new_edges, None)
+            while old_edge is not None or new_edge is not None:
+                if new_edge is None or (old_edge is not None and
+                                        old_edge[0] < new_edge[0]):
+                    removed_writer.writerow(old_edge[1])
+                    num_removed += 1
+                    old_edge = next(old_edges, None)
+                elif old_edge is None or new_edge[0] < old_edge[0]:
+                    added_writer.writerow(new_edge[1])
+                    num_added += 1
+                    new_edge = next(new_edges, None)
+                else:
+                    old_edge = next(old_edges, None)
+                    new_edge = next(new_edges, None)
+        finally:
+            for spill_file in old_spill + new_spill:
+                if os.path.isfile(spill_file):
+                    os.unlink(spill_file)
+        return num_added, num_removed
+
+    def diff_edgelists(self, old_edgelist, new_edgelist, outdir):
+        """
+        Writes edges only in **new_edgelist** to
+        :py:const:`EDGES_ADDED_FILE` and edges only in **old_edgelist**
+        to :py:const:`EDGES_REMOVED_FILE` under **outdir**
+
+        :param old_edgelist: path to old ``ppi_edgelist.tsv``
+        :type old_edgelist: str
+        :param new_edgelist: path to new ``ppi_edgelist.tsv``
+        :type new_edgelist: str
+        :param outdir: existing directory to write files to
+        :type outdir: str
+        :return: (edges added, edges removed)
+        :rtype: tuple
+        """
+        with open(os.path.join(outdir, NetworkDiff.EDGES_ADDED_FILE), 'w',
+                  newline='') as added_f, \
+                open(os.path.join(outdir, NetworkDiff.EDGES_REMOVED_FILE), 'w',
+                     newline='') as removed_f:
+            added_writer = csv.writer(added_f, delimiter='\t', lineterminator='\r\n')
+            removed_writer = csv.writer(removed_f, delimiter='\t', lineterminator='\r\n')
+            added_writer.writerow(NetworkDiff._get_edge_header(new_edgelist))
+            removed_writer.writerow(NetworkDiff._get_edge_header(old_edgelist))
+            if self._max_in_memory is not None:
+                return self._diff_sorted_edges(old_edgelist, new_edgelist,
+                                               added_writer, removed_writer)
+            old_hashes = NetworkDiff._get_edge_hashes(old_edgelist)
+            new_hashes = NetworkDiff._get_edge_hashes(new_edgelist)
+            num_added = NetworkDiff._write_edges_in(new_edgelist,
+                                                    new_hashes.difference(old_hashes),
+                                                    added_writer)
+            num_removed = NetworkDiff._write_edges_in(old_edgelist,
+                                                      old_hashes.difference(new_hashes),
+                                                      removed_writer)
+            return num_added, num_removed
+
+    @staticmethod
+    def _read_gene_node_attributes(gene_node_attr_file):
+        """
+        Reads **gene_node_attr_file**
+
+        :return: (columns, dict of name to list of row dicts)
+        :rtype: tuple
+        """
+        genes = {}
+        with open(gene_node_attr_file, 'r', newline='') as f:
+            reader = csv.DictReader(f, delimiter='\t')
+            for row in reader:
+                genes.setdefault(row['name'], []).append(row)
+            return list(reader.fieldnames or []), genes
+
+    @staticmethod
+    def _pair_genes(old_rows, new_rows):
+        """
+        Pairs rows of genes sharing a name in old and new gene node
+        attributes. One row in each is the same gene, whose attributes
+        may have changed. Otherwise rows are paired on
+        :py:const:`GENE_KEY_COLS`
+
+        :return: (list of (old row, new row), rows only in new,
+                  rows only in old)
+        :rtype: tuple
+        """
+        if len(old_rows) == 1 and len(new_rows) == 1:
+            return [(old_rows[0], new_rows[0])], [], []
+        new_by_key = {}
+        for index, row in enumerate(new_rows):
+            key = tuple(row.get(c) or '' for c in NetworkDiff.GENE_KEY_COLS)
+            new_by_key.setdefault(key, []).append(index)
+        pairs = []
+        removed = []
+        paired = set()
+        for row in old_rows:
+            key = tuple(row.get(c) or '' for c in NetworkDiff.GENE_KEY_COLS)
+            indexes = new_by_key.get(key)
+            if not indexes:
+                removed.append(row)
+                continue
+            index = indexes.pop(0)
+            paired.add(index)
+            pairs.append((row, new_rows[index]))
+        added = [row for index, row in enumerate(new_rows) if index not in paired]
+        return pairs, added, removed
+
+    def diff_gene_node_attributes(self, old_attr_file, new_attr_file, outdir):
+        """
+        Writes genes only in **new_attr_file** to
+        :py:const:`NODES_ADDED_FILE`, genes only in **old_attr_file**
+        to :py:const:`NODES_REMOVED_FILE` and each attribute that
+        differs for a gene in both to :py:const:`NODES_CHANGED_FILE`
+        under **outdir**. Genes sharing a name are told apart by
+        :py:const:`GENE_KEY_COLS`
+
+        :param old_attr_file: path to old ``ppi_gene_node_attributes.tsv``
+        :type old_attr_file: str
+        :param new_attr_file: path to new ``ppi_gene_node_attributes.tsv``
+        :type new_attr_file: str
+        :param outdir: existing directory to write files to
+        :type outdir: str
+        :return: (genes added, genes removed, genes changed)
+        :rtype: tuple
+        """
+        old_cols, old_genes = NetworkDiff._read_gene_node_attributes(old_attr_file)
+        new_cols, new_genes = NetworkDiff._read_gene_node_attributes(new_attr_file)
+        cols = old_cols + [c for c in new_cols if c not in old_cols]
+        added = []
+        removed = []
+        pairs = []
+        for name in sorted(set(old_genes.keys()).union(new_genes.keys())):
+            name_pairs, name_added, name_removed = NetworkDiff._pair_genes(old_genes.get(name, []),
+                                                                           new_genes.get(name, []))
+            pairs.extend(name_pairs)
+            added.extend(name_added)
+            removed.extend(name_removed)
+        for cols_to_write, rows, filename in [(new_cols, added, NetworkDiff.NODES_ADDED_FILE),
+                                              (old_cols, removed, NetworkDiff.NODES_REMOVED_FILE)]:
+            with open(os.path.join(outdir, filename), 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=cols_to_write, delimiter='\t')
+                writer.writeheader()
+                for row in rows:
+                    writer.writerow(row)
+        num_changed = 0
+        with open(os.path.join(outdir, NetworkDiff.NODES_CHANGED_FILE), 'w',
+                  newline='') as f:
+            writer = csv.writer(f, delimiter='\t', lineterminator='\r\n')
+            writer.writerow(NetworkDiff.NODES_CHANGED_COLS)
+            for old_row, new_row in pairs:
+                changed = False
+                for col in cols:
+                    if col == 'name':
+                        continue
+                    old_val = old_row.get(col) or ''
+                    new_val = new_row.get(col) or ''
+                    if old_val != new_val:
+                        writer.writerow([old_row['name'], col, old_val, new_val])
+                        changed = True
+                if changed:
+                    num_changed += 1
+        return len(added), len(removed), num_changed
+
+    def diff(self, old_dir, new_dir, outdir):
+        """
+        Compares ``ppi_edgelist.tsv`` and ``ppi_gene_node_attributes.tsv``
+        of **old_dir** and **new_dir** writing the delta to **outdir**
+
+        :param old_dir: output directory of earlier run
+        :type old_dir: str
+        :param new_dir: output directory of later run
+        :type new_dir: str
+        :param outdir: directory to write delta files to, created if needed
+        :type outdir: str
+        :raises CellMapsPPIDownloaderError: If an input file is missing
+        :return: counts of ``edges_added``, ``edges_removed``, ``genes_added``,
+                 ``genes_removed`` and ``genes_changed``
+        :rtype: dict
+        """
+        for d in [old_dir, new_dir]:
+            for filename in [constants.PPI_EDGELIST_FILE,
+                             constants.PPI_GENE_NODE_ATTR_FILE]:
+                if not os.path.isfile(os.path.join(d, filename)):
+                    raise CellMapsPPIDownloaderError(filename + ' not found in ' + d)
+        if not os.path.isdir(outdir):
+            os.makedirs(outdir, mode=0o755)
+        edges_added, edges_removed = self.diff_edgelists(os.path.join(old_dir,
+                                                                      constants.PPI_EDGELIST_FILE),
+                                                         os.path.join(new_dir,
+                                                                      constants.PPI_EDGELIST_FILE),
+                                                         outdir)
+        genes_added, genes_removed, genes_changed = \
+            self.diff_gene_node_attributes(os.path.join(old_dir, constants.PPI_GENE_NODE_ATTR_FILE),
+                                           os.path.join(new_dir, constants.PPI_GENE_NODE_ATTR_FILE),
+                                           outdir)
+        counts = {'edges_added': edges_added,
+                  'edges_removed': edges_removed,
+                  'genes_added': genes_added,
+                  'genes_removed': genes_removed,
+                  'genes_changed': genes_changed}
+        logger.info('Diff of ' + old_dir + ' and ' + new_dir + ': ' + str(counts))
+        return counts
@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+
+import os
+import csv
+import math
+import heapq
+import hashlib
+import logging
+import tempfile
+
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+logger = logging.getLogger(__name__)
+
+
+def canonical_pair(genea, geneb):
+    """
+    Orders an undirected edge so (A, B) and (B, A) give the same pair
+
+    :param genea: first gene
+    :type genea: str
+    :param geneb: second gene
+    :type geneb: str
+    :return: (smaller gene, larger gene)
+    :rtype: tuple
+    """
+    if genea <= geneb:
+        return genea, geneb
+    return geneb, genea
+
+
+def edge_hash(genea, geneb, salt=''):
+    """
+    Gets stable 64 bit hash of undirected edge between **genea**
+    and **geneb** so (A, B) and (B, A) give the same value in every
+    process and Python version
+
+    :param genea: first gene
+    :type genea: str
+    :param geneb: second gene
+    :type geneb: str
+    :param salt: if set, prepended to the pair so different salts,
+                 such as sampling seeds, give unrelated values
+    :type salt: str
+    :return: hash of canonical pair
+    :rtype: int
+    """
+    key = canonical_pair(str(genea), str(geneb))
+    if salt:
+        key = (str(salt),) + key
+    digest = hashlib.blake2b('\t'.join(key).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+class EdgeDeduplicator(object):
+    """
+    Collapses undirected edges that connect the same pair of genes,
+    such as reciprocal A-B/B-A rows, replicate rows and rows that map
+    to the same gene symbols, into one edge per canonical pair.
+    Scores of collapsed edges are merged using the configured policy
+
+    Unique pairs are kept in a hash table. If **max_in_memory** is
+    set and the table grows past that size, pairs are spilled to
+    sorted temporary files that are merged at the end
+    """
+
+    FIRST = 'first'
+    MAX = 'max'
+    MIN = 'min'
+    MEAN = 'mean'
+    SUM = 'sum'
+    SCORE_MERGE_POLICIES = [FIRST, MAX, MIN, MEAN, SUM]
+    """
+    Supported ways to merge scores of duplicate edges
+    """
+
+    KEEP = 'keep'
+    DROP = 'drop'
+    SELF_LOOP_POLICIES = [KEEP, DROP]
+    """
+    Supported ways to handle edges connecting a gene to itself
+    """
+
+    def __init__(self, self_loops=KEEP, score_merge=FIRST,
+                 max_in_memory=None, tmpdir=None):
+        """
+        Constructor
+
+        :param self_loops: One of :py:const:`SELF_LOOP_POLICIES`
+        :type self_loops: str
+        :param score_merge: One of :py:const:`SCORE_MERGE_POLICIES`.
+                            Missing (``nan``) scores are ignored
+                            when merging
+        :type score_merge: str
+        :param max_in_memory: Maximum number of unique pairs to hold in
+                              memory before spilling to disk. ``None``
+                              means never spill
+        :type max_in_memory: int
+        :param tmpdir: directory for spill files, ``None`` uses system
+                       default
+        :type tmpdir: str
+        :raises CellMapsPPIDownloaderError: If a policy is invalid
+        """
+        if self_loops not in EdgeDeduplicator.SELF_LOOP_POLICIES:
+            raise CellMapsPPIDownloaderError('Invalid self loop policy: ' + str(self_loops))
+        if score_merge not in EdgeDeduplicator.SCORE_MERGE_POLICIES:
+            raise CellMapsPPIDownloaderError('Invalid score merge policy: ' + str(score_merge))
+        if max_in_memory is not None and max_in_memory < 1:
+            raise CellMapsPPIDownloaderError('max_in_memory must be at least 1')
+        self._self_loops = self_loops
+        self._score_merge = score_merge
+        self._max_in_memory = max_in_memory
+        self._tmpdir = tmpdir
+        self._num_in = 0
+        self._num_out = 0
+        self._num_self_loops = 0
+        self._union_cols = set()
+
+    def get_counts(self):
+        """
+        Gets counts from last call to :py:meth:`deduplicate`
+
+        :return: (edges in, edges out, self loops dropped)
+        :rtype: tuple
+        """
+        return self._num_in, self._num_out, self._num_self_loops
+
+    def _merge_value(self, current, new):
+        """
+        Merges score **new** into accumulated score **current**
+        """
+        if math.isnan(current):
+            return new
+        if math.isnan(new):
+            return current
+        if self._score_merge == EdgeDeduplicator.MAX:
+            return max(current, new)
+        if self._score_merge == EdgeDeduplicator.MIN:
+            return min(current, new)
+        if self._score_merge in (EdgeDeduplicator.MEAN, EdgeDeduplicator.SUM):
+            return current + new
+        return current
+
+    def _merge(self, current, new):
+        """
+        Merges accumulator **new** into **current** where an
+        accumulator is a list of (number of scores seen, score)
+        for each score column
+        """
+        for i, (count, value) in enumerate(new):
+            cur_count, cur_value = current[i]
+            if math.isnan(value):
+                continue
+            if i in self._union_cols and not math.isnan(cur_value):
+                current[i] = (cur_count + count, float(int(cur_value) | int(value)))
+                continue
+            current[i] = (cur_count + count, self._merge_value(cur_value, value))
+
+    def _finalize(self, accumulator):
+        """
+        Converts accumulator to tuple of merged scores
+        """
+        if self._score_merge == EdgeDeduplicator.MEAN:
+            return tuple(value / count if count > 0 and i not in self._union_cols else value
+                         for i, (count, value) in enumerate(accumulator))
+        return tuple(value for _, value in accumulator)
+
+    @staticmethod
+    def _new_accumulator(scores):
+        return [(0, float('nan')) if math.isnan(s) else (1, s)
+                for s in (float(s) for s in scores)]
+
+    def merge_scores(self, scores):
+        """
+        Merges **scores** of edges connecting the same pair of genes
+        with the score merge policy, as :py:meth:`deduplicate` does,
+        without counting or logging them as deduplicated edges
+
+        :param scores: tuple of scores for each edge
+        :type scores: list
+        :return: merged scores
+        :rtype: tuple
+        """
+        self._union_cols = set()
+        accumulator = None
+        for edge_scores in scores:
+            if accumulator is None:
+                accumulator = EdgeDeduplicator._new_accumulator(edge_scores)
+                continue
+            self._merge(accumulator, EdgeDeduplicator._new_accumulator(edge_scores))
+        return self._finalize(accumulator)
+
+    def deduplicate(self, edges, union_cols=None):
+        """
+        Deduplicates **edges**
+
+        Without spilling, edges are output in order each pair
+        was first seen. If pairs were spilled to disk, edges
+        are output sorted by pair
+
+        :param edges: iterable of (gene A, gene B, tuple of scores)
+        :type edges: iterable
+        :param union_cols: Indexes of score columns holding bit masks,
+                           such as the sources of an edge, that are
+                           merged with bitwise or instead of the
+                           score merge policy
+        :type union_cols: list
+        :return: generator of (gene A, gene B, tuple of merged scores)
+                 where gene A <= gene B
+        :rtype: tuple
+        """
+        self._num_in = 0
+        self._num_out = 0
+        self._num_self_loops = 0
+        self._union_cols = set(union_cols or [])
+        table = {}
+        spill_files = []
+        try:
+            for genea, geneb, scores in edges:
+                self._num_in += 1
+                if genea == geneb and self._self_loops == EdgeDeduplicator.DROP:
+                    self._num_self_loops += 1
+                    continue
+                key = canonical_pair(genea, geneb)
+                accumulator = EdgeDeduplicator._new_accumulator(scores)
+                if key in table:
+                    self._merge(table[key], accumulator)
+                    continue
+                table[key] = accumulator
+                if self._max_in_memory is not None and len(table) >= self._max_in_memory:
+                    spill_files.append(self._spill(table))
+                    table = {}
+
+            if len(spill_files) == 0:
+                for (genea, geneb), accumulator in table.items():
+                    self._num_out += 1
+                    yield genea, geneb, self._finalize(accumulator)
+                return
+            if len(table) > 0:
+                spill_files.append(self._spill(table))
+                table = {}
+            for genea, geneb, scores in self._merge_spill_files(spill_files):
+                self._num_out += 1
+                yield genea, geneb, scores
+        finally:
+            for spill_file in spill_files:
+                if os.path.isfile(spill_file):
+                    os.unlink(spill_file)
+            logger.info('Deduplicated ' + str(self._num_in) + ' edges to ' +
+                        str(self._num_out) + ' (' + str(self._num_self_loops) +
+                        ' self loops dropped)')
+
+    def _spill(self, table):
+        """
+        Writes **table** sorted by pair to a temporary file
+
+        :return: path to file
+        :rtype: str
+        """
+        fd, spill_file = tempfile.mkstemp(prefix='ppidedup_', suffix='.tsv',
+                                          dir=self._tmpdir)
+        logger.debug('Spilling ' + str(len(table)) + ' edges to ' + spill_file)
+        with os.fdopen(fd, 'w', newline='') as f:
+            writer = csv.writer(f, delimiter='\t', lineterminator='\n')
+            for key in sorted(table.keys()):
+                row = [key[0], key[1]]
+                for count, value in table[key]:
+                    row.extend([count, repr(value)])
+                writer.writerow(row)
+        return spill_file
+
+    @staticmethod
+    def _read_spill_file(spill_file):
+        """
+        Reads file written by :py:meth:`_spill`
+
+        :return: generator of (pair, accumulator)
+        """
+        with open(spill_file, 'r', newline='') as f:
+            reader = csv.reader(f, delimiter='\t')
+            for row in reader:
+                accumulator = [(int(row[i]), float(row[i + 1]))
+                               for i in range(2, len(row), 2)]
+                yield (row[0], row[1]), accumulator
+
+    def _merge_spill_files(self, spill_files):
+        """
+        k-way merges sorted spill files combining entries
+        with the same pair. Ties are taken in file order so
+        the ``first`` policy keeps the earliest score
+
+        :return: generator of (gene A, gene B, tuple of merged scores)
+        """
+        readers = [EdgeDeduplicator._read_spill_file(s) for s in spill_files]
+        cur_key = None
+        cur_acc = None
+        for key, accumulator in heapq.merge(*readers, key=lambda x: x[0]):
+            if key == cur_key:
+                self._merge(cur_acc, accumulator)
+                continue
+            if cur_key is not None:
+                yield cur_key[0], cur_key[1], self._finalize(cur_acc)
+            cur_key = key
+            cur_acc = accumulator
+        if cur_key is not None:
+            yield cur_key[0], cur_key[1], self._finalize(cur_acc)
+
+
+class TopKSelector(object):
+    """
+    Streaming selection of the **k** highest scoring items for each
+    group, such as the top preys of each bait. Each group keeps a
+    bounded min-heap so memory scales with number of groups times
+    **k** rather than number of items added
+    """
+
+    def __init__(self, k=None):
+        """
+        Constructor
+
+        :param k: Number of items to keep per group
+        :type k: int
+        :raises CellMapsPPIDownloaderError: If **k** is less then 1
+        """
+        if k is None or k < 1:
+            raise CellMapsPPIDownloaderError('k must be at least 1')
+        self._k = k
+        self._heaps = {}
+        self._num_added = 0
+
+    def add(self, group, score, item):
+        """
+        Adds **item** to **group**. Score of ``nan`` ranks below all
+        other scores and on ties the item added first is kept
+
+        :param group: group item belongs to, such as bait
+        :param score: score to rank item by
+        :type score: float
+        :param item: item to keep if it ranks in top **k** of its group
+        """
+        if math.isnan(score):
+            score = -math.inf
+        entry = (score, -self._num_added, item)
+        self._num_added += 1
+        heap = self._heaps.setdefault(group, [])
+        if len(heap) < self._k:
+            heapq.heappush(heap, entry)
+        elif entry[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, entry)
+
+    def get_selected(self):
+        """
+        Gets selected items of all groups
+
+        :return: selected items in the order they were added
+        :rtype: list
+        """
+        selected = []
+        for heap in self._heaps.values():
+            selected.extend(heap)
+        selected.sort(key=lambda x: -x[1])
+        logger.info('Kept ' + str(len(selected)) + ' of ' +
+                    str(self._num_added) + ' items in top ' +
+                    str(self._k) + ' of ' + str(len(self._heaps)) + ' groups')
+        return [x[2] for x in selected]
@@ -1,10 +1,22 @@
+import os
 import re
 import csv
+import math
+import asyncio
 import logging
+import functools
+import threading
+from array import array
+import httpx
 import mygene
 from tqdm import tqdm
 
 from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+from cellmaps_ppidownloader.edges import TopKSelector
+from cellmaps_ppidownloader.cache import NegativeCache
+from cellmaps_ppidownloader import identifiers
+from cellmaps_ppidownloader import archive
+from cellmaps_ppidownloader.store import GeneNodeAttributeStore
 
 logger = logging.getLogger(__name__)
 
@@ -14,15 +26,285 @@ class GeneQuery(object):
     Gets information about genes from mygene
     """
 
-    def __init__(self, mygeneinfo=mygene.MyGeneInfo()):
+    DEFAULT_FALLBACK_SCOPES = 'alias,retired,uniprot'
+    """
+    Broader scopes queried for genes missed by the first query
+    when fallback is enabled
+    """
+
+    DEFAULT_POOL_SIZE = 10
+    """
+    Default number of connections in shared HTTP session
+    """
+
+    DEFAULT_TIMEOUT = 60.0
+    """
+    Default timeout in seconds of shared HTTP session requests
+    """
+
+    DEFAULT_KEEPALIVE = 30.0
+    """
+    Default seconds idle connections of shared HTTP session are kept open
+    """
+
+    DEADLINE_BATCH_SIZE = 1000
+    """
+    Number of terms per query when a deadline is set, matching the
+    batch size mygene uses
+    """
+
+    _shared_session = None
+    _shared_session_pid = None
+    _shared_session_lock = threading.Lock()
+
+    def __init__(self, mygeneinfo=mygene.MyGeneInfo(),
+                 fallback_scopes=None, sanitize=False,
+                 negative_cache=None, deadline=None,
+                 async_mygeneinfo=None):
         """
         Constructor
+
+        :param mygeneinfo: object with mygene style ``querymany`` method
+        :param fallback_scopes: If set, genes missing from results of
+                                :py:meth:`get_symbols_for_genes` are
+                                queried again, in one batch, against
+                                these scopes. For example
+                                :py:const:`DEFAULT_FALLBACK_SCOPES`
+        :type fallback_scopes: str
+        :param sanitize: If ``True``, query terms that are junk or do not
+                         look like an id for any of the scopes, see
+                         :py:func:`~cellmaps_ppidownloader.identifiers.is_valid_for_scopes`,
+                         are answered as not found without querying mygene
+        :type sanitize: bool
+        :param negative_cache: If set, query terms in this cache are
+                               answered as not found without querying
+                               mygene and terms mygene does not find
+                               are added to it
+        :type negative_cache: :py:class:`~cellmaps_ppidownloader.cache.NegativeCache`
+        :param deadline: If set, terms are queried in batches of
+                         :py:const:`DEADLINE_BATCH_SIZE` until the query
+                         budget of the deadline is spent. The batch in
+                         flight is abandoned and it and the remaining
+                         terms are answered as not found and recorded
+                         as unresolved in **deadline**
+        :type deadline: :py:class:`~cellmaps_ppidownloader.deadline.Deadline`
+        :param async_mygeneinfo: object with mygene style coroutine
+                                 ``querymany`` method, such as
+                                 ``biothings_client.get_async_client('gene')``,
+                                 used by :py:meth:`querymany_async`. If ``None``
+                                 :py:meth:`querymany_async` runs :py:meth:`querymany`
+                                 in the default executor of the event loop
         """
         self._mg = mygeneinfo
+        self._async_mg = async_mygeneinfo
+        self._fallback_scopes = fallback_scopes
+        self._sanitize = sanitize
+        self._negative_cache = negative_cache
+        self._deadline = deadline
+        self._fallback_misses = set()
+        self._num_recovered = 0
+
+    @classmethod
+    def get_shared_session(cls, pool_size=DEFAULT_POOL_SIZE,
+                           timeout=DEFAULT_TIMEOUT,
+                           keepalive=DEFAULT_KEEPALIVE):
+        """
+        Gets HTTP session shared by all mygene clients of this process,
+        creating it on first call. Connections are pooled and kept alive
+        between batches so TCP/TLS handshakes are not repeated. A forked
+        process gets its own session
+
+        .. note::
+
+            **pool_size**, **timeout** and **keepalive** are only used
+            when the session is created
+
+        :param pool_size: most connections open at once
+        :type pool_size: int
+        :param timeout: seconds to wait for connect and each read or
+                        write. ``None`` means wait forever
+        :type timeout: float
+        :param keepalive: seconds an idle connection is kept open
+        :type keepalive: float
+        :return: shared session
+        :rtype: :py:class:`httpx.Client`
+        """
+        with cls._shared_session_lock:
+            if cls._shared_session is None or \
+                    cls._shared_session_pid != os.getpid():
+                logger.debug('Creating shared HTTP session with pool size ' +
+                             str(pool_size) + ', timeout ' + str(timeout) +
+                             ' and keep-alive ' + str(keepalive))
+                limits = httpx.Limits(max_connections=pool_size,
+                                      max_keepalive_connections=pool_size,
+                                      keepalive_expiry=keepalive)
+                cls._shared_session = httpx.Client(limits=limits,
+                                                   timeout=httpx.Timeout(timeout))
+                cls._shared_session_pid = os.getpid()
+            return cls._shared_session
+
+    @classmethod
+    def close_shared_session(cls):
+        """
+        Closes HTTP session returned by :py:meth:`get_shared_session`.
+        A new session is created on next call to that method
+        """
+        with cls._shared_session_lock:
+            if cls._shared_session is not None and \
+                    cls._shared_session_pid == os.getpid():
+                cls._shared_session.close()
+            cls._shared_session = None
+            cls._shared_session_pid = None
+
+    @classmethod
+    def use_shared_session(cls, mygeneinfo, pool_size=DEFAULT_POOL_SIZE,
+                           timeout=DEFAULT_TIMEOUT,
+                           keepalive=DEFAULT_KEEPALIVE):
+        """
+        Makes **mygeneinfo** send its requests through the session
+        returned by :py:meth:`get_shared_session`. Objects that are not
+        mygene clients, and clients of ``biothings_client`` versions
+        before ``0.4`` that do not use httpx, are left as is
+
+        :param mygeneinfo: mygene client
+        :type mygeneinfo: :py:class:`mygene.MyGeneInfo`
+        :param pool_size: see :py:meth:`get_shared_session`
+        :type pool_size: int
+        :param timeout: see :py:meth:`get_shared_session`
+        :type timeout: float
+        :param keepalive: see :py:meth:`get_shared_session`
+        :type keepalive: float
+        :return: **mygeneinfo**
+        :rtype: :py:class:`mygene.MyGeneInfo`
+        """
+        if not isinstance(mygeneinfo, mygene.MyGeneInfo):
+            return mygeneinfo
+        if not hasattr(mygeneinfo, 'http_client_setup'):
+            logger.debug('mygene client does not use httpx, keeping its '
+                         'default session')
+            return mygeneinfo
+        mygeneinfo.http_client = cls.get_shared_session(pool_size=pool_size,
+                                                        timeout=timeout,
+                                                        keepalive=keepalive)
+        mygeneinfo.http_client_setup = True
+        return mygeneinfo
+
+    @staticmethod
+    def get_dup_and_missing(out):
+        """
+        Finds query terms with more than one hit and query terms
+        without a hit in mygene querymany output **out**, like
+        mygene does when passed ``returnall=True``
+
+        :param out: mygene querymany output
+        :type out: list
+        :return: (list of (query, number of hits) for duplicates,
+                  list of missing queries)
+        :rtype: tuple
+        """
+        counts = {}
+        missing = []
+        for hit in out:
+            if hit.get('notfound', False):
+                missing.append(hit['query'])
+            else:
+                counts[hit['query']] = counts.get(hit['query'], 0) + 1
+        return [(q, c) for q, c in counts.items() if c > 1], missing
+
+    def _query_upstream(self, queries, scopes=None, fields=None,
+                        species=None):
+        """
+        Queries mygene. Real mygene clients are asked for ``returnall``
+        output, with logging of every duplicate and missing term turned
+        off, so the missing and duplicate lists come straight from mygene
+
+        :return: (mygene querymany output, duplicates or ``None``,
+                  missing queries or ``None``)
+        :rtype: tuple
+        """
+        if isinstance(self._mg, mygene.MyGeneInfo):
+            res = self._mg.querymany(queries,
+                                     scopes=scopes,
+                                     fields=fields,
+                                     species=species,
+                                     returnall=True,
+                                     verbose=False)
+            return res['out'], res['dup'], res['missing']
+        return self._mg.querymany(queries,
+                                  scopes=scopes,
+                                  fields=fields,
+                                  species=species), None, None
+
+    def _query_upstream_with_timeout(self, queries, timeout, scopes=None,
+                                     fields=None, species=None):
+        """
+        Runs :py:meth:`_query_upstream` in a daemon thread waiting at
+        most **timeout** seconds for it. The thread of a query that
+        takes longer is abandoned so it cannot delay exit
+
+        :return: output of :py:meth:`_query_upstream` or ``None`` if
+                 query did not finish in time
+        :rtype: tuple
+        """
+        result = {}
+
+        def _target():
+            try:
+                result['value'] = self._query_upstream(queries, scopes=scopes,
+                                                       fields=fields,
+                                                       species=species)
+            except Exception as e:
+                result['error'] = e
+
+        thread = threading.Thread(target=_target, daemon=True)
+        thread.start()
+        thread.join(timeout)
+        if thread.is_alive():
+            return None
+        if 'error' in result:
+            raise result['error']
+        return result['value']
+
+    def _query_upstream_before_deadline(self, queries, scopes=None,
+                                        fields=None, species=None):
+        """
+        Queries **queries** in batches of :py:const:`DEADLINE_BATCH_SIZE`
+        while query budget of deadline lasts
+
+        :return: (mygene querymany output, duplicates, missing
+                  queries, queries skipped because of the deadline)
+        :rtype: tuple
+        """
+        out = []
+        dup = []
+        missing = []
+        skipped = []
+        for start in range(0, len(queries), GeneQuery.DEADLINE_BATCH_SIZE):
+            batch = queries[start:start + GeneQuery.DEADLINE_BATCH_SIZE]
+            budget = self._deadline.get_query_budget()
+            res = None
+            if budget > 0:
+                res = self._query_upstream_with_timeout(batch, budget,
+                                                        scopes=scopes,
+                                                        fields=fields,
+                                                        species=species)
+            if res is None:
+                skipped = list(queries[start:])
+                logger.warning('Deadline reached, leaving ' + str(len(skipped)) +
+                               ' of ' + str(len(queries)) + ' terms unresolved')
+                break
+            batch_out, batch_dup, batch_missing = res
+            if batch_missing is None:
+                batch_dup, batch_missing = GeneQuery.get_dup_and_missing(batch_out)
+            out.extend(batch_out)
+            dup.extend(batch_dup)
+            missing.extend(batch_missing)
+        return out, dup, missing, skipped
 
     def querymany(self, queries, species=None,
                   scopes=None,
-                  fields=None):
+                  fields=None,
+                  returnall=False):
         """
         Simple wrapper that calls MyGene querymany
         returning the results
@@ -35,14 +317,218 @@ class GeneQuery(object):
         :type scopes: str
         :param fields:
         :type fields: list
+        :param returnall: If ``True`` return dict like mygene does for
+                          ``returnall=True`` with hits under ``out``,
+                          list of (query, number of hits) under ``dup``
+                          and queries without hits under ``missing``
+        :type returnall: bool
         :return: dict from MyGene usually in format of
         :rtype: list
         """
-        mygene_out = self._mg.querymany(queries,
-                                        scopes=scopes,
-                                        fields=fields,
-                                        species=species)
-        return mygene_out
+        if not self._sanitize and self._negative_cache is None and \
+                self._deadline is None:
+            out, dup, missing = self._query_upstream(queries,
+                                                     scopes=scopes,
+                                                     fields=fields,
+                                                     species=species)
+            if not returnall:
+                return out
+            if missing is None:
+                dup, missing = GeneQuery.get_dup_and_missing(out)
+            return {'out': out, 'dup': dup, 'missing': missing}
+        to_query, notfound = self._split_queries(queries, scopes=scopes,
+                                                 species=species)
+        mygene_out = []
+        dup = []
+        missing = []
+        if len(to_query) > 0 and self._deadline is not None:
+            mygene_out, dup, missing, skipped = \
+                self._query_upstream_before_deadline(to_query, scopes=scopes,
+                                                     fields=fields,
+                                                     species=species)
+            self._add_deadline_skipped(skipped, notfound)
+        elif len(to_query) > 0:
+            mygene_out, dup, missing = self._query_upstream(to_query,
+                                                            scopes=scopes,
+                                                            fields=fields,
+                                                            species=species)
+            if missing is None:
+                dup, missing = GeneQuery.get_dup_and_missing(mygene_out)
+        return self._get_querymany_result(mygene_out, dup, missing, notfound,
+                                          scopes=scopes, species=species,
+                                          returnall=returnall)
+
+    def _split_queries(self, queries, scopes=None, species=None):
+        """
+        Splits **queries** into terms to send upstream and terms
+        answered as not found because they are junk, when sanitizing,
+        or in the negative cache
+
+        :return: (terms to query, list of not found entries)
+        :rtype: tuple
+        """
+        notfound = []
+        to_query = []
+        for query in queries:
+            if self._sanitize and not identifiers.is_valid_for_scopes(query, scopes=scopes):
+                notfound.append({'query': str(query), 'notfound': True})
+            elif self._negative_cache is not None and \
+                    self._negative_cache.contains(query, scopes=scopes, species=species):
+                notfound.append({'query': str(query), 'notfound': True})
+            else:
+                to_query.append(query)
+        if len(notfound) > 0:
+            logger.info('Skipping query of ' + str(len(notfound)) +
+                        ' terms known not to resolve')
+        return to_query, notfound
+
+    def _add_deadline_skipped(self, skipped, notfound):
+        """
+        Records terms **skipped** because of the deadline as unresolved
+        and appends not found entries for them to **notfound**
+        """
+        self._deadline.add_unresolved(skipped)
+        notfound.extend({'query': str(query), 'notfound': True}
+                        for query in skipped)
+
+    def _get_querymany_result(self, mygene_out, dup, missing, notfound,
+                              scopes=None, species=None, returnall=False):
+        """
+        Adds **missing** terms to negative cache and combines upstream
+        output with **notfound** entries into output of :py:meth:`querymany`
+        """
+        if self._negative_cache is not None:
+            for query in missing:
+                self._negative_cache.add(query, scopes=scopes, species=species)
+        out = list(mygene_out) + notfound
+        if not returnall:
+            return out
+        return {'out': out, 'dup': dup,
+                'missing': list(missing) + [x['query'] for x in notfound]}
+
+    async def _query_upstream_async(self, queries, scopes=None, fields=None,
+                                    species=None):
+        """
+        Coroutine version of :py:meth:`_query_upstream` that queries
+        via **async_mygeneinfo** passed to constructor
+
+        :return: (mygene querymany output, duplicates or ``None``,
+                  missing queries or ``None``)
+        :rtype: tuple
+        """
+        try:
+            # only in biothings_client 0.4 and later
+            from biothings_client import AsyncBiothingClient
+        except ImportError:
+            AsyncBiothingClient = None
+        if AsyncBiothingClient is not None and \
+                isinstance(self._async_mg, AsyncBiothingClient):
+            res = await self._async_mg.querymany(queries,
+                                                 scopes=scopes,
+                                                 fields=fields,
+                                                 species=species,
+                                                 returnall=True,
+                                                 verbose=False)
+            return res['out'], res['dup'], res['missing']
+        out = await self._async_mg.querymany(queries,
+                                             scopes=scopes,
+                                             fields=fields,
+                                             species=species)
+        return out, None, None
+
+    async def _query_upstream_before_deadline_async(self, queries, scopes=None,
+                                                    fields=None, species=None):
+        """
+        Coroutine version of :py:meth:`_query_upstream_before_deadline`.
+        The batch in flight when the query budget is spent is cancelled
+
+        :return: (mygene querymany output, duplicates, missing
+                  queries, queries skipped because of the deadline)
+        :rtype: tuple
+        """
+        out = []
+        dup = []
+        missing = []
+        skipped = []
+        for start in range(0, len(queries), GeneQuery.DEADLINE_BATCH_SIZE):
+            batch = queries[start:start + GeneQuery.DEADLINE_BATCH_SIZE]
+            budget = self._deadline.get_query_budget()
+            res = None
+            if budget > 0:
+                try:
+                    res = await asyncio.wait_for(self._query_upstream_async(batch,
+                                                                            scopes=scopes,
+                                                                            fields=fields,
+                                                                            species=species),
+                                                 timeout=budget)
+                except asyncio.TimeoutError:
+                    res = None
+            if res is None:
+                skipped = list(queries[start:])
+                logger.warning('Deadline reached, leaving ' + str(len(skipped)) +
+                               ' of ' + str(len(queries)) + ' terms unresolved')
+                break
+            batch_out, batch_dup, batch_missing = res
+            if batch_missing is None:
+                batch_dup, batch_missing = GeneQuery.get_dup_and_missing(batch_out)
+            out.extend(batch_out)
+            dup.extend(batch_dup)
+            missing.extend(batch_missing)
+        return out, dup, missing, skipped
+
+    async def querymany_async(self, queries, species=None,
+                              scopes=None,
+                              fields=None,
+                              returnall=False):
+        """
+        Coroutine version of :py:meth:`querymany`. If no
+        **async_mygeneinfo** was passed to constructor
+        :py:meth:`querymany` is run in the default executor of
+        the running event loop
+
+        :param queries: list of gene ids/symbols to query
+        :type queries: list
+        :param species:
+        :type species: str
+        :param scopes:
+        :type scopes: str
+        :param fields:
+        :type fields: list
+        :param returnall: see :py:meth:`querymany`
+        :type returnall: bool
+        :return: see :py:meth:`querymany`
+        :rtype: list
+        """
+        if self._async_mg is None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, functools.partial(self.querymany,
+                                                                      queries,
+                                                                      species=species,
+                                                                      scopes=scopes,
+                                                                      fields=fields,
+                                                                      returnall=returnall))
+        to_query, notfound = self._split_queries(queries, scopes=scopes,
+                                                 species=species)
+        mygene_out = []
+        dup = []
+        missing = []
+        if len(to_query) > 0 and self._deadline is not None:
+            mygene_out, dup, missing, skipped = \
+                await self._query_upstream_before_deadline_async(to_query,
+                                                                 scopes=scopes,
+                                                                 fields=fields,
+                                                                 species=species)
+            self._add_deadline_skipped(skipped, notfound)
+        elif len(to_query) > 0:
+            mygene_out, dup, missing = await self._query_upstream_async(to_query,
+                                                                        scopes=scopes,
+                                                                        fields=fields,
+                                                                        species=species)
+            if missing is None:
+                dup, missing = GeneQuery.get_dup_and_missing(mygene_out)
+        return self._get_querymany_result(mygene_out, dup, missing, notfound,
+                                          scopes=scopes, species=species,
+                                          returnall=returnall)
 
     def get_symbols_for_genes(self, genelist=None,
                               scopes='_id'):
@@ -69,8 +555,145 @@ class GeneQuery(object):
         res = self.querymany(genelist,
                              species='human',
                              scopes=scopes,
-                             fields=['ensembl.gene', 'symbol'])
-        return res
+                             fields=['ensembl.gene', 'symbol'],
+                             returnall=True)
+        if len(res['missing']) > 0:
+            logger.info(str(len(res['missing'])) + ' of ' + str(len(genelist)) +
+                        ' genes not found querying ' + str(scopes))
+        if self._fallback_scopes is None:
+            return res['out']
+        return self._resolve_misses(res['out'])
+
+    async def get_symbols_for_genes_async(self, genelist=None,
+                                          scopes='_id'):
+        """
+        Coroutine version of :py:meth:`get_symbols_for_genes`
+
+        :param genelist: genes to query for valid symbols and ensembl ids
+        :type genelist: list
+        :param scopes: field to query on _id for gene id, ensemble.gene
+                       for ENSEMBLE IDs
+        :type scopes: str
+        :return: see :py:meth:`get_symbols_for_genes`
+        :rtype: list
+        """
+        res = await self.querymany_async(genelist,
+                                         species='human',
+                                         scopes=scopes,
+                                         fields=['ensembl.gene', 'symbol'],
+                                         returnall=True)
+        if len(res['missing']) > 0:
+            logger.info(str(len(res['missing'])) + ' of ' + str(len(genelist)) +
+                        ' genes not found querying ' + str(scopes))
+        if self._fallback_scopes is None:
+            return res['out']
+        misses = self._get_misses(res['out'])
+        if len(misses) == 0:
+            return res['out']
+        fallback_res = await self.querymany_async(misses,
+                                                  species='human',
+                                                  scopes=self._fallback_scopes,
+                                                  fields=['ensembl.gene', 'symbol'])
+        return self._add_fallback_results(res['out'], misses, fallback_res)
+
+    def get_number_recovered(self):
+        """
+        Gets number of genes recovered by fallback queries
+
+        :return: number of genes recovered
+        :rtype: int
+        """
+        return self._num_recovered
+
+    def _resolve_misses(self, res):
+        """
+        Queries genes without a hit in **res**, or whose hits all lack
+        an Ensembl id, against fallback scopes in one batch.
+        Genes not found are remembered and not queried again
+
+        :param res: result of first query
+        :type res: list
+        :return: **res** with results of missed genes replaced by
+                 first fallback result having an Ensembl id
+        :rtype: list
+        """
+        misses = self._get_misses(res)
+        if len(misses) == 0:
+            return res
+
+        fallback_res = self.querymany(misses,
+                                      species='human',
+                                      scopes=self._fallback_scopes,
+                                      fields=['ensembl.gene', 'symbol'])
+        return self._add_fallback_results(res, misses, fallback_res)
+
+    def _get_fallback_miss_key(self, gene):
+        """
+        Gets key remembering that **gene** was not found querying
+        the current fallback scopes, so a miss under one set of
+        scopes does not skip the gene under another
+
+        :param gene: gene that was queried
+        :type gene: str
+        :return: key
+        :rtype: str
+        """
+        return NegativeCache.get_key(gene, scopes=self._fallback_scopes,
+                                     species='human')
+
+    def _get_misses(self, res):
+        """
+        Gets genes in **res** without a hit having an Ensembl id that
+        have not already been missed by a fallback query
+
+        :param res: result of first query
+        :type res: list
+        :return: genes to query against fallback scopes
+        :rtype: list
+        """
+        found = set(str(x['query']) for x in res if 'ensembl' in x)
+        misses = []
+        seen = set()
+        for x in res:
+            gene = str(x['query'])
+            if gene in found or self._get_fallback_miss_key(gene) in self._fallback_misses \
+                    or gene in seen:
+                continue
+            if self._deadline is not None and self._deadline.is_unresolved(gene):
+                continue
+            seen.add(gene)
+            misses.append(gene)
+        return misses
+
+    def _add_fallback_results(self, res, misses, fallback_res):
+        """
+        Replaces results of **misses** in **res** with first result
+        in **fallback_res** having an Ensembl id and remembers genes
+        not recovered
+
+        :param res: result of first query
+        :type res: list
+        :param misses: genes queried against fallback scopes
+        :type misses: list
+        :param fallback_res: result of fallback query
+        :type fallback_res: list
+        :return: updated results
+        :rtype: list
+        """
+        recovered = {}
+        for x in fallback_res:
+            query = str(x['query'])
+            if 'ensembl' in x and query not in recovered:
+                recovered[query] = x
+        self._fallback_misses.update(self._get_fallback_miss_key(g) for g in misses
+                                     if g not in recovered and
+                                     (self._deadline is None or
+                                      not self._deadline.is_unresolved(g)))
+        self._num_recovered += len(recovered)
+        logger.info('Recovered ' + str(len(recovered)) + ' of ' +
+                    str(len(misses)) + ' missed genes by querying ' +
+                    self._fallback_scopes)
+        return [x for x in res if str(x['query']) not in recovered] + list(recovered.values())
 
 
 class GeneNodeAttributeGenerator(object):
@@ -78,11 +701,30 @@ class GeneNodeAttributeGenerator(object):
     Base class for GeneNodeAttribute Generator
     """
 
-    def __init__(self):
+    def __init__(self, gene_node_attrs_max_in_memory=None):
         """
         Constructor
+
+        :param gene_node_attrs_max_in_memory: If set, gene node
+                                              attributes are returned in a
+                                              :py:class:`~cellmaps_ppidownloader.store.GeneNodeAttributeStore`
+                                              that spills to disk past this
+                                              many genes, instead of a dict
+        :type gene_node_attrs_max_in_memory: int
+        """
+        self._gene_node_attrs_max_in_memory = gene_node_attrs_max_in_memory
+
+    def _new_gene_node_attrs(self):
+        """
+        Creates empty mapping to hold gene node attributes
+
+        :return: dict or store if **gene_node_attrs_max_in_memory**
+                 was set in constructor
+        :rtype: dict or :py:class:`~cellmaps_ppidownloader.store.GeneNodeAttributeStore`
         """
-        pass
+        if self._gene_node_attrs_max_in_memory is None:
+            return {}
+        return GeneNodeAttributeStore(max_in_memory=self._gene_node_attrs_max_in_memory)
 
     @staticmethod
     def add_geneids_to_set(gene_set=None,
@@ -116,6 +758,119 @@ class GeneNodeAttributeGenerator(object):
                     ambiguous_gene_dict[entry] = geneid
         return split_str
 
+    @staticmethod
+    def check_score_cols(fieldnames=None, score_cols=None, tsvfile=None):
+        """
+        Checks that all **score_cols** are in header of input table
+
+        :param fieldnames: columns in header of **tsvfile**
+        :type fieldnames: list
+        :param score_cols: names of score columns
+        :type score_cols: list
+        :param tsvfile: path to input table, used in error message
+        :type tsvfile: str
+        :raises CellMapsPPIDownloaderError: If any of **score_cols**
+                                            is not in **fieldnames**
+        """
+        if score_cols is None:
+            return
+        missing = [col for col in score_cols if col not in (fieldnames or [])]
+        if len(missing) > 0:
+            raise CellMapsPPIDownloaderError('Score column(s) ' + ', '.join(missing) +
+                                             ' not found in ' + str(tsvfile) +
+                                             '. Columns are: ' + ', '.join(fieldnames or []))
+
+    @staticmethod
+    def add_scores_to_arrays(edge_scores=None, row=None, score_cols=None):
+        """
+        Appends values of **score_cols** columns in **row** to float32
+        arrays in **edge_scores** keyed by column name, creating the
+        arrays as needed. Values that are missing or not numbers
+        are stored as ``nan``
+
+        :param edge_scores: column name to :py:class:`array.array` of
+                            type ``f`` (float32)
+        :type edge_scores: dict
+        :param row: row of input table
+        :type row: dict
+        :param score_cols: names of score columns
+        :type score_cols: list
+        """
+        if edge_scores is None or score_cols is None:
+            return
+        for col in score_cols:
+            if col not in edge_scores:
+                edge_scores[col] = array('f')
+            edge_scores[col].append(GeneNodeAttributeGenerator.get_score(row.get(col)))
+
+    @staticmethod
+    def get_score(value):
+        """
+        Converts **value** from input table to a float
+
+        :param value: value to convert
+        :type value: str
+        :return: **value** as float or ``nan`` if **value** is
+                 missing or not a number
+        :rtype: float
+        """
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return math.nan
+
+    @staticmethod
+    def passes_thresholds(bfdr=math.nan, foldchange=math.nan,
+                          bfdr_maxcutoff=None, foldchange_cutoff=None):
+        """
+        Checks edge with **bfdr** and **foldchange** values
+        against cutoffs. A ``nan`` value, such as from a missing
+        column, passes the corresponding cutoff
+
+        :param bfdr: BFDR of edge
+        :type bfdr: float
+        :param foldchange: FoldChange of edge
+        :type foldchange: float
+        :param bfdr_maxcutoff: Keep edges with BFDR less then or equal to
+                               this value. ``None`` means no filtering
+        :type bfdr_maxcutoff: float
+        :param foldchange_cutoff: Keep edges with FoldChange greater then
+                                  this value. ``None`` means no filtering
+        :type foldchange_cutoff: float
+        :return: ``True`` if edge should be kept
+        :rtype: bool
+        """
+        if bfdr_maxcutoff is not None and bfdr > bfdr_maxcutoff:
+            return False
+        if foldchange_cutoff is not None and foldchange <= foldchange_cutoff:
+            return False
+        return True
+
+    def get_apms_edge_scores(self):
+        """
+        Gets score columns carried through for edges returned by
+        ``get_apms_edgelist()``
+
+        :return: column name to :py:class:`array.array` of float32
+                 values aligned with ``get_apms_edgelist()`` or ``None``
+                 if no score columns were requested
+        :rtype: dict
+        """
+        return None
+
+    def get_apms_edge_sources(self):
+        """
+        Gets sources of edges returned by ``get_apms_edgelist()``
+        when edges come from several inputs
+
+        :return: (list of source names, :py:class:`array.array` of
+                  bit masks aligned with ``get_apms_edgelist()`` where
+                  bit ``i`` is set if edge came from source ``i``) or
+                 ``None`` if edges come from a single input
+        :rtype: tuple
+        """
+        return None
+
     def get_gene_node_attributes(self):
         """
         Should be implemented by subclasses
@@ -124,6 +879,19 @@ class GeneNodeAttributeGenerator(object):
         """
         raise NotImplementedError('Subclasses should implement')
 
+    async def get_gene_node_attributes_async(self):
+        """
+        Coroutine version of :py:meth:`get_gene_node_attributes`.
+        Runs :py:meth:`get_gene_node_attributes` in the default
+        executor of the running event loop. Subclasses override
+        this to resolve genes without blocking a thread
+
+        :return: see :py:meth:`get_gene_node_attributes`
+        :rtype: tuple
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.get_gene_node_attributes)
+
 
 class APMSGeneNodeAttributeGenerator(GeneNodeAttributeGenerator):
     """
@@ -138,7 +906,9 @@ class APMSGeneNodeAttributeGenerator(GeneNodeAttributeGenerator):
     BAITLIST_NUM_INTERACTORS = '# Interactors'
 
     def __init__(self, apms_edgelist=None, apms_baitlist=None,
-                 genequery=GeneQuery()):
+                 genequery=GeneQuery(), edge_scores=None,
+                 trust_input=False, mapping_index=None,
+                 gene_node_attrs_max_in_memory=None):
         """
         Constructor
 
@@ -151,6 +921,9 @@ class APMSGeneNodeAttributeGenerator(GeneNodeAttributeGenerator):
                                    'Symbol1': VAL,
                                    'GeneID2': VAL,
                                    'Symbol2': VAL}
+
+                              with optional ``Ensembl1`` and ``Ensembl2``
+                              keys
         :type apms_edgelist: list
         :param apms_baitlist: list of dict elements where each dict is of
                               format:
@@ -162,18 +935,43 @@ class APMSGeneNodeAttributeGenerator(GeneNodeAttributeGenerator):
                                     'NumIteractors': VAL }
         :type apms_baitlist: list
         :param genequery:
+        :param edge_scores: Optional score columns aligned with
+                            **apms_edgelist** as filled in by
+                            :py:meth:`get_apms_edgelist_from_tsvfile`
+        :type edge_scores: dict
+        :param trust_input: If ``True``, gene symbols and Ensembl ids
+                            in **apms_edgelist** are used as is and only
+                            genes with missing, invalid or conflicting
+                            values, including genes without Ensembl ids,
+                            are queried via **genequery**
+        :type trust_input: bool
+        :param mapping_index: If set, genes whose symbol in
+                              **apms_edgelist** was already resolved
+                              by a previous run are taken from this
+                              index instead of **genequery**
+        :type mapping_index: :py:class:`~cellmaps_ppidownloader.mapping.MappingIndex`
+        :param gene_node_attrs_max_in_memory: see :py:class:`GeneNodeAttributeGenerator`
+        :type gene_node_attrs_max_in_memory: int
         """
-        super().__init__()
+        super().__init__(gene_node_attrs_max_in_memory=gene_node_attrs_max_in_memory)
         self._apms_edgelist = apms_edgelist
         self._apms_baitlist = apms_baitlist
         self._genequery = genequery
+        self._edge_scores = edge_scores
+        self._trust_input = trust_input
+        self._mapping_index = mapping_index
 
     @staticmethod
     def get_apms_edgelist_from_tsvfile(tsvfile=None,
                                        geneid_one_col=GENEID_COL1,
                                        symbol_one_col=SYMBOL_COL1,
                                        geneid_two_col=GENEID_COL2,
-                                       symbol_two_col=SYMBOL_COL2):
+                                       symbol_two_col=SYMBOL_COL2,
+                                       score_cols=None,
+                                       edge_scores=None,
+                                       ensembl_one_col=None,
+                                       ensembl_two_col=None,
+                                       sampler=None):
         """
         Generates list of dicts by parsing TSV file specified
         by **tsvfile** with the
@@ -185,6 +983,23 @@ class APMSGeneNodeAttributeGenerator(GeneNodeAttributeGenerator):
 
         :param tsvfile: Path to TSV file with above format
         :type tsvfile: str
+        :param score_cols: Names of numeric columns to carry through
+        :type score_cols: list
+        :param edge_scores: If set, values of **score_cols** for each
+                            edge are appended to float32 arrays in
+                            this dict keyed by column name
+        :type edge_scores: dict
+        :param ensembl_one_col: If set, name of column with Ensembl gene
+                                id(s) of gene 1, stored as ``Ensembl1``
+        :type ensembl_one_col: str
+        :param ensembl_two_col: If set, name of column with Ensembl gene
+                                id(s) of gene 2, stored as ``Ensembl2``
+        :type ensembl_two_col: str
+        :param sampler: If set, only edges sampled by this while
+                        reading, keyed on gene ids, are kept
+        :type sampler: :py:class:`~cellmaps_ppidownloader.sample.EdgeSampler`
+        :raises CellMapsPPIDownloaderError: If any of **score_cols** is not
+                                            a column of **tsvfile**
         :return: list of dicts, with each dict of format:
 
                  .. code-block::
@@ -196,15 +1011,62 @@ class APMSGeneNodeAttributeGenerator(GeneNodeAttributeGenerator):
         :rtype: list
         """
         edgelist = []
-        with open(tsvfile, 'r') as f:
+        with archive.open_text(tsvfile) as f:
             reader = csv.DictReader(f, delimiter='\t')
+            GeneNodeAttributeGenerator.check_score_cols(fieldnames=reader.fieldnames,
+                                                        score_cols=score_cols,
+                                                        tsvfile=tsvfile)
             for row in reader:
-                edgelist.append({'GeneID1': row[geneid_one_col],
-                                 'Symbol1': row[symbol_one_col],
-                                 'GeneID2': row[geneid_two_col],
-                                 'Symbol2': row[symbol_two_col]})
+                if sampler is not None:
+                    sampler.add(row[geneid_one_col], row[geneid_two_col], row)
+                    continue
+                APMSGeneNodeAttributeGenerator._add_edge_from_row(edgelist, row,
+                                                                  geneid_one_col=geneid_one_col,
+                                                                  symbol_one_col=symbol_one_col,
+                                                                  geneid_two_col=geneid_two_col,
+                                                                  symbol_two_col=symbol_two_col,
+                                                                  score_cols=score_cols,
+                                                                  edge_scores=edge_scores,
+                                                                  ensembl_one_col=ensembl_one_col,
+                                                                  ensembl_two_col=ensembl_two_col)
+        if sampler is not None:
+            for row in sampler.get_sampled():
+                APMSGeneNodeAttributeGenerator._add_edge_from_row(edgelist, row,
+                                                                  geneid_one_col=geneid_one_col,
+                                                                  symbol_one_col=symbol_one_col,
+                                                                  geneid_two_col=geneid_two_col,
+                                                                  symbol_two_col=symbol_two_col,
+                                                                  score_cols=score_cols,
+                                                                  edge_scores=edge_scores,
+                                                                  ensembl_one_col=ensembl_one_col,
+                                                                  ensembl_two_col=ensembl_two_col)
         return edgelist
 
+    @staticmethod
+    def _add_edge_from_row(edgelist, row, geneid_one_col=GENEID_COL1,
+                           symbol_one_col=SYMBOL_COL1,
+                           geneid_two_col=GENEID_COL2,
+                           symbol_two_col=SYMBOL_COL2,
+                           score_cols=None, edge_scores=None,
+                           ensembl_one_col=None, ensembl_two_col=None):
+        """
+        Appends edge in **row** of edgelist file to **edgelist** and
+        its scores to **edge_scores**. See
+        :py:meth:`get_apms_edgelist_from_tsvfile` for parameters
+        """
+        edge = {'GeneID1': row[geneid_one_col],
+                'Symbol1': row[symbol_one_col],
+                'GeneID2': row[geneid_two_col],
+                'Symbol2': row[symbol_two_col]}
+        if ensembl_one_col is not None:
+            edge['Ensembl1'] = row.get(ensembl_one_col)
+        if ensembl_two_col is not None:
+            edge['Ensembl2'] = row.get(ensembl_two_col)
+        edgelist.append(edge)
+        GeneNodeAttributeGenerator.add_scores_to_arrays(edge_scores=edge_scores,
+                                                        row=row,
+                                                        score_cols=score_cols)
+
     @staticmethod
     def get_apms_baitlist_from_tsvfile(tsvfile=None,
                                        symbol_col=BAITLIST_GENE_SYMBOL,
@@ -232,7 +1094,7 @@ class APMSGeneNodeAttributeGenerator(GeneNodeAttributeGenerator):
         """
         edgelist = []
         if tsvfile is not None:
-            with open(tsvfile, 'r') as f:
+            with archive.open_text(tsvfile) as f:
                 reader = csv.DictReader(f, delimiter='\t')
                 for row in reader:
                     edgelist.append({'GeneSymbol': row[symbol_col],
@@ -249,6 +1111,16 @@ class APMSGeneNodeAttributeGenerator(GeneNodeAttributeGenerator):
         """
         return self._apms_edgelist
 
+    def get_apms_edge_scores(self):
+        """
+        Gets score columns passed in via constructor
+
+        :return: column name to float32 :py:class:`array.array`
+                 aligned with :py:meth:`get_apms_edgelist` or ``None``
+        :rtype: dict
+        """
+        return self._edge_scores
+
     def _get_unique_genelist_from_edgelist(self):
         """
         Gets unique list of genes from edge list along with a
@@ -284,6 +1156,98 @@ class APMSGeneNodeAttributeGenerator(GeneNodeAttributeGenerator):
             bait_set.add(entry['GeneID'])
         return bait_set
 
+    def _get_input_gene_values(self):
+        """
+        Gets symbol and Ensembl ids given for each gene in edge list
+
+        :return: gene id to (symbol, Ensembl ids) where value is
+                 ``None`` if rows disagree on the values
+        :rtype: dict
+        """
+        gene_values = {}
+        for row in self._apms_edgelist:
+            for i in ['1', '2']:
+                geneid = row['GeneID' + i]
+                values = (row['Symbol' + i], row.get('Ensembl' + i))
+                if geneid in gene_values and gene_values[geneid] != values:
+                    if gene_values[geneid] is not None:
+                        logger.debug('Conflicting values for gene ' + str(geneid))
+                    gene_values[geneid] = None
+                    continue
+                gene_values[geneid] = values
+        return gene_values
+
+    def _get_mapped_query_results(self, genelist):
+        """
+        Builds mygene style query results for genes in **genelist**
+        whose symbol in the edge list is found in the mapping index
+        passed in via constructor
+
+        :param genelist: genes to build results for
+        :type genelist: list
+        :return: (list of query results in same format as
+                  :py:meth:`GeneQuery.get_symbols_for_genes`,
+                  list of genes not found in mapping index)
+        :rtype: tuple
+        """
+        gene_values = self._get_input_gene_values()
+        query_res = []
+        unmapped_genes = []
+        for geneid in genelist:
+            ensembl_ids = None
+            if gene_values.get(geneid) is not None:
+                symbol = gene_values[geneid][0]
+                ensembl_ids = self._mapping_index.get_ensembl_ids_for_symbol(symbol)
+            if ensembl_ids is None:
+                unmapped_genes.append(geneid)
+                continue
+            query_res.append({'query': geneid, '_id': geneid, 'symbol': symbol,
+                              'ensembl': [{'gene': g} for g in ensembl_ids]})
+        logger.info('Mapped ' + str(len(query_res)) + ' of ' +
+                    str(len(genelist)) + ' genes using previous runs')
+        return query_res, unmapped_genes
+
+    def _get_trusted_query_results(self, genelist):
+        """
+        Builds mygene style query results from the symbols and
+        Ensembl ids in the edge list for genes in **genelist**.
+        A gene is trusted if its id, symbol and Ensembl ids are
+        valid and every row agrees on them. Genes without Ensembl
+        ids, such as when the edge list has no Ensembl columns, are
+        not trusted as their ``represents`` would be empty
+
+        :param genelist: genes to build results for
+        :type genelist: list
+        :return: (list of query results in same format as
+                  :py:meth:`GeneQuery.get_symbols_for_genes`,
+                  list of genes that were not trusted)
+        :rtype: tuple
+        """
+        gene_values = self._get_input_gene_values()
+        query_res = []
+        untrusted_genes = []
+        for geneid in genelist:
+            if gene_values.get(geneid) is None \
+                    or not identifiers.is_valid_entrez_id(geneid):
+                untrusted_genes.append(geneid)
+                continue
+            symbol, ensembl = gene_values[geneid]
+            if not identifiers.is_valid_symbol(symbol):
+                untrusted_genes.append(geneid)
+                continue
+            ensembl_ids = None
+            if ensembl is not None:
+                ensembl_ids = identifiers.get_ensembl_gene_ids(ensembl)
+            if ensembl_ids is None:
+                untrusted_genes.append(geneid)
+                continue
+            query_res.append({'query': geneid, '_id': geneid, 'symbol': symbol,
+                              'ensembl': [{'gene': g} for g in ensembl_ids]})
+        logger.info('Trusted ' + str(len(query_res)) + ' of ' +
+                    str(len(genelist)) + ' genes from input, ' +
+                    str(len(untrusted_genes)) + ' genes need to be resolved')
+        return query_res, untrusted_genes
+
     def _process_query_results(self, query_res):
         """
         Processes the results from a gene symbol query, organizing the data into mappings
@@ -330,7 +1294,7 @@ class APMSGeneNodeAttributeGenerator(GeneNodeAttributeGenerator):
 
             if symbol not in symbol_ensembl_dict:
                 symbol_ensembl_dict[symbol] = set()
-            if len(x['ensembl']) > 1:
+            if isinstance(x['ensembl'], list):
                 for g in x['ensembl']:
                     symbol_ensembl_dict[symbol].add(g['gene'])
             else:
@@ -348,10 +1312,10 @@ class APMSGeneNodeAttributeGenerator(GeneNodeAttributeGenerator):
         :param symbol_ensembl_dict: Mapping of gene symbols to Ensembl IDs.
         :param bait_set: Set with boolean values, indicating bait proteins with True
         :param ambiguous_gene_dict: Mapping of ambiguous genes.
-        :return: A dictionary of gene node attributes.
+        :return: A dictionary, or store, of gene node attributes.
         :rtype: dict
         """
-        gene_node_attrs = {}
+        gene_node_attrs = self._new_gene_node_attrs()
         for symbol, queries in symbol_query_dict.items():
 
             ensemble_str = ','.join(sorted(symbol_ensembl_dict[symbol]))
@@ -388,19 +1352,66 @@ class APMSGeneNodeAttributeGenerator(GeneNodeAttributeGenerator):
         t = tqdm(total=2, desc='Get updated gene symbols', unit='steps')
         try:
             t.update()
-            genelist, ambiguous_gene_dict = self._get_unique_genelist_from_edgelist()
+            genelist, ambiguous_gene_dict, query_res = self._get_genes_to_query()
             t.update()
-            query_res = self._genequery.get_symbols_for_genes(genelist=genelist)
-            bait_set = self._get_apms_bait_set()
+            if len(genelist) > 0:
+                query_res.extend(self._genequery.get_symbols_for_genes(genelist=genelist))
+            return self._get_gene_node_attributes_from_results(query_res,
+                                                               ambiguous_gene_dict)
+        finally:
+            t.close()
+
+    async def get_gene_node_attributes_async(self):
+        """
+        Coroutine version of :py:meth:`get_gene_node_attributes`
+        that resolves genes via
+        :py:meth:`GeneQuery.get_symbols_for_genes_async`
 
-            query_symbol_dict, symbol_query_dict, symbol_ensembl_dict, errors = self._process_query_results(query_res)
+        :return: (list of dicts containing gene node attributes,
+                  list of str describing any errors encountered)
+        :rtype: tuple
+        """
+        genelist, ambiguous_gene_dict, query_res = self._get_genes_to_query()
+        if len(genelist) > 0:
+            query_res.extend(await self._genequery.get_symbols_for_genes_async(genelist=genelist))
+        return self._get_gene_node_attributes_from_results(query_res,
+                                                           ambiguous_gene_dict)
 
-            gene_node_attrs = self._create_gene_node_attributes_dict(symbol_query_dict, symbol_ensembl_dict,
-                                                                     bait_set, ambiguous_gene_dict)
+    def _get_genes_to_query(self):
+        """
+        Gets genes in edgelist, resolving those that can be
+        resolved from the input or mapping index
 
-            return gene_node_attrs, errors
-        finally:
-            t.close()
+        :return: (genes left to query, ambiguous gene dict,
+                  results for genes already resolved)
+        :rtype: tuple
+        """
+        genelist, ambiguous_gene_dict = self._get_unique_genelist_from_edgelist()
+        if self._trust_input:
+            query_res, genelist = self._get_trusted_query_results(genelist)
+        else:
+            query_res = []
+        if self._mapping_index is not None and len(genelist) > 0:
+            mapped_res, genelist = self._get_mapped_query_results(genelist)
+            query_res.extend(mapped_res)
+        return genelist, ambiguous_gene_dict, query_res
+
+    def _get_gene_node_attributes_from_results(self, query_res, ambiguous_gene_dict):
+        """
+        Builds gene node attributes from results of resolving genes
+
+        :return: (list of dicts containing gene node attributes,
+                  list of str describing any errors encountered)
+        :rtype: tuple
+        """
+        bait_set = self._get_apms_bait_set()
+
+        query_symbol_dict, symbol_query_dict, symbol_ensembl_dict, errors = self._process_query_results(query_res)
+
+        gene_node_attrs = self._create_gene_node_attributes_dict(symbol_query_dict, symbol_ensembl_dict,
+                                                                 bait_set, ambiguous_gene_dict)
+
+        return gene_node_attrs, errors
 
 
 class CM4AIGeneNodeAttributeGenerator(GeneNodeAttributeGenerator):
@@ -409,7 +1420,8 @@ class CM4AIGeneNodeAttributeGenerator(GeneNodeAttributeGenerator):
     """
 
     def __init__(self, apms_edgelist=None,
-                 genequery=GeneQuery()):
+                 genequery=GeneQuery(), edge_scores=None,
+                 gene_node_attrs_max_in_memory=None):
         """
         Constructor
 
@@ -425,11 +1437,19 @@ class CM4AIGeneNodeAttributeGenerator(GeneNodeAttributeGenerator):
                                    'BFDR.x': VAL}
         :type apms_edgelist: list
         :param genequery:
+        :param edge_scores: Optional score columns aligned with
+                            **apms_edgelist** as filled in by
+                            :py:meth:`get_apms_edgelist_from_tsvfile`
+        :type edge_scores: dict
+        :param gene_node_attrs_max_in_memory: see :py:class:`GeneNodeAttributeGenerator`
+        :type gene_node_attrs_max_in_memory: int
         """
-        super().__init__()
+        super().__init__(gene_node_attrs_max_in_memory=gene_node_attrs_max_in_memory)
         self._raw_apms_edgelist = apms_edgelist
         self._apms_edgelist = None
         self._genequery = genequery
+        self._raw_edge_scores = edge_scores
+        self._apms_edge_scores = None
 
     @staticmethod
     def get_apms_edgelist_from_tsvfile(tsvfile=None,
@@ -438,7 +1458,12 @@ class CM4AIGeneNodeAttributeGenerator(GeneNodeAttributeGenerator):
                                        bfdr_col=None,
                                        foldchange_col=None,
                                        foldchange_cutoff=0.0,
-                                       bfdr_maxcutoff=0.05):
+                                       bfdr_maxcutoff=0.05,
+                                       score_cols=None,
+                                       edge_scores=None,
+                                       topk=None,
+                                       topk_col='logOddsScore',
+                                       sampler=None):
         """
         Generates list of dicts by parsing TSV file specified
         by **tsvfile** with the
@@ -475,6 +1500,27 @@ class CM4AIGeneNodeAttributeGenerator(GeneNodeAttributeGenerator):
                                If this value is ``None`` no filtering will
                                occur
         :type bfdr_maxcutoff: float
+        :param score_cols: Names of numeric columns to carry through,
+                           such as ``logOddsScore``
+        :type score_cols: list
+        :param edge_scores: If set, values of **score_cols** for each
+                            kept edge are appended to float32 arrays
+                            in this dict keyed by column name
+        :type edge_scores: dict
+        :param topk: If set, only keep the **topk** highest scoring
+                     preys of each bait, by **topk_col**, among rows
+                     passing the cutoffs. Selection is done while
+                     reading with a bounded heap per bait
+        :type topk: int
+        :param topk_col: Name of score column used by **topk**. Missing
+                         or non numeric values rank lowest
+        :type topk_col: str
+        :param sampler: If set, only edges sampled by this while
+                        reading, among rows passing the cutoffs
+                        and **topk**, are kept
+        :type sampler: :py:class:`~cellmaps_ppidownloader.sample.EdgeSampler`
+        :raises CellMapsPPIDownloaderError: If any of **score_cols** is not
+                                            a column of **tsvfile**
         :return: list of dicts, with each dict of format:
 
                  .. code-block::
@@ -484,17 +1530,53 @@ class CM4AIGeneNodeAttributeGenerator(GeneNodeAttributeGenerator):
         :rtype: list
         """
         edgelist = []
-        with open(tsvfile, 'r') as f:
+        selector = None
+        if topk is not None:
+            selector = TopKSelector(k=topk)
+        with archive.open_text(tsvfile) as f:
             reader = csv.DictReader(f, delimiter='\t')
+            GeneNodeAttributeGenerator.check_score_cols(fieldnames=reader.fieldnames,
+                                                        score_cols=score_cols,
+                                                        tsvfile=tsvfile)
             for row in reader:
-                if bfdr_col is not None and bfdr_col in row \
-                    and row[bfdr_col] > bfdr_maxcutoff:
+                bfdr = math.nan
+                if bfdr_col is not None:
+                    bfdr = GeneNodeAttributeGenerator.get_score(row.get(bfdr_col))
+                foldchange = math.nan
+                if foldchange_col is not None:
+                    foldchange = GeneNodeAttributeGenerator.get_score(row.get(foldchange_col))
+                if not GeneNodeAttributeGenerator.passes_thresholds(bfdr=bfdr,
+                                                                    foldchange=foldchange,
+                                                                    bfdr_maxcutoff=bfdr_maxcutoff,
+                                                                    foldchange_cutoff=foldchange_cutoff):
+                    continue
+                if selector is not None:
+                    selector.add(row[bait_col],
+                                 GeneNodeAttributeGenerator.get_score(row.get(topk_col)),
+                                 row)
                     continue
-                if foldchange_col is not None and foldchange_col in row \
-                    and row[foldchange_col] <= foldchange_cutoff:
+                if sampler is not None:
+                    sampler.add(row[bait_col], row[prey_col], row)
                     continue
                 edgelist.append({'Bait': row[bait_col],
                                  'Prey': row[prey_col]})
+                GeneNodeAttributeGenerator.add_scores_to_arrays(edge_scores=edge_scores,
+                                                                row=row,
+                                                                score_cols=score_cols)
+        rows = None
+        if selector is not None:
+            rows = selector.get_selected()
+        if sampler is not None:
+            for row in rows or []:
+                sampler.add(row[bait_col], row[prey_col], row)
+            rows = sampler.get_sampled()
+        if rows is not None:
+            for row in rows:
+                edgelist.append({'Bait': row[bait_col],
+                                 'Prey': row[prey_col]})
+                GeneNodeAttributeGenerator.add_scores_to_arrays(edge_scores=edge_scores,
+                                                                row=row,
+                                                                score_cols=score_cols)
         return edgelist
 
     def _get_unique_set_from_raw_edgelist(self, colname=None):
@@ -510,50 +1592,78 @@ class CM4AIGeneNodeAttributeGenerator(GeneNodeAttributeGenerator):
             col_set.add(entry[colname])
         return col_set
 
-    def _get_baits_to_ensemblsymbolmap(self):
+    def _get_baits_to_ensemblsymbolmap(self, res=None):
         """
         Get unique set of bait names from raw apms edgelist
         and query mygene to get symbols and ensembl gene ids
 
+        :param res: If set, results of querying baits used
+                    instead of querying mygene
+        :type res: list
         :return: original bait name to mapped to tuple
                  (id, symbol, ensembl gene id)
         :rtype: dict
         """
-        bait_set = self._get_unique_set_from_raw_edgelist('Bait')
-        res = self._genequery.get_symbols_for_genes(list(bait_set),
-                                                    scopes='symbol')
+        if res is None:
+            bait_set = self._get_unique_set_from_raw_edgelist('Bait')
+            res = self._genequery.get_symbols_for_genes(list(bait_set),
+                                                        scopes='symbol')
         bait_to_id = {}
         for entry in res:
-            bait_to_id[entry['query']] = (entry['_id'],
-                                          entry['symbol'],
-                                          entry['ensembl']['gene'])
+            id_tuple = CM4AIGeneNodeAttributeGenerator._get_id_symbol_ensembl(entry)
+            if id_tuple is not None:
+                bait_to_id[entry['query']] = id_tuple
         return bait_to_id
 
-    def _get_prey_to_ensemblsymbolmap(self):
+    @staticmethod
+    def _get_id_symbol_ensembl(entry):
+        """
+        Gets id, symbol and ensembl gene id of mygene query result
+        **entry**. Several ensembl gene ids are joined with ``;``
+
+        :param entry: mygene query result
+        :type entry: dict
+        :return: (id, symbol, ensembl gene id) or ``None`` if **entry**
+                 is not found, such as terms skipped when the deadline
+                 runs out, or lacks any of those
+        :rtype: tuple
+        """
+        if entry.get('notfound', False):
+            logger.debug(str(entry['query']) + ' not found')
+            return None
+        if '_id' not in entry or 'symbol' not in entry:
+            logger.error(str(entry) + ' no id or symbol found')
+            return None
+        if 'ensembl' not in entry:
+            logger.error(str(entry) + ' no ensembl found')
+            return None
+        if isinstance(entry['ensembl'], list):
+            ensemblstr = ';'.join([g['gene'] for g in entry['ensembl']])
+        else:
+            ensemblstr = entry['ensembl']['gene']
+        return entry['_id'], entry['symbol'], ensemblstr
+
+    def _get_prey_to_ensemblsymbolmap(self, res=None):
         """
         Get unique set of prey names from raw apms edgelist
         and query mygene to get symbols and ensembl gene ids
 
+        :param res: If set, results of querying preys used
+                    instead of querying mygene
+        :type res: list
         :return: original bait name to mapped to tuple
                  (id, symbol, ensembl gene id)
         :rtype: dict
         """
-        prey_set = self._get_unique_set_from_raw_edgelist('Prey')
-        res = self._genequery.get_symbols_for_genes(list(prey_set),
-                                                    scopes='uniprot')
+        if res is None:
+            prey_set = self._get_unique_set_from_raw_edgelist('Prey')
+            res = self._genequery.get_symbols_for_genes(list(prey_set),
+                                                        scopes='uniprot')
         prey_to_id = {}
         for entry in res:
-            ensemblstr = ''
-            if 'ensembl' not in entry:
-                logger.error(str(entry) + ' no ensembl found')
-                continue
-            if isinstance(entry['ensembl'], list):
-                ensemblstr += ';'.join([g['gene'] for g in entry['ensembl']])
-            else:
-                ensemblstr = entry['ensembl']['gene']
-            prey_to_id[entry['query']] = (entry['_id'],
-                                          entry['symbol'],
-                                          ensemblstr)
+            id_tuple = CM4AIGeneNodeAttributeGenerator._get_id_symbol_ensembl(entry)
+            if id_tuple is not None:
+                prey_to_id[entry['query']] = id_tuple
         return prey_to_id
 
     def get_apms_edgelist(self):
@@ -569,11 +1679,44 @@ class CM4AIGeneNodeAttributeGenerator(GeneNodeAttributeGenerator):
         # we need to generate this list
         baits_to_idmap = self._get_baits_to_ensemblsymbolmap()
 
+        prey_to_idmap = self._get_prey_to_ensemblsymbolmap()
+        return self._build_apms_edgelist(baits_to_idmap, prey_to_idmap)
+
+    async def get_apms_edgelist_async(self):
+        """
+        Coroutine version of :py:meth:`get_apms_edgelist` that
+        resolves baits and preys concurrently via
+        :py:meth:`GeneQuery.get_symbols_for_genes_async`
+
+        :return:
+        :rtype: list
+        """
+        if self._apms_edgelist is not None:
+            return self._apms_edgelist
+        bait_set = self._get_unique_set_from_raw_edgelist('Bait')
         prey_set = self._get_unique_set_from_raw_edgelist('Prey')
+        bait_res, prey_res = await asyncio.gather(
+            self._genequery.get_symbols_for_genes_async(list(bait_set),
+                                                        scopes='symbol'),
+            self._genequery.get_symbols_for_genes_async(list(prey_set),
+                                                        scopes='uniprot'))
+        if self._apms_edgelist is not None:
+            return self._apms_edgelist
+        return self._build_apms_edgelist(self._get_baits_to_ensemblsymbolmap(res=bait_res),
+                                         self._get_prey_to_ensemblsymbolmap(res=prey_res))
 
-        prey_to_idmap = self._get_prey_to_ensemblsymbolmap()
+    def _build_apms_edgelist(self, baits_to_idmap, prey_to_idmap):
+        """
+        Builds apms edgelist, and scores if requested, from raw apms
+        edgelist using maps of resolved baits and preys
+
+        :return:
+        :rtype: list
+        """
         self._apms_edgelist = []
-        for row in self._raw_apms_edgelist:
+        if self._raw_edge_scores is not None:
+            self._apms_edge_scores = {col: array('f') for col in self._raw_edge_scores}
+        for index, row in enumerate(self._raw_apms_edgelist):
             if row['Bait'] not in baits_to_idmap:
                 logger.warning('Bait ' + str(row['Bait']) + ' not in map. Skipping')
                 continue
@@ -588,8 +1731,94 @@ class CM4AIGeneNodeAttributeGenerator(GeneNodeAttributeGenerator):
                                         'GeneID2': prey_tuple[0],
                                         'Symbol2': prey_tuple[1],
                                         'Ensembl2': prey_tuple[2]})
+            if self._apms_edge_scores is not None:
+                for col, values in self._raw_edge_scores.items():
+                    self._apms_edge_scores[col].append(values[index])
         return self._apms_edgelist
 
+    def get_apms_edge_scores(self):
+        """
+        Gets score columns for edges returned by
+        :py:meth:`get_apms_edgelist`
+
+        :return: column name to float32 :py:class:`array.array`
+                 aligned with :py:meth:`get_apms_edgelist` or ``None``
+        :rtype: dict
+        """
+        self.get_apms_edgelist()
+        return self._apms_edge_scores
+
+    def get_thresholded_generator(self, bfdr_col='BFDR.x',
+                                  bfdr_maxcutoff=None,
+                                  foldchange_col='FoldChange.x',
+                                  foldchange_cutoff=None,
+                                  score_cols=None):
+        """
+        Creates a new generator holding only the mapped edges of this
+        generator that pass the cutoffs. Genes are resolved by this
+        generator once and reused, so a sweep over many cutoffs reads
+        the table and queries mygene a single time.
+
+        **bfdr_col** and **foldchange_col** must be among the score
+        columns passed to the constructor via **edge_scores**
+
+        :param bfdr_col: Name of BFDR score column
+        :type bfdr_col: str
+        :param bfdr_maxcutoff: Keep edges with BFDR less then or equal to
+                               this value. ``None`` means no filtering
+        :type bfdr_maxcutoff: float
+        :param foldchange_col: Name of FoldChange score column
+        :type foldchange_col: str
+        :param foldchange_cutoff: Keep edges with FoldChange greater then
+                                  this value. ``None`` means no filtering
+        :type foldchange_cutoff: float
+        :param score_cols: Score columns to keep in new generator.
+                           ``None`` keeps all
+        :type score_cols: list
+        :raises CellMapsPPIDownloaderError: If a cutoff is set and its
+                                            column was not loaded
+        :return: generator with filtered edges
+        :rtype: :py:class:`CM4AIGeneNodeAttributeGenerator`
+        """
+        edgelist = self.get_apms_edgelist()
+        edge_scores = self.get_apms_edge_scores()
+        if edge_scores is None:
+            edge_scores = {}
+        for col, cutoff in [(bfdr_col, bfdr_maxcutoff),
+                            (foldchange_col, foldchange_cutoff)]:
+            if cutoff is not None and col not in edge_scores:
+                raise CellMapsPPIDownloaderError(str(col) + ' column needed '
+                                                            'for filtering not loaded')
+        if score_cols is None:
+            score_cols = list(edge_scores.keys())
+        nan_scores = array('f', [math.nan]) * len(edgelist)
+        bfdrs = edge_scores.get(bfdr_col, nan_scores)
+        foldchanges = edge_scores.get(foldchange_col, nan_scores)
+
+        filtered_edgelist = []
+        filtered_scores = {col: array('f') for col in score_cols}
+        for index, edge in enumerate(edgelist):
+            if not GeneNodeAttributeGenerator.passes_thresholds(bfdr=bfdrs[index],
+                                                                foldchange=foldchanges[index],
+                                                                bfdr_maxcutoff=bfdr_maxcutoff,
+                                                                foldchange_cutoff=foldchange_cutoff):
+                continue
+            filtered_edgelist.append(edge)
+            for col in score_cols:
+                filtered_scores[col].append(edge_scores[col][index])
+
+        logger.info('Kept ' + str(len(filtered_edgelist)) + ' of ' +
+                    str(len(edgelist)) + ' edges with BFDR cutoff ' +
+                    str(bfdr_maxcutoff) + ' and FoldChange cutoff ' +
+                    str(foldchange_cutoff))
+        gen = CM4AIGeneNodeAttributeGenerator(apms_edgelist=self._raw_apms_edgelist,
+                                              genequery=self._genequery,
+                                              gene_node_attrs_max_in_memory=self._gene_node_attrs_max_in_memory)
+        gen._apms_edgelist = filtered_edgelist
+        if len(score_cols) > 0:
+            gen._apms_edge_scores = filtered_scores
+        return gen
+
     def _get_apms_bait_set(self):
         """
         Gets unique set of baits
@@ -623,7 +1852,7 @@ class CM4AIGeneNodeAttributeGenerator(GeneNodeAttributeGenerator):
         """
         self.get_apms_edgelist()
         errors = []
-        gene_node_attrs = {}
+        gene_node_attrs = self._new_gene_node_attrs()
         for i in ['1', '2']:
             if i == '1':
                 bait = True
@@ -639,3 +1868,189 @@ class CM4AIGeneNodeAttributeGenerator(GeneNodeAttributeGenerator):
                                                     'bait': bait}
 
         return gene_node_attrs, errors
+
+    async def get_gene_node_attributes_async(self):
+        """
+        Coroutine version of :py:meth:`get_gene_node_attributes`
+        that resolves baits and preys via :py:meth:`get_apms_edgelist_async`
+
+        :return: (list of dicts containing gene node attributes,
+                  list of str describing any errors encountered)
+        :rtype: tuple
+        """
+        await self.get_apms_edgelist_async()
+        return self.get_gene_node_attributes()
+
+
+class MultiSourceGeneNodeAttributeGenerator(GeneNodeAttributeGenerator):
+    """
+    Combines gene node attribute generators of several AP-MS
+    inputs, such as BioPlex edge lists of different cell lines
+    and CM4AI tables, into one. Edges of all inputs are
+    concatenated in order and tagged with the source they came
+    from. Genes found in several inputs get one set of
+    attributes and are a bait if they are a bait in any input.
+
+    Pass the same :py:class:`GeneQuery` to every generator, backed
+    by a caching ``querymany`` such as
+    :py:class:`~cellmaps_ppidownloader.resolver.GeneResolverService`,
+    so genes shared by inputs are only sent to mygene once
+    """
+
+    MAX_SOURCES = 53
+    """
+    Most sources supported. Bit masks of sources must be exact
+    in a float64 when merged with scores of duplicate edges
+    """
+
+    def __init__(self, generators=None, gene_node_attrs_max_in_memory=None):
+        """
+        Constructor
+
+        :param generators: list of (source name, generator) tuples
+        :type generators: list
+        :param gene_node_attrs_max_in_memory: see :py:class:`GeneNodeAttributeGenerator`
+        :type gene_node_attrs_max_in_memory: int
+        :raises CellMapsPPIDownloaderError: If no generators are given,
+                                            source names are not unique
+                                            or there are more than
+                                            :py:const:`MAX_SOURCES`
+        """
+        super().__init__(gene_node_attrs_max_in_memory=gene_node_attrs_max_in_memory)
+        if generators is None or len(generators) == 0:
+            raise CellMapsPPIDownloaderError('At least one source is required')
+        names = [name for name, _ in generators]
+        if len(set(names)) != len(names):
+            raise CellMapsPPIDownloaderError('Source names must be unique: ' + str(names))
+        if len(names) > MultiSourceGeneNodeAttributeGenerator.MAX_SOURCES:
+            raise CellMapsPPIDownloaderError('At most ' +
+                                             str(MultiSourceGeneNodeAttributeGenerator.MAX_SOURCES) +
+                                             ' sources are supported')
+        self._generators = generators
+        self._apms_edgelist = None
+        self._apms_edge_scores = None
+        self._apms_edge_sources = None
+
+    def get_source_names(self):
+        """
+        Gets names of sources in order passed to constructor
+
+        :return: source names
+        :rtype: list
+        """
+        return [name for name, _ in self._generators]
+
+    def get_apms_edgelist(self):
+        """
+        Gets edges of all sources, concatenated in order of sources,
+        with ``GeneID1``, ``Symbol1``, ``Ensembl1``, ``GeneID2``,
+        ``Symbol2`` and ``Ensembl2`` keys
+
+        :return:
+        :rtype: list
+        """
+        if self._apms_edgelist is not None:
+            return self._apms_edgelist
+        edgelists = [gen.get_apms_edgelist() for _, gen in self._generators]
+        edge_scores = [gen.get_apms_edge_scores() for _, gen in self._generators]
+        score_cols = []
+        for scores in edge_scores:
+            for col in scores or {}:
+                if col not in score_cols:
+                    score_cols.append(col)
+
+        self._apms_edgelist = []
+        sources = array('Q')
+        merged_scores = {col: array('f') for col in score_cols}
+        for index, edgelist in enumerate(edgelists):
+            self._apms_edgelist.extend(edgelist)
+            sources.extend([1 << index] * len(edgelist))
+            for col in score_cols:
+                if edge_scores[index] is not None and col in edge_scores[index]:
+                    merged_scores[col].extend(edge_scores[index][col])
+                else:
+                    merged_scores[col].extend(array('f', [math.nan]) * len(edgelist))
+        self._apms_edge_sources = sources
+        if len(score_cols) > 0:
+            self._apms_edge_scores = merged_scores
+        logger.info('Combined ' + str(len(self._apms_edgelist)) + ' edges from ' +
+                    str(len(edgelists)) + ' sources')
+        return self._apms_edgelist
+
+    def get_apms_edge_scores(self):
+        """
+        Gets score columns of all sources for edges returned by
+        :py:meth:`get_apms_edgelist`. Columns missing from a source
+        are ``nan`` for its edges
+
+        :return: column name to float32 :py:class:`array.array`
+                 aligned with :py:meth:`get_apms_edgelist` or ``None``
+        :rtype: dict
+        """
+        self.get_apms_edgelist()
+        return self._apms_edge_scores
+
+    def get_apms_edge_sources(self):
+        """
+        Gets sources of edges returned by :py:meth:`get_apms_edgelist`
+
+        :return: (list of source names, :py:class:`array.array` of
+                  bit masks aligned with :py:meth:`get_apms_edgelist`)
+        :rtype: tuple
+        """
+        self.get_apms_edgelist()
+        return self.get_source_names(), self._apms_edge_sources
+
+    def _merge_gene_node_attributes(self, results):
+        """
+        Merges (gene node attributes, errors) of each source keeping
+        first attributes found for a gene and setting bait if gene
+        is a bait in any source. Attributes of sources held in a
+        :py:class:`~cellmaps_ppidownloader.store.GeneNodeAttributeStore`
+        are closed once merged
+
+        :return: (dict, or store, of gene node attributes, list of errors)
+        :rtype: tuple
+        """
+        gene_node_attrs = self._new_gene_node_attrs()
+        errors = []
+        for attrs, src_errors in results:
+            errors.extend(src_errors)
+            for geneid, gene_attrs in attrs.items():
+                if geneid not in gene_node_attrs:
+                    gene_node_attrs[geneid] = dict(gene_attrs)
+                    continue
+                if gene_attrs.get('bait') is True:
+                    # reassign as stores return copies of attributes
+                    merged_attrs = gene_node_attrs[geneid]
+                    merged_attrs['bait'] = True
+                    gene_node_attrs[geneid] = merged_attrs
+            if isinstance(attrs, GeneNodeAttributeStore):
+                attrs.close()
+        return gene_node_attrs, errors
+
+    def get_gene_node_attributes(self):
+        """
+        Gets gene node attributes of all sources, in format of
+        :py:meth:`APMSGeneNodeAttributeGenerator.get_gene_node_attributes`,
+        keyed by gene id
+
+        :return: (list of dicts containing gene node attributes,
+                  list of str describing any errors encountered)
+        :rtype: tuple
+        """
+        return self._merge_gene_node_attributes([gen.get_gene_node_attributes()
+                                                 for _, gen in self._generators])
+
+    async def get_gene_node_attributes_async(self):
+        """
+        Coroutine version of :py:meth:`get_gene_node_attributes`
+        that resolves genes of all sources concurrently
+
+        :return: (list of dicts containing gene node attributes,
+                  list of str describing any errors encountered)
+        :rtype: tuple
+        """
+        results = await asyncio.gather(*[gen.get_gene_node_attributes_async()
+                                         for _, gen in self._generators])
+        return self._merge_gene_node_attributes(results)
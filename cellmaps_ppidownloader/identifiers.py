@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+import re
+
+ENTREZ_ID_PATTERN = re.compile(r'^[0-9]+$')
+"""
+NCBI Entrez gene id
+"""
+
+SYMBOL_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._@/-]*$')
+"""
+HGNC style gene symbol
+"""
+
+DATE_MANGLED_SYMBOL_PATTERN = re.compile(r'^[0-9]+-[A-Za-z]{3}$')
+"""
+Symbols such as ``1-Mar`` that spreadsheet programs create
+from ``MARCH1``
+"""
+
+ENSEMBL_GENE_PATTERN = re.compile(r'^ENSG[0-9]{11}(\.[0-9]+)?$')
+"""
+Human Ensembl gene id with optional version
+"""
+
+UNIPROT_ACCESSION_PATTERN = re.compile(r'^([OPQ][0-9][A-Z0-9]{3}[0-9]|'
+                                       r'[A-NR-Z][0-9]([A-Z][A-Z0-9]{2}[0-9]){1,2})'
+                                       r'(-[0-9]+)?$')
+"""
+UniProt accession with optional isoform suffix
+"""
+
+JUNK_VALUES = {'', 'na', 'n/a', 'nan', 'none', 'null', '-', '?'}
+"""
+Lower cased values that mean missing
+"""
+
+JUNK_PREFIXES = ('rev_', 'decoy_', 'con_', 'contam_', '##')
+"""
+Lower cased prefixes of decoy and contaminant accessions
+"""
+
+ENSEMBL_DELIMITER_PATTERN = re.compile(r'\s*[,;]\s*')
+"""
+Delimiters allowed between multiple Ensembl gene ids
+"""
+
+
+def is_valid_entrez_id(value):
+    """
+    Checks if **value** looks like an NCBI Entrez gene id
+
+    :param value: value to check
+    :type value: str
+    :return: ``True`` if valid
+    :rtype: bool
+    """
+    if value is None:
+        return False
+    return ENTREZ_ID_PATTERN.match(value) is not None
+
+
+def is_valid_symbol(value):
+    """
+    Checks if **value** looks like a gene symbol. Empty values,
+    values with multiple genes and symbols mangled into dates
+    are not valid
+
+    :param value: value to check
+    :type value: str
+    :return: ``True`` if valid
+    :rtype: bool
+    """
+    if value is None:
+        return False
+    if SYMBOL_PATTERN.match(value) is None:
+        return False
+    return DATE_MANGLED_SYMBOL_PATTERN.match(value) is None
+
+
+def get_ensembl_gene_ids(value):
+    """
+    Splits **value** into Ensembl gene ids
+
+    :param value: one or more Ensembl gene ids delimited
+                  by ``,`` or ``;``
+    :type value: str
+    :return: Ensembl gene ids or ``None`` if **value** is empty
+             or any id is not valid
+    :rtype: list
+    """
+    if value is None:
+        return None
+    value = value.strip()
+    if len(value) == 0:
+        return None
+    ensembl_ids = ENSEMBL_DELIMITER_PATTERN.split(value)
+    for ensembl_id in ensembl_ids:
+        if ENSEMBL_GENE_PATTERN.match(ensembl_id) is None:
+            return None
+    return ensembl_ids
+
+
+def is_valid_uniprot_accession(value):
+    """
+    Checks if **value** looks like a UniProt accession
+
+    :param value: value to check
+    :type value: str
+    :return: ``True`` if valid
+    :rtype: bool
+    """
+    if value is None:
+        return False
+    return UNIPROT_ACCESSION_PATTERN.match(value) is not None
+
+
+def is_junk(value):
+    """
+    Checks if **value** is empty, a missing value marker such
+    as ``NA`` or a decoy/contaminant accession such as ``REV_P12345``
+
+    :param value: value to check
+    :type value: str
+    :return: ``True`` if **value** is junk
+    :rtype: bool
+    """
+    if value is None:
+        return True
+    value = str(value).strip().lower()
+    if value in JUNK_VALUES:
+        return True
+    return value.startswith(JUNK_PREFIXES)
+
+
+SCOPE_VALIDATORS = {'_id': is_valid_entrez_id,
+                    'entrezgene': is_valid_entrez_id,
+                    'retired': is_valid_entrez_id,
+                    'symbol': is_valid_symbol,
+                    'alias': is_valid_symbol,
+                    'uniprot': is_valid_uniprot_accession,
+                    'uniprot.Swiss-Prot': is_valid_uniprot_accession,
+                    'uniprot.TrEMBL': is_valid_uniprot_accession,
+                    'ensembl.gene': lambda x: get_ensembl_gene_ids(x) is not None}
+"""
+Maps mygene scope to function validating query terms for it
+"""
+
+
+def is_valid_for_scopes(value, scopes=None):
+    """
+    Checks if **value** is worth querying against **scopes**. A value
+    is valid if it is not junk (see :py:func:`is_junk`) and passes
+    the validator of any of the scopes. Scopes without a validator
+    accept any value
+
+    :param value: query term
+    :type value: str
+    :param scopes: mygene scopes as comma delimited str or list
+    :type scopes: str or list
+    :return: ``True`` if valid
+    :rtype: bool
+    """
+    if is_junk(value):
+        return False
+    if scopes is None:
+        return True
+    if isinstance(scopes, str):
+        scopes = scopes.split(',')
+    value = str(value).strip()
+    for scope in scopes:
+        validator = SCOPE_VALIDATORS.get(scope.strip())
+        if validator is None or validator(value):
+            return True
+    return False
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+import os
+import csv
+import logging
+
+from cellmaps_utils import constants
+
+from cellmaps_ppidownloader import identifiers
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+logger = logging.getLogger(__name__)
+
+
+class MappingIndex(object):
+    """
+    In-memory index of genes already resolved by previous runs of
+    this tool, loaded from the ``ppi_gene_node_attributes.tsv`` files
+    of their output directories (RO-Crates). Genes are indexed by
+    symbol (``name`` column) with Ensembl ids taken from the
+    ``represents`` column
+    """
+
+    ROCRATE_METADATA_FILE = 'ro-crate-metadata.json'
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self._symbol_index = {}
+        self._rocrates = []
+
+    @staticmethod
+    def get_gene_node_attributes_file(path):
+        """
+        Gets path to gene node attributes file for **path**
+
+        :param path: output directory of previous run or path
+                     to gene node attributes file
+        :type path: str
+        :raises CellMapsPPIDownloaderError: If file is not found
+        :return: path to gene node attributes file
+        :rtype: str
+        """
+        if os.path.isdir(path):
+            path = os.path.join(path, constants.PPI_GENE_NODE_ATTR_FILE)
+        if not os.path.isfile(path):
+            raise CellMapsPPIDownloaderError('Gene node attributes file not '
+                                             'found: ' + str(path))
+        return path
+
+    @staticmethod
+    def get_ensembl_ids(represents):
+        """
+        Parses ``represents`` value of gene node attributes file
+        which can be of format ``ENSG1,ENSG2`` or ``ensembl:ENSG1;ENSG2``
+
+        :param represents: value to parse
+        :type represents: str
+        :return: Ensembl gene ids or ``None`` if any id is invalid
+        :rtype: list
+        """
+        if represents is None:
+            return None
+        if represents.startswith('ensembl:'):
+            represents = represents[len('ensembl:'):]
+        if len(represents.strip()) == 0:
+            return []
+        return identifiers.get_ensembl_gene_ids(represents)
+
+    def load(self, path):
+        """
+        Adds genes from previous run at **path** to index. Genes
+        already in the index keep their earlier values. If the
+        directory holding the file is an RO-Crate it is remembered
+        so it can be listed as an input dataset
+
+        :param path: output directory of previous run or path
+                     to gene node attributes file
+        :type path: str
+        :raises CellMapsPPIDownloaderError: If file is not found
+        :return: number of genes added
+        :rtype: int
+        """
+        attr_file = MappingIndex.get_gene_node_attributes_file(path)
+        rocrate_dir = os.path.dirname(os.path.abspath(attr_file))
+        if os.path.isfile(os.path.join(rocrate_dir, MappingIndex.ROCRATE_METADATA_FILE)):
+            self._rocrates.append(rocrate_dir)
+        num_added = 0
+        with open(attr_file, 'r', newline='') as f:
+            reader = csv.DictReader(f, delimiter='\t')
+            for row in reader:
+                name = row.get('name')
+                if not identifiers.is_valid_symbol(name):
+                    continue
+                ensembl_ids = MappingIndex.get_ensembl_ids(row.get('represents'))
+                if ensembl_ids is None:
+                    logger.debug('Skipping ' + str(name) + ' invalid represents: ' +
+                                 str(row.get('represents')))
+                    continue
+                if name in self._symbol_index:
+                    continue
+                self._symbol_index[name] = ensembl_ids
+                num_added += 1
+        logger.info('Loaded ' + str(num_added) + ' genes from ' + attr_file)
+        return num_added
+
+    def get_rocrates(self):
+        """
+        Gets RO-Crate directories genes were loaded from
+
+        :return: paths to RO-Crate directories
+        :rtype: list
+        """
+        return list(self._rocrates)
+
+    def get_ensembl_ids_for_symbol(self, symbol):
+        """
+        Gets Ensembl ids of gene with **symbol**
+
+        :param symbol: gene symbol
+        :type symbol: str
+        :return: Ensembl ids, which can be empty, or ``None`` if
+                 **symbol** is not in index
+        :rtype: list
+        """
+        return self._symbol_index.get(symbol)
+
+    def __len__(self):
+        return len(self._symbol_index)
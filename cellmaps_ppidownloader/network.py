@@ -0,0 +1,462 @@
+# -*- coding: utf-8 -*-
+
+import os
+import csv
+import json
+import logging
+import numpy as np
+
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+logger = logging.getLogger(__name__)
+
+
+def get_symbol_edges(edgelist=None, gene_node_attrs=None):
+    """
+    Maps edges in **edgelist** from gene ids to gene symbols
+    using **gene_node_attrs**, skipping edges where either gene
+    lacks a symbol
+
+    :param edgelist: list of dicts with ``GeneID1`` and ``GeneID2`` keys
+    :type edgelist: list
+    :param gene_node_attrs: gene node attributes keyed by gene id as
+                            returned by ``get_gene_node_attributes()``
+                            of the gene node attribute generators
+    :type gene_node_attrs: dict
+    :return: generator of (index of edge in **edgelist**,
+             symbol of gene A, symbol of gene B)
+    :rtype: tuple
+    """
+    for index, edge in enumerate(edgelist):
+        if edge['GeneID1'] not in gene_node_attrs:
+            logger.error('Skipping ' + str(edge['GeneID1'] + ' cause it lacks a symbol'))
+            continue
+        if edge['GeneID2'] not in gene_node_attrs:
+            logger.error('Skipping ' + str(edge['GeneID2'] + ' cause it lacks a symbol'))
+            continue
+
+        genea = gene_node_attrs[edge['GeneID1']]['name']
+        geneb = gene_node_attrs[edge['GeneID2']]['name']
+        if genea is None or geneb is None:
+            logger.error('Skipping edge cause no symbol is found: ' + str(edge))
+            continue
+        if len(genea) == 0 or len(geneb) == 0:
+            logger.error('Skipping edge cause no symbol is found: ' + str(edge))
+            continue
+        yield index, genea, geneb
+
+
+class PPINetwork(object):
+    """
+    Protein-protein interaction network held in memory as
+    `CSR <https://en.wikipedia.org/wiki/Sparse_matrix#Compressed_sparse_row_(CSR,_CRS_or_Yale_format)>`__
+    arrays along with a vocabulary of gene symbols. Node ``i`` is
+    ``nodes[i]`` and its neighbors are
+    ``indices[indptr[i]:indptr[i+1]]`` with optional edge scores in
+    ``weights[indptr[i]:indptr[i+1]]``
+    """
+
+    INDPTR_FILE = 'indptr.npy'
+    """
+    Name of CSR offsets file in bundle written by :py:meth:`save`
+    """
+
+    INDICES_FILE = 'indices.npy'
+    """
+    Name of CSR neighbor indices file in bundle written by :py:meth:`save`
+    """
+
+    WEIGHTS_FILE = 'weights.npy'
+    """
+    Name of float32 edge scores file in bundle written by :py:meth:`save`
+    """
+
+    NODES_FILE = 'nodes.tsv'
+    """
+    Name of node index file in bundle written by :py:meth:`save`
+    """
+
+    INFO_FILE = 'csr_info.json'
+    """
+    Name of file describing bundle written by :py:meth:`save`
+    """
+
+    NODES_COLS = ['index', 'name']
+    """
+    Columns in :py:const:`NODES_FILE`
+    """
+
+    def __init__(self, nodes=None, indptr=None, indices=None,
+                 weights=None, undirected=True):
+        """
+        Constructor
+
+        :param nodes: gene symbols where position is the node index
+        :type nodes: list
+        :param indptr: offsets into **indices** for each node, length
+                       is number of nodes plus one
+        :type indptr: :py:class:`numpy.ndarray`
+        :param indices: neighbor node indices
+        :type indices: :py:class:`numpy.ndarray`
+        :param weights: Optional edge scores aligned with **indices**
+        :type weights: :py:class:`numpy.ndarray`
+        :param undirected: If ``True`` every edge is stored in both
+                           directions
+        :type undirected: bool
+        """
+        if nodes is None or indptr is None or indices is None:
+            raise CellMapsPPIDownloaderError('nodes, indptr and indices must be set')
+        if len(indptr) != len(nodes) + 1:
+            raise CellMapsPPIDownloaderError('Length of indptr must be number of nodes plus one')
+        if weights is not None and len(weights) != len(indices):
+            raise CellMapsPPIDownloaderError('Length of weights must match length of indices')
+        self._nodes = list(nodes)
+        self._node_index = {symbol: i for i, symbol in enumerate(self._nodes)}
+        self._indptr = indptr
+        self._indices = indices
+        self._weights = weights
+        self._undirected = undirected
+        self._num_edges = None
+
+    @staticmethod
+    def from_symbol_edges(edges=None, nodes=None, weights=None,
+                          undirected=True):
+        """
+        Builds network from (gene A, gene B) symbol pairs
+
+        :param edges: iterable of (gene A symbol, gene B symbol)
+        :type edges: iterable
+        :param weights: Optional score for each edge in **edges**
+        :type weights: list
+        :param nodes: Optional initial vocabulary of gene symbols, used to
+                      fix node order. Symbols in **edges** missing from
+                      this list are appended in order of appearance
+        :type nodes: list
+        :param undirected: If ``True`` store each edge in both directions
+                           (self loops are stored once)
+        :type undirected: bool
+        :return: network
+        :rtype: :py:class:`PPINetwork`
+        """
+        node_index = {}
+        vocab = []
+        if nodes is not None:
+            for symbol in nodes:
+                if symbol not in node_index:
+                    node_index[symbol] = len(vocab)
+                    vocab.append(symbol)
+        sources = []
+        targets = []
+        for genea, geneb in edges:
+            for symbol in (genea, geneb):
+                if symbol not in node_index:
+                    node_index[symbol] = len(vocab)
+                    vocab.append(symbol)
+            sources.append(node_index[genea])
+            targets.append(node_index[geneb])
+        src = np.asarray(sources, dtype=np.int32)
+        tgt = np.asarray(targets, dtype=np.int32)
+        wgt = None
+        if weights is not None:
+            wgt = np.asarray(weights, dtype=np.float32)
+            if len(wgt) != len(src):
+                raise CellMapsPPIDownloaderError('Number of weights does not match number of edges')
+        if undirected:
+            not_loop = src != tgt
+            src, tgt = (np.concatenate((src, tgt[not_loop])),
+                        np.concatenate((tgt, src[not_loop])))
+            if wgt is not None:
+                wgt = np.concatenate((wgt, wgt[not_loop]))
+        indptr, indices, order = PPINetwork._to_csr(len(vocab), src, tgt)
+        if wgt is not None:
+            wgt = wgt[order]
+        return PPINetwork(nodes=vocab, indptr=indptr, indices=indices,
+                          weights=wgt, undirected=undirected)
+
+    @staticmethod
+    def _to_csr(num_nodes, src, tgt):
+        """
+        Converts coordinate arrays to CSR arrays, keeping input
+        order of edges for each source node
+
+        :return: (indptr, indices, permutation applied to edges)
+        :rtype: tuple
+        """
+        order = np.argsort(src, kind='stable')
+        counts = np.bincount(src, minlength=num_nodes)
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return indptr, tgt[order].astype(np.int32, copy=False), order
+
+    @staticmethod
+    def from_edgelist(edgelist=None, gene_node_attrs=None, weights=None,
+                      undirected=True):
+        """
+        Builds network from edge list and gene node attributes as
+        returned by the gene node attribute generators. Node order
+        follows the order of gene symbols in **gene_node_attrs**
+
+        :param edgelist: list of dicts with ``GeneID1`` and ``GeneID2`` keys
+        :type edgelist: list
+        :param gene_node_attrs: gene node attributes keyed by gene id
+        :type gene_node_attrs: dict
+        :param weights: Optional score for each edge in **edgelist**
+        :type weights: list
+        :param undirected: If ``True`` store each edge in both directions
+        :type undirected: bool
+        :return: network
+        :rtype: :py:class:`PPINetwork`
+        """
+        nodes = [attrs['name'] for attrs in gene_node_attrs.values()
+                 if attrs['name'] is not None and len(attrs['name']) > 0]
+        edges = []
+        edge_weights = None if weights is None else []
+        for index, genea, geneb in get_symbol_edges(edgelist=edgelist,
+                                                    gene_node_attrs=gene_node_attrs):
+            edges.append((genea, geneb))
+            if edge_weights is not None:
+                edge_weights.append(weights[index])
+        return PPINetwork.from_symbol_edges(edges=edges, nodes=nodes,
+                                            weights=edge_weights,
+                                            undirected=undirected)
+
+    @staticmethod
+    def from_generator(apmsgen=None, undirected=True):
+        """
+        Resolves genes with **apmsgen** and builds the network
+        without writing any files
+
+        :param apmsgen: gene node attribute generator
+        :type apmsgen: :py:class:`~cellmaps_ppidownloader.gene.GeneNodeAttributeGenerator`
+        :param undirected: If ``True`` store each edge in both directions
+        :type undirected: bool
+        :return: (network, list of str describing any errors encountered)
+        :rtype: tuple
+        """
+        gene_node_attrs, errors = apmsgen.get_gene_node_attributes()
+        return PPINetwork.from_edgelist(edgelist=apmsgen.get_apms_edgelist(),
+                                        gene_node_attrs=gene_node_attrs,
+                                        undirected=undirected), errors
+
+    @property
+    def nodes(self):
+        """
+        Gene symbols where position is the node index
+
+        :rtype: list
+        """
+        return self._nodes
+
+    @property
+    def indptr(self):
+        """
+        CSR offsets array
+
+        :rtype: :py:class:`numpy.ndarray`
+        """
+        return self._indptr
+
+    @property
+    def indices(self):
+        """
+        CSR neighbor indices array
+
+        :rtype: :py:class:`numpy.ndarray`
+        """
+        return self._indices
+
+    @property
+    def weights(self):
+        """
+        Edge scores aligned with :py:attr:`indices` or ``None``
+
+        :rtype: :py:class:`numpy.ndarray`
+        """
+        return self._weights
+
+    @property
+    def undirected(self):
+        """
+        ``True`` if each edge is stored in both directions
+
+        :rtype: bool
+        """
+        return self._undirected
+
+    def get_number_of_nodes(self):
+        """
+        Gets number of nodes
+
+        :rtype: int
+        """
+        return len(self._nodes)
+
+    def get_number_of_edges(self):
+        """
+        Gets number of edges, counting each undirected edge once
+
+        :rtype: int
+        """
+        if not self._undirected:
+            return len(self._indices)
+        if self._num_edges is None:
+            row_ids = np.repeat(np.arange(len(self._nodes)), np.diff(self._indptr))
+            num_loops = int(np.count_nonzero(self._indices == row_ids))
+            self._num_edges = (len(self._indices) - num_loops) // 2 + num_loops
+        return self._num_edges
+
+    def get_node_index(self, symbol):
+        """
+        Gets node index of gene **symbol**
+
+        :param symbol: gene symbol
+        :type symbol: str
+        :return: index or ``None`` if not in network
+        :rtype: int
+        """
+        return self._node_index.get(symbol)
+
+    def get_neighbors(self, symbol):
+        """
+        Gets gene symbols of neighbors of gene **symbol**
+
+        :param symbol: gene symbol
+        :type symbol: str
+        :return: neighbor gene symbols, empty if **symbol** not in network
+        :rtype: list
+        """
+        i = self.get_node_index(symbol)
+        if i is None:
+            return []
+        return [self._nodes[j] for j in
+                self._indices[self._indptr[i]:self._indptr[i + 1]]]
+
+    def save(self, bundle_dir):
+        """
+        Writes network as a binary CSR bundle into **bundle_dir** that
+        can be opened without parsing via :py:meth:`load`. The bundle
+        contains :py:const:`INDPTR_FILE`, :py:const:`INDICES_FILE`,
+        :py:const:`WEIGHTS_FILE` (if network has weights) saved in
+        numpy ``.npy`` format, :py:const:`NODES_FILE` mapping node index
+        to gene symbol and :py:const:`INFO_FILE`
+
+        :param bundle_dir: directory to write to, created if needed
+        :type bundle_dir: str
+        :return: paths to files written
+        :rtype: list
+        """
+        os.makedirs(bundle_dir, mode=0o755, exist_ok=True)
+        written = []
+        arrays = [(PPINetwork.INDPTR_FILE, self._indptr),
+                  (PPINetwork.INDICES_FILE, self._indices)]
+        if self._weights is not None:
+            arrays.append((PPINetwork.WEIGHTS_FILE, self._weights))
+        for filename, array in arrays:
+            path = os.path.join(bundle_dir, filename)
+            np.save(path, np.ascontiguousarray(array))
+            written.append(path)
+
+        nodes_file = os.path.join(bundle_dir, PPINetwork.NODES_FILE)
+        with open(nodes_file, 'w', newline='') as f:
+            writer = csv.writer(f, delimiter='\t')
+            writer.writerow(PPINetwork.NODES_COLS)
+            for i, symbol in enumerate(self._nodes):
+                writer.writerow([i, symbol])
+        written.append(nodes_file)
+
+        info_file = os.path.join(bundle_dir, PPINetwork.INFO_FILE)
+        with open(info_file, 'w') as f:
+            json.dump({'num_nodes': self.get_number_of_nodes(),
+                       'num_edges': self.get_number_of_edges(),
+                       'undirected': self._undirected,
+                       'weighted': self._weights is not None}, f, indent=2)
+        written.append(info_file)
+        return written
+
+    @staticmethod
+    def load(bundle_dir, mmap_mode='r'):
+        """
+        Loads network from bundle written by :py:meth:`save`
+
+        :param bundle_dir: directory containing bundle
+        :type bundle_dir: str
+        :param mmap_mode: passed to :py:func:`numpy.load`. Default
+                          ``r`` memory maps the arrays read only so
+                          nothing is read until accessed. Set to
+                          ``None`` to read arrays into memory
+        :type mmap_mode: str
+        :raises CellMapsPPIDownloaderError: If bundle is missing files
+        :return: network
+        :rtype: :py:class:`PPINetwork`
+        """
+        info_file = os.path.join(bundle_dir, PPINetwork.INFO_FILE)
+        if not os.path.isfile(info_file):
+            raise CellMapsPPIDownloaderError(str(bundle_dir) + ' is not a CSR bundle')
+        with open(info_file, 'r') as f:
+            info = json.load(f)
+        nodes = []
+        with open(os.path.join(bundle_dir, PPINetwork.NODES_FILE), 'r') as f:
+            reader = csv.DictReader(f, delimiter='\t')
+            for row in reader:
+                nodes.append(row['name'])
+        weights = None
+        if info['weighted']:
+            weights = np.load(os.path.join(bundle_dir, PPINetwork.WEIGHTS_FILE),
+                              mmap_mode=mmap_mode)
+        return PPINetwork(nodes=nodes,
+                          indptr=np.load(os.path.join(bundle_dir, PPINetwork.INDPTR_FILE),
+                                         mmap_mode=mmap_mode),
+                          indices=np.load(os.path.join(bundle_dir, PPINetwork.INDICES_FILE),
+                                          mmap_mode=mmap_mode),
+                          weights=weights,
+                          undirected=info['undirected'])
+
+    def to_scipy_sparse(self):
+        """
+        Converts network to :py:class:`scipy.sparse.csr_matrix`
+        adjacency matrix sharing the underlying arrays
+
+        :raises CellMapsPPIDownloaderError: If scipy is not installed
+        :return: adjacency matrix with edge scores or ``1`` for each
+                 edge if network lacks weights
+        :rtype: :py:class:`scipy.sparse.csr_matrix`
+        """
+        try:
+            from scipy.sparse import csr_matrix
+        except ImportError:
+            raise CellMapsPPIDownloaderError('scipy is required to convert to sparse matrix')
+        num_nodes = len(self._nodes)
+        if self._weights is not None:
+            data = self._weights
+        else:
+            data = np.ones(len(self._indices), dtype=np.float32)
+        return csr_matrix((data, self._indices, self._indptr),
+                          shape=(num_nodes, num_nodes))
+
+    def to_networkx(self):
+        """
+        Converts network to :py:class:`networkx.Graph` (or
+        :py:class:`networkx.DiGraph` if not undirected) with
+        gene symbols as node names
+
+        :raises CellMapsPPIDownloaderError: If networkx is not installed
+        :return: graph
+        :rtype: :py:class:`networkx.Graph`
+        """
+        try:
+            import networkx
+        except ImportError:
+            raise CellMapsPPIDownloaderError('networkx is required to convert to graph')
+        if self._undirected:
+            graph = networkx.Graph()
+        else:
+            graph = networkx.DiGraph()
+        graph.add_nodes_from(self._nodes)
+        for i, symbol in enumerate(self._nodes):
+            for k in range(self._indptr[i], self._indptr[i + 1]):
+                if self._weights is not None:
+                    graph.add_edge(symbol, self._nodes[self._indices[k]],
+                                   weight=float(self._weights[k]))
+                else:
+                    graph.add_edge(symbol, self._nodes[self._indices[k]])
+        return graph
@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import socket
+import logging
+import threading
+import socketserver
+import http.client
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from cellmaps_ppidownloader.cache import ResolutionCache
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+logger = logging.getLogger(__name__)
+
+
+class GeneResolverService(object):
+    """
+    Resolves gene queries through mygene keeping a warm
+    :py:class:`~cellmaps_ppidownloader.cache.ResolutionCache`.
+    Identical query terms requested by concurrent callers
+    while an upstream call is in flight are merged so each
+    term is sent upstream only once
+    """
+
+    def __init__(self, mygeneinfo=None, cache=None):
+        """
+        Constructor
+
+        :param mygeneinfo: object with a mygene style ``querymany`` method.
+                           If ``None`` :py:class:`mygene.MyGeneInfo` is used
+        :param cache: cache of results. If ``None`` a new
+                      :py:class:`~cellmaps_ppidownloader.cache.ResolutionCache`
+                      is created
+        :type cache: :py:class:`~cellmaps_ppidownloader.cache.ResolutionCache`
+        """
+        if mygeneinfo is None:
+            import mygene
+            mygeneinfo = mygene.MyGeneInfo()
+        self._mg = mygeneinfo
+        if cache is None:
+            cache = ResolutionCache()
+        self._cache = cache
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._stats = {'requests': 0,
+                       'queries': 0,
+                       'cache_hits': 0,
+                       'coalesced': 0,
+                       'upstream_calls': 0,
+                       'upstream_queries': 0}
+
+    def get_stats(self):
+        """
+        Gets counters describing work done by this service
+
+        :return: counters along with number of cached entries
+        :rtype: dict
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats['cached'] = len(self._cache)
+        return stats
+
+    def querymany(self, queries, scopes=None, fields=None, species=None):
+        """
+        Same interface as mygene querymany. Query terms found in
+        the cache are answered directly, terms already being
+        fetched for another caller are waited on and only the
+        remaining terms are sent upstream in one call
+
+        :param queries: gene ids/symbols to query
+        :type queries: list
+        :return: mygene style hits in order of **queries**
+        :rtype: list
+        """
+        queries = [str(q) for q in queries]
+        keys = {q: ResolutionCache.get_key(q, scopes=scopes,
+                                           species=species,
+                                           fields=fields) for q in queries}
+        results = {}
+        waiting = {}
+        claimed = []
+        with self._lock:
+            self._stats['requests'] += 1
+            self._stats['queries'] += len(keys)
+            for query, key in keys.items():
+                hits = self._cache.get(key)
+                if hits is not None:
+                    results[query] = hits
+                    self._stats['cache_hits'] += 1
+                elif key in self._inflight:
+                    waiting[query] = self._inflight[key]
+                    self._stats['coalesced'] += 1
+                else:
+                    self._inflight[key] = threading.Event()
+                    claimed.append(query)
+
+        if len(claimed) > 0:
+            try:
+                self._query_upstream(claimed, scopes=scopes,
+                                     fields=fields, species=species,
+                                     results=results)
+            finally:
+                with self._lock:
+                    for query in claimed:
+                        self._inflight.pop(keys[query]).set()
+
+        retry = []
+        for query, event in waiting.items():
+            event.wait()
+            hits = self._cache.get(keys[query])
+            if hits is None:
+                # upstream call made by other caller failed
+                retry.append(query)
+            else:
+                results[query] = hits
+        if len(retry) > 0:
+            for hit in self.querymany(retry, scopes=scopes,
+                                      fields=fields, species=species):
+                results.setdefault(hit['query'], []).append(hit)
+
+        ordered = []
+        for query in keys:
+            ordered.extend(results[query])
+        return ordered
+
+    def _query_upstream(self, queries, scopes=None, fields=None,
+                        species=None, results=None):
+        """
+        Queries mygene for **queries** storing hits in cache
+        and in **results** dict
+
+        """
+        logger.debug('Querying mygene for ' + str(len(queries)) + ' terms')
+        with self._lock:
+            self._stats['upstream_calls'] += 1
+            self._stats['upstream_queries'] += len(queries)
+        res = self._mg.querymany(queries, scopes=scopes,
+                                 fields=fields, species=species)
+        for hit in res:
+            results.setdefault(str(hit['query']), []).append(hit)
+        for query in queries:
+            if query not in results:
+                results[query] = [{'query': query, 'notfound': True}]
+            self._cache.put(ResolutionCache.get_key(query, scopes=scopes,
+                                                    species=species,
+                                                    fields=fields),
+                            results[query])
+
+
+class GeneResolverRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handles HTTP requests for the resolver daemon.
+
+    ``POST /querymany`` with JSON body of format:
+
+    .. code-block::
+
+        {'queries': ['2', '16'], 'scopes': '_id',
+         'fields': ['ensembl.gene', 'symbol'], 'species': 'human'}
+
+    returns the JSON list of hits. ``GET /stats`` returns counters
+    from :py:meth:`GeneResolverService.get_stats`
+    """
+
+    def address_string(self):
+        """
+        Unix domain sockets lack a client address so
+        fall back to ``unix``
+        """
+        if isinstance(self.client_address, tuple) and len(self.client_address) > 0:
+            return str(self.client_address[0])
+        return 'unix'
+
+    def log_message(self, format, *args):
+        logger.debug(self.address_string() + ' ' + (format % args))
+
+    def _write_json(self, data, status=200):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/stats':
+            self._write_json(self.server.resolver_service.get_stats())
+            return
+        self._write_json({'error': 'Unknown path ' + self.path}, status=404)
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/querymany':
+            self._write_json({'error': 'Unknown path ' + self.path}, status=404)
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            req = json.loads(self.rfile.read(length).decode('utf-8'))
+            res = self.server.resolver_service.querymany(req['queries'],
+                                                         scopes=req.get('scopes'),
+                                                         fields=req.get('fields'),
+                                                         species=req.get('species'))
+        except Exception as e:
+            logger.exception('Error handling request: ' + str(e))
+            self._write_json({'error': str(e)}, status=500)
+            return
+        self._write_json(res)
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn,
+                              socketserver.UnixStreamServer):
+    """
+    HTTP server listening on a Unix domain socket
+    """
+    daemon_threads = True
+
+
+def create_resolver_server(service, host='127.0.0.1', port=8765,
+                           socket_path=None):
+    """
+    Creates server for resolver daemon. Caller should invoke
+    ``serve_forever()`` on the returned object
+
+    :param service: service that resolves the queries
+    :type service: :py:class:`GeneResolverService`
+    :param host: host to listen on, ignored if **socket_path** is set
+    :type host: str
+    :param port: port to listen on, ignored if **socket_path** is set
+    :type port: int
+    :param socket_path: If set, listen on Unix domain socket at this path
+    :type socket_path: str
+    :return: server
+    :rtype: :py:class:`socketserver.BaseServer`
+    """
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = ThreadingUnixHTTPServer(socket_path, GeneResolverRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), GeneResolverRequestHandler)
+    server.resolver_service = service
+    return server
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    HTTP connection over a Unix domain socket
+    """
+
+    def __init__(self, socket_path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self._socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self._socket_path)
+        self.sock = sock
+
+
+class ResolverClient(object):
+    """
+    Thin client to the resolver daemon. Has the same ``querymany``
+    interface as :py:class:`mygene.MyGeneInfo` so it can be passed
+    to :py:class:`~cellmaps_ppidownloader.gene.GeneQuery` as the
+    **mygeneinfo** parameter
+    """
+
+    def __init__(self, url='http://127.0.0.1:8765', timeout=None):
+        """
+        Constructor
+
+        :param url: URL of daemon either ``http://HOST:PORT`` or
+                    ``unix:///path/to/socket``
+        :type url: str
+        :param timeout: timeout in seconds for requests, ``None``
+                        means wait forever
+        :type timeout: float
+        """
+        self._url = url
+        self._parsed = urlparse(url)
+        if self._parsed.scheme not in ('http', 'unix'):
+            raise CellMapsPPIDownloaderError('Unsupported resolver URL: ' + str(url))
+        self._timeout = timeout
+
+    def _get_connection(self):
+        if self._parsed.scheme == 'unix':
+            return _UnixHTTPConnection(self._parsed.path, timeout=self._timeout)
+        return http.client.HTTPConnection(self._parsed.hostname,
+                                          port=self._parsed.port,
+                                          timeout=self._timeout)
+
+    def _request(self, method, path, data=None):
+        conn = self._get_connection()
+        try:
+            body = None
+            headers = {}
+            if data is not None:
+                body = json.dumps(data).encode('utf-8')
+                headers['Content-Type'] = 'application/json'
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+            res = json.loads(resp.read().decode('utf-8'))
+            if resp.status != 200:
+                raise CellMapsPPIDownloaderError('Resolver at ' + self._url +
+                                                 ' returned ' + str(resp.status) +
+                                                 ': ' + str(res))
+            return res
+        finally:
+            conn.close()
+
+    def querymany(self, queries, scopes=None, fields=None, species=None):
+        """
+        Sends query to daemon
+
+        :return: mygene style hits
+        :rtype: list
+        """
+        return self._request('POST', '/querymany',
+                             data={'queries': [str(q) for q in queries],
+                                   'scopes': scopes,
+                                   'fields': fields,
+                                   'species': species})
+
+    def get_stats(self):
+        """
+        Gets counters from daemon
+
+        :return: counters
+        :rtype: dict
+        """
+        return self._request('GET', '/stats')
@@ -2,8 +2,13 @@
 
 import os
 import csv
+import json
+import math
+import asyncio
 import logging
 import logging.config
+import functools
+import threading
 import time
 from datetime import date
 from tqdm import tqdm
@@ -12,6 +17,13 @@ from cellmaps_utils import constants
 from cellmaps_utils.provenance import ProvenanceUtil
 import cellmaps_ppidownloader
 from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+from cellmaps_ppidownloader.network import get_symbol_edges
+from cellmaps_ppidownloader.network import PPINetwork
+from cellmaps_ppidownloader.edges import EdgeDeduplicator
+from cellmaps_ppidownloader.mapping import MappingIndex
+from cellmaps_ppidownloader.store import GeneNodeAttributeStore
+from cellmaps_ppidownloader import shard
+from cellmaps_ppidownloader import archive
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +36,30 @@ class CellmapsPPIDownloader(object):
     EDGELIST_FILEKEY = 'edgelist'
     BAITLIST_FILEKEY = 'baitlist'
     CM4AI_ROCRATE = 'cm4ai_rocrate'
+    SOURCES_KEY = 'sources'
+    """
+    Key in provenance of optional dict of source name to provenance
+    of edge list of that source, used when **sources** is set
+    """
+    SOURCE_COL = 'source'
+    """
+    Column in ppi edgelist file listing, semicolon delimited,
+    sources of edge when edges come from several inputs
+    """
+    PPI_CSR_DIR = 'ppi_csr'
+    """
+    Name of directory in output directory holding binary CSR adjacency
+    bundle written when **write_csr** is ``True``
+    """
+    PENDING_PROVENANCE_FILE = 'pending_provenance.json'
+    """
+    Name of journal written to output directory when **defer_provenance**
+    is ``True``. See :py:meth:`finalize`
+    """
+
+    _async_runs_lock = threading.Lock()
+    _async_runs = 0
+    _async_logging_runs = 0
 
     def __init__(self, outdir=None,
                  imgsuffix='.jpg',
@@ -32,7 +68,17 @@ class CellmapsPPIDownloader(object):
                  provenance=None,
                  input_data_dict=None,
                  provenance_utils=ProvenanceUtil(),
-                 skip_failed=False):
+                 skip_failed=False,
+                 write_csr=False,
+                 dedup_edges=False,
+                 self_loops=EdgeDeduplicator.KEEP,
+                 score_merge=EdgeDeduplicator.FIRST,
+                 dedup_max_in_memory=None,
+                 mapping_rocrates=None,
+                 deadline=None,
+                 defer_provenance=False,
+                 sort_outputs=False,
+                 sources=None):
         """
         Constructor
 
@@ -83,6 +129,62 @@ class CellmapsPPIDownloader(object):
 
                     The `imgsuffix` parameter is deprecated and will be removed in a future release.
         :type imgsuffix: str
+        :param write_csr: If ``True`` also write network as memory mappable
+                          binary CSR bundle in :py:const:`PPI_CSR_DIR`
+                          directory. See :py:meth:`~cellmaps_ppidownloader.network.PPINetwork.load`
+        :type write_csr: bool
+        :param dedup_edges: If ``True`` collapse edges connecting the same
+                            pair of gene symbols, in either direction,
+                            into one edge written as (smaller symbol, larger symbol)
+        :type dedup_edges: bool
+        :param self_loops: How to handle edges connecting a gene symbol
+                           to itself. One of
+                           :py:const:`~cellmaps_ppidownloader.edges.EdgeDeduplicator.SELF_LOOP_POLICIES`
+        :type self_loops: str
+        :param score_merge: How to merge scores of collapsed edges. One of
+                            :py:const:`~cellmaps_ppidownloader.edges.EdgeDeduplicator.SCORE_MERGE_POLICIES`
+        :type score_merge: str
+        :param dedup_max_in_memory: Maximum number of unique edges held in memory
+                                    when **dedup_edges** is ``True`` before
+                                    spilling to disk and merging with an external sort.
+                                    ``None`` means no limit
+        :type dedup_max_in_memory: int
+        :param mapping_rocrates: RO-Crates of previous runs whose resolved
+                                 genes were reused, registered as input
+                                 datasets. See :py:meth:`~cellmaps_ppidownloader.mapping.MappingIndex.get_rocrates`
+        :type mapping_rocrates: list
+        :param deadline: Time budget of run, shared with the
+                         :py:class:`~cellmaps_ppidownloader.gene.GeneQuery`
+                         of **apmsgen**. Optional outputs are skipped once
+                         it has passed and genes it left unresolved are
+                         written to task finish file
+        :type deadline: :py:class:`~cellmaps_ppidownloader.deadline.Deadline`
+        :param defer_provenance: If ``True`` only data outputs are written.
+                                 The RO-Crate is not created, nothing is
+                                 registered and inputs are not copied.
+                                 What is needed to do that later via
+                                 :py:meth:`finalize` is written to
+                                 :py:const:`PENDING_PROVENANCE_FILE`
+        :type defer_provenance: bool
+        :param sources: Inputs combined by **apmsgen**, each a dict
+                        with ``name`` and ``edgelist`` plus optional
+                        ``baitlist`` or with ``name`` and ``cm4ai_table``,
+                        as returned by :py:func:`~cellmaps_ppidownloader.sources.parse_source`.
+                        Edge and bait lists are registered as input
+                        datasets using provenance under
+                        :py:const:`SOURCES_KEY` for the source name,
+                        either that of the edge list or a dict with
+                        ``edgelist`` and ``baitlist`` provenance, or
+                        else the top level ``edgelist`` and ``baitlist``
+                        provenance, which is then not registered itself.
+                        RO-Crates holding CM4AI tables are registered
+                        as input datasets
+        :type sources: list
+        :param sort_outputs: If ``True`` gene node attributes are written
+                             sorted by name and edges sorted by gene
+                             symbol pair, as needed by :py:meth:`merge`
+                             to combine shards
+        :type sort_outputs: bool
         """
         if outdir is None:
             raise CellMapsPPIDownloaderError('outdir is None')
@@ -102,6 +204,20 @@ class CellmapsPPIDownloader(object):
         self._apms_gene_attrid = None
         self._provenance_utils = provenance_utils
         self.skip_failed = skip_failed
+        self._write_csr = write_csr
+        self._dedup_edges = dedup_edges
+        self._edge_deduplicator = EdgeDeduplicator(self_loops=self_loops,
+                                                   score_merge=score_merge,
+                                                   max_in_memory=dedup_max_in_memory)
+        self._self_loops = self_loops
+        self._score_merge = score_merge
+        self._ppi_csr_files = []
+        self._ppi_csr_ids = []
+        self._mapping_rocrates = mapping_rocrates
+        self._deadline = deadline
+        self._defer_provenance = defer_provenance
+        self._sort_outputs = sort_outputs
+        self._sources = sources
 
         if self._input_data_dict is None or not self._input_data_dict:
             self._input_data_dict = {'outdir': self._outdir,
@@ -262,6 +378,31 @@ class CellmapsPPIDownloader(object):
                                                        data_dict=data_dict,
                                                        skip_copy=skip_copy)
 
+    def _add_input_file_to_crate(self, data_dict=None, path=None):
+        """
+        Adds input file at **path** to crate. Local files are copied
+        into the crate. URLs and members of archives are registered
+        by reference, with **path** set as url of the dataset if
+        **data_dict** lacks one, so remote inputs are not downloaded
+
+        :param data_dict: information about dataset
+        :type data_dict: dict
+        :param path: path, URL or reference into an archive of file
+        :type path: str
+        :return: id of dataset
+        :rtype: str
+        """
+        if archive.is_url(path) or archive.is_archive_path(path):
+            if 'url' not in data_dict:
+                data_dict = dict(data_dict)
+                data_dict['url'] = path
+            return self._add_dataset_to_crate(data_dict=data_dict,
+                                              source_file=path,
+                                              skip_copy=True)
+        return self._add_dataset_to_crate(data_dict=data_dict,
+                                          source_file=os.path.abspath(path),
+                                          skip_copy=False)
+
     def _register_computation(self):
         """
 
@@ -278,7 +419,7 @@ class CellmapsPPIDownloader(object):
                                                     keywords=keywords,
                                                     used_software=[self._softwareid],
                                                     used_dataset=self._inputdataset_ids,
-                                                    generated=[self._apms_gene_attrid])
+                                                    generated=[self._apms_gene_attrid] + self._ppi_csr_ids)
 
     def _create_rocrate(self):
         """
@@ -302,9 +443,14 @@ class CellmapsPPIDownloader(object):
         """
         Registers cm4ai/apms dataset or samples and unique input
         datasets with FAIRSCAPE
-        adding values to **self._inputdataset_ids**
+        adding values to **self._inputdataset_ids**. Nothing is
+        registered if **sources** was passed to constructor, as
+        those inputs are registered by :py:meth:`_register_sources`
 
         """
+        if self._sources is not None:
+            logger.debug('Inputs are registered per source')
+            return
         edgelist_datasetid = None
         baitlist_datasetid = None
         if 'guid' in self._provenance[CellmapsPPIDownloader.EDGELIST_FILEKEY]:
@@ -322,10 +468,9 @@ class CellmapsPPIDownloader(object):
             if CellmapsPPIDownloader.EDGELIST_FILEKEY in self._input_data_dict and \
                 self._input_data_dict[CellmapsPPIDownloader.EDGELIST_FILEKEY] is not None:
                 # write file and add samples dataset
-                edgelist_datasetid = self._add_dataset_to_crate(
+                edgelist_datasetid = self._add_input_file_to_crate(
                     data_dict=self._provenance[CellmapsPPIDownloader.EDGELIST_FILEKEY],
-                    source_file=os.path.abspath(self._input_data_dict[CellmapsPPIDownloader.EDGELIST_FILEKEY]),
-                    skip_copy=False)
+                    path=self._input_data_dict[CellmapsPPIDownloader.EDGELIST_FILEKEY])
                 self._inputdataset_ids.append(edgelist_datasetid)
                 logger.debug('Edgelist dataset id: ' + str(edgelist_datasetid))
 
@@ -333,10 +478,9 @@ class CellmapsPPIDownloader(object):
             if CellmapsPPIDownloader.BAITLIST_FILEKEY in self._input_data_dict and \
                 self._input_data_dict[CellmapsPPIDownloader.BAITLIST_FILEKEY] is not None:
                 # write file and add unique dataset
-                baitlist_datasetid = self._add_dataset_to_crate(
+                baitlist_datasetid = self._add_input_file_to_crate(
                     data_dict=self._provenance[CellmapsPPIDownloader.BAITLIST_FILEKEY],
-                    source_file=os.path.abspath(self._input_data_dict[CellmapsPPIDownloader.BAITLIST_FILEKEY]),
-                    skip_copy=False)
+                    path=self._input_data_dict[CellmapsPPIDownloader.BAITLIST_FILEKEY])
                 self._inputdataset_ids.append(baitlist_datasetid)
                 logger.debug('Baitlist dataset id: ' + str(baitlist_datasetid))
         if CellmapsPPIDownloader.CM4AI_ROCRATE in self._provenance:
@@ -344,6 +488,128 @@ class CellmapsPPIDownloader(object):
                 self._provenance[CellmapsPPIDownloader.CM4AI_ROCRATE])
             self._inputdataset_ids.append(parent_rocrate_id)
 
+    def merge(self, shard_dirs):
+        """
+        Merges outputs of runs with **sort_outputs** set to ``True`` on
+        shards of the input into output directory specified in
+        constructor, see :py:func:`~cellmaps_ppidownloader.shard.merge_shards`,
+        and registers the result in a new RO-Crate. Shards that are
+        RO-Crates are registered as input datasets. If **dedup_edges**
+        is ``True``, edges of the same gene symbol pair from different
+        shards are collapsed using **score_merge**
+
+        :param shard_dirs: output directories of shards
+        :type shard_dirs: list
+        :raises CellMapsPPIDownloaderError: If there is an error
+        :return: 0 upon success, otherwise failure
+        """
+        try:
+            exitcode = 99
+            self._create_output_directory()
+            if self._skip_logging is False:
+                logutils.setup_filelogger(outdir=self._outdir,
+                                          handlerprefix='cellmaps_ppidownloader')
+            self._write_task_start_json()
+            self.generate_readme()
+
+            self._update_provenance_with_description()
+            self._update_provenance_with_keywords()
+            self._create_rocrate()
+            self._register_rocrates([d for d in shard_dirs
+                                     if os.path.isfile(os.path.join(d, MappingIndex.ROCRATE_METADATA_FILE))])
+            self._register_software()
+
+            score_merge = None
+            if self._dedup_edges:
+                score_merge = self._score_merge
+            shard.merge_shards(shard_dirs, self._outdir, score_merge=score_merge,
+                               union_cols=[CellmapsPPIDownloader.SOURCE_COL])
+
+            self._register_apms_gene_node_attrs()
+            self._register_ppi_edgelist()
+            self._register_computation()
+            exitcode = 0
+            return exitcode
+        finally:
+            self._write_task_finish(exitcode)
+
+    def _register_rocrates(self, rocrates):
+        """
+        Adds ids of **rocrates** to **self._inputdataset_ids**
+
+        :param rocrates: paths to RO-Crate directories or RO-Crate
+                         metadata as returned by
+                         :py:func:`~cellmaps_ppidownloader.archive.get_rocrate_metadata`
+        :type rocrates: list
+        """
+        for rocrate in rocrates:
+            rocrate_id = self._provenance_utils.get_id_of_rocrate(rocrate)
+            logger.debug('RO-Crate ' + str(rocrate) + ' id: ' + str(rocrate_id))
+            self._inputdataset_ids.append(rocrate_id)
+
+    def _get_source_data_dict(self, source_name, filekey):
+        """
+        Gets provenance to register **filekey** file of source
+        **source_name** with. Provenance under :py:const:`SOURCES_KEY`
+        for the source name is either that of its edge list or a dict
+        with provenance of ``edgelist`` and/or ``baitlist``
+
+        :raises CellMapsPPIDownloaderError: If there is no provenance
+                                            for the source and the
+                                            **filekey** provenance has
+                                            a ``guid``
+        :return: dataset provenance
+        :rtype: dict
+        """
+        source_provs = self._provenance.get(CellmapsPPIDownloader.SOURCES_KEY) or {}
+        source_prov = source_provs.get(source_name)
+        if source_prov is not None:
+            if CellmapsPPIDownloader.EDGELIST_FILEKEY in source_prov or \
+                    CellmapsPPIDownloader.BAITLIST_FILEKEY in source_prov:
+                if filekey in source_prov:
+                    return source_prov[filekey]
+            elif filekey == CellmapsPPIDownloader.EDGELIST_FILEKEY:
+                return source_prov
+        data_dict = dict(self._provenance[filekey])
+        if 'guid' in data_dict:
+            raise CellMapsPPIDownloaderError('Provenance for ' + filekey + ' of source ' +
+                                             source_name + ' needed under ' +
+                                             CellmapsPPIDownloader.SOURCES_KEY +
+                                             ' in provenance')
+        data_dict['name'] = str(data_dict.get('name', filekey)) + ' (' + source_name + ')'
+        return data_dict
+
+    def _register_sources(self):
+        """
+        Registers inputs passed in via **sources** in constructor
+        as input datasets adding ids to **self._inputdataset_ids**
+        """
+        if self._sources is None:
+            return
+        for source in self._sources:
+            if source.get('cm4ai_table') is not None:
+                self._register_rocrates([archive.get_parent_rocrate(source['cm4ai_table'])])
+                continue
+            for filekey in [CellmapsPPIDownloader.EDGELIST_FILEKEY,
+                            CellmapsPPIDownloader.BAITLIST_FILEKEY]:
+                if source.get(filekey) is None:
+                    continue
+                data_dict = self._get_source_data_dict(source['name'], filekey)
+                if 'guid' in data_dict:
+                    self._inputdataset_ids.append(data_dict['guid'])
+                    continue
+                self._inputdataset_ids.append(self._add_input_file_to_crate(data_dict=data_dict,
+                                                                            path=source[filekey]))
+
+    def _register_mapping_rocrates(self):
+        """
+        Adds ids of RO-Crates passed in via **mapping_rocrates**
+        in constructor to **self._inputdataset_ids**
+        """
+        if self._mapping_rocrates is None:
+            return
+        self._register_rocrates(self._mapping_rocrates)
+
     def _write_task_start_json(self):
         """
         Writes task_start.json file with information about
@@ -382,6 +648,21 @@ class CellmapsPPIDownloader(object):
         return os.path.join(self._outdir,
                             constants.PPI_GENE_NODE_ERRORS_FILE)
 
+    def _get_gene_node_attr_keys(self, gene_node_attrs=None):
+        """
+        Gets keys of **gene_node_attrs** in the order their rows are
+        written to ppi gene node attributes file, sorted by gene
+        symbol if **sort_outputs** was set in constructor
+
+        :param gene_node_attrs:
+        :return: keys of **gene_node_attrs**
+        :rtype: iterable
+        """
+        keys = gene_node_attrs.keys()
+        if self._sort_outputs:
+            keys = sorted(keys, key=lambda k: gene_node_attrs[k]['name'])
+        return keys
+
     def _write_ppi_gene_node_attrs(self, gene_node_attrs=None,
                                    errors=None):
         """
@@ -394,7 +675,7 @@ class CellmapsPPIDownloader(object):
             writer = csv.DictWriter(f, fieldnames=constants.PPI_GENE_NODE_COLS, delimiter='\t')
 
             writer.writeheader()
-            for key in gene_node_attrs:
+            for key in self._get_gene_node_attr_keys(gene_node_attrs):
                 writer.writerow(gene_node_attrs[key])
 
         if errors is not None:
@@ -410,35 +691,210 @@ class CellmapsPPIDownloader(object):
         return os.path.join(self._outdir,
                             constants.PPI_EDGELIST_FILE)
 
+    def _get_ppi_edges(self, edgelist=None, gene_node_attrs=None,
+                       edge_scores=None, edge_sources=None):
+        """
+        Maps edges to gene symbols, applying self loop policy and
+        deduplication if enabled in constructor
+
+        :param edgelist:
+        :param gene_node_attrs:
+        :param edge_scores: Optional column name to float32 arrays
+                            aligned with **edgelist**
+        :type edge_scores: dict
+        :param edge_sources: Optional bit masks of sources aligned with
+                             **edgelist**. If set, mask is added after
+                             scores and sources of collapsed edges
+                             are combined
+        :type edge_sources: :py:class:`array.array`
+        :return: generator of (gene A symbol, gene B symbol, tuple of scores
+                 in order of **edge_scores** columns)
+        :rtype: tuple
+        """
+        score_arrays = []
+        if edge_scores is not None:
+            score_arrays = list(edge_scores.values())
+        union_cols = None
+        if edge_sources is not None:
+            union_cols = [len(score_arrays)]
+            score_arrays.append(edge_sources)
+        edges = ((genea, geneb, tuple(float(a[index]) for a in score_arrays))
+                 for index, genea, geneb in
+                 get_symbol_edges(edgelist=edgelist,
+                                  gene_node_attrs=gene_node_attrs))
+        if self._dedup_edges:
+            edges = self._edge_deduplicator.deduplicate(edges, union_cols=union_cols)
+        elif self._self_loops == EdgeDeduplicator.DROP:
+            edges = (e for e in edges if e[0] != e[1])
+        if self._sort_outputs:
+            return sorted(edges, key=lambda e: (e[0], e[1]))
+        return edges
+
+    @staticmethod
+    def _format_score(value):
+        """
+        Formats score for output with float32 precision, ``nan``
+        is written as an empty string
+
+        :param value:
+        :type value: float
+        :return:
+        :rtype: str
+        """
+        if math.isnan(value):
+            return ''
+        return '%.7g' % value
+
+    @staticmethod
+    def _format_sources(mask, source_names):
+        """
+        Formats bit mask of sources as semicolon delimited names
+
+        :param mask: bit mask where bit ``i`` is ``source_names[i]``
+        :type mask: float
+        :param source_names: names of sources
+        :type source_names: list
+        :return:
+        :rtype: str
+        """
+        mask = int(mask)
+        return ';'.join(name for i, name in enumerate(source_names)
+                        if mask & (1 << i))
+
     def _write_ppi_network(self, edgelist=None,
-                           gene_node_attrs=None):
+                           gene_node_attrs=None,
+                           edge_scores=None,
+                           edge_sources=None):
         """
+        Writes network to ppi edgelist file, along with a column
+        for each score column in **edge_scores** and a
+        :py:const:`SOURCE_COL` column if **edge_sources** is set
 
         :param edgelist:
         :param gene_node_attrs:
+        :param edge_scores: Optional column name to float32 arrays
+                            aligned with **edgelist**
+        :type edge_scores: dict
+        :param edge_sources: Optional (source names, bit masks aligned
+                             with **edgelist**) as returned by
+                             ``get_apms_edge_sources()`` of generators
+        :type edge_sources: tuple
         :return:
         """
+        score_cols = []
+        if edge_scores is not None:
+            score_cols = list(edge_scores.keys())
+        source_names = None
+        source_masks = None
+        extra_cols = []
+        if edge_sources is not None:
+            source_names, source_masks = edge_sources
+            extra_cols = [CellmapsPPIDownloader.SOURCE_COL]
         with open(self.get_ppi_edgelist_file(), 'w', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=constants.PPI_EDGELIST_COLS, delimiter='\t')
-            writer.writeheader()
-            for edge in edgelist:
-                if edge['GeneID1'] not in gene_node_attrs:
-                    logger.error('Skipping ' + str(edge['GeneID1'] + ' cause it lacks a symbol'))
-                    continue
-                if edge['GeneID2'] not in gene_node_attrs:
-                    logger.error('Skipping ' + str(edge['GeneID2'] + ' cause it lacks a symbol'))
-                    continue
+            writer = csv.writer(f, delimiter='\t', lineterminator='\r\n')
+            writer.writerow(constants.PPI_EDGELIST_COLS + score_cols + extra_cols)
+            for genea, geneb, scores in self._get_ppi_edges(edgelist=edgelist,
+                                                            gene_node_attrs=gene_node_attrs,
+                                                            edge_scores=edge_scores,
+                                                            edge_sources=source_masks):
+                row = [genea, geneb]
+                row.extend(CellmapsPPIDownloader._format_score(v) for v in scores[:len(score_cols)])
+                if source_names is not None:
+                    row.append(CellmapsPPIDownloader._format_sources(scores[-1], source_names))
+                writer.writerow(row)
+
+    def get_ppi_csr_dir(self):
+        """
+        Gets full path to binary CSR adjacency bundle directory under
+        output directory created when invoking
+        :py:meth:`~cellmaps_ppidownloader.runner.CellmapsPPIDownloader.run`
+        with **write_csr** set to ``True``
 
-                genea = gene_node_attrs[edge['GeneID1']]['name']
-                geneb = gene_node_attrs[edge['GeneID2']]['name']
-                if genea is None or geneb is None:
-                    logger.error('Skipping edge cause no symbol is found: ' + str(edge))
-                    continue
-                if len(genea) == 0 or len(geneb) == 0:
-                    logger.error('Skipping edge cause no symbol is found: ' + str(edge))
-                    continue
-                writer.writerow({constants.PPI_EDGELIST_COLS[0]: genea,
-                                 constants.PPI_EDGELIST_COLS[1]: geneb})
+        :return: Path to directory
+        :rtype: str
+        """
+        return os.path.join(self._outdir, CellmapsPPIDownloader.PPI_CSR_DIR)
+
+    def _write_ppi_csr(self, edgelist=None, gene_node_attrs=None,
+                       edge_scores=None):
+        """
+        Writes network as binary CSR adjacency bundle. Node order
+        matches the order in which gene symbols first appear in ppi
+        gene node attributes file, ids sharing a symbol are one node.
+        If **edge_scores** is set, the first score column is stored
+        as the edge weights
+
+        :param edgelist:
+        :param gene_node_attrs:
+        :param edge_scores: Optional column name to float32 arrays
+                            aligned with **edgelist**
+        :type edge_scores: dict
+        """
+        nodes = []
+        for key in self._get_gene_node_attr_keys(gene_node_attrs):
+            name = gene_node_attrs[key]['name']
+            if name is not None and len(name) > 0:
+                nodes.append(name)
+        edges = []
+        weights = None
+        if edge_scores is not None and len(edge_scores) > 0:
+            weights = []
+        for genea, geneb, scores in self._get_ppi_edges(edgelist=edgelist,
+                                                        gene_node_attrs=gene_node_attrs,
+                                                        edge_scores=edge_scores):
+            edges.append((genea, geneb))
+            if weights is not None:
+                weights.append(scores[0])
+        network = PPINetwork.from_symbol_edges(edges=edges, nodes=nodes,
+                                               weights=weights)
+        self._ppi_csr_files = network.save(self.get_ppi_csr_dir())
+
+    def _register_ppi_csr(self):
+        """
+        Registers files in binary CSR adjacency bundle with crate
+        as datasets
+
+        """
+        for csr_file in self._ppi_csr_files:
+            basename = os.path.basename(csr_file)
+            data_format = os.path.splitext(basename)[1][1:]
+            description = self._provenance['description'] + ' AP-MS ppi CSR adjacency ' + basename + ' file'
+            data_dict = {'name': cellmaps_ppidownloader.__name__ + ' ppi CSR ' + basename + ' file',
+                         'description': description,
+                         'keywords': self._provenance['keywords'] + ['ppi', 'csr', 'adjacency', 'file'],
+                         'data-format': data_format,
+                         'author': cellmaps_ppidownloader.__author__,
+                         'version': cellmaps_ppidownloader.__version__,
+                         'date-published': date.today().strftime(self._provenance_utils.get_default_date_format_str())}
+            self._ppi_csr_ids.append(self._provenance_utils.register_dataset(self._outdir,
+                                                                             source_file=csr_file,
+                                                                             data_dict=data_dict))
+
+    def _add_deadline_to_task_finish_json(self):
+        """
+        Adds deadline in seconds, whether it passed and genes left
+        unresolved because of it to task finish file written by
+        :py:func:`cellmaps_utils.logutils.write_task_finish_json`
+        """
+        if self._deadline is None:
+            return
+        task_finish_file = os.path.join(self._outdir,
+                                        constants.TASK_FILE_PREFIX +
+                                        str(self._start_time) +
+                                        constants.TASK_FINISH_FILE_SUFFIX)
+        if not os.path.isfile(task_finish_file):
+            return
+        with open(task_finish_file, 'r') as f:
+            task = json.load(f)
+        unresolved = self._deadline.get_unresolved()
+        if len(unresolved) > 0:
+            logger.warning(str(len(unresolved)) + ' genes left unresolved '
+                           'because of deadline')
+        task.update({'deadline': self._deadline.get_seconds(),
+                     'deadline_expired': self._deadline.is_expired(),
+                     'deadline_unresolved': unresolved})
+        with open(task_finish_file, 'w') as f:
+            json.dump(task, f, indent=2)
 
     def generate_readme(self):
         description = getattr(cellmaps_ppidownloader, '__description__', 'No description provided.')
@@ -460,40 +916,238 @@ class CellmapsPPIDownloader(object):
         """
         try:
             exitcode = 99
-            self._create_output_directory()
+            self._start_run()
+
+            gene_node_attrs, errors = self._apmsgen.get_gene_node_attributes()
+
+            self._finish_run(gene_node_attrs, errors)
+            exitcode = 0
+            return exitcode
+        finally:
+            self._write_task_finish(exitcode)
+
+    async def run_async(self):
+        """
+        Coroutine version of :py:meth:`run` for use in asyncio
+        applications. Genes are resolved via
+        ``get_gene_node_attributes_async()`` of the generator and
+        the blocking file and provenance steps run in the default
+        executor of the event loop, so one event loop can drive
+        many downloads concurrently
+
+        .. note::
+
+            When **skip_logging** is ``False`` the log file handlers
+            replace those of the root logger, so a download that logs
+            cannot run while another download is running
+
+        :raises CellMapsPPIDownloaderError: If there is an error or
+                                            if **skip_logging** is
+                                            ``False`` and another
+                                            download is running
+        :return: 0 upon success, otherwise failure
+        """
+        loop = asyncio.get_running_loop()
+        self._begin_async_run()
+        try:
+            try:
+                exitcode = 99
+                await loop.run_in_executor(None, self._start_run)
+
+                gene_node_attrs, errors = await self._apmsgen.get_gene_node_attributes_async()
+
+                await loop.run_in_executor(None, functools.partial(self._finish_run,
+                                                                   gene_node_attrs,
+                                                                   errors))
+                exitcode = 0
+                return exitcode
+            finally:
+                await loop.run_in_executor(None, functools.partial(self._write_task_finish,
+                                                                   exitcode))
+        finally:
+            self._end_async_run()
+
+    def _begin_async_run(self):
+        """
+        Counts this download as running via :py:meth:`run_async`
+
+        :raises CellMapsPPIDownloaderError: If this download or another
+                                            running download logs to
+                                            file and the other is running
+        """
+        with CellmapsPPIDownloader._async_runs_lock:
+            if CellmapsPPIDownloader._async_logging_runs > 0 or \
+                    (self._skip_logging is False and
+                     CellmapsPPIDownloader._async_runs > 0):
+                raise CellMapsPPIDownloaderError('Downloads run concurrently via '
+                                                 'run_async() must set skip_logging '
+                                                 'to True, otherwise they log to '
+                                                 'each other\'s files')
+            CellmapsPPIDownloader._async_runs += 1
             if self._skip_logging is False:
-                logutils.setup_filelogger(outdir=self._outdir,
-                                          handlerprefix='cellmaps_ppidownloader')
-            self._write_task_start_json()
+                CellmapsPPIDownloader._async_logging_runs += 1
 
-            self.generate_readme()
+    def _end_async_run(self):
+        """
+        Stops counting this download as running via :py:meth:`run_async`
+        """
+        with CellmapsPPIDownloader._async_runs_lock:
+            CellmapsPPIDownloader._async_runs -= 1
+            if self._skip_logging is False:
+                CellmapsPPIDownloader._async_logging_runs -= 1
 
-            self._update_provenance_with_description()
-            self._update_provenance_with_keywords()
-            self._create_rocrate()
-            self._register_input_datasets()
+    def _start_run(self):
+        """
+        Creates output directory, task start file, README and RO-Crate
+        and registers input datasets and software
+        """
+        self._create_output_directory()
+        if self._skip_logging is False:
+            logutils.setup_filelogger(outdir=self._outdir,
+                                      handlerprefix='cellmaps_ppidownloader')
+        self._write_task_start_json()
 
-            self._register_software()
+        self.generate_readme()
 
-            gene_node_attrs, errors = self._apmsgen.get_gene_node_attributes()
+        if self._defer_provenance:
+            logger.info('Deferring provenance to finalize')
+            return
+        self._register_run_inputs()
+
+    def _register_run_inputs(self):
+        """
+        Creates RO-Crate and registers input datasets and software
+        """
+        self._update_provenance_with_description()
+        self._update_provenance_with_keywords()
+        self._create_rocrate()
+        self._register_input_datasets()
+        self._register_sources()
+        self._register_mapping_rocrates()
+
+        self._register_software()
 
+    def _finish_run(self, gene_node_attrs, errors):
+        """
+        Writes and registers gene node attributes and network and
+        registers computation
+
+        :param gene_node_attrs: gene node attributes from generator
+        :type gene_node_attrs: dict or
+                               :py:class:`~cellmaps_ppidownloader.store.GeneNodeAttributeStore`
+        :param errors: errors from generator
+        :type errors: list
+        """
+        try:
             # write apms attribute data
             self._write_ppi_gene_node_attrs(gene_node_attrs, errors)
 
             # write apms network
             self._write_ppi_network(edgelist=self._apmsgen.get_apms_edgelist(),
-                                    gene_node_attrs=gene_node_attrs)
+                                    gene_node_attrs=gene_node_attrs,
+                                    edge_scores=self._apmsgen.get_apms_edge_scores(),
+                                    edge_sources=self._apmsgen.get_apms_edge_sources())
+
+            if self._write_csr and self._deadline is not None and self._deadline.is_expired():
+                logger.warning('Deadline passed, skipping write of CSR bundle')
+                self._write_csr = False
+
+            if self._write_csr:
+                self._write_ppi_csr(edgelist=self._apmsgen.get_apms_edgelist(),
+                                    gene_node_attrs=gene_node_attrs,
+                                    edge_scores=self._apmsgen.get_apms_edge_scores())
+        finally:
+            if isinstance(gene_node_attrs, GeneNodeAttributeStore):
+                gene_node_attrs.close()
 
-            self._register_apms_gene_node_attrs()
-            self._register_ppi_edgelist()
+        if self._defer_provenance:
+            self._write_pending_provenance()
+            return
+        self._register_run_outputs()
 
-            self._register_computation()
-            exitcode = 0
-            return exitcode
-        finally:
-            self._end_time = int(time.time())
-            # write a task finish file
-            logutils.write_task_finish_json(outdir=self._outdir,
-                                            start_time=self._start_time,
-                                            end_time=self._end_time,
-                                            status=exitcode)
+    def _register_run_outputs(self):
+        """
+        Registers output datasets and computation
+        """
+        self._register_apms_gene_node_attrs()
+        self._register_ppi_edgelist()
+        if self._write_csr:
+            self._register_ppi_csr()
+
+        self._register_computation()
+
+    def get_pending_provenance_file(self):
+        """
+        Gets path to journal of provenance registrations deferred
+        by **defer_provenance**
+
+        :return: path to :py:const:`PENDING_PROVENANCE_FILE` in output directory
+        :rtype: str
+        """
+        return os.path.join(self._outdir, CellmapsPPIDownloader.PENDING_PROVENANCE_FILE)
+
+    def _write_pending_provenance(self):
+        """
+        Writes provenance, command line arguments, mapping RO-Crates
+        and CSR bundle files, relative to output directory, to
+        :py:meth:`get_pending_provenance_file` so registration can be
+        done later by :py:meth:`finalize`
+        """
+        journal = {'provenance': self._provenance,
+                   'input_data_dict': self._input_data_dict,
+                   'mapping_rocrates': self._mapping_rocrates,
+                   'sources': self._sources,
+                   'write_csr': self._write_csr,
+                   'ppi_csr_files': [os.path.relpath(f, self._outdir)
+                                     for f in self._ppi_csr_files]}
+        with open(self.get_pending_provenance_file(), 'w') as f:
+            json.dump(journal, f, default=str)
+
+    @staticmethod
+    def finalize(outdir, provenance_utils=ProvenanceUtil()):
+        """
+        Does the provenance registration deferred by a run with
+        **defer_provenance** set to ``True``: creates the RO-Crate,
+        registers (copying where needed) input datasets, software,
+        outputs and computation and then removes the journal.
+        Inputs must still be at the paths used by the run
+
+        :param outdir: output directory of run
+        :type outdir: str
+        :param provenance_utils: used to register provenance
+        :type provenance_utils: :py:class:`~cellmaps_utils.provenance.ProvenanceUtil`
+        :raises CellMapsPPIDownloaderError: If output directory has no journal
+        """
+        outdir = os.path.abspath(outdir)
+        journal_file = os.path.join(outdir, CellmapsPPIDownloader.PENDING_PROVENANCE_FILE)
+        if not os.path.isfile(journal_file):
+            raise CellMapsPPIDownloaderError('No pending provenance found in ' + outdir)
+        with open(journal_file, 'r') as f:
+            journal = json.load(f)
+        downloader = CellmapsPPIDownloader(outdir=outdir,
+                                           provenance=journal['provenance'],
+                                           input_data_dict=journal['input_data_dict'],
+                                           provenance_utils=provenance_utils,
+                                           write_csr=journal['write_csr'],
+                                           mapping_rocrates=journal['mapping_rocrates'],
+                                           sources=journal.get('sources'))
+        downloader._ppi_csr_files = [os.path.join(outdir, f) for f in journal['ppi_csr_files']]
+        logger.info('Registering provenance of ' + outdir)
+        downloader._register_run_inputs()
+        downloader._register_run_outputs()
+        os.remove(journal_file)
+
+    def _write_task_finish(self, exitcode):
+        """
+        Writes task finish file with **exitcode** as status
+
+        :param exitcode: exit code of run
+        :type exitcode: int
+        """
+        self._end_time = int(time.time())
+        # write a task finish file
+        logutils.write_task_finish_json(outdir=self._outdir,
+                                        start_time=self._start_time,
+                                        end_time=self._end_time,
+                                        status=exitcode)
+        self._add_deadline_to_task_finish_json()
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+import heapq
+import logging
+
+from cellmaps_ppidownloader.edges import edge_hash
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+logger = logging.getLogger(__name__)
+
+
+class EdgeSampler(object):
+    """
+    Reproducible streaming sample of undirected edges, used to
+    iterate quickly on a subset of a large AP-MS table
+
+    Each edge gets a pseudo random priority in ``[0, 1)`` from a
+    stable hash of **seed** and its canonical gene pair. With
+    **fraction**, edges with priority below **fraction** are kept.
+    With **size**, a bounded heap keeps the **size** edges with
+    lowest priority, a reservoir sample that needs no second pass.
+    Either way the same seed always selects the same edges whatever
+    the order of rows, and a smaller sample is contained in a larger
+    one
+    """
+
+    def __init__(self, fraction=None, size=None, seed=0):
+        """
+        Constructor
+
+        :param fraction: fraction of edges to keep, greater than
+                         ``0`` and at most ``1``
+        :type fraction: float
+        :param size: number of edges to keep
+        :type size: int
+        :param seed: selects which edges are kept
+        :type seed: int
+        :raises CellMapsPPIDownloaderError: If not exactly one of
+                                            **fraction** and **size**
+                                            is set or either is invalid
+        """
+        if (fraction is None) == (size is None):
+            raise CellMapsPPIDownloaderError('Exactly one of fraction and '
+                                             'size must be set')
+        if fraction is not None and (fraction <= 0 or fraction > 1):
+            raise CellMapsPPIDownloaderError('Sample fraction must be greater '
+                                             'than 0 and at most 1: ' + str(fraction))
+        if size is not None and size < 1:
+            raise CellMapsPPIDownloaderError('Sample size must be at least 1: ' +
+                                             str(size))
+        self._fraction = fraction
+        self._size = size
+        self._seed = str(seed)
+        self._num_in = 0
+        self._kept = []
+
+    @staticmethod
+    def from_string(val, seed=0):
+        """
+        Creates sampler from **val**, a fraction below ``1`` such as
+        ``0.01`` or a whole number of edges such as ``5000``. Values
+        of at least ``1`` written as decimals, such as ``1.0``, are
+        rejected as they could mean either
+
+        :param val: fraction or number of edges
+        :type val: str
+        :param seed: selects which edges are kept
+        :type seed: int
+        :raises CellMapsPPIDownloaderError: If **val** is invalid
+        :return: sampler
+        :rtype: :py:class:`EdgeSampler`
+        """
+        try:
+            number = float(val)
+        except ValueError:
+            raise CellMapsPPIDownloaderError('Sample must be a fraction or '
+                                             'number of edges: ' + str(val))
+        if number < 1:
+            return EdgeSampler(fraction=number, seed=seed)
+        try:
+            size = int(str(val).strip())
+        except ValueError:
+            raise CellMapsPPIDownloaderError('Sample of at least 1 must be a '
+                                             'whole number of edges, such as '
+                                             '5000, to keep all edges omit '
+                                             'sample: ' + str(val))
+        return EdgeSampler(size=size, seed=seed)
+
+    def get_priority(self, genea, geneb):
+        """
+        Gets priority of edge between **genea** and **geneb**
+
+        :param genea: first gene
+        :type genea: str
+        :param geneb: second gene
+        :type geneb: str
+        :return: value in ``[0, 1)``, same for (A, B) and (B, A)
+        :rtype: float
+        """
+        return edge_hash(genea, geneb, salt=self._seed) / 2.0 ** 64
+
+    def add(self, genea, geneb, item):
+        """
+        Offers **item**, the edge between **genea** and **geneb**,
+        to the sample
+
+        :param genea: first gene
+        :type genea: str
+        :param geneb: second gene
+        :type geneb: str
+        :param item: edge, such as a row of input file
+        """
+        priority = self.get_priority(genea, geneb)
+        index = self._num_in
+        self._num_in += 1
+        if self._fraction is not None:
+            if priority < self._fraction:
+                self._kept.append((-priority, index, item))
+            return
+        entry = (-priority, index, item)
+        if len(self._kept) < self._size:
+            heapq.heappush(self._kept, entry)
+        elif entry[:2] > self._kept[0][:2]:
+            heapq.heapreplace(self._kept, entry)
+
+    def get_sampled(self):
+        """
+        Gets sampled items in the order they were added
+
+        :return: items
+        :rtype: list
+        """
+        kept = sorted(self._kept, key=lambda x: x[1])
+        logger.info('Sampled ' + str(len(kept)) + ' of ' +
+                    str(self._num_in) + ' edges')
+        return [item for _, _, item in kept]
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+
+import os
+import csv
+import math
+import heapq
+import logging
+from array import array
+from itertools import groupby
+
+from cellmaps_utils import constants
+
+from cellmaps_ppidownloader.edges import edge_hash
+from cellmaps_ppidownloader.edges import EdgeDeduplicator
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+logger = logging.getLogger(__name__)
+
+
+def check_shard(shard_index=None, shard_count=None):
+    """
+    Checks **shard_index** and **shard_count** are both unset
+    or describe a valid shard
+
+    :param shard_index: zero based index of shard
+    :type shard_index: int
+    :param shard_count: number of shards
+    :type shard_count: int
+    :raises CellMapsPPIDownloaderError: If values are invalid
+    """
+    if shard_index is None and shard_count is None:
+        return
+    if shard_index is None or shard_count is None:
+        raise CellMapsPPIDownloaderError('shard_index and shard_count must '
+                                         'be set together')
+    if shard_count < 1 or shard_index < 0 or shard_index >= shard_count:
+        raise CellMapsPPIDownloaderError('shard_index must be at least 0 and '
+                                         'less than shard_count ' +
+                                         str(shard_count) + ': ' + str(shard_index))
+
+
+def get_edge_shard(genea, geneb, shard_count):
+    """
+    Gets shard of undirected edge between **genea** and **geneb**
+    so (A, B) and (B, A) land in the same shard
+
+    :param genea: first gene
+    :type genea: str
+    :param geneb: second gene
+    :type geneb: str
+    :param shard_count: number of shards
+    :type shard_count: int
+    :return: zero based shard index
+    :rtype: int
+    """
+    return edge_hash(genea, geneb) % shard_count
+
+
+def filter_edges_for_shard(edgelist, shard_index, shard_count,
+                           cols=('GeneID1', 'GeneID2'), edge_scores=None):
+    """
+    Keeps edges of **edgelist** in shard **shard_index** along
+    with their scores
+
+    :param edgelist: list of dicts
+    :type edgelist: list
+    :param shard_index: zero based index of shard to keep
+    :type shard_index: int
+    :param shard_count: number of shards
+    :type shard_count: int
+    :param cols: keys of the two genes of an edge
+    :type cols: tuple
+    :param edge_scores: Optional column name to float32 arrays
+                        aligned with **edgelist**
+    :type edge_scores: dict
+    :return: (edges in shard, scores aligned with edges in shard or
+              ``None`` if **edge_scores** is ``None``)
+    :rtype: tuple
+    """
+    check_shard(shard_index=shard_index, shard_count=shard_count)
+    keep = [index for index, edge in enumerate(edgelist)
+            if get_edge_shard(edge[cols[0]], edge[cols[1]], shard_count) == shard_index]
+    logger.info('Shard ' + str(shard_index) + ' of ' + str(shard_count) +
+                ' has ' + str(len(keep)) + ' of ' + str(len(edgelist)) + ' edges')
+    shard_scores = None
+    if edge_scores is not None:
+        shard_scores = {col: array('f', (values[i] for i in keep))
+                        for col, values in edge_scores.items()}
+    return [edgelist[i] for i in keep], shard_scores
+
+
+def _read_rows(tsvfile):
+    """
+    Generator of (header, iterator of rows) of tab delimited **tsvfile**
+    that closes the file when rows are exhausted
+    """
+    with open(tsvfile, 'r', newline='') as f:
+        reader = csv.reader(f, delimiter='\t')
+        header = next(reader, None)
+        yield header
+        for row in reader:
+            yield row
+
+
+def _open_sorted_files(tsvfiles):
+    """
+    Opens **tsvfiles** which must share the same header
+
+    :raises CellMapsPPIDownloaderError: If headers differ
+    :return: (header, list of row iterators)
+    :rtype: tuple
+    """
+    header = None
+    iterators = []
+    for tsvfile in tsvfiles:
+        rows = _read_rows(tsvfile)
+        file_header = next(rows)
+        if header is None:
+            header = file_header
+        elif file_header != header:
+            raise CellMapsPPIDownloaderError('Header of ' + tsvfile +
+                                             ' does not match: ' + str(file_header))
+        iterators.append(rows)
+    return header, iterators
+
+
+def merge_gene_node_attributes(tsvfiles, outfile):
+    """
+    Merges gene node attributes files of shards, each sorted by
+    name, into **outfile** with a streaming k-way merge. A gene,
+    identified by all its attributes other than bait, found in
+    several shards is written once and is a bait if it is a bait
+    in any shard. Distinct genes sharing a name are all kept
+
+    :param tsvfiles: gene node attributes files sorted by name
+    :type tsvfiles: list
+    :param outfile: path to write merged file
+    :type outfile: str
+    :raises CellMapsPPIDownloaderError: If headers differ
+    :return: number of genes written
+    :rtype: int
+    """
+    header, iterators = _open_sorted_files(tsvfiles)
+    name_index = header.index('name')
+    bait_index = header.index('bait')
+    count = 0
+    with open(outfile, 'w', newline='') as f:
+        writer = csv.writer(f, delimiter='\t', lineterminator='\r\n')
+        writer.writerow(header)
+        for name, rows in groupby(heapq.merge(*iterators, key=lambda r: r[name_index]),
+                                  key=lambda r: r[name_index]):
+            genes = {}
+            for row in rows:
+                key = tuple(v for i, v in enumerate(row) if i != bait_index)
+                if key not in genes:
+                    genes[key] = list(row)
+                elif row[bait_index] == 'True':
+                    genes[key][bait_index] = 'True'
+            for row in genes.values():
+                row[bait_index] = str(row[bait_index] == 'True')
+                writer.writerow(row)
+                count += 1
+    return count
+
+
+def _parse_score(value):
+    """
+    Parses score of ppi edgelist file, an empty string is ``nan``
+    """
+    if value == '':
+        return float('nan')
+    return float(value)
+
+
+def _format_score(value):
+    """
+    Formats score as written to ppi edgelist file
+    """
+    if math.isnan(value):
+        return ''
+    return '%.7g' % value
+
+
+def _merge_edge_rows(rows, score_indexes, union_indexes, deduplicator):
+    """
+    Merges **rows** of edges connecting the same pair of genes into
+    one row. Scores are merged with the score merge policy of
+    **deduplicator** and semicolon
+    delimited names in **union_indexes** columns are combined
+
+    :return: merged row
+    :rtype: list
+    """
+    row = list(rows[0])
+    if len(rows) == 1:
+        return row
+    scores = deduplicator.merge_scores([tuple(_parse_score(r[i]) for i in score_indexes)
+                                        for r in rows])
+    for i, value in zip(score_indexes, scores):
+        row[i] = _format_score(value)
+    for i in union_indexes:
+        names = []
+        for r in rows:
+            for name in r[i].split(';'):
+                if name != '' and name not in names:
+                    names.append(name)
+        row[i] = ';'.join(names)
+    return row
+
+
+def merge_edgelists(tsvfiles, outfile, score_merge=None, union_cols=None):
+    """
+    Merges ppi edgelist files of shards, each sorted by gene symbol
+    pair, into **outfile** with a streaming k-way merge.
+
+    If **score_merge** is set, rows of the same gene symbol pair,
+    such as reciprocal edges of a CM4AI table deduplicated in
+    different shards, are collapsed into one row as
+    ``--dedup_edges`` does within a run
+
+    :param tsvfiles: ppi edgelist files sorted by gene symbol pair
+    :type tsvfiles: list
+    :param outfile: path to write merged file
+    :type outfile: str
+    :param score_merge: One of
+                        :py:const:`~cellmaps_ppidownloader.edges.EdgeDeduplicator.SCORE_MERGE_POLICIES`
+                        used to merge scores of collapsed rows.
+                        ``None`` means rows are not collapsed
+    :type score_merge: str
+    :param union_cols: columns holding semicolon delimited names, such
+                       as sources, combined when rows are collapsed
+    :type union_cols: list
+    :raises CellMapsPPIDownloaderError: If headers differ or
+                                        **score_merge** is invalid
+    :return: number of edges written
+    :rtype: int
+    """
+    deduplicator = None
+    if score_merge is not None:
+        deduplicator = EdgeDeduplicator(score_merge=score_merge)
+    header, iterators = _open_sorted_files(tsvfiles)
+    union_indexes = [i for i, col in enumerate(header)
+                     if i > 1 and col in (union_cols or [])]
+    score_indexes = [i for i in range(2, len(header)) if i not in union_indexes]
+    count = 0
+    with open(outfile, 'w', newline='') as f:
+        writer = csv.writer(f, delimiter='\t', lineterminator='\r\n')
+        writer.writerow(header)
+        merged = heapq.merge(*iterators, key=lambda r: (r[0], r[1]))
+        if deduplicator is None:
+            for row in merged:
+                writer.writerow(row)
+                count += 1
+            return count
+        for pair, rows in groupby(merged, key=lambda r: (r[0], r[1])):
+            writer.writerow(_merge_edge_rows(list(rows), score_indexes,
+                                             union_indexes, deduplicator))
+            count += 1
+    return count
+
+
+def merge_shards(shard_dirs, outdir, score_merge=None, union_cols=None):
+    """
+    Merges gene node attributes, edgelist and errors files written
+    to **shard_dirs** by runs with ``--shard_index`` and ``--shard_count``
+    into **outdir**
+
+    :param shard_dirs: output directories of shards
+    :type shard_dirs: list
+    :param outdir: existing directory to write merged files
+    :type outdir: str
+    :param score_merge: see :py:func:`merge_edgelists`
+    :type score_merge: str
+    :param union_cols: see :py:func:`merge_edgelists`
+    :type union_cols: list
+    :return: (number of genes, number of edges)
+    :rtype: tuple
+    """
+    num_genes = merge_gene_node_attributes([os.path.join(d, constants.PPI_GENE_NODE_ATTR_FILE)
+                                            for d in shard_dirs],
+                                           os.path.join(outdir, constants.PPI_GENE_NODE_ATTR_FILE))
+    num_edges = merge_edgelists([os.path.join(d, constants.PPI_EDGELIST_FILE)
+                                 for d in shard_dirs],
+                                os.path.join(outdir, constants.PPI_EDGELIST_FILE),
+                                score_merge=score_merge, union_cols=union_cols)
+    with open(os.path.join(outdir, constants.PPI_GENE_NODE_ERRORS_FILE), 'w') as out:
+        for shard_dir in shard_dirs:
+            errors_file = os.path.join(shard_dir, constants.PPI_GENE_NODE_ERRORS_FILE)
+            if not os.path.isfile(errors_file):
+                continue
+            with open(errors_file, 'r') as f:
+                for line in f:
+                    out.write(line)
+    logger.info('Merged ' + str(len(shard_dirs)) + ' shards with ' +
+                str(num_genes) + ' genes and ' + str(num_edges) + ' edges')
+    return num_genes, num_edges
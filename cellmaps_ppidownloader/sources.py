@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+import os
+import logging
+
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+logger = logging.getLogger(__name__)
+
+EDGELIST_KEYS = ['edgelist', 'baitlist',
+                 'geneid_one_col', 'symbol_one_col',
+                 'geneid_two_col', 'symbol_two_col',
+                 'ensembl_one_col', 'ensembl_two_col',
+                 'baitlist_symbol_col', 'baitlist_geneid_col',
+                 'baitlist_numinteractors_col']
+"""
+Keys allowed in spec of a source with an AP-MS edge list. Column
+keys match parameters of
+:py:meth:`~cellmaps_ppidownloader.gene.APMSGeneNodeAttributeGenerator.get_apms_edgelist_from_tsvfile`
+and, prefixed with ``baitlist_``, of
+:py:meth:`~cellmaps_ppidownloader.gene.APMSGeneNodeAttributeGenerator.get_apms_baitlist_from_tsvfile`
+"""
+
+CM4AI_KEYS = ['cm4ai_table', 'bait_col', 'prey_col',
+              'bfdr_col', 'bfdr_maxcutoff',
+              'foldchange_col', 'foldchange_cutoff']
+"""
+Keys allowed in spec of a source with a CM4AI table, matching parameters of
+:py:meth:`~cellmaps_ppidownloader.gene.CM4AIGeneNodeAttributeGenerator.get_apms_edgelist_from_tsvfile`
+"""
+
+FLOAT_KEYS = ['bfdr_maxcutoff', 'foldchange_cutoff']
+"""
+Keys whose values are converted to float
+"""
+
+
+def parse_source(spec):
+    """
+    Parses spec of an AP-MS input in format
+    ``KEY=VALUE,KEY=VALUE,...`` such as:
+
+    .. code-block::
+
+        name=hek293t,edgelist=BioPlex_293T.tsv,baitlist=baits.tsv,geneid_one_col=GeneA
+        name=u2os,cm4ai_table=u2os/apms.tsv,bfdr_col=BFDR.x,bfdr_maxcutoff=0.05
+
+    Exactly one of ``edgelist`` or ``cm4ai_table`` is required along
+    with keys in :py:const:`EDGELIST_KEYS` or :py:const:`CM4AI_KEYS`
+    respectively. If ``name`` is not set, name of file without
+    extension is used
+
+    :param spec: spec of source
+    :type spec: str
+    :raises CellMapsPPIDownloaderError: If **spec** is invalid
+    :return: source with ``name`` key and a key for each one in **spec**
+    :rtype: dict
+    """
+    source = {}
+    for entry in spec.split(','):
+        entry = entry.strip()
+        if len(entry) == 0:
+            continue
+        if '=' not in entry:
+            raise CellMapsPPIDownloaderError('Expected KEY=VALUE in source: ' + entry)
+        key, value = [x.strip() for x in entry.split('=', 1)]
+        if key in source:
+            raise CellMapsPPIDownloaderError('Duplicate ' + key + ' in source: ' + spec)
+        source[key] = value
+    if ('edgelist' in source) == ('cm4ai_table' in source):
+        raise CellMapsPPIDownloaderError('Exactly one of edgelist and cm4ai_table '
+                                         'is required in source: ' + spec)
+    allowed = EDGELIST_KEYS if 'edgelist' in source else CM4AI_KEYS
+    for key in source:
+        if key != 'name' and key not in allowed:
+            raise CellMapsPPIDownloaderError('Unknown key ' + key + ' in source: ' + spec)
+    for key in FLOAT_KEYS:
+        if key in source:
+            try:
+                source[key] = float(source[key])
+            except ValueError:
+                raise CellMapsPPIDownloaderError(key + ' must be a number in source: ' + spec)
+    if 'name' not in source or len(source['name']) == 0:
+        path = source.get('edgelist') or source.get('cm4ai_table')
+        source['name'] = os.path.splitext(os.path.basename(path))[0]
+    return source
+
+
+def get_source_kwargs(source, prefix=''):
+    """
+    Gets keys of **source** starting with **prefix**, with
+    **prefix** removed, that name columns or cutoffs
+
+    :param source: source as returned by :py:func:`parse_source`
+    :type source: dict
+    :param prefix: prefix of keys to get
+    :type prefix: str
+    :return: keyword arguments for reading files of source
+    :rtype: dict
+    """
+    kwargs = {}
+    for key, value in source.items():
+        if key in ['name', 'edgelist', 'baitlist', 'cm4ai_table']:
+            continue
+        if not key.startswith(prefix):
+            continue
+        if prefix == '' and key.startswith('baitlist_'):
+            continue
+        kwargs[key[len(prefix):]] = value
+    return kwargs
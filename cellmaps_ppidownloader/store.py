@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+import os
+import logging
+import sqlite3
+import tempfile
+import weakref
+from collections.abc import MutableMapping
+
+from cellmaps_utils import constants
+
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+logger = logging.getLogger(__name__)
+
+
+def _remove_database(conn, database):
+    """
+    Closes **conn** and deletes **database** file
+    """
+    conn.close()
+    if os.path.isfile(database):
+        os.unlink(database)
+
+
+class GeneNodeAttributeStore(MutableMapping):
+    """
+    Mapping of gene id to gene node attributes, a dict with keys in
+    :py:const:`COLUMNS`, usable in place of the dict returned by
+    ``get_gene_node_attributes()`` of the generators in
+    :py:mod:`cellmaps_ppidownloader.gene`
+
+    Attributes are held in a dict until more than **max_in_memory**
+    genes are stored. All attributes are then moved to a temporary
+    SQLite database, and stored from then on, so memory use stays
+    flat however many genes a run has. Iteration follows the order
+    genes were first stored, as with a dict. Values returned are
+    copies, so changing them does not change the store. The
+    database is deleted by :py:meth:`close` or when the store is
+    garbage collected
+    """
+
+    COLUMNS = constants.PPI_GENE_NODE_COLS
+    """
+    Keys of gene node attributes
+    """
+
+    def __init__(self, max_in_memory=None, tmpdir=None):
+        """
+        Constructor
+
+        :param max_in_memory: Maximum number of genes to hold in
+                              memory before spilling to disk. ``None``
+                              means never spill
+        :type max_in_memory: int
+        :param tmpdir: directory for database, ``None`` uses system
+                       temp directory
+        :type tmpdir: str
+        :raises CellMapsPPIDownloaderError: If **max_in_memory** is
+                                            less than ``1``
+        """
+        if max_in_memory is not None and max_in_memory < 1:
+            raise CellMapsPPIDownloaderError('max_in_memory must be at least 1')
+        self._max_in_memory = max_in_memory
+        self._tmpdir = tmpdir
+        self._memory = {}
+        self._conn = None
+        self._database = None
+        self._finalizer = None
+        self._len = 0
+
+    def is_spilled(self):
+        """
+        Checks if attributes were moved to disk
+
+        :return: ``True`` if attributes are in SQLite database
+        :rtype: bool
+        """
+        return self._conn is not None
+
+    def _spill(self):
+        """
+        Moves attributes held in memory to a new SQLite database
+        """
+        fd, self._database = tempfile.mkstemp(prefix='ppinodes_', suffix='.sqlite',
+                                              dir=self._tmpdir)
+        os.close(fd)
+        logger.debug('Spilling ' + str(len(self._memory)) +
+                     ' gene node attributes to ' + self._database)
+        # the store may be filled in an executor thread and read in another
+        self._conn = sqlite3.connect(self._database, check_same_thread=False)
+        self._finalizer = weakref.finalize(self, _remove_database,
+                                           self._conn, self._database)
+        self._conn.execute('PRAGMA journal_mode=OFF')
+        self._conn.execute('PRAGMA synchronous=OFF')
+        self._conn.execute('CREATE TABLE attrs (key TEXT PRIMARY KEY, ' +
+                           ', '.join(c + ' TEXT' for c in GeneNodeAttributeStore.COLUMNS) + ')')
+        self._conn.executemany(self._get_insert_sql(),
+                               ((key,) + self._to_row(value)
+                                for key, value in self._memory.items()))
+        self._len = len(self._memory)
+        self._memory = {}
+
+    @staticmethod
+    def _get_insert_sql():
+        """
+        Gets SQL inserting key and :py:const:`COLUMNS`
+        """
+        return 'INSERT INTO attrs (key, ' + ', '.join(GeneNodeAttributeStore.COLUMNS) + \
+               ') VALUES (' + ', '.join(['?'] * (len(GeneNodeAttributeStore.COLUMNS) + 1)) + ')'
+
+    @staticmethod
+    def _check_value(value):
+        """
+        Raises :py:class:`~cellmaps_ppidownloader.exceptions.CellMapsPPIDownloaderError`
+        if **value** has keys not in :py:const:`COLUMNS`
+        """
+        extra = set(value.keys()).difference(GeneNodeAttributeStore.COLUMNS)
+        if len(extra) > 0:
+            raise CellMapsPPIDownloaderError('Unsupported gene node attributes: ' +
+                                             str(sorted(extra)))
+
+    @staticmethod
+    def _to_row(value):
+        """
+        Converts attributes to tuple of :py:const:`COLUMNS` values
+        """
+        row = []
+        for col in GeneNodeAttributeStore.COLUMNS:
+            val = value.get(col)
+            if isinstance(val, bool):
+                val = int(val)
+            row.append(val)
+        return tuple(row)
+
+    @staticmethod
+    def _from_row(row):
+        """
+        Converts tuple of :py:const:`COLUMNS` values to attributes
+        """
+        value = {}
+        for col, val in zip(GeneNodeAttributeStore.COLUMNS, row):
+            if col == 'bait' and val is not None:
+                val = bool(int(val))
+            value[col] = val
+        return value
+
+    def __getitem__(self, key):
+        if self._conn is None:
+            return dict(self._memory[key])
+        row = self._conn.execute('SELECT ' + ', '.join(GeneNodeAttributeStore.COLUMNS) +
+                                 ' FROM attrs WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return GeneNodeAttributeStore._from_row(row)
+
+    def __setitem__(self, key, value):
+        GeneNodeAttributeStore._check_value(value)
+        if self._conn is None:
+            if self._max_in_memory is None or key in self._memory or \
+                    len(self._memory) < self._max_in_memory:
+                self._memory[key] = dict(value)
+                return
+            self._spill()
+        row = GeneNodeAttributeStore._to_row(value)
+        cursor = self._conn.execute('UPDATE attrs SET ' +
+                                    ', '.join(c + ' = ?' for c in GeneNodeAttributeStore.COLUMNS) +
+                                    ' WHERE key = ?', row + (key,))
+        if cursor.rowcount == 0:
+            self._conn.execute(self._get_insert_sql(), (key,) + row)
+            self._len += 1
+
+    def __delitem__(self, key):
+        if self._conn is None:
+            del self._memory[key]
+            return
+        cursor = self._conn.execute('DELETE FROM attrs WHERE key = ?', (key,))
+        if cursor.rowcount == 0:
+            raise KeyError(key)
+        self._len -= 1
+
+    def __iter__(self):
+        if self._conn is None:
+            yield from self._memory
+            return
+        for row in self._conn.execute('SELECT key FROM attrs ORDER BY rowid'):
+            yield row[0]
+
+    def __len__(self):
+        if self._conn is None:
+            return len(self._memory)
+        return self._len
+
+    def close(self):
+        """
+        Empties store deleting SQLite database if there is one
+        """
+        if self._finalizer is not None:
+            self._finalizer()
+        self._conn = None
+        self._database = None
+        self._finalizer = None
+        self._memory = {}
+        self._len = 0
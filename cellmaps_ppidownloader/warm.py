@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import logging
+from tqdm import tqdm
+
+from cellmaps_utils import constants
+
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+logger = logging.getLogger(__name__)
+
+
+class CacheWarmer(object):
+    """
+    Bulk resolves a gene universe, such as all human protein coding
+    genes or the union of baits and preys of a compendium, ahead of
+    production runs. Genes are resolved through a
+    :py:class:`~cellmaps_ppidownloader.gene.GeneQuery` so, depending
+    on how it was built, results land in the cache of the resolver
+    daemon and misses land in the negative cache. Resolved genes can
+    also be written as a local index usable via ``--mapping_from``
+    """
+
+    DEFAULT_BATCH_SIZE = 1000
+    """
+    Default number of genes resolved per query
+    """
+
+    ALL_PROTEIN_CODING_QUERY = 'type_of_gene:protein-coding'
+    """
+    mygene query matching all protein coding genes
+    """
+
+    ALL_GENES_SCOPES = ['_id', 'symbol', 'uniprot']
+    """
+    Scopes queried by the gene node attribute generators: gene ids
+    of APMS edgelists, and bait symbols and prey UniProt ids of
+    CM4AI tables
+    """
+
+    SCOPE_FIELDS = {'uniprot': 'uniprot.Swiss-Prot'}
+    """
+    mygene field holding terms of a scope, scopes not listed
+    here use the field of the same name
+    """
+
+    def __init__(self, genequery=None, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Constructor
+
+        :param genequery: used to resolve genes
+        :type genequery: :py:class:`~cellmaps_ppidownloader.gene.GeneQuery`
+        :param batch_size: number of genes resolved per query
+        :type batch_size: int
+        :raises CellMapsPPIDownloaderError: If **batch_size** is less than 1
+        """
+        if batch_size < 1:
+            raise CellMapsPPIDownloaderError('batch_size must be at least 1')
+        self._genequery = genequery
+        self._batch_size = batch_size
+        self._requested = {}
+        self._resolved = {}
+
+    @staticmethod
+    def read_genes(path):
+        """
+        Reads genes from first column of **path**. Empty lines and
+        lines starting with ``#`` are skipped
+
+        :param path: text or tab delimited file
+        :type path: str
+        :return: unique genes in order of first appearance
+        :rtype: list
+        """
+        genes = []
+        seen = set()
+        with open(path, 'r') as f:
+            for line in f:
+                gene = line.rstrip('\r\n').split('\t')[0].strip()
+                if len(gene) == 0 or gene.startswith('#') or gene in seen:
+                    continue
+                seen.add(gene)
+                genes.append(gene)
+        return genes
+
+    @staticmethod
+    def fetch_all_genes(mygeneinfo, query=ALL_PROTEIN_CODING_QUERY,
+                        species='human'):
+        """
+        Gets ids of all genes matching **query** using the fetch all
+        paging of mygene
+
+        :param mygeneinfo: mygene client
+        :type mygeneinfo: :py:class:`mygene.MyGeneInfo`
+        :param query: mygene query
+        :type query: str
+        :param species: species of genes
+        :type species: str
+        :return: gene ids
+        :rtype: list
+        """
+        return CacheWarmer.fetch_all_terms(mygeneinfo, query=query,
+                                           species=species)['_id']
+
+    @staticmethod
+    def _get_field_values(hit, field):
+        """
+        Gets values of dotted **field**, such as ``uniprot.Swiss-Prot``,
+        of mygene **hit**, following lists at every level
+
+        :return: values as strings
+        :rtype: list
+        """
+        values = [hit]
+        for key in field.split('.'):
+            next_values = []
+            for value in values:
+                if isinstance(value, list):
+                    next_values.extend(v[key] for v in value
+                                       if isinstance(v, dict) and key in v)
+                elif isinstance(value, dict) and key in value:
+                    next_values.append(value[key])
+            values = next_values
+        terms = []
+        for value in values:
+            if isinstance(value, list):
+                terms.extend(str(v) for v in value)
+            else:
+                terms.append(str(value))
+        return terms
+
+    @staticmethod
+    def fetch_all_terms(mygeneinfo, query=ALL_PROTEIN_CODING_QUERY,
+                        species='human', scopes=None):
+        """
+        Gets terms, in each of **scopes**, of all genes matching
+        **query** using the fetch all paging of mygene, so genes can
+        be warmed in every scope runs query them by
+
+        :param mygeneinfo: mygene client
+        :type mygeneinfo: :py:class:`mygene.MyGeneInfo`
+        :param query: mygene query
+        :type query: str
+        :param species: species of genes
+        :type species: str
+        :param scopes: mygene scopes, ``None`` means ``['_id']``
+        :type scopes: list
+        :return: scope to unique terms in order of first appearance
+        :rtype: dict
+        """
+        if scopes is None:
+            scopes = ['_id']
+        fields = [CacheWarmer.SCOPE_FIELDS.get(scope, scope) for scope in scopes]
+        terms = {scope: {} for scope in scopes}
+        num_genes = 0
+        for hit in mygeneinfo.query(query, species=species, fields=','.join(fields),
+                                    fetch_all=True):
+            num_genes += 1
+            for scope, field in zip(scopes, fields):
+                for term in CacheWarmer._get_field_values(hit, field):
+                    terms[scope][term] = True
+        logger.info('Fetched ' + str(num_genes) + ' genes matching ' + query)
+        return {scope: list(scope_terms.keys()) for scope, scope_terms in terms.items()}
+
+    def warm(self, genes, scopes='_id'):
+        """
+        Resolves **genes** in batches
+
+        :param genes: genes to resolve
+        :type genes: list
+        :param scopes: mygene scopes of **genes**
+        :type scopes: str
+        :return: number of genes resolved by this call
+        :rtype: int
+        """
+        requested = self._requested.setdefault(scopes, set())
+        resolved = self._resolved.setdefault(scopes, {})
+        num_resolved = len(resolved)
+        genes = [str(g) for g in genes]
+        requested.update(genes)
+        t = tqdm(total=len(genes), desc='Warming cache (' + str(scopes) + ')',
+                 unit='genes')
+        try:
+            for start in range(0, len(genes), self._batch_size):
+                batch = genes[start:start + self._batch_size]
+                for hit in self._genequery.get_symbols_for_genes(genelist=batch,
+                                                                 scopes=scopes):
+                    query = str(hit['query'])
+                    if 'ensembl' not in hit or 'symbol' not in hit or query in resolved:
+                        continue
+                    resolved[query] = hit
+                t.update(len(batch))
+        finally:
+            t.close()
+        return len(resolved) - num_resolved
+
+    def get_scopes(self):
+        """
+        Gets scopes passed to :py:meth:`warm`
+
+        :return: scopes in order first warmed
+        :rtype: list
+        """
+        return list(self._requested.keys())
+
+    def get_coverage(self, scopes=None):
+        """
+        Gets coverage of genes passed to :py:meth:`warm`
+
+        :param scopes: if set, only genes warmed in this scope
+                       are counted, otherwise genes of all scopes are
+        :type scopes: str
+        :return: dict with number of ``requested``, ``resolved`` and
+                 ``missing`` genes and ``coverage`` as fraction of
+                 requested genes resolved
+        :rtype: dict
+        """
+        if scopes is None:
+            scope_list = self.get_scopes()
+        else:
+            scope_list = [scopes]
+        requested = sum(len(self._requested.get(s, ())) for s in scope_list)
+        resolved = sum(len(self._resolved.get(s, ())) for s in scope_list)
+        coverage = 0.0
+        if requested > 0:
+            coverage = resolved / requested
+        return {'requested': requested,
+                'resolved': resolved,
+                'missing': requested - resolved,
+                'coverage': coverage}
+
+    def get_missing(self, scopes=None):
+        """
+        Gets genes passed to :py:meth:`warm` that were not resolved
+
+        :param scopes: if set, only genes warmed in this scope are
+                       considered, otherwise genes of all scopes are
+        :type scopes: str
+        :return: sorted genes
+        :rtype: list
+        """
+        if scopes is None:
+            scope_list = self.get_scopes()
+        else:
+            scope_list = [scopes]
+        missing = set()
+        for scope in scope_list:
+            missing.update(self._requested.get(scope, set()).difference(self._resolved.get(scope, {}).keys()))
+        return sorted(missing)
+
+    def write_gene_node_attributes(self, path):
+        """
+        Writes resolved genes to **path** in the format of
+        ``ppi_gene_node_attributes.tsv`` so it can be passed
+        to ``--mapping_from``. Each symbol is written once
+
+        :param path: file to write
+        :type path: str
+        :return: number of genes written
+        :rtype: int
+        """
+        seen = set()
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=constants.PPI_GENE_NODE_COLS, delimiter='\t')
+            writer.writeheader()
+            for hit in (h for resolved in self._resolved.values()
+                        for h in resolved.values()):
+                if hit['symbol'] in seen:
+                    continue
+                seen.add(hit['symbol'])
+                ensembl = hit['ensembl']
+                if not isinstance(ensembl, list):
+                    ensembl = [ensembl]
+                writer.writerow({'name': hit['symbol'],
+                                 'represents': 'ensembl:' + ';'.join(e['gene'] for e in ensembl),
+                                 'ambiguous': '',
+                                 'bait': False})
+        return len(seen)
@@ -30,10 +30,15 @@ with open('HISTORY.rst') as history_file:
 requirements = ['cellmaps_utils>=0.5.0,<1.0.0',
                 'requests>=2.32.3,<3.0.0',
                 'mygene>=3.2.2,<4.0.0',
+                'biothings_client>=0.4.0,<1.0.0',
+                'httpx>=0.23.0,<1.0.0',
+                'numpy',
                 'tqdm>=4.67.1,<5.0.0']
 
 setup_requirements = [ ]
 
+extras_requirements = {'url': ['fsspec', 's3fs', 'gcsfs']}
+
 setup(
     author=author,
     author_email=email,
@@ -49,6 +54,7 @@ setup(
     ],
     description=desc,
     install_requires=requirements,
+    extras_require=extras_requirements,
     license="MIT license",
     long_description=readme + '\n\n' + history,
     long_description_content_type='text/x-rst',
@@ -4,13 +4,17 @@
 """Tests for `APMSGeneNodeAttributeGenerator`"""
 
 import os
+import asyncio
 import unittest
 import shutil
 import tempfile
 import csv
 from unittest.mock import MagicMock
+from unittest.mock import AsyncMock
 
 from cellmaps_ppidownloader.gene import APMSGeneNodeAttributeGenerator
+from cellmaps_ppidownloader.sample import EdgeSampler
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
 
 SKIP_REASON = 'CELLMAPS_PPIDOWNLOADER_INTEGRATION_TEST ' \
               'environment variable not set, cannot run integration ' \
@@ -63,6 +67,27 @@ class TestAPMSGeneNodeAttributeGenerator(unittest.TestCase):
         self.assertEqual('219541', edgelist[0]['GeneID2'])
         self.assertEqual('MED19', edgelist[0]['Symbol2'])
 
+    def test_get_apms_edgelist_from_tsvfile_with_unknown_score_col(self):
+        with self.assertRaises(CellMapsPPIDownloaderError) as ce:
+            APMSGeneNodeAttributeGenerator.get_apms_edgelist_from_tsvfile(self.get_edgelist(),
+                                                                          score_cols=['pW'],
+                                                                          edge_scores={})
+        self.assertTrue('pW not found' in str(ce.exception))
+
+    def test_get_apms_edgelist_from_tsvfile_with_sampler(self):
+        edgelist = APMSGeneNodeAttributeGenerator.get_apms_edgelist_from_tsvfile(self.get_edgelist(),
+                                                                                 sampler=EdgeSampler(size=50,
+                                                                                                     seed=3))
+        self.assertEqual(50, len(edgelist))
+        again = APMSGeneNodeAttributeGenerator.get_apms_edgelist_from_tsvfile(self.get_edgelist(),
+                                                                              sampler=EdgeSampler(size=50,
+                                                                                                  seed=3))
+        self.assertEqual(edgelist, again)
+        fraction = APMSGeneNodeAttributeGenerator.get_apms_edgelist_from_tsvfile(self.get_edgelist(),
+                                                                                 sampler=EdgeSampler(fraction=0.1,
+                                                                                                     seed=3))
+        self.assertTrue(100 < len(fraction) < 500)
+
     def test_get_apms_baitlist_from_tsvfile(self):
         baitlist_path = self.get_baitlist()
         baitlist = APMSGeneNodeAttributeGenerator.get_apms_baitlist_from_tsvfile(baitlist_path)
@@ -141,3 +166,106 @@ class TestAPMSGeneNodeAttributeGenerator(unittest.TestCase):
 
         self.assertTrue(len(gene_node_attrs) > 0)
         self.assertEqual(len(errors), 0)
+
+    def test_get_gene_node_attributes_async(self):
+        edge_list = [
+            {'GeneID1': '101928739', 'Symbol1': 'PIK3CA', 'GeneID2': '219541', 'Symbol2': 'MED19'}
+        ]
+        bait_list = [
+            {'GeneSymbol': 'PIK3CA', 'GeneID': '101928739', '# Interactors': 2783}
+        ]
+        mockgenequery = MagicMock()
+        mockgenequery.get_symbols_for_genes_async = AsyncMock(return_value=[
+            {'query': '101928739', 'ensembl': {'gene': 'ENSG00000121879'}, 'symbol': 'PIK3CA'},
+            {'query': '219541', 'ensembl': {'gene': 'ENSG00000156603'}, 'symbol': 'MED19'}])
+
+        ppigen = APMSGeneNodeAttributeGenerator(apms_edgelist=edge_list, apms_baitlist=bait_list,
+                                                genequery=mockgenequery)
+        gene_node_attrs, errors = asyncio.run(ppigen.get_gene_node_attributes_async())
+        self.assertEqual(0, len(errors))
+        self.assertEqual(2, len(gene_node_attrs))
+        mockgenequery.get_symbols_for_genes.assert_not_called()
+        self.assertEqual(1, mockgenequery.get_symbols_for_genes_async.call_count)
+
+    def test_get_gene_node_attributes_trust_input(self):
+        mockquery = MagicMock()
+        mockquery.get_symbols_for_genes = MagicMock(return_value=[
+            {'query': '3', '_id': '3', 'symbol': 'GENEC',
+             'ensembl': {'gene': 'ENSG00000000003'}},
+            {'query': '2', '_id': '2', 'symbol': 'GENEB',
+             'ensembl': {'gene': 'ENSG00000000002'}}])
+        edgelist = [{'GeneID1': '1', 'Symbol1': 'GENEA', 'Ensembl1': 'ENSG00000000001',
+                     'GeneID2': '2', 'Symbol2': 'GENEB',
+                     'Ensembl2': 'ENSG00000000002;ENSG00000000012'},
+                    {'GeneID1': '1', 'Symbol1': 'GENEA', 'Ensembl1': 'ENSG00000000001',
+                     'GeneID2': '3', 'Symbol2': '', 'Ensembl2': 'ENSG00000000003'},
+                    {'GeneID1': '4', 'Symbol1': 'GENED', 'Ensembl1': 'ENSG00000000004',
+                     'GeneID2': '2', 'Symbol2': 'GENEB', 'Ensembl2': 'ENSG00000000002'}]
+        gen = APMSGeneNodeAttributeGenerator(apms_edgelist=edgelist,
+                                             apms_baitlist=[{'GeneID': '1'}],
+                                             genequery=mockquery,
+                                             trust_input=True)
+        gene_node_attrs, errors = gen.get_gene_node_attributes()
+        self.assertEqual([], errors)
+
+        # gene 3 has no symbol and rows disagree on gene 2
+        # Ensembl ids so only they are resolved
+        args = mockquery.get_symbols_for_genes.call_args
+        self.assertEqual(['2', '3'], sorted(args[1]['genelist']))
+        self.assertEqual({'name': 'GENEA', 'represents': 'ENSG00000000001',
+                          'ambiguous': '', 'bait': True}, gene_node_attrs['1'])
+        self.assertEqual('GENEC', gene_node_attrs['3']['name'])
+        self.assertEqual('ENSG00000000002', gene_node_attrs['2']['represents'])
+        self.assertEqual('GENED', gene_node_attrs['4']['name'])
+
+    def test_get_gene_node_attributes_trust_input_no_queries(self):
+        mockquery = MagicMock()
+        edgelist = [{'GeneID1': '1', 'Symbol1': 'GENEA', 'Ensembl1': 'ENSG00000000001',
+                     'GeneID2': '2', 'Symbol2': 'GENEB', 'Ensembl2': 'ENSG00000000002'}]
+        gen = APMSGeneNodeAttributeGenerator(apms_edgelist=edgelist,
+                                             apms_baitlist=[],
+                                             genequery=mockquery,
+                                             trust_input=True)
+        gene_node_attrs, errors = gen.get_gene_node_attributes()
+        mockquery.get_symbols_for_genes.assert_not_called()
+        self.assertEqual({'name': 'GENEB', 'represents': 'ENSG00000000002',
+                          'ambiguous': '', 'bait': False}, gene_node_attrs['2'])
+
+    def test_get_gene_node_attributes_trust_input_without_ensembl(self):
+        mockquery = MagicMock()
+        mockquery.get_symbols_for_genes = MagicMock(return_value=[
+            {'query': '2', '_id': '2', 'symbol': 'GENEB',
+             'ensembl': {'gene': 'ENSG00000000002'}}])
+        edgelist = [{'GeneID1': '1', 'Symbol1': 'GENEA', 'Ensembl1': 'ENSG00000000001',
+                     'GeneID2': '2', 'Symbol2': 'GENEB'}]
+        gen = APMSGeneNodeAttributeGenerator(apms_edgelist=edgelist,
+                                             apms_baitlist=[],
+                                             genequery=mockquery,
+                                             trust_input=True)
+        gene_node_attrs, errors = gen.get_gene_node_attributes()
+        # gene 2 has no Ensembl id so it is resolved
+        args = mockquery.get_symbols_for_genes.call_args
+        self.assertEqual(['2'], args[1]['genelist'])
+        self.assertEqual('ENSG00000000002', gene_node_attrs['2']['represents'])
+
+    def test_get_gene_node_attributes_with_mapping_index(self):
+        mockquery = MagicMock()
+        mockquery.get_symbols_for_genes = MagicMock(return_value=[
+            {'query': '2', '_id': '2', 'symbol': 'GENEB',
+             'ensembl': {'gene': 'ENSG00000000002'}}])
+        mapping_index = MagicMock()
+        mapping_index.get_ensembl_ids_for_symbol = MagicMock(side_effect=lambda x:
+                                                             {'GENEA': ['ENSG00000000001']}.get(x))
+        edgelist = [{'GeneID1': '1', 'Symbol1': 'GENEA',
+                     'GeneID2': '2', 'Symbol2': 'OLDB'}]
+        gen = APMSGeneNodeAttributeGenerator(apms_edgelist=edgelist,
+                                             apms_baitlist=[{'GeneID': '1'}],
+                                             genequery=mockquery,
+                                             mapping_index=mapping_index)
+        gene_node_attrs, errors = gen.get_gene_node_attributes()
+        self.assertEqual([], errors)
+        self.assertEqual(['2'], mockquery.get_symbols_for_genes.call_args[1]['genelist'])
+        self.assertEqual({'name': 'GENEA', 'represents': 'ENSG00000000001',
+                          'ambiguous': '', 'bait': True}, gene_node_attrs['1'])
+        self.assertEqual('GENEB', gene_node_attrs['2']['name'])
+
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `archive` module"""
+
+import os
+import io
+import json
+import shutil
+import tarfile
+import tempfile
+import unittest
+import zipfile
+import importlib.util
+from unittest.mock import patch
+
+from cellmaps_ppidownloader import archive
+from cellmaps_ppidownloader.gene import CM4AIGeneNodeAttributeGenerator
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+APMS_TSV = 'Bait\tPrey\tBFDR.x\tFoldChange.x\n' \
+           'DNMT3A\tO00422\t0.0\t77.5\n' \
+           'HDAC2\tQ9Y2K7\t0.5\t1.0\n'
+
+ROCRATE = {'@id': 'crate-id', 'name': 'apms'}
+
+HAS_FSSPEC = importlib.util.find_spec('fsspec') is not None
+
+HAS_MOTO = HAS_FSSPEC and importlib.util.find_spec('moto') is not None and \
+    importlib.util.find_spec('s3fs') is not None
+
+
+class TestArchive(unittest.TestCase):
+    """Tests for `archive` module"""
+
+    def setUp(self):
+        self._temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        archive.set_url_options()
+        archive._parent_rocrates.clear()
+        shutil.rmtree(self._temp_dir)
+
+    def create_zip(self, metadata_member='release/ro-crate-metadata.json'):
+        path = os.path.join(self._temp_dir, 'release.zip')
+        with zipfile.ZipFile(path, 'w') as zf:
+            zf.writestr('release/apms/apms.tsv', APMS_TSV)
+            if metadata_member is not None:
+                zf.writestr(metadata_member, json.dumps(ROCRATE))
+        return path
+
+    def create_tar(self):
+        path = os.path.join(self._temp_dir, 'release.tar.gz')
+        with tarfile.open(path, 'w:gz') as tf:
+            for name, data in [('apms/apms.tsv', APMS_TSV),
+                               ('apms/ro-crate-metadata.json', json.dumps(ROCRATE))]:
+                raw = data.encode('utf-8')
+                info = tarfile.TarInfo(name)
+                info.size = len(raw)
+                tf.addfile(info, io.BytesIO(raw))
+        return path
+
+    def test_split_archive_path(self):
+        self.assertEqual(('a.zip', 'x/apms.tsv'),
+                         archive.split_archive_path('a.zip!/x/apms.tsv'))
+        self.assertEqual(('a.tar.gz', 'apms.tsv'),
+                         archive.split_archive_path('a.tar.gz!apms.tsv'))
+        self.assertEqual((None, 'foo!bar.tsv'),
+                         archive.split_archive_path('foo!bar.tsv'))
+        self.assertEqual((None, 'apms.tsv'),
+                         archive.split_archive_path('apms.tsv'))
+        self.assertFalse(archive.is_archive_path('apms.tsv'))
+        self.assertTrue(archive.is_archive_path('a.ZIP!apms.tsv'))
+
+    def test_open_text_zip_and_tar(self):
+        for path in [self.create_zip() + '!/release/apms/apms.tsv',
+                     self.create_tar() + '!apms/apms.tsv']:
+            with archive.open_text(path) as f:
+                self.assertEqual(APMS_TSV, f.read())
+
+    def test_open_text_missing_member(self):
+        for path in [self.create_zip() + '!nope.tsv',
+                     self.create_tar() + '!nope.tsv']:
+            with self.assertRaises(CellMapsPPIDownloaderError):
+                with archive.open_text(path):
+                    pass
+
+    def test_get_parent_rocrate(self):
+        # metadata found in parent directory of member
+        zipfile_path = self.create_zip()
+        self.assertEqual(ROCRATE, archive.get_parent_rocrate(
+            zipfile_path + '!/release/apms/apms.tsv'))
+        self.assertEqual(ROCRATE, archive.get_parent_rocrate(
+            self.create_tar() + '!apms/apms.tsv'))
+        self.assertEqual(os.path.abspath('foo'),
+                         archive.get_parent_rocrate('foo/apms.tsv'))
+
+    def test_get_parent_rocrate_opens_archive_once(self):
+        for path in [self.create_zip() + '!/release/apms/apms.tsv',
+                     self.create_tar() + '!apms/apms.tsv']:
+            with patch.object(archive, '_open_archive',
+                              wraps=archive._open_archive) as mock_open:
+                self.assertEqual(ROCRATE, archive.get_parent_rocrate(path))
+                self.assertEqual(ROCRATE, archive.get_parent_rocrate(path))
+                self.assertEqual(1, mock_open.call_count)
+
+    def test_get_rocrate_metadata_missing(self):
+        path = self.create_zip(metadata_member=None)
+        with self.assertRaises(CellMapsPPIDownloaderError):
+            archive.get_rocrate_metadata(path + '!/release/apms/apms.tsv')
+
+    def test_cm4ai_edgelist_from_zip(self):
+        path = self.create_zip() + '!/release/apms/apms.tsv'
+        edgelist = CM4AIGeneNodeAttributeGenerator.get_apms_edgelist_from_tsvfile(path,
+                                                                                  bfdr_col='BFDR.x')
+        self.assertEqual([{'Bait': 'DNMT3A', 'Prey': 'O00422'}], edgelist)
+
+    def test_is_url(self):
+        for path in ['s3://bucket/apms.tsv', 'gs://bucket/apms.tsv',
+                     'file:///tmp/apms.tsv', 'simplecache::s3://bucket/apms.tsv',
+                     's3://bucket/release.zip!/apms.tsv']:
+            self.assertTrue(archive.is_url(path), path)
+        for path in [None, 'apms.tsv', '/tmp/apms.tsv', 'C:\\apms.tsv',
+                     'release.zip!/apms.tsv']:
+            self.assertFalse(archive.is_url(path), path)
+
+    def test_set_url_options(self):
+        archive.set_url_options(block_size=1024, cache_dir=self._temp_dir)
+        self.assertEqual({'block_size': 1024, 'cache_dir': self._temp_dir},
+                         archive._url_options)
+        archive.set_url_options()
+        self.assertEqual(archive.URL_BLOCK_SIZE, archive._url_options['block_size'])
+        with self.assertRaises(CellMapsPPIDownloaderError):
+            archive.set_url_options(block_size=0)
+
+    @unittest.skipIf(HAS_FSSPEC, 'fsspec is installed')
+    def test_open_text_url_without_fsspec(self):
+        with self.assertRaises(CellMapsPPIDownloaderError) as ce:
+            with archive.open_text('s3://bucket/apms.tsv'):
+                pass
+        self.assertTrue('fsspec is required' in str(ce.exception))
+
+    @unittest.skipUnless(HAS_FSSPEC, 'fsspec is not installed')
+    def test_open_text_file_url(self):
+        tsvfile = os.path.join(self._temp_dir, 'apms.tsv')
+        with open(tsvfile, 'w') as f:
+            f.write(APMS_TSV)
+        zip_url = 'file://' + self.create_zip()
+        for cache_dir in [None, os.path.join(self._temp_dir, 'cache')]:
+            archive.set_url_options(block_size=16, cache_dir=cache_dir)
+            with archive.open_text('file://' + tsvfile) as f:
+                self.assertEqual(APMS_TSV, f.read())
+            with archive.open_text(zip_url + '!/release/apms/apms.tsv') as f:
+                self.assertEqual(APMS_TSV, f.read())
+            self.assertEqual(ROCRATE, archive.get_parent_rocrate(zip_url + '!/release/apms/apms.tsv'))
+        with self.assertRaises(CellMapsPPIDownloaderError):
+            archive.get_parent_rocrate('file://' + tsvfile)
+
+    @unittest.skipUnless(HAS_MOTO, 'fsspec, s3fs and moto are required')
+    def test_cm4ai_edgelist_from_s3(self):
+        import boto3
+        import fsspec
+        from moto.server import ThreadedMotoServer
+        server = ThreadedMotoServer(ip_address='127.0.0.1', port=5123)
+        server.start()
+        old_conf = fsspec.config.conf.get('s3')
+        try:
+            endpoint_url = 'http://127.0.0.1:5123'
+            client = boto3.client('s3', endpoint_url=endpoint_url, region_name='us-east-1',
+                                  aws_access_key_id='foo', aws_secret_access_key='foo')
+            client.create_bucket(Bucket='lake')
+            client.put_object(Bucket='lake', Key='crate/apms.tsv', Body=APMS_TSV)
+            client.put_object(Bucket='lake', Key='crate/ro-crate-metadata.json',
+                              Body=json.dumps(ROCRATE))
+            fsspec.config.conf['s3'] = {'endpoint_url': endpoint_url,
+                                        'key': 'foo', 'secret': 'foo'}
+            edgelist = CM4AIGeneNodeAttributeGenerator.get_apms_edgelist_from_tsvfile('s3://lake/crate/apms.tsv',
+                                                                                      bfdr_col='BFDR.x')
+            self.assertEqual([{'Bait': 'DNMT3A', 'Prey': 'O00422'}], edgelist)
+            self.assertEqual(ROCRATE, archive.get_parent_rocrate('s3://lake/crate/apms.tsv'))
+        finally:
+            if old_conf is None:
+                fsspec.config.conf.pop('s3', None)
+            else:
+                fsspec.config.conf['s3'] = old_conf
+            server.stop()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `batching` module"""
+
+import unittest
+from unittest.mock import MagicMock
+
+from cellmaps_ppidownloader.batching import AdaptiveQueryController
+from cellmaps_ppidownloader.batching import is_retriable_error
+from cellmaps_ppidownloader.cache import ResolutionCache
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+
+class FakeHTTPError(Exception):
+    def __init__(self, status_code):
+        super().__init__('HTTP ' + str(status_code))
+        self.response = MagicMock()
+        self.response.status_code = status_code
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def fake_querymany(queries, scopes=None, fields=None, species=None):
+    return [{'query': q, '_id': q, 'symbol': 'S' + q} for q in queries]
+
+
+class TestAdaptiveQueryController(unittest.TestCase):
+    """Tests for `AdaptiveQueryController`"""
+
+    def test_is_retriable_error(self):
+        self.assertTrue(is_retriable_error(FakeHTTPError(429)))
+        self.assertTrue(is_retriable_error(FakeHTTPError(503)))
+        self.assertFalse(is_retriable_error(FakeHTTPError(400)))
+        self.assertTrue(is_retriable_error(TimeoutError()))
+        self.assertFalse(is_retriable_error(ValueError()))
+
+    def test_invalid_constructor_args(self):
+        for kwargs in [{'min_batch_size': 0}, {'min_batch_size': 10, 'max_batch_size': 5},
+                       {'max_inflight': 0}]:
+            try:
+                AdaptiveQueryController(mygeneinfo=MagicMock(), **kwargs)
+                self.fail('Expected exception')
+            except CellMapsPPIDownloaderError:
+                pass
+
+    def test_batch_size_grows_when_fast(self):
+        mockmg = MagicMock()
+        mockmg.querymany = MagicMock(side_effect=fake_querymany)
+        clock = FakeClock()
+        controller = AdaptiveQueryController(mygeneinfo=mockmg, initial_batch_size=10,
+                                             max_batch_size=40, max_inflight=1,
+                                             clock=clock, sleep=clock.sleep)
+        queries = [str(i) for i in range(100)]
+        res = controller.querymany(queries, scopes='_id')
+        self.assertEqual(queries, [x['query'] for x in res])
+        self.assertEqual([10, 12, 15, 18, 22, 23],
+                         [len(c[0][0]) for c in mockmg.querymany.call_args_list])
+        self.assertEqual(33, controller.get_batch_size())
+
+    def test_batch_size_shrinks_when_slow(self):
+        clock = FakeClock()
+
+        def slow_querymany(queries, **kwargs):
+            clock.now += 5.0
+            return fake_querymany(queries)
+        controller = AdaptiveQueryController(mygeneinfo=MagicMock(querymany=slow_querymany),
+                                             initial_batch_size=40, min_batch_size=10,
+                                             max_inflight=1, target_latency=2.0,
+                                             clock=clock, sleep=clock.sleep)
+        controller.querymany([str(i) for i in range(70)])
+        self.assertEqual(10, controller.get_batch_size())
+        self.assertEqual(5.0, controller.get_latency_percentile())
+
+    def test_retry_then_circuit_breaker_with_cache(self):
+        clock = FakeClock()
+        cache = ResolutionCache(ttl=None)
+        cache.put_results(fake_querymany(['1']), scopes='_id')
+        mockmg = MagicMock()
+        mockmg.querymany = MagicMock(side_effect=[FakeHTTPError(503),
+                                                  FakeHTTPError(429),
+                                                  FakeHTTPError(503),
+                                                  fake_querymany(['2'])])
+        controller = AdaptiveQueryController(mygeneinfo=mockmg, cache=cache,
+                                             initial_batch_size=10, max_inflight=1,
+                                             failure_threshold=3, reset_timeout=30,
+                                             base_backoff=1.0,
+                                             clock=clock, sleep=clock.sleep)
+        res = controller.querymany(['1', '2'], scopes='_id')
+        self.assertEqual(['1', '2'], sorted(x['query'] for x in res))
+        self.assertEqual(AdaptiveQueryController.CLOSED, controller.get_state())
+        # backoff of 1 + 2 seconds then breaker open for 30 seconds
+        self.assertEqual(33.0, clock.now)
+        # query 1 answered from cache so trial batch only has query 2
+        self.assertEqual(['2'], mockmg.querymany.call_args_list[-1][0][0])
+        self.assertEqual(fake_querymany(['2']),
+                         cache.get(ResolutionCache.get_key('2', scopes='_id')))
+
+    def test_gives_up_after_max_retries(self):
+        clock = FakeClock()
+        mockmg = MagicMock()
+        mockmg.querymany = MagicMock(side_effect=FakeHTTPError(503))
+        controller = AdaptiveQueryController(mygeneinfo=mockmg, max_retries=2,
+                                             clock=clock, sleep=clock.sleep)
+        try:
+            controller.querymany(['1'])
+            self.fail('Expected exception')
+        except CellMapsPPIDownloaderError as ce:
+            self.assertEqual('Query failed 3 times: HTTP 503', str(ce))
+        self.assertEqual(3, mockmg.querymany.call_count)
+
+    def test_non_retriable_error_raised(self):
+        mockmg = MagicMock()
+        mockmg.querymany = MagicMock(side_effect=FakeHTTPError(400))
+        controller = AdaptiveQueryController(mygeneinfo=mockmg)
+        try:
+            controller.querymany(['1'])
+            self.fail('Expected exception')
+        except FakeHTTPError:
+            pass
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `cache` module"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from cellmaps_ppidownloader.cache import ResolutionCache
+from cellmaps_ppidownloader.cache import NegativeCache
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+
+class TestResolutionCache(unittest.TestCase):
+    """Tests for `ResolutionCache`"""
+
+    def test_get_key(self):
+        self.assertEqual(ResolutionCache.get_key('2', scopes='_id',
+                                                 fields='symbol,ensembl.gene'),
+                         ResolutionCache.get_key(2, scopes=['_id'],
+                                                 fields=['ensembl.gene', 'symbol']))
+        self.assertNotEqual(ResolutionCache.get_key('2', scopes='_id'),
+                            ResolutionCache.get_key('2', scopes='symbol'))
+
+    def test_put_get_and_expire(self):
+        now = [100.0]
+        cache = ResolutionCache(ttl=10, clock=lambda: now[0])
+        key = ResolutionCache.get_key('A', scopes='symbol')
+        self.assertIsNone(cache.get(key))
+        cache.put(key, [{'query': 'A', 'symbol': 'A'}])
+        self.assertEqual([{'query': 'A', 'symbol': 'A'}], cache.get(key))
+        now[0] = 111.0
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(0, len(cache))
+
+    def test_put_results(self):
+        cache = ResolutionCache()
+        self.assertEqual(2, cache.put_results([{'query': 'A', '_id': '1'},
+                                               {'query': 'A', '_id': '2'},
+                                               {'query': 'B', 'notfound': True}],
+                                              scopes='symbol'))
+        self.assertEqual(2, len(cache.get(ResolutionCache.get_key('A', scopes='symbol'))))
+
+
+class TestNegativeCache(unittest.TestCase):
+    """Tests for `NegativeCache`"""
+
+    def test_invalid_constructor_args(self):
+        for kwargs in [{'capacity': 0}, {'error_rate': 0}, {'error_rate': 1.0}]:
+            try:
+                NegativeCache(**kwargs)
+                self.fail('Expected exception')
+            except CellMapsPPIDownloaderError:
+                pass
+
+    def test_add_and_contains(self):
+        cache = NegativeCache(capacity=1000)
+        self.assertFalse(cache.contains('NA', scopes='symbol'))
+        cache.add('NA', scopes='symbol', species='human')
+        self.assertTrue(cache.contains('NA', scopes='symbol', species='human'))
+        self.assertFalse(cache.contains('NA', scopes='_id', species='human'))
+        self.assertEqual(1, len(cache))
+        for i in range(500):
+            cache.add(str(i), scopes='_id')
+        false_positives = sum(1 for i in range(500, 10500)
+                              if cache.contains(str(i), scopes='_id'))
+        self.assertLess(false_positives, 5)
+
+    def test_add_past_capacity(self):
+        cache = NegativeCache(capacity=2)
+        self.assertTrue(cache.add('A'))
+        self.assertTrue(cache.add('A'))
+        self.assertEqual(1, len(cache))
+        self.assertTrue(cache.add('B'))
+        self.assertTrue(cache.is_full())
+        with self.assertLogs('cellmaps_ppidownloader.cache', level='WARNING'):
+            self.assertFalse(cache.add('C'))
+        self.assertFalse(cache.contains('C'))
+        self.assertEqual(2, len(cache))
+
+    def test_load_with_max_age(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp_dir, 'negative.bloom')
+            now = [1000.0]
+            cache = NegativeCache(capacity=100, clock=lambda: now[0])
+            cache.add('A', scopes='_id')
+            cache.save(path)
+            now[0] = 1500.0
+            loaded = NegativeCache.load(path, max_age=600, clock=lambda: now[0])
+            self.assertEqual(500.0, loaded.get_age())
+            self.assertTrue(loaded.contains('A', scopes='_id'))
+            # age is kept across saves so the cache still expires
+            loaded.save(path)
+            now[0] = 1700.0
+            loaded = NegativeCache.load(path, max_age=600, clock=lambda: now[0])
+            self.assertFalse(loaded.contains('A', scopes='_id'))
+            self.assertEqual(0, len(loaded))
+            self.assertEqual(0.0, loaded.get_age())
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_save_and_load(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp_dir, 'negative.bloom')
+            cache = NegativeCache(capacity=100)
+            cache.add('REV_P12345', scopes='uniprot')
+            cache.save(path)
+            loaded = NegativeCache.load(path)
+            self.assertTrue(loaded.contains('REV_P12345', scopes='uniprot'))
+            self.assertFalse(loaded.contains('P12345', scopes='uniprot'))
+            self.assertEqual(1, len(loaded))
+
+            with open(path, 'wb') as f:
+                f.write(b'{"capacity": 100, "error_rate": 0.000001, '
+                        b'"num_bits": 5, "num_hashes": 1, "count": 0}\n')
+            try:
+                NegativeCache.load(path)
+                self.fail('Expected exception')
+            except CellMapsPPIDownloaderError as ce:
+                self.assertTrue(str(ce).startswith('Invalid negative cache file'))
+        finally:
+            shutil.rmtree(temp_dir)
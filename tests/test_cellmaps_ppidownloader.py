@@ -4,11 +4,20 @@
 """Tests for `cellmaps_ppidownloader` package."""
 
 import os
+import json
+import asyncio
+import logging
 import tempfile
 import shutil
 
 import unittest
+from unittest.mock import MagicMock
+from unittest.mock import AsyncMock
+from cellmaps_utils import constants
+from cellmaps_utils import logutils
 from cellmaps_ppidownloader.runner import CellmapsPPIDownloader
+from cellmaps_ppidownloader.network import PPINetwork
+from cellmaps_ppidownloader.deadline import Deadline
 from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
 
 
@@ -37,6 +46,212 @@ class TestCellmapsPPIDownloader(unittest.TestCase):
         finally:
             shutil.rmtree(temp_dir)
 
+    def test_run_async(self):
+        """ Tests run_async()"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            run_dir = os.path.join(temp_dir, 'run')
+            myobj = CellmapsPPIDownloader(outdir=run_dir)
+            try:
+                asyncio.run(myobj.run_async())
+                self.fail('Expected CellMapsPPIDownloaderError')
+            except CellMapsPPIDownloaderError as c:
+                self.assertTrue('Invalid provenance' in str(c))
+            task_files = [f for f in os.listdir(run_dir)
+                          if f.endswith(constants.TASK_FINISH_FILE_SUFFIX)]
+            self.assertEqual(1, len(task_files))
+            with open(os.path.join(run_dir, task_files[0]), 'r') as f:
+                self.assertEqual('99', json.load(f)['status'])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_run_async_concurrent(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            downloaders = []
+            for i in range(3):
+                apmsgen = MagicMock()
+                apmsgen.get_gene_node_attributes_async = AsyncMock(return_value=({}, []))
+                myobj = CellmapsPPIDownloader(outdir=os.path.join(temp_dir, str(i)),
+                                              apmsgen=apmsgen)
+                myobj._start_run = MagicMock()
+                myobj._finish_run = MagicMock()
+                myobj._write_task_finish = MagicMock()
+                downloaders.append(myobj)
+
+            async def _run_all():
+                return await asyncio.gather(*[d.run_async() for d in downloaders])
+
+            self.assertEqual([0, 0, 0], asyncio.run(_run_all()))
+            for myobj in downloaders:
+                myobj._finish_run.assert_called_once_with({}, [])
+                myobj._write_task_finish.assert_called_once_with(0)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_run_async_concurrent_with_logging(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            downloaders = []
+            for i in range(2):
+                apmsgen = MagicMock()
+                apmsgen.get_gene_node_attributes_async = AsyncMock(return_value=({}, []))
+                myobj = CellmapsPPIDownloader(outdir=os.path.join(temp_dir, str(i)),
+                                              apmsgen=apmsgen,
+                                              skip_logging=i == 1)
+                myobj._start_run = MagicMock()
+                myobj._finish_run = MagicMock()
+                myobj._write_task_finish = MagicMock()
+                downloaders.append(myobj)
+
+            async def _run_all():
+                return await asyncio.gather(*[d.run_async() for d in downloaders],
+                                            return_exceptions=True)
+
+            res = asyncio.run(_run_all())
+            self.assertEqual(0, res[0])
+            self.assertTrue(isinstance(res[1], CellMapsPPIDownloaderError))
+            self.assertTrue('skip_logging' in str(res[1]))
+            downloaders[1]._start_run.assert_not_called()
+            downloaders[1]._write_task_finish.assert_not_called()
+
+            # once the first download is done the second may run
+            self.assertEqual(0, asyncio.run(downloaders[1].run_async()))
+            self.assertEqual(0, CellmapsPPIDownloader._async_runs)
+            self.assertEqual(0, CellmapsPPIDownloader._async_logging_runs)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_run_with_defer_provenance_then_finalize(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            run_dir = os.path.join(temp_dir, 'run')
+            apmsgen = MagicMock()
+            apmsgen.get_gene_node_attributes = MagicMock(return_value=(
+                {'1788': {'name': 'DNMT3A', 'represents': 'ensembl:ENSG00000119772',
+                          'ambiguous': '', 'bait': True}}, []))
+            apmsgen.get_apms_edgelist = MagicMock(return_value=[])
+            apmsgen.get_apms_edge_sources = MagicMock(return_value=None)
+            apmsgen.get_apms_edge_scores = MagicMock(return_value=None)
+            prov = MagicMock()
+            provenance = CellmapsPPIDownloader.get_example_provenance(with_ids=True)
+            myobj = CellmapsPPIDownloader(outdir=run_dir, apmsgen=apmsgen,
+                                          provenance=provenance,
+                                          provenance_utils=prov,
+                                          input_data_dict={'outdir': run_dir},
+                                          defer_provenance=True)
+            self.assertEqual(0, myobj.run())
+            self.assertEqual([], prov.method_calls)
+            self.assertTrue(os.path.isfile(myobj.get_ppi_gene_node_attributes_file()))
+            self.assertTrue(os.path.isfile(myobj.get_ppi_edgelist_file()))
+            self.assertTrue(os.path.isfile(myobj.get_pending_provenance_file()))
+
+            prov = MagicMock()
+            prov.get_default_date_format_str = MagicMock(return_value='%Y-%m-%d')
+            CellmapsPPIDownloader.finalize(run_dir, provenance_utils=prov)
+            prov.register_rocrate.assert_called_once()
+            prov.register_software.assert_called_once()
+            self.assertEqual(2, prov.register_dataset.call_count)
+            prov.register_computation.assert_called_once()
+            self.assertFalse(os.path.isfile(myobj.get_pending_provenance_file()))
+
+            try:
+                CellmapsPPIDownloader.finalize(run_dir, provenance_utils=prov)
+                self.fail('Expected CellMapsPPIDownloaderError')
+            except CellMapsPPIDownloaderError as c:
+                self.assertTrue('No pending provenance' in str(c))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_sorted_shards_then_merge(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            attrs = {'1': {'name': 'B', 'represents': 'ensembl:ENSG2', 'ambiguous': '', 'bait': True},
+                     '2': {'name': 'A', 'represents': 'ensembl:ENSG1', 'ambiguous': '', 'bait': False},
+                     '3': {'name': 'C', 'represents': 'ensembl:ENSG3', 'ambiguous': '', 'bait': False}}
+            shard_edges = [[{'GeneID1': '1', 'GeneID2': '3'}, {'GeneID1': '1', 'GeneID2': '2'}],
+                           [{'GeneID1': '2', 'GeneID2': '3'}]]
+            shard_dirs = []
+            for i, edges in enumerate(shard_edges):
+                apmsgen = MagicMock()
+                apmsgen.get_gene_node_attributes = MagicMock(return_value=(attrs, []))
+                apmsgen.get_apms_edgelist = MagicMock(return_value=edges)
+                apmsgen.get_apms_edge_scores = MagicMock(return_value=None)
+                apmsgen.get_apms_edge_sources = MagicMock(return_value=None)
+                shard_dir = os.path.join(temp_dir, 'shard' + str(i))
+                CellmapsPPIDownloader(outdir=shard_dir, apmsgen=apmsgen,
+                                      provenance_utils=MagicMock(),
+                                      input_data_dict={'outdir': shard_dir},
+                                      defer_provenance=True,
+                                      sort_outputs=True).run()
+                shard_dirs.append(shard_dir)
+
+            with open(os.path.join(shard_dirs[0], constants.PPI_EDGELIST_FILE), 'r') as f:
+                self.assertEqual(['B\tA', 'B\tC'], [line.rstrip() for line in f][1:])
+            with open(os.path.join(shard_dirs[0], constants.PPI_GENE_NODE_ATTR_FILE), 'r') as f:
+                self.assertEqual(['A', 'B', 'C'], [line.split('\t')[0] for line in f][1:])
+
+            prov = MagicMock()
+            prov.get_default_date_format_str = MagicMock(return_value='%Y-%m-%d')
+            merged_dir = os.path.join(temp_dir, 'merged')
+            myobj = CellmapsPPIDownloader(outdir=merged_dir,
+                                          provenance=CellmapsPPIDownloader.get_example_provenance(with_ids=True),
+                                          provenance_utils=prov,
+                                          input_data_dict={'outdir': merged_dir})
+            self.assertEqual(0, myobj.merge(shard_dirs))
+            with open(myobj.get_ppi_edgelist_file(), 'r') as f:
+                self.assertEqual(['A\tC', 'B\tA', 'B\tC'], [line.rstrip() for line in f][1:])
+            with open(myobj.get_ppi_gene_node_attributes_file(), 'r') as f:
+                self.assertEqual(4, len(f.readlines()))
+            prov.register_rocrate.assert_called_once()
+            # shards have no RO-Crate so none are registered as inputs
+            prov.get_id_of_rocrate.assert_not_called()
+            self.assertEqual(2, prov.register_dataset.call_count)
+            prov.register_computation.assert_called_once()
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_dedup_shards_then_merge_reciprocal_edges(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            from array import array
+            attrs = {'1': {'name': 'A', 'represents': 'ensembl:ENSG1', 'ambiguous': '', 'bait': True},
+                     '2': {'name': 'B', 'represents': 'ensembl:ENSG2', 'ambiguous': '', 'bait': True}}
+            # reciprocal edges of a CM4AI table landing in different shards
+            shard_edges = [([{'GeneID1': '1', 'GeneID2': '2'}], 1.0),
+                           ([{'GeneID1': '2', 'GeneID2': '1'}], 3.0)]
+            shard_dirs = []
+            for i, (edges, score) in enumerate(shard_edges):
+                apmsgen = MagicMock()
+                apmsgen.get_gene_node_attributes = MagicMock(return_value=(attrs, []))
+                apmsgen.get_apms_edgelist = MagicMock(return_value=edges)
+                apmsgen.get_apms_edge_scores = MagicMock(return_value={'score': array('f', [score])})
+                apmsgen.get_apms_edge_sources = MagicMock(return_value=None)
+                shard_dir = os.path.join(temp_dir, 'shard' + str(i))
+                CellmapsPPIDownloader(outdir=shard_dir, apmsgen=apmsgen,
+                                      provenance_utils=MagicMock(),
+                                      input_data_dict={'outdir': shard_dir},
+                                      defer_provenance=True,
+                                      dedup_edges=True,
+                                      score_merge='max',
+                                      sort_outputs=True).run()
+                shard_dirs.append(shard_dir)
+
+            prov = MagicMock()
+            prov.get_default_date_format_str = MagicMock(return_value='%Y-%m-%d')
+            merged_dir = os.path.join(temp_dir, 'merged')
+            myobj = CellmapsPPIDownloader(outdir=merged_dir,
+                                          provenance=CellmapsPPIDownloader.get_example_provenance(with_ids=True),
+                                          provenance_utils=prov,
+                                          input_data_dict={'outdir': merged_dir},
+                                          dedup_edges=True,
+                                          score_merge='max')
+            self.assertEqual(0, myobj.merge(shard_dirs))
+            with open(myobj.get_ppi_edgelist_file(), 'r') as f:
+                self.assertEqual(['A\tB\t3'], [line.rstrip() for line in f][1:])
+        finally:
+            shutil.rmtree(temp_dir)
+
     def test_run_with_skip_logging_false(self):
         """ Tests run()"""
         temp_dir = tempfile.mkdtemp()
@@ -52,6 +267,227 @@ class TestCellmapsPPIDownloader(unittest.TestCase):
             self.assertTrue(os.path.isfile(os.path.join(run_dir, 'output.log')))
             self.assertTrue(os.path.isfile(os.path.join(run_dir, 'error.log')))
 
+        finally:
+            # remove file handlers so later tests do not log to removed directory
+            for handler in logging.getLogger().handlers[:]:
+                logging.getLogger().removeHandler(handler)
+                handler.close()
+            shutil.rmtree(temp_dir)
+
+    def test_write_and_register_ppi_csr(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            prov = MagicMock()
+            prov.get_default_date_format_str = MagicMock(return_value='%Y-%m-%d')
+            prov.register_dataset = MagicMock(side_effect=['id1', 'id2', 'id3', 'id4'])
+            myobj = CellmapsPPIDownloader(outdir=temp_dir, write_csr=True,
+                                          provenance={'description': 'desc',
+                                                      'keywords': ['key']},
+                                          provenance_utils=prov)
+            gene_node_attrs = {'1': {'name': 'A'}, '2': {'name': 'B'}}
+            myobj._write_ppi_csr(edgelist=[{'GeneID1': '1', 'GeneID2': '2'}],
+                                 gene_node_attrs=gene_node_attrs)
+            network = PPINetwork.load(myobj.get_ppi_csr_dir())
+            self.assertEqual(['A', 'B'], network.nodes)
+            self.assertEqual(['B'], network.get_neighbors('A'))
+            myobj._register_ppi_csr()
+            self.assertEqual(['id1', 'id2', 'id3', 'id4'], myobj._ppi_csr_ids)
+            self.assertEqual(4, prov.register_dataset.call_count)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_write_ppi_csr_node_order_matches_sorted_attributes(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            myobj = CellmapsPPIDownloader(outdir=temp_dir, write_csr=True,
+                                          sort_outputs=True)
+            gene_node_attrs = {'1': {'name': 'C', 'represents': 'ensembl:1'},
+                               '2': {'name': 'A', 'represents': 'ensembl:2'},
+                               '3': {'name': 'B', 'represents': 'ensembl:3'},
+                               '4': {'name': 'A', 'represents': 'ensembl:4'}}
+            myobj._write_ppi_gene_node_attrs(gene_node_attrs=gene_node_attrs)
+            myobj._write_ppi_csr(edgelist=[{'GeneID1': '1', 'GeneID2': '4'},
+                                           {'GeneID1': '3', 'GeneID2': '1'}],
+                                 gene_node_attrs=gene_node_attrs)
+            with open(myobj.get_ppi_gene_node_attributes_file(), 'r') as f:
+                names = [line.split('\t')[0] for line in f][1:]
+            self.assertEqual(['A', 'A', 'B', 'C'], names)
+            network = PPINetwork.load(myobj.get_ppi_csr_dir())
+            self.assertEqual(['A', 'B', 'C'], network.nodes)
+            self.assertEqual(['C'], network.get_neighbors('A'))
+            self.assertEqual(['A', 'B'], network.get_neighbors('C'))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_write_ppi_network_with_dedup(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            myobj = CellmapsPPIDownloader(outdir=temp_dir, dedup_edges=True,
+                                          self_loops='drop')
+            gene_node_attrs = {'1': {'name': 'A'}, '2': {'name': 'B'},
+                               '3': {'name': 'B'}}
+            myobj._write_ppi_network(edgelist=[{'GeneID1': '1', 'GeneID2': '2'},
+                                               {'GeneID1': '3', 'GeneID2': '1'},
+                                               {'GeneID1': '2', 'GeneID2': '3'}],
+                                     gene_node_attrs=gene_node_attrs)
+            with open(myobj.get_ppi_edgelist_file(), 'r') as f:
+                self.assertEqual('geneA\tgeneB\nA\tB\n', f.read().replace('\r', ''))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_write_ppi_network_with_scores(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            from array import array
+            myobj = CellmapsPPIDownloader(outdir=temp_dir, dedup_edges=True,
+                                          score_merge='max')
+            gene_node_attrs = {'1': {'name': 'A'}, '2': {'name': 'B'},
+                               '3': {'name': 'C'}}
+            myobj._write_ppi_network(edgelist=[{'GeneID1': '1', 'GeneID2': '2'},
+                                               {'GeneID1': '2', 'GeneID2': '1'},
+                                               {'GeneID1': '1', 'GeneID2': '3'}],
+                                     gene_node_attrs=gene_node_attrs,
+                                     edge_scores={'score': array('f', [0.1, 0.5, float('nan')])})
+            with open(myobj.get_ppi_edgelist_file(), 'r') as f:
+                self.assertEqual('geneA\tgeneB\tscore\nA\tB\t0.5\nA\tC\t\n',
+                                 f.read().replace('\r', ''))
         finally:
             shutil.rmtree(temp_dir)
 
+    def test_write_ppi_network_with_sources(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            from array import array
+            myobj = CellmapsPPIDownloader(outdir=temp_dir, dedup_edges=True,
+                                          score_merge='mean')
+            gene_node_attrs = {'1': {'name': 'A'}, '2': {'name': 'B'},
+                               '3': {'name': 'C'}}
+            myobj._write_ppi_network(edgelist=[{'GeneID1': '1', 'GeneID2': '2'},
+                                               {'GeneID1': '1', 'GeneID2': '3'},
+                                               {'GeneID1': '2', 'GeneID2': '1'}],
+                                     gene_node_attrs=gene_node_attrs,
+                                     edge_scores={'score': array('f', [1.0, 2.0, 3.0])},
+                                     edge_sources=(['hek293t', 'u2os'],
+                                                   array('Q', [1, 1, 2])))
+            with open(myobj.get_ppi_edgelist_file(), 'r') as f:
+                self.assertEqual('geneA\tgeneB\tscore\tsource\n'
+                                 'A\tB\t2\thek293t;u2os\n'
+                                 'A\tC\t2\thek293t\n',
+                                 f.read().replace('\r', ''))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_register_sources(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            prov = MagicMock()
+            prov.register_dataset = MagicMock(side_effect=['e1', 'b1', 'e2'])
+            prov.get_id_of_rocrate = MagicMock(return_value='c1')
+            provenance = {'edgelist': {'name': 'edges', 'description': 'x'},
+                          'baitlist': {'name': 'baits', 'description': 'y'},
+                          'sources': {'hct116': {'guid': 'g2'},
+                                      'other': {'name': 'other edges'}}}
+            myobj = CellmapsPPIDownloader(outdir=temp_dir, provenance=provenance,
+                                          provenance_utils=prov,
+                                          sources=[{'name': 'hek293t', 'edgelist': 'a.tsv',
+                                                    'baitlist': 'b.tsv'},
+                                                   {'name': 'hct116', 'edgelist': 'c.tsv'},
+                                                   {'name': 'other', 'edgelist': 'd.tsv'},
+                                                   {'name': 'u2os',
+                                                    'cm4ai_table': os.path.join(temp_dir, 'apms.tsv')}])
+            myobj._register_sources()
+            self.assertEqual(['e1', 'b1', 'g2', 'e2', 'c1'], myobj._inputdataset_ids)
+            data_dicts = [c[1]['data_dict'] for c in prov.register_dataset.call_args_list]
+            self.assertEqual(['edges (hek293t)', 'baits (hek293t)', 'other edges'],
+                             [d['name'] for d in data_dicts])
+            prov.get_id_of_rocrate.assert_called_once_with(temp_dir)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_register_sources_with_ids(self):
+        prov = MagicMock()
+        provenance = CellmapsPPIDownloader.get_example_provenance(with_ids=True)
+        provenance['sources'] = {'hek293t': {'edgelist': {'guid': 'e1'},
+                                             'baitlist': {'guid': 'b1'}},
+                                 'hct116': {'guid': 'e2'}}
+        myobj = CellmapsPPIDownloader(outdir='foo', provenance=provenance,
+                                      provenance_utils=prov,
+                                      sources=[{'name': 'hek293t', 'edgelist': 'a.tsv',
+                                                'baitlist': 'b.tsv'},
+                                               {'name': 'hct116', 'edgelist': 'c.tsv'}])
+        # top level edgelist and baitlist are not inputs when sources are set
+        myobj._register_input_datasets()
+        self.assertEqual([], myobj._inputdataset_ids)
+        myobj._register_sources()
+        self.assertEqual(['e1', 'b1', 'e2'], myobj._inputdataset_ids)
+        prov.register_dataset.assert_not_called()
+
+        # baitlist of source without provenance cannot use top level guid
+        myobj = CellmapsPPIDownloader(outdir='foo', provenance=provenance,
+                                      provenance_utils=prov,
+                                      sources=[{'name': 'hct116', 'edgelist': 'c.tsv',
+                                                'baitlist': 'd.tsv'}])
+        with self.assertRaises(CellMapsPPIDownloaderError) as ce:
+            myobj._register_sources()
+        self.assertTrue('baitlist of source hct116' in str(ce.exception))
+
+    def test_add_input_file_to_crate_url(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            prov = MagicMock()
+            prov.register_dataset = MagicMock(side_effect=['e1', 'e2'])
+            myobj = CellmapsPPIDownloader(outdir=temp_dir, provenance_utils=prov)
+            data_dict = {'name': 'edges'}
+            self.assertEqual('e1', myobj._add_input_file_to_crate(data_dict=data_dict,
+                                                                  path='s3://lake/a.tsv'))
+            self.assertEqual('e2', myobj._add_input_file_to_crate(data_dict=data_dict,
+                                                                  path='a.tsv'))
+            calls = prov.register_dataset.call_args_list
+            self.assertEqual({'name': 'edges', 'url': 's3://lake/a.tsv'},
+                             calls[0][1]['data_dict'])
+            self.assertEqual('s3://lake/a.tsv', calls[0][1]['source_file'])
+            self.assertTrue(calls[0][1]['skip_copy'])
+            self.assertEqual({'name': 'edges'}, calls[1][1]['data_dict'])
+            self.assertEqual(os.path.abspath('a.tsv'), calls[1][1]['source_file'])
+            self.assertFalse(calls[1][1]['skip_copy'])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_add_deadline_to_task_finish_json(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            deadline = Deadline(60)
+            deadline.add_unresolved(['2', '16'])
+            myobj = CellmapsPPIDownloader(outdir=temp_dir, deadline=deadline)
+            # no task finish file yet, nothing to update
+            myobj._add_deadline_to_task_finish_json()
+
+            logutils.write_task_finish_json(outdir=temp_dir,
+                                            start_time=myobj._start_time,
+                                            status=0)
+            myobj._add_deadline_to_task_finish_json()
+            task_file = os.path.join(temp_dir, constants.TASK_FILE_PREFIX +
+                                     str(myobj._start_time) +
+                                     constants.TASK_FINISH_FILE_SUFFIX)
+            with open(task_file, 'r') as f:
+                task = json.load(f)
+            self.assertEqual('0', task['status'])
+            self.assertEqual(60, task['deadline'])
+            self.assertFalse(task['deadline_expired'])
+            self.assertEqual(['2', '16'], task['deadline_unresolved'])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_register_mapping_rocrates(self):
+        prov = MagicMock()
+        prov.get_id_of_rocrate = MagicMock(side_effect=['crate1', 'crate2'])
+        myobj = CellmapsPPIDownloader(outdir='foo', provenance_utils=prov,
+                                      mapping_rocrates=['/a', '/b'])
+        myobj._register_mapping_rocrates()
+        self.assertEqual(['crate1', 'crate2'], myobj._inputdataset_ids)
+        prov.get_id_of_rocrate.assert_any_call('/a')
+
+        myobj = CellmapsPPIDownloader(outdir='foo', provenance_utils=prov)
+        myobj._register_mapping_rocrates()
+        self.assertEqual([], myobj._inputdataset_ids)
+
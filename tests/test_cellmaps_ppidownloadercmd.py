@@ -9,6 +9,8 @@ import shutil
 
 import unittest
 from cellmaps_ppidownloader import cellmaps_ppidownloadercmd
+from cellmaps_ppidownloader.deadline import Deadline
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
 
 
 class TestCellmapsDownloader(unittest.TestCase):
@@ -48,3 +50,65 @@ class TestCellmapsDownloader(unittest.TestCase):
             self.assertEqual(res, 1)
         finally:
             shutil.rmtree(temp_dir)
+
+    def test_get_http_timeout(self):
+        theargs = cellmaps_ppidownloadercmd._parse_arguments('hi', ['foo', '--http_timeout', '30'])
+        self.assertEqual(30.0, cellmaps_ppidownloadercmd._get_http_timeout(theargs))
+        clock = [0.0]
+        deadline = Deadline(100, reserve=10, clock=lambda: clock[0])
+        self.assertEqual(30.0, cellmaps_ppidownloadercmd._get_http_timeout(theargs,
+                                                                           deadline=deadline))
+        clock[0] = 80.0
+        self.assertEqual(10.0, cellmaps_ppidownloadercmd._get_http_timeout(theargs,
+                                                                           deadline=deadline))
+        clock[0] = 95.0
+        self.assertEqual(30.0, cellmaps_ppidownloadercmd._get_http_timeout(theargs,
+                                                                           deadline=deadline))
+
+    def test_parse_cutoffs(self):
+        self.assertEqual([(None, None)], cellmaps_ppidownloadercmd._parse_cutoffs(None))
+        self.assertEqual([('0.01', 0.01), ('0.1', 0.1)],
+                         cellmaps_ppidownloadercmd._parse_cutoffs('0.01, 0.1,'))
+
+    def test_get_sweep_dirname(self):
+        self.assertEqual('bfdr_0.05_foldchange_2',
+                         cellmaps_ppidownloadercmd.get_sweep_dirname(bfdr_cutoff='0.05',
+                                                                     foldchange_cutoff='2'))
+        self.assertEqual('foldchange_2',
+                         cellmaps_ppidownloadercmd.get_sweep_dirname(foldchange_cutoff='2'))
+
+    def test_finalize_main_without_pending_provenance(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            res = cellmaps_ppidownloadercmd.main(['myprog.py', 'finalize', temp_dir])
+            self.assertEqual(2, res)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_warm_cache_main_without_genes(self):
+        res = cellmaps_ppidownloadercmd.main(['myprog.py', 'warm-cache'])
+        self.assertEqual(1, res)
+
+    def test_diff_main_missing_dirs(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            res = cellmaps_ppidownloadercmd.main(['myprog.py', 'diff',
+                                                  os.path.join(temp_dir, 'a'),
+                                                  os.path.join(temp_dir, 'b'),
+                                                  os.path.join(temp_dir, 'c')])
+            self.assertEqual(2, res)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_run_source_with_edgelist(self):
+        theargs = cellmaps_ppidownloadercmd._parse_arguments('hi', ['foo', '--edgelist', 'a.tsv',
+                                                                    '--source', 'edgelist=b.tsv'])
+        with self.assertRaises(CellMapsPPIDownloaderError):
+            cellmaps_ppidownloadercmd._run(theargs, json_prov={})
+
+    def test_run_trust_input_with_cm4ai_table(self):
+        theargs = cellmaps_ppidownloadercmd._parse_arguments('hi', ['foo', '--cm4ai_table', 'a.tsv',
+                                                                    '--trust_input'])
+        with self.assertRaises(CellMapsPPIDownloaderError) as ce:
+            cellmaps_ppidownloadercmd._run(theargs, json_prov={})
+        self.assertTrue('--trust_input' in str(ce.exception))
@@ -4,13 +4,19 @@
 """Tests for `CM4AIGeneNodeAttributeGenerator`"""
 
 import os
+import asyncio
 import unittest
 import shutil
 import tempfile
 import csv
+import math
+from unittest.mock import MagicMock
+from unittest.mock import AsyncMock
 
-
+from cellmaps_ppidownloader.gene import GeneQuery
 from cellmaps_ppidownloader.gene import CM4AIGeneNodeAttributeGenerator
+from cellmaps_ppidownloader.deadline import Deadline
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
 
 SKIP_REASON = 'CELLMAPS_PPIDOWNLOADER_INTEGRATION_TEST ' \
               'environment variable not set, cannot run integration ' \
@@ -77,6 +83,198 @@ class TestCM4AIGeneNodeAttributeGenerator(unittest.TestCase):
         finally:
             shutil.rmtree(temp_dir)
 
+    def test_get_apms_edgelist_from_tsvfile_with_scores(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            tsvfile = os.path.join(temp_dir, 'foo.tsv')
+            self.create_tsvfile(tsvfile)
+            edge_scores = {}
+            edgelist = CM4AIGeneNodeAttributeGenerator.get_apms_edgelist_from_tsvfile(tsvfile,
+                                                                                      score_cols=['FoldChange.x',
+                                                                                                  'BFDR.x'],
+                                                                                      edge_scores=edge_scores)
+            self.assertEqual(3, len(edgelist))
+            self.assertEqual(['FoldChange.x', 'BFDR.x'], list(edge_scores.keys()))
+            self.assertEqual('f', edge_scores['FoldChange.x'].typecode)
+            self.assertEqual([77.5, -0.5], list(edge_scores['FoldChange.x'][:2]))
+            self.assertTrue(math.isnan(edge_scores['BFDR.x'][2]))
+        finally:
+            shutil.rmtree(temp_dir)
 
+    def test_get_apms_edgelist_from_tsvfile_with_unknown_score_col(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            tsvfile = os.path.join(temp_dir, 'foo.tsv')
+            self.create_tsvfile(tsvfile)
+            with self.assertRaises(CellMapsPPIDownloaderError) as ce:
+                CM4AIGeneNodeAttributeGenerator.get_apms_edgelist_from_tsvfile(tsvfile,
+                                                                               score_cols=['BFDR.x',
+                                                                                           'logOdds'],
+                                                                               edge_scores={})
+            self.assertTrue('logOdds not found' in str(ce.exception))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_get_apms_edge_scores_aligned_with_mapped_edges(self):
+        mockquery = MagicMock()
+        mockquery.get_symbols_for_genes = MagicMock(side_effect=[
+            [{'query': 'DNMT3A', '_id': '1788', 'symbol': 'DNMT3A',
+              'ensembl': {'gene': 'ENSG00000119772'}},
+             {'query': 'HDAC2', '_id': '3066', 'symbol': 'HDAC2',
+              'ensembl': {'gene': 'ENSG00000196591'}}],
+            [{'query': 'O00422', '_id': '10284', 'symbol': 'SAP18',
+              'ensembl': {'gene': 'ENSG00000150459'}},
+             {'query': 'P09429', '_id': '3146', 'symbol': 'HMGB1',
+              'ensembl': [{'gene': 'ENSG00000189403'}, {'gene': 'ENSG00000276074'}]}]])
+        from array import array
+        gen = CM4AIGeneNodeAttributeGenerator(apms_edgelist=[{'Bait': 'DNMT3A', 'Prey': 'O00422'},
+                                                             {'Bait': 'HDAC2', 'Prey': 'Q9Y2K7'},
+                                                             {'Bait': 'HDAC2', 'Prey': 'P09429'}],
+                                              genequery=mockquery,
+                                              edge_scores={'logOddsScore': array('f', [1.0, 2.0, 3.0])})
+        edgelist = gen.get_apms_edgelist()
+        self.assertEqual(2, len(edgelist))
+        self.assertEqual({'logOddsScore': array('f', [1.0, 3.0])}, gen.get_apms_edge_scores())
+        self.assertEqual('ENSG00000189403;ENSG00000276074', edgelist[1]['Ensembl2'])
+
+    def test_get_gene_node_attributes_async(self):
+        mockquery = MagicMock()
+        mockquery.get_symbols_for_genes_async = AsyncMock(side_effect=[
+            [{'query': 'DNMT3A', '_id': '1788', 'symbol': 'DNMT3A',
+              'ensembl': {'gene': 'ENSG00000119772'}}],
+            [{'query': 'O00422', '_id': '10284', 'symbol': 'SAP18',
+              'ensembl': {'gene': 'ENSG00000150459'}}]])
+        gen = CM4AIGeneNodeAttributeGenerator(apms_edgelist=[{'Bait': 'DNMT3A', 'Prey': 'O00422'}],
+                                              genequery=mockquery)
+        gene_node_attrs, errors = asyncio.run(gen.get_gene_node_attributes_async())
+        self.assertEqual([], errors)
+        self.assertEqual({'1788': {'name': 'DNMT3A',
+                                   'represents': 'ensembl:ENSG00000119772',
+                                   'ambiguous': '', 'bait': True},
+                          '10284': {'name': 'SAP18',
+                                    'represents': 'ensembl:ENSG00000150459',
+                                    'ambiguous': '', 'bait': False}},
+                         gene_node_attrs)
+        mockquery.get_symbols_for_genes_async.assert_any_call(['DNMT3A'], scopes='symbol')
+        mockquery.get_symbols_for_genes_async.assert_any_call(['O00422'], scopes='uniprot')
+        mockquery.get_symbols_for_genes.assert_not_called()
+
+    def get_deadline_genequery(self):
+        now = [0.0]
+        deadline = Deadline(100, reserve=10, clock=lambda: now[0])
+        genes = {'DNMT3A': ('1788', 'ENSG00000119772'),
+                 'HDAC2': ('3066', 'ENSG00000196591'),
+                 'O00422': ('10284', 'ENSG00000150459')}
+
+        def fake_querymany(queries, scopes=None, fields=None, species=None):
+            # first batch uses up the budget
+            now[0] += 100
+            return [{'query': q, '_id': genes[q][0], 'symbol': q,
+                     'ensembl': {'gene': genes[q][1]}} for q in queries]
+
+        mockquery = MagicMock()
+        mockquery.querymany = MagicMock(side_effect=fake_querymany)
+        asyncquery = MagicMock()
+        asyncquery.querymany = AsyncMock(side_effect=fake_querymany)
+        return deadline, GeneQuery(mygeneinfo=mockquery, deadline=deadline,
+                                   async_mygeneinfo=asyncquery)
+
+    def test_get_apms_edgelist_with_deadline_expired(self):
+        orig_batch_size = GeneQuery.DEADLINE_BATCH_SIZE
+        try:
+            GeneQuery.DEADLINE_BATCH_SIZE = 1
+            for use_async in [False, True]:
+                deadline, genequery = self.get_deadline_genequery()
+                raw_edgelist = [{'Bait': 'DNMT3A', 'Prey': 'O00422'},
+                                {'Bait': 'HDAC2', 'Prey': 'O00422'}]
+                gen = CM4AIGeneNodeAttributeGenerator(apms_edgelist=raw_edgelist,
+                                                      genequery=genequery)
+                if use_async:
+                    edgelist = asyncio.run(gen.get_apms_edgelist_async())
+                else:
+                    edgelist = gen.get_apms_edgelist()
 
+                # genes left unresolved by the deadline are skipped
+                unresolved = set(deadline.get_unresolved())
+                self.assertTrue(len(unresolved) > 0)
+                self.assertEqual([row['Bait'] for row in raw_edgelist
+                                  if row['Bait'] not in unresolved and
+                                  row['Prey'] not in unresolved],
+                                 [row['Symbol1'] for row in edgelist])
+                bait_to_id = gen._get_baits_to_ensemblsymbolmap(res=[
+                    {'query': 'DNMT3A', '_id': '1788', 'symbol': 'DNMT3A',
+                     'ensembl': [{'gene': 'ENSG00000119772'}, {'gene': 'ENSG2'}]},
+                    {'query': 'HDAC2', 'notfound': True},
+                    {'query': 'X', '_id': '1', 'symbol': 'X'}])
+                self.assertEqual({'DNMT3A': ('1788', 'DNMT3A',
+                                             'ENSG00000119772;ENSG2')}, bait_to_id)
+        finally:
+            GeneQuery.DEADLINE_BATCH_SIZE = orig_batch_size
+
+    def test_get_apms_edgelist_from_tsvfile_with_cutoffs(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            tsvfile = os.path.join(temp_dir, 'foo.tsv')
+            self.create_tsvfile(tsvfile)
+            edgelist = CM4AIGeneNodeAttributeGenerator.get_apms_edgelist_from_tsvfile(tsvfile,
+                                                                                      bfdr_col='BFDR.x',
+                                                                                      foldchange_col='FoldChange.x')
+            self.assertEqual([{'Bait': 'DNMT3A', 'Prey': 'O00422'},
+                              {'Bait': 'HDAC2', 'Prey': 'P09429'}], edgelist)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_get_thresholded_generator(self):
+        from array import array
+        mockquery = MagicMock()
+        mockquery.get_symbols_for_genes = MagicMock(side_effect=[
+            [{'query': 'DNMT3A', '_id': '1788', 'symbol': 'DNMT3A',
+              'ensembl': {'gene': 'ENSG00000119772'}},
+             {'query': 'HDAC2', '_id': '3066', 'symbol': 'HDAC2',
+              'ensembl': {'gene': 'ENSG00000196591'}}],
+            [{'query': 'O00422', '_id': '10284', 'symbol': 'SAP18',
+              'ensembl': {'gene': 'ENSG00000150459'}},
+             {'query': 'Q9Y2K7', '_id': '22992', 'symbol': 'KDM2A',
+              'ensembl': {'gene': 'ENSG00000173120'}}]])
+        gen = CM4AIGeneNodeAttributeGenerator(apms_edgelist=[{'Bait': 'DNMT3A', 'Prey': 'O00422'},
+                                                             {'Bait': 'HDAC2', 'Prey': 'Q9Y2K7'}],
+                                              genequery=mockquery,
+                                              edge_scores={'BFDR.x': array('f', [0.0, 0.5]),
+                                                           'FoldChange.x': array('f', [8.0, 1.0])})
+        res = gen.get_thresholded_generator(bfdr_maxcutoff=0.5, score_cols=['BFDR.x'])
+        self.assertEqual(2, len(res.get_apms_edgelist()))
+        self.assertEqual({'BFDR.x': array('f', [0.0, 0.5])}, res.get_apms_edge_scores())
+
+        res = gen.get_thresholded_generator(bfdr_maxcutoff=0.5, foldchange_cutoff=2.0,
+                                            score_cols=[])
+        self.assertEqual(['SAP18'], [e['Symbol2'] for e in res.get_apms_edgelist()])
+        self.assertIsNone(res.get_apms_edge_scores())
+        gene_node_attrs, errors = res.get_gene_node_attributes()
+        self.assertEqual({'1788', '10284'}, set(gene_node_attrs.keys()))
+
+        # genes are only resolved once
+        self.assertEqual(2, mockquery.get_symbols_for_genes.call_count)
+
+        try:
+            gen.get_thresholded_generator(bfdr_col='foo', bfdr_maxcutoff=0.1)
+            self.fail('Expected exception')
+        except CellMapsPPIDownloaderError as ce:
+            self.assertEqual('foo column needed for filtering not loaded', str(ce))
+
+    def test_get_apms_edgelist_from_tsvfile_with_topk(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            tsvfile = os.path.join(temp_dir, 'foo.tsv')
+            self.create_tsvfile(tsvfile)
+            edge_scores = {}
+            edgelist = CM4AIGeneNodeAttributeGenerator.get_apms_edgelist_from_tsvfile(tsvfile,
+                                                                                      score_cols=['BFDR.x'],
+                                                                                      edge_scores=edge_scores,
+                                                                                      topk=1,
+                                                                                      topk_col='FoldChange.x')
+            self.assertEqual([{'Bait': 'DNMT3A', 'Prey': 'O00422'},
+                              {'Bait': 'HDAC2', 'Prey': 'Q9Y2K7'}], edgelist)
+            self.assertEqual([0.0, 10.0], list(edge_scores['BFDR.x']))
+        finally:
+            shutil.rmtree(temp_dir)
 
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `Deadline`"""
+
+import unittest
+
+from cellmaps_ppidownloader.deadline import Deadline
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestDeadline(unittest.TestCase):
+    """Tests for `Deadline`"""
+
+    def test_invalid_values(self):
+        for seconds, reserve in [(None, None), (0, None), (-1, None),
+                                 (10, -1), (10, 10)]:
+            try:
+                Deadline(seconds, reserve=reserve)
+                self.fail('Expected exception for ' + str((seconds, reserve)))
+            except CellMapsPPIDownloaderError:
+                pass
+
+    def test_budget(self):
+        clock = FakeClock()
+        deadline = Deadline(100, clock=clock)
+        self.assertEqual(100, deadline.get_seconds())
+        self.assertEqual(100.0, deadline.get_remaining())
+        self.assertEqual(90.0, deadline.get_query_budget())
+        self.assertFalse(deadline.is_expired())
+
+        clock.now += 95
+        self.assertEqual(5.0, deadline.get_remaining())
+        self.assertEqual(0.0, deadline.get_query_budget())
+        self.assertFalse(deadline.is_expired())
+
+        clock.now += 10
+        self.assertEqual(0.0, deadline.get_remaining())
+        self.assertTrue(deadline.is_expired())
+
+    def test_unresolved(self):
+        deadline = Deadline(10, reserve=0)
+        self.assertEqual([], deadline.get_unresolved())
+        deadline.add_unresolved(['2', 16, '2'])
+        deadline.add_unresolved(['1'])
+        self.assertEqual(['2', '16', '1'], deadline.get_unresolved())
+        self.assertTrue(deadline.is_unresolved(16))
+        self.assertFalse(deadline.is_unresolved('3'))
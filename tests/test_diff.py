@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `diff` module"""
+
+import os
+import csv
+import shutil
+import tempfile
+import unittest
+
+from cellmaps_utils import constants
+
+from cellmaps_ppidownloader.diff import NetworkDiff
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+
+class TestNetworkDiff(unittest.TestCase):
+    """Tests for `diff` module"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.old_dir = os.path.join(self.temp_dir, 'old')
+        self.new_dir = os.path.join(self.temp_dir, 'new')
+        self.outdir = os.path.join(self.temp_dir, 'out')
+        os.makedirs(self.old_dir)
+        os.makedirs(self.new_dir)
+        self.write_file(self.old_dir, constants.PPI_EDGELIST_FILE,
+                        [['geneA', 'geneB'], ['A', 'B'], ['C', 'B'],
+                         ['B', 'A'], ['D', 'E']])
+        self.write_file(self.new_dir, constants.PPI_EDGELIST_FILE,
+                        [['geneA', 'geneB', 'score'], ['B', 'A', '1'],
+                         ['B', 'C', '2'], ['E', 'F', '3'], ['E', 'F', '4']])
+        self.write_file(self.old_dir, constants.PPI_GENE_NODE_ATTR_FILE,
+                        [constants.PPI_GENE_NODE_COLS,
+                         ['A', 'ensembl:1', '', 'True'],
+                         ['B', 'ensembl:2', '', 'False'],
+                         ['D', 'ensembl:4', '', 'False']])
+        self.write_file(self.new_dir, constants.PPI_GENE_NODE_ATTR_FILE,
+                        [constants.PPI_GENE_NODE_COLS,
+                         ['A', 'ensembl:1', '', 'True'],
+                         ['B', 'ensembl:2;ensembl:22', '', 'True'],
+                         ['F', 'ensembl:6', '', 'False']])
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_file(self, dirname, name, rows):
+        with open(os.path.join(dirname, name), 'w', newline='') as f:
+            writer = csv.writer(f, delimiter='\t')
+            for row in rows:
+                writer.writerow(row)
+
+    def read_file(self, name):
+        with open(os.path.join(self.outdir, name), 'r', newline='') as f:
+            return list(csv.reader(f, delimiter='\t'))
+
+    def check_diff(self, differ):
+        counts = differ.diff(self.old_dir, self.new_dir, self.outdir)
+        self.assertEqual({'edges_added': 1, 'edges_removed': 1,
+                          'genes_added': 1, 'genes_removed': 1,
+                          'genes_changed': 1}, counts)
+        self.assertEqual([['geneA', 'geneB', 'score'], ['E', 'F', '3']],
+                         self.read_file(NetworkDiff.EDGES_ADDED_FILE))
+        self.assertEqual([['geneA', 'geneB'], ['D', 'E']],
+                         self.read_file(NetworkDiff.EDGES_REMOVED_FILE))
+        self.assertEqual([constants.PPI_GENE_NODE_COLS,
+                          ['F', 'ensembl:6', '', 'False']],
+                         self.read_file(NetworkDiff.NODES_ADDED_FILE))
+        self.assertEqual([constants.PPI_GENE_NODE_COLS,
+                          ['D', 'ensembl:4', '', 'False']],
+                         self.read_file(NetworkDiff.NODES_REMOVED_FILE))
+        self.assertEqual([NetworkDiff.NODES_CHANGED_COLS,
+                          ['B', 'represents', 'ensembl:2', 'ensembl:2;ensembl:22'],
+                          ['B', 'bait', 'False', 'True']],
+                         self.read_file(NetworkDiff.NODES_CHANGED_FILE))
+
+    def test_diff_gene_node_attributes_duplicate_names(self):
+        self.write_file(self.old_dir, constants.PPI_GENE_NODE_ATTR_FILE,
+                        [constants.PPI_GENE_NODE_COLS,
+                         ['A', 'ensembl:E1', '', 'True'],
+                         ['A', 'ensembl:E2', '', 'False'],
+                         ['B', 'ensembl:E3', '', 'False']])
+        self.write_file(self.new_dir, constants.PPI_GENE_NODE_ATTR_FILE,
+                        [constants.PPI_GENE_NODE_COLS,
+                         ['A', 'ensembl:E1', '', 'True'],
+                         ['B', 'ensembl:E3', '', 'True'],
+                         ['B', 'ensembl:E4', '', 'False']])
+        os.makedirs(self.outdir)
+        differ = NetworkDiff()
+        self.assertEqual((1, 1, 1), differ.diff_gene_node_attributes(
+            os.path.join(self.old_dir, constants.PPI_GENE_NODE_ATTR_FILE),
+            os.path.join(self.new_dir, constants.PPI_GENE_NODE_ATTR_FILE),
+            self.outdir))
+        self.assertEqual([constants.PPI_GENE_NODE_COLS,
+                          ['B', 'ensembl:E4', '', 'False']],
+                         self.read_file(NetworkDiff.NODES_ADDED_FILE))
+        self.assertEqual([constants.PPI_GENE_NODE_COLS,
+                          ['A', 'ensembl:E2', '', 'False']],
+                         self.read_file(NetworkDiff.NODES_REMOVED_FILE))
+        self.assertEqual([NetworkDiff.NODES_CHANGED_COLS,
+                          ['B', 'bait', 'False', 'True']],
+                         self.read_file(NetworkDiff.NODES_CHANGED_FILE))
+
+    def test_constructor_invalid_max_in_memory(self):
+        with self.assertRaises(CellMapsPPIDownloaderError):
+            NetworkDiff(max_in_memory=0)
+
+    def test_diff_hashed(self):
+        self.check_diff(NetworkDiff())
+
+    def test_diff_external_sort(self):
+        self.check_diff(NetworkDiff(max_in_memory=1, tmpdir=self.temp_dir))
+        self.assertEqual(['new', 'old', 'out'], sorted(os.listdir(self.temp_dir)))
+
+    def test_diff_missing_file(self):
+        os.unlink(os.path.join(self.new_dir, constants.PPI_EDGELIST_FILE))
+        with self.assertRaises(CellMapsPPIDownloaderError):
+            NetworkDiff().diff(self.old_dir, self.new_dir, self.outdir)
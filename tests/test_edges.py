@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `edges` module"""
+
+import math
+import unittest
+
+from cellmaps_ppidownloader.edges import canonical_pair
+from cellmaps_ppidownloader.edges import edge_hash
+from cellmaps_ppidownloader.edges import EdgeDeduplicator
+from cellmaps_ppidownloader.edges import TopKSelector
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+
+class TestEdgeDeduplicator(unittest.TestCase):
+    """Tests for `EdgeDeduplicator`"""
+
+    def get_edges(self):
+        return [('B', 'A', (1.0,)),
+                ('A', 'C', (5.0,)),
+                ('A', 'B', (3.0,)),
+                ('C', 'C', (2.0,)),
+                ('C', 'A', (float('nan'),)),
+                ('A', 'B', (2.0,))]
+
+    def test_canonical_pair(self):
+        self.assertEqual(('A', 'B'), canonical_pair('B', 'A'))
+        self.assertEqual(('A', 'B'), canonical_pair('A', 'B'))
+
+    def test_edge_hash(self):
+        self.assertEqual(edge_hash('A', 'B'), edge_hash('B', 'A'))
+        self.assertNotEqual(edge_hash('A', 'B'), edge_hash('A', 'C'))
+        self.assertEqual(edge_hash('A', 'B', salt='1'), edge_hash('B', 'A', salt='1'))
+        self.assertNotEqual(edge_hash('A', 'B'), edge_hash('A', 'B', salt='1'))
+        # value must not depend on process, python hash seed or version
+        self.assertEqual(17446104691958225793, edge_hash('A', 'B'))
+        self.assertTrue(0 <= edge_hash('A', 'B', salt='7') < 2 ** 64)
+
+    def test_invalid_policies(self):
+        for kwargs in [{'self_loops': 'foo'}, {'score_merge': 'foo'},
+                       {'max_in_memory': 0}]:
+            try:
+                EdgeDeduplicator(**kwargs)
+                self.fail('Expected CellMapsPPIDownloaderError')
+            except CellMapsPPIDownloaderError:
+                pass
+
+    def test_deduplicate_first(self):
+        dedup = EdgeDeduplicator()
+        res = list(dedup.deduplicate(self.get_edges()))
+        self.assertEqual([('A', 'B', (1.0,)), ('A', 'C', (5.0,)),
+                          ('C', 'C', (2.0,))], res)
+        self.assertEqual((6, 3, 0), dedup.get_counts())
+
+    def test_deduplicate_policies(self):
+        expected = {EdgeDeduplicator.MAX: [3.0, 5.0],
+                    EdgeDeduplicator.MIN: [1.0, 5.0],
+                    EdgeDeduplicator.SUM: [6.0, 5.0],
+                    EdgeDeduplicator.MEAN: [2.0, 5.0]}
+        for policy, scores in expected.items():
+            dedup = EdgeDeduplicator(score_merge=policy,
+                                     self_loops=EdgeDeduplicator.DROP)
+            res = list(dedup.deduplicate(self.get_edges()))
+            self.assertEqual([('A', 'B'), ('A', 'C')], [r[:2] for r in res])
+            self.assertEqual(scores, [r[2][0] for r in res], policy)
+            self.assertEqual((6, 2, 1), dedup.get_counts())
+
+    def test_deduplicate_all_missing_scores(self):
+        dedup = EdgeDeduplicator(score_merge=EdgeDeduplicator.MEAN)
+        res = list(dedup.deduplicate([('A', 'B', (float('nan'), 1.0)),
+                                      ('B', 'A', (float('nan'), 3.0))]))
+        self.assertTrue(math.isnan(res[0][2][0]))
+        self.assertEqual(2.0, res[0][2][1])
+
+    def test_deduplicate_with_spill(self):
+        for policy in EdgeDeduplicator.SCORE_MERGE_POLICIES:
+            in_memory = list(EdgeDeduplicator(score_merge=policy).deduplicate(self.get_edges()))
+            spilled = list(EdgeDeduplicator(score_merge=policy,
+                                            max_in_memory=1).deduplicate(self.get_edges()))
+            self.assertEqual(sorted(in_memory), spilled, policy)
+
+    def test_deduplicate_union_cols(self):
+        edges = [('A', 'B', (1.0, 1.0)), ('B', 'A', (3.0, 4.0)),
+                 ('A', 'B', (5.0, 1.0)), ('A', 'C', (1.0, 2.0))]
+        for max_in_memory in [None, 1]:
+            dedup = EdgeDeduplicator(score_merge=EdgeDeduplicator.MEAN,
+                                     max_in_memory=max_in_memory)
+            res = sorted(dedup.deduplicate(edges, union_cols=[1]))
+            self.assertEqual([('A', 'B', (3.0, 5.0)), ('A', 'C', (1.0, 2.0))], res)
+
+    def test_merge_scores(self):
+        scores = [(1.0, float('nan')), (3.0, 2.0), (float('nan'), 4.0)]
+        expected = {EdgeDeduplicator.FIRST: (1.0, 2.0),
+                    EdgeDeduplicator.MAX: (3.0, 4.0),
+                    EdgeDeduplicator.MIN: (1.0, 2.0),
+                    EdgeDeduplicator.SUM: (4.0, 6.0),
+                    EdgeDeduplicator.MEAN: (2.0, 3.0)}
+        for policy, merged in expected.items():
+            dedup = EdgeDeduplicator(score_merge=policy)
+            self.assertEqual(merged, dedup.merge_scores(scores), policy)
+            self.assertEqual((0, 0, 0), dedup.get_counts())
+
+    def test_topk_selector_invalid_k(self):
+        for k in [None, 0]:
+            try:
+                TopKSelector(k=k)
+                self.fail('Expected exception')
+            except CellMapsPPIDownloaderError as ce:
+                self.assertEqual('k must be at least 1', str(ce))
+
+    def test_topk_selector(self):
+        selector = TopKSelector(k=2)
+        selector.add('A', 1.0, 'a1')
+        selector.add('B', 5.0, 'b1')
+        selector.add('A', 3.0, 'a2')
+        selector.add('A', float('nan'), 'a3')
+        selector.add('A', 2.0, 'a4')
+        selector.add('A', 2.0, 'a5')
+        self.assertEqual(['b1', 'a2', 'a4'], selector.get_selected())
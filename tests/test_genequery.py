@@ -4,18 +4,38 @@
 """Tests for `cellmaps_ppidownloader` package."""
 
 import os
+import time
+import asyncio
 import unittest
 import tempfile
 import shutil
 import json
 from unittest.mock import MagicMock
+import mygene
 from cellmaps_ppidownloader.gene import GeneQuery
+from cellmaps_ppidownloader.cache import NegativeCache
+from cellmaps_ppidownloader.deadline import Deadline
 
 SKIP_REASON = 'CELLMAPS_PPIDOWNLOADER_INTEGRATION_TEST ' \
               'environment variable not set, cannot run integration ' \
               'tests'
 
 
+class FakeAsyncMyGeneInfo(object):
+
+    def __init__(self, hits, delay=0):
+        self.hits = hits
+        self.delay = delay
+        self.calls = []
+
+    async def querymany(self, queries, scopes=None, fields=None, species=None):
+        self.calls.append((list(queries), scopes))
+        if self.delay > 0:
+            await asyncio.sleep(self.delay)
+        return [self.hits[q] if q in self.hits else {'query': q, 'notfound': True}
+                for q in queries]
+
+
 class TestGeneQuery(unittest.TestCase):
     """Tests for `cellmaps_downloader` package."""
 
@@ -38,6 +58,213 @@ class TestGeneQuery(unittest.TestCase):
                                                     fields=['field1'],
                                                     species='human')
 
+    def test_querymany_returnall_mygene_client(self):
+        mockquery = MagicMock(spec=mygene.MyGeneInfo)
+        mockquery.querymany = MagicMock(return_value={'out': [{'query': '2', 'notfound': True}],
+                                                      'dup': [],
+                                                      'missing': ['2']})
+        query = GeneQuery(mygeneinfo=mockquery)
+        res = query.querymany(['2'], scopes='_id', returnall=True)
+        self.assertEqual(['2'], res['missing'])
+        mockquery.querymany.assert_called_once_with(['2'], scopes='_id', fields=None,
+                                                    species=None, returnall=True,
+                                                    verbose=False)
+        self.assertEqual([{'query': '2', 'notfound': True}],
+                         query.querymany(['2'], scopes='_id'))
+
+    def test_querymany_returnall_other_client(self):
+        mockquery = MagicMock()
+        mockquery.querymany = MagicMock(return_value=[{'query': '1', '_id': '1'},
+                                                      {'query': '1', '_id': '11'},
+                                                      {'query': '2', 'notfound': True}])
+        query = GeneQuery(mygeneinfo=mockquery)
+        res = query.querymany(['1', '2'], scopes='_id', returnall=True)
+        self.assertEqual([('1', 2)], res['dup'])
+        self.assertEqual(['2'], res['missing'])
+        self.assertEqual(3, len(res['out']))
+
+    def test_get_symbols_for_genes_with_fallback(self):
+        mockquery = MagicMock()
+        mockquery.querymany = MagicMock(side_effect=[
+            [{'query': '1', '_id': '1', 'symbol': 'A', 'ensembl': {'gene': 'ENSG1'}},
+             {'query': '2', 'notfound': True},
+             {'query': '3', '_id': '3', 'symbol': 'C'},
+             {'query': '4', 'notfound': True}],
+            [{'query': '2', '_id': '22', 'symbol': 'B', 'ensembl': {'gene': 'ENSG2'}},
+             {'query': '2', '_id': '23', 'symbol': 'B2', 'ensembl': {'gene': 'ENSG3'}},
+             {'query': '3', 'notfound': True},
+             {'query': '4', 'notfound': True}],
+            [{'query': '4', 'notfound': True}],
+            [{'query': '4', 'notfound': True}],
+            [{'query': '4', 'notfound': True}]])
+        query = GeneQuery(mygeneinfo=mockquery, fallback_scopes='alias,retired')
+        res = query.get_symbols_for_genes(genelist=['1', '2', '3', '4'])
+        self.assertEqual(['1', '3', '4', '2'], [x['query'] for x in res])
+        self.assertEqual('22', res[-1]['_id'])
+        self.assertEqual(1, query.get_number_recovered())
+        mockquery.querymany.assert_called_with(['2', '3', '4'], species='human',
+                                               scopes='alias,retired',
+                                               fields=['ensembl.gene', 'symbol'])
+
+        # misses are remembered so no fallback query is made
+        query.get_symbols_for_genes(genelist=['4'])
+        self.assertEqual(3, mockquery.querymany.call_count)
+
+        # but only for the fallback scopes they were missed with
+        query._fallback_scopes = 'symbol'
+        query.get_symbols_for_genes(genelist=['4'])
+        self.assertEqual(5, mockquery.querymany.call_count)
+        mockquery.querymany.assert_called_with(['4'], species='human',
+                                               scopes='symbol',
+                                               fields=['ensembl.gene', 'symbol'])
+
+    def test_querymany_sanitize_and_negative_cache(self):
+        mockquery = MagicMock()
+        mockquery.querymany = MagicMock(return_value=[
+            {'query': '1788', '_id': '1788', 'symbol': 'DNMT3A'},
+            {'query': '999999999', 'notfound': True}])
+        negative_cache = NegativeCache(capacity=100)
+        query = GeneQuery(mygeneinfo=mockquery, sanitize=True,
+                          negative_cache=negative_cache)
+        res = query.querymany(['1788', 'NA', 'DNMT3A', '999999999'],
+                              scopes='_id', species='human')
+        mockquery.querymany.assert_called_once_with(['1788', '999999999'],
+                                                    scopes='_id',
+                                                    fields=None,
+                                                    species='human')
+        self.assertEqual(['1788', '999999999', 'NA', 'DNMT3A'],
+                         [x['query'] for x in res])
+        self.assertTrue(negative_cache.contains('999999999', scopes='_id',
+                                                species='human'))
+        self.assertFalse(negative_cache.contains('1788', scopes='_id',
+                                                 species='human'))
+
+        # known misses are not sent again
+        res = query.querymany(['999999999'], scopes='_id', species='human')
+        self.assertEqual([{'query': '999999999', 'notfound': True}], res)
+        self.assertEqual(1, mockquery.querymany.call_count)
+
+    def test_querymany_with_deadline(self):
+        now = [0.0]
+        deadline = Deadline(100, reserve=10, clock=lambda: now[0])
+
+        def fake_querymany(queries, scopes=None, fields=None, species=None):
+            # each batch uses up half of the budget
+            now[0] += 50
+            return [{'query': q, '_id': q, 'symbol': 'S' + q} for q in queries]
+
+        mockquery = MagicMock()
+        mockquery.querymany = MagicMock(side_effect=fake_querymany)
+        negative_cache = NegativeCache(capacity=100)
+        query = GeneQuery(mygeneinfo=mockquery, deadline=deadline,
+                          negative_cache=negative_cache)
+        orig_batch_size = GeneQuery.DEADLINE_BATCH_SIZE
+        try:
+            GeneQuery.DEADLINE_BATCH_SIZE = 2
+            res = query.querymany(['1', '2', '3', '4', '5'],
+                                  scopes='_id', species='human',
+                                  returnall=True)
+        finally:
+            GeneQuery.DEADLINE_BATCH_SIZE = orig_batch_size
+        self.assertEqual(2, mockquery.querymany.call_count)
+        self.assertEqual(['1', '2', '3', '4', '5'],
+                         [x['query'] for x in res['out']])
+        self.assertEqual([{'query': '5', 'notfound': True}], res['out'][4:])
+        self.assertEqual(['5'], res['missing'])
+        self.assertEqual(['5'], deadline.get_unresolved())
+
+        # genes skipped because of deadline are not known misses
+        self.assertFalse(negative_cache.contains('5', scopes='_id',
+                                                 species='human'))
+
+    def test_querymany_with_deadline_abandons_slow_query(self):
+        deadline = Deadline(0.2, reserve=0.1)
+        mockquery = MagicMock()
+        mockquery.querymany = MagicMock(side_effect=lambda *args, **kwargs: time.sleep(5))
+        query = GeneQuery(mygeneinfo=mockquery, deadline=deadline)
+        start = time.monotonic()
+        res = query.querymany(['1', '2'], scopes='_id', species='human')
+        self.assertTrue(time.monotonic() - start < 2)
+        self.assertEqual([{'query': '1', 'notfound': True},
+                          {'query': '2', 'notfound': True}], res)
+        self.assertEqual(['1', '2'], deadline.get_unresolved())
+
+    def test_get_symbols_for_genes_async(self):
+        hits = {'2': {'query': '2', '_id': '2', 'symbol': 'A2M',
+                      'ensembl': {'gene': 'ENSG00000175899'}},
+                'MARCH1': {'query': 'MARCH1', '_id': '55016', 'symbol': 'MARCHF1',
+                           'ensembl': {'gene': 'ENSG00000145416'}}}
+        asyncquery = FakeAsyncMyGeneInfo(hits)
+        mockquery = MagicMock()
+        query = GeneQuery(mygeneinfo=mockquery, sanitize=True,
+                          fallback_scopes='alias',
+                          async_mygeneinfo=asyncquery)
+        res = asyncio.run(query.get_symbols_for_genes_async(['2', 'MARCH1', 'NA']))
+        mockquery.querymany.assert_not_called()
+        self.assertEqual([(['2'], '_id'), (['MARCH1'], 'alias')],
+                         asyncquery.calls)
+        self.assertEqual(['2', 'NA', 'MARCH1'], [x['query'] for x in res])
+        self.assertEqual('MARCHF1', res[2]['symbol'])
+        self.assertEqual(1, query.get_number_recovered())
+
+    def test_querymany_async_without_async_client(self):
+        mockquery = MagicMock()
+        mockquery.querymany = MagicMock(return_value=[{'query': '2', '_id': '2'}])
+        query = GeneQuery(mygeneinfo=mockquery)
+        res = asyncio.run(query.querymany_async(['2'], scopes='_id',
+                                                species='human'))
+        self.assertEqual([{'query': '2', '_id': '2'}], res)
+        mockquery.querymany.assert_called_once_with(['2'], scopes='_id',
+                                                    fields=None,
+                                                    species='human')
+
+    def test_querymany_async_with_deadline_cancels_slow_query(self):
+        deadline = Deadline(0.2, reserve=0.1)
+        asyncquery = FakeAsyncMyGeneInfo({}, delay=5)
+        query = GeneQuery(mygeneinfo=MagicMock(), deadline=deadline,
+                          async_mygeneinfo=asyncquery)
+        start = time.monotonic()
+        res = asyncio.run(query.querymany_async(['1', '2'], scopes='_id',
+                                                species='human'))
+        self.assertTrue(time.monotonic() - start < 2)
+        self.assertEqual([{'query': '1', 'notfound': True},
+                          {'query': '2', 'notfound': True}], res)
+        self.assertEqual(['1', '2'], deadline.get_unresolved())
+
+    def test_use_shared_session(self):
+        GeneQuery.close_shared_session()
+        try:
+            mg_one = mygene.MyGeneInfo()
+            mg_two = mygene.MyGeneInfo()
+            self.assertIs(mg_one, GeneQuery.use_shared_session(mg_one, pool_size=3,
+                                                               timeout=5.0,
+                                                               keepalive=7.0))
+            GeneQuery.use_shared_session(mg_two)
+            self.assertTrue(mg_one.http_client_setup)
+            self.assertIs(mg_one.http_client, mg_two.http_client)
+            session = mg_one.http_client
+            self.assertEqual(5.0, session.timeout.read)
+            pool = session._transport._pool
+            self.assertEqual(3, pool._max_connections)
+            self.assertEqual(7.0, pool._keepalive_expiry)
+
+            # clients that are not mygene are left as is
+            mockquery = MagicMock()
+            self.assertIs(mockquery, GeneQuery.use_shared_session(mockquery))
+
+            # clients without httpx session keep their default session
+            mg_old = mygene.MyGeneInfo()
+            del mg_old.http_client_setup
+            default_client = mg_old.http_client
+            self.assertIs(mg_old, GeneQuery.use_shared_session(mg_old))
+            self.assertIs(default_client, mg_old.http_client)
+
+            GeneQuery.close_shared_session()
+            self.assertTrue(session.is_closed)
+            self.assertIsNot(session, GeneQuery.get_shared_session())
+        finally:
+            GeneQuery.close_shared_session()
+
     @unittest.skipUnless(os.getenv('CELLMAPS_PPIDOWNLOADER_INTEGRATION_TEST') is not None, SKIP_REASON)
     def test_simple_query(self):
         query = GeneQuery()
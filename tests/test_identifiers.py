@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `identifiers` module"""
+
+import unittest
+
+from cellmaps_ppidownloader import identifiers
+
+
+class TestIdentifiers(unittest.TestCase):
+    """Tests for `identifiers` module"""
+
+    def test_is_valid_entrez_id(self):
+        self.assertTrue(identifiers.is_valid_entrez_id('1788'))
+        for val in [None, '', 'DNMT3A', '12,13', ' 1788']:
+            self.assertFalse(identifiers.is_valid_entrez_id(val), str(val))
+
+    def test_is_valid_symbol(self):
+        for val in ['DNMT3A', 'HLA-A', 'C1orf112', 'MT-ND1']:
+            self.assertTrue(identifiers.is_valid_symbol(val), val)
+        for val in [None, '', 'A,B', '1-Mar', 'ABC D', '-A']:
+            self.assertFalse(identifiers.is_valid_symbol(val), str(val))
+
+    def test_get_ensembl_gene_ids(self):
+        self.assertEqual(['ENSG00000119772'],
+                         identifiers.get_ensembl_gene_ids('ENSG00000119772'))
+        self.assertEqual(['ENSG00000189403', 'ENSG00000276074.2'],
+                         identifiers.get_ensembl_gene_ids('ENSG00000189403; ENSG00000276074.2'))
+        for val in [None, '', ' ', 'ENSG1', 'ENSG00000189403,foo']:
+            self.assertIsNone(identifiers.get_ensembl_gene_ids(val), str(val))
+
+    def test_is_valid_uniprot_accession(self):
+        for val in ['P09429', 'O00422', 'Q9Y2K7', 'A0A024RBG1', 'P09429-2']:
+            self.assertTrue(identifiers.is_valid_uniprot_accession(val), val)
+        for val in [None, '', 'p09429', 'DNMT3A', '1788', 'REV_P09429']:
+            self.assertFalse(identifiers.is_valid_uniprot_accession(val), str(val))
+
+    def test_is_junk(self):
+        for val in [None, '', ' ', 'NA', 'nan', 'NULL', 'REV_P09429',
+                    'CON_P02768', 'DECOY_ABC', '##FOO']:
+            self.assertTrue(identifiers.is_junk(val), str(val))
+        for val in ['DNMT3A', 'P09429', '1788']:
+            self.assertFalse(identifiers.is_junk(val), val)
+
+    def test_is_valid_for_scopes(self):
+        self.assertTrue(identifiers.is_valid_for_scopes('1788', scopes='_id'))
+        self.assertFalse(identifiers.is_valid_for_scopes('DNMT3A', scopes='_id'))
+        self.assertTrue(identifiers.is_valid_for_scopes('DNMT3A', scopes='alias,retired'))
+        self.assertTrue(identifiers.is_valid_for_scopes('P09429', scopes=['uniprot']))
+        self.assertFalse(identifiers.is_valid_for_scopes('foo bar', scopes='uniprot'))
+        self.assertTrue(identifiers.is_valid_for_scopes('anything', scopes='unknownscope'))
+        self.assertTrue(identifiers.is_valid_for_scopes('anything'))
+        self.assertFalse(identifiers.is_valid_for_scopes('NA'))
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `MappingIndex`"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from cellmaps_utils import constants
+
+from cellmaps_ppidownloader.mapping import MappingIndex
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+
+class TestMappingIndex(unittest.TestCase):
+    """Tests for `MappingIndex`"""
+
+    def write_attr_file(self, outdir, rows):
+        with open(os.path.join(outdir, constants.PPI_GENE_NODE_ATTR_FILE), 'w') as f:
+            f.write('\t'.join(constants.PPI_GENE_NODE_COLS) + '\n')
+            for row in rows:
+                f.write('\t'.join(row) + '\n')
+
+    def test_get_ensembl_ids(self):
+        self.assertEqual(['ENSG00000189403', 'ENSG00000276074'],
+                         MappingIndex.get_ensembl_ids('ensembl:ENSG00000189403;ENSG00000276074'))
+        self.assertEqual(['ENSG00000189403', 'ENSG00000276074'],
+                         MappingIndex.get_ensembl_ids('ENSG00000189403,ENSG00000276074'))
+        self.assertEqual([], MappingIndex.get_ensembl_ids('ensembl:'))
+        self.assertIsNone(MappingIndex.get_ensembl_ids('foo'))
+        self.assertIsNone(MappingIndex.get_ensembl_ids(None))
+
+    def test_load_missing_file(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            MappingIndex().load(temp_dir)
+            self.fail('Expected exception')
+        except CellMapsPPIDownloaderError as ce:
+            self.assertTrue(str(ce).startswith('Gene node attributes file not found'))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_load(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            first = os.path.join(temp_dir, 'first')
+            os.makedirs(first)
+            self.write_attr_file(first, [['DNMT3A', 'ensembl:ENSG00000119772', '', 'True'],
+                                         ['HMGB1', 'ENSG00000189403,ENSG00000276074', '', 'False'],
+                                         ['BAD', 'foo', '', 'False']])
+            with open(os.path.join(first, MappingIndex.ROCRATE_METADATA_FILE), 'w') as f:
+                f.write('{}')
+            second = os.path.join(temp_dir, 'second')
+            os.makedirs(second)
+            self.write_attr_file(second, [['DNMT3A', 'ENSG00000000001', '', 'True'],
+                                          ['SAP18', '', '', 'False']])
+            index = MappingIndex()
+            self.assertEqual(2, index.load(first))
+            self.assertEqual(1, index.load(os.path.join(second,
+                                                        constants.PPI_GENE_NODE_ATTR_FILE)))
+            self.assertEqual(3, len(index))
+            self.assertEqual([first], index.get_rocrates())
+            self.assertEqual(['ENSG00000119772'], index.get_ensembl_ids_for_symbol('DNMT3A'))
+            self.assertEqual([], index.get_ensembl_ids_for_symbol('SAP18'))
+            self.assertIsNone(index.get_ensembl_ids_for_symbol('BAD'))
+        finally:
+            shutil.rmtree(temp_dir)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `MultiSourceGeneNodeAttributeGenerator`"""
+
+import math
+import asyncio
+import unittest
+from array import array
+from unittest.mock import MagicMock
+from unittest.mock import AsyncMock
+
+from cellmaps_ppidownloader.gene import MultiSourceGeneNodeAttributeGenerator
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+
+class TestMultiSourceGeneNodeAttributeGenerator(unittest.TestCase):
+    """Tests for `MultiSourceGeneNodeAttributeGenerator`"""
+
+    def get_generator(self, edgelist, attrs, edge_scores=None):
+        gen = MagicMock()
+        gen.get_apms_edgelist = MagicMock(return_value=edgelist)
+        gen.get_apms_edge_scores = MagicMock(return_value=edge_scores)
+        gen.get_gene_node_attributes = MagicMock(return_value=(attrs, ['err']))
+        gen.get_gene_node_attributes_async = AsyncMock(return_value=(attrs, ['err']))
+        return gen
+
+    def get_generators(self):
+        one = self.get_generator([{'GeneID1': '1', 'GeneID2': '2'}],
+                                 {'1': {'name': 'A', 'bait': True},
+                                  '2': {'name': 'B', 'bait': False}},
+                                 edge_scores={'score': array('f', [1.0])})
+        two = self.get_generator([{'GeneID1': '2', 'GeneID2': '3'},
+                                  {'GeneID1': '2', 'GeneID2': '1'}],
+                                 {'2': {'name': 'B', 'bait': True},
+                                  '3': {'name': 'C', 'bait': False}})
+        return [('hek293t', one), ('u2os', two)]
+
+    def test_constructor_invalid(self):
+        gen = self.get_generator([], {})
+        for generators in [None, [], [('a', gen), ('a', gen)],
+                           [(str(i), gen) for i in range(54)]]:
+            with self.assertRaises(CellMapsPPIDownloaderError):
+                MultiSourceGeneNodeAttributeGenerator(generators=generators)
+
+    def test_get_apms_edgelist_scores_and_sources(self):
+        gen = MultiSourceGeneNodeAttributeGenerator(generators=self.get_generators())
+        self.assertEqual(['hek293t', 'u2os'], gen.get_source_names())
+        self.assertEqual(3, len(gen.get_apms_edgelist()))
+        scores = gen.get_apms_edge_scores()
+        self.assertEqual(1.0, scores['score'][0])
+        self.assertTrue(math.isnan(scores['score'][1]))
+        self.assertTrue(math.isnan(scores['score'][2]))
+        names, masks = gen.get_apms_edge_sources()
+        self.assertEqual(['hek293t', 'u2os'], names)
+        self.assertEqual([1, 2, 2], list(masks))
+
+    def test_get_gene_node_attributes(self):
+        gen = MultiSourceGeneNodeAttributeGenerator(generators=self.get_generators())
+        attrs, errors = gen.get_gene_node_attributes()
+        self.assertEqual({'1': {'name': 'A', 'bait': True},
+                          '2': {'name': 'B', 'bait': True},
+                          '3': {'name': 'C', 'bait': False}}, attrs)
+        self.assertEqual(['err', 'err'], errors)
+
+    def test_get_gene_node_attributes_async(self):
+        generators = self.get_generators()
+        gen = MultiSourceGeneNodeAttributeGenerator(generators=generators)
+        attrs, errors = asyncio.run(gen.get_gene_node_attributes_async())
+        self.assertEqual(3, len(attrs))
+        self.assertTrue(attrs['2']['bait'])
+        for _, source_gen in generators:
+            source_gen.get_gene_node_attributes_async.assert_awaited_once()
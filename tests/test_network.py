@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `network` module"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+import numpy as np
+
+from cellmaps_ppidownloader.network import PPINetwork
+from cellmaps_ppidownloader.network import get_symbol_edges
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+
+class TestPPINetwork(unittest.TestCase):
+    """Tests for `PPINetwork`"""
+
+    def get_edgelist(self):
+        return [{'GeneID1': '1', 'GeneID2': '2'},
+                {'GeneID1': '1', 'GeneID2': '3'},
+                {'GeneID1': '2', 'GeneID2': '99'},
+                {'GeneID1': '3', 'GeneID2': '3'}]
+
+    def get_gene_node_attrs(self):
+        return {'1': {'name': 'A', 'represents': '', 'ambiguous': '', 'bait': True},
+                '2': {'name': 'B', 'represents': '', 'ambiguous': '', 'bait': False},
+                '3': {'name': 'C', 'represents': '', 'ambiguous': '', 'bait': False},
+                '4': {'name': 'D', 'represents': '', 'ambiguous': '', 'bait': False}}
+
+    def test_get_symbol_edges(self):
+        res = list(get_symbol_edges(edgelist=self.get_edgelist(),
+                                    gene_node_attrs=self.get_gene_node_attrs()))
+        self.assertEqual([(0, 'A', 'B'), (1, 'A', 'C'), (3, 'C', 'C')], res)
+
+    def test_constructor_invalid(self):
+        try:
+            PPINetwork(nodes=['A'], indptr=[0], indices=[])
+            self.fail('Expected CellMapsPPIDownloaderError')
+        except CellMapsPPIDownloaderError as ce:
+            self.assertTrue('indptr' in str(ce))
+
+    def test_from_edgelist_undirected(self):
+        net = PPINetwork.from_edgelist(edgelist=self.get_edgelist(),
+                                       gene_node_attrs=self.get_gene_node_attrs())
+        self.assertEqual(['A', 'B', 'C', 'D'], net.nodes)
+        self.assertEqual(4, net.get_number_of_nodes())
+        self.assertEqual(3, net.get_number_of_edges())
+        self.assertEqual([0, 2, 3, 5, 5], list(net.indptr))
+        self.assertEqual(['B', 'C'], net.get_neighbors('A'))
+        self.assertEqual(['A', 'C'], sorted(net.get_neighbors('C')))
+        self.assertEqual([], net.get_neighbors('D'))
+        self.assertEqual([], net.get_neighbors('nope'))
+
+    def test_get_number_of_edges_with_self_loops(self):
+        net = PPINetwork.from_symbol_edges(edges=[('A', 'B'), ('B', 'B'),
+                                                  ('C', 'A'), ('C', 'C')])
+        self.assertEqual(6, len(net.indices))
+        self.assertEqual(4, net.get_number_of_edges())
+        self.assertEqual(4, net.get_number_of_edges())
+
+    def test_from_symbol_edges_directed(self):
+        net = PPINetwork.from_symbol_edges(edges=[('A', 'B'), ('B', 'C')],
+                                           undirected=False)
+        self.assertEqual(2, net.get_number_of_edges())
+        self.assertEqual(['B'], net.get_neighbors('A'))
+        self.assertEqual([], net.get_neighbors('C'))
+
+    def test_to_scipy_sparse(self):
+        net = PPINetwork.from_symbol_edges(edges=[('A', 'B'), ('B', 'C')])
+        mat = net.to_scipy_sparse()
+        self.assertEqual((3, 3), mat.shape)
+        self.assertEqual(4, mat.nnz)
+        self.assertEqual(1.0, mat[0, 1])
+        self.assertEqual(1.0, mat[1, 0])
+
+    def test_to_networkx(self):
+        net = PPINetwork.from_symbol_edges(edges=[('A', 'B'), ('B', 'C')],
+                                           nodes=['Z'])
+        graph = net.to_networkx()
+        self.assertEqual(4, graph.number_of_nodes())
+        self.assertEqual(2, graph.number_of_edges())
+        self.assertTrue(graph.has_edge('C', 'B'))
+
+    def test_from_generator(self):
+        gen = MagicMock()
+        gen.get_gene_node_attributes = MagicMock(return_value=(self.get_gene_node_attrs(), ['err']))
+        gen.get_apms_edgelist = MagicMock(return_value=self.get_edgelist())
+        net, errors = PPINetwork.from_generator(apmsgen=gen)
+        self.assertEqual(['err'], errors)
+        self.assertEqual(3, net.get_number_of_edges())
+
+    def test_weights(self):
+        net = PPINetwork.from_symbol_edges(edges=[('A', 'B'), ('B', 'C'), ('C', 'C')],
+                                           weights=[0.5, 2.0, 3.0])
+        self.assertEqual(np.float32, net.weights.dtype)
+        self.assertEqual([0.5], list(net.weights[net.indptr[0]:net.indptr[1]]))
+        self.assertEqual(2.0, net.to_scipy_sparse()[2, 1])
+        self.assertEqual(3.0, net.to_networkx()['C']['C']['weight'])
+        try:
+            PPINetwork.from_symbol_edges(edges=[('A', 'B')], weights=[])
+            self.fail('Expected CellMapsPPIDownloaderError')
+        except CellMapsPPIDownloaderError as ce:
+            self.assertTrue('Number of weights' in str(ce))
+
+    def test_save_and_load(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            bundle_dir = os.path.join(temp_dir, 'csr')
+            net = PPINetwork.from_edgelist(edgelist=self.get_edgelist(),
+                                           gene_node_attrs=self.get_gene_node_attrs(),
+                                           weights=[1.0, 2.0, 3.0, 4.0])
+            written = net.save(bundle_dir)
+            self.assertEqual(5, len(written))
+            loaded = PPINetwork.load(bundle_dir)
+            self.assertTrue(isinstance(loaded.indices, np.memmap))
+            self.assertEqual(net.nodes, loaded.nodes)
+            self.assertEqual(list(net.indptr), list(loaded.indptr))
+            self.assertEqual(list(net.indices), list(loaded.indices))
+            self.assertEqual([2.0, 4.0], sorted(loaded.weights[loaded.indptr[2]:loaded.indptr[3]]))
+            self.assertEqual(3, loaded.get_number_of_edges())
+            self.assertEqual(['B', 'C'], loaded.get_neighbors('A'))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_load_not_bundle(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            PPINetwork.load(temp_dir)
+            self.fail('Expected CellMapsPPIDownloaderError')
+        except CellMapsPPIDownloaderError as ce:
+            self.assertTrue('is not a CSR bundle' in str(ce))
+        finally:
+            shutil.rmtree(temp_dir)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `resolver` module"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from cellmaps_ppidownloader.resolver import GeneResolverService
+from cellmaps_ppidownloader.resolver import ResolverClient
+from cellmaps_ppidownloader.resolver import create_resolver_server
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+
+def fake_querymany(queries, scopes=None, fields=None, species=None):
+    res = []
+    for q in queries:
+        if q == 'missing':
+            res.append({'query': q, 'notfound': True})
+        else:
+            res.append({'query': q, 'symbol': 'SYM' + q,
+                        'ensembl': {'gene': 'ENSG' + q}})
+    return res
+
+
+class TestGeneResolverService(unittest.TestCase):
+    """Tests for `GeneResolverService`"""
+
+    def test_querymany_uses_cache(self):
+        mockmg = MagicMock()
+        mockmg.querymany = MagicMock(side_effect=fake_querymany)
+        service = GeneResolverService(mygeneinfo=mockmg)
+        res = service.querymany(['1', 'missing'], scopes='_id',
+                                fields=['symbol'], species='human')
+        self.assertEqual(['1', 'missing'], [r['query'] for r in res])
+        res = service.querymany(['missing', '1', '2'], scopes='_id',
+                                fields=['symbol'], species='human')
+        self.assertEqual(['missing', '1', '2'], [r['query'] for r in res])
+        self.assertEqual(2, mockmg.querymany.call_count)
+        mockmg.querymany.assert_called_with(['2'], scopes='_id',
+                                            fields=['symbol'],
+                                            species='human')
+        stats = service.get_stats()
+        self.assertEqual(2, stats['cache_hits'])
+        self.assertEqual(3, stats['upstream_queries'])
+        self.assertEqual(3, stats['cached'])
+
+    def test_different_scopes_not_shared(self):
+        mockmg = MagicMock()
+        mockmg.querymany = MagicMock(side_effect=fake_querymany)
+        service = GeneResolverService(mygeneinfo=mockmg)
+        service.querymany(['1'], scopes='_id')
+        service.querymany(['1'], scopes='symbol')
+        self.assertEqual(2, mockmg.querymany.call_count)
+
+    def test_concurrent_queries_coalesced(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_querymany(queries, **kwargs):
+            started.set()
+            release.wait(5)
+            return fake_querymany(queries)
+
+        mockmg = MagicMock()
+        mockmg.querymany = MagicMock(side_effect=slow_querymany)
+        service = GeneResolverService(mygeneinfo=mockmg)
+        results = {}
+
+        def run(name, queries):
+            results[name] = service.querymany(queries, scopes='_id')
+
+        first = threading.Thread(target=run, args=('first', ['1', '2']))
+        first.start()
+        started.wait(5)
+        second = threading.Thread(target=run, args=('second', ['2', '3']))
+        second.start()
+        # wait for second thread to claim 3 and wait on 2
+        for _ in range(100):
+            if service.get_stats()['coalesced'] == 1:
+                break
+            time.sleep(0.01)
+        release.set()
+        first.join(5)
+        second.join(5)
+        self.assertEqual(['2', '3'], [r['query'] for r in results['second']])
+        self.assertEqual(1, service.get_stats()['coalesced'])
+        self.assertEqual(3, service.get_stats()['upstream_queries'])
+
+
+class TestResolverClient(unittest.TestCase):
+    """Tests for `ResolverClient` against a running server"""
+
+    def _run_server(self, server):
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def test_invalid_url(self):
+        try:
+            ResolverClient('ftp://foo')
+            self.fail('Expected CellMapsPPIDownloaderError')
+        except CellMapsPPIDownloaderError as ce:
+            self.assertTrue('Unsupported resolver URL' in str(ce))
+
+    def test_querymany_over_http(self):
+        mockmg = MagicMock()
+        mockmg.querymany = MagicMock(side_effect=fake_querymany)
+        server = create_resolver_server(GeneResolverService(mygeneinfo=mockmg),
+                                        port=0)
+        self._run_server(server)
+        try:
+            client = ResolverClient('http://127.0.0.1:' + str(server.server_address[1]),
+                                    timeout=10)
+            res = client.querymany([1, 'missing'], scopes='_id',
+                                   fields=['symbol'], species='human')
+            self.assertEqual([{'query': '1', 'symbol': 'SYM1',
+                               'ensembl': {'gene': 'ENSG1'}},
+                              {'query': 'missing', 'notfound': True}], res)
+            self.assertEqual(2, client.get_stats()['cached'])
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'Unix domain sockets not supported')
+    def test_querymany_over_unix_socket(self):
+        temp_dir = tempfile.mkdtemp()
+        mockmg = MagicMock()
+        mockmg.querymany = MagicMock(side_effect=fake_querymany)
+        socket_path = os.path.join(temp_dir, 'resolver.sock')
+        server = create_resolver_server(GeneResolverService(mygeneinfo=mockmg),
+                                        socket_path=socket_path)
+        self._run_server(server)
+        try:
+            client = ResolverClient('unix://' + socket_path, timeout=10)
+            res = client.querymany(['5'], scopes='_id')
+            self.assertEqual('SYM5', res[0]['symbol'])
+        finally:
+            server.shutdown()
+            server.server_close()
+            shutil.rmtree(temp_dir)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `sample` module"""
+
+import unittest
+
+from cellmaps_ppidownloader.sample import EdgeSampler
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+
+class TestEdgeSampler(unittest.TestCase):
+    """Tests for `sample` module"""
+
+    def get_edges(self, num=1000):
+        return [('G' + str(i), 'G' + str(i + 1), i) for i in range(num)]
+
+    def sample(self, edges, **kwargs):
+        sampler = EdgeSampler(**kwargs)
+        for genea, geneb, item in edges:
+            sampler.add(genea, geneb, item)
+        return sampler.get_sampled()
+
+    def test_constructor_invalid(self):
+        for kwargs in [{}, {'fraction': 0.1, 'size': 1}, {'fraction': 0},
+                       {'fraction': 1.5}, {'size': 0}]:
+            with self.assertRaises(CellMapsPPIDownloaderError):
+                EdgeSampler(**kwargs)
+
+    def test_from_string(self):
+        sampler = EdgeSampler.from_string('0.25', seed=1)
+        self.assertEqual(0.25, sampler._fraction)
+        sampler = EdgeSampler.from_string('500')
+        self.assertEqual(500, sampler._size)
+        for val in ['foo', '2.5', '-1', '1.0', '5000.0', '1e3']:
+            with self.assertRaises(CellMapsPPIDownloaderError):
+                EdgeSampler.from_string(val)
+
+    def test_get_priority_undirected(self):
+        sampler = EdgeSampler(size=1)
+        self.assertEqual(sampler.get_priority('A', 'B'),
+                         sampler.get_priority('B', 'A'))
+        self.assertNotEqual(sampler.get_priority('A', 'B'),
+                            EdgeSampler(size=1, seed=1).get_priority('A', 'B'))
+
+    def test_size_reproducible_order_independent_and_nested(self):
+        edges = self.get_edges()
+        res = self.sample(edges, size=100, seed=5)
+        self.assertEqual(100, len(res))
+        self.assertEqual(sorted(res), res)
+        self.assertEqual(res, sorted(self.sample(list(reversed(edges)),
+                                                 size=100, seed=5)))
+        self.assertTrue(set(self.sample(edges, size=50, seed=5)).issubset(res))
+        self.assertNotEqual(res, self.sample(edges, size=100, seed=6))
+
+    def test_fraction(self):
+        edges = self.get_edges()
+        res = self.sample(edges, fraction=0.2, seed=5)
+        self.assertTrue(120 < len(res) < 280)
+        self.assertEqual(res, self.sample(edges, fraction=0.2, seed=5))
+        self.assertTrue(set(self.sample(edges, fraction=0.1,
+                                        seed=5)).issubset(res))
+        self.assertEqual(1000, len(self.sample(edges, fraction=1.0)))
+
+    def test_size_larger_than_input(self):
+        self.assertEqual(list(range(10)), self.sample(self.get_edges(10),
+                                                      size=100))
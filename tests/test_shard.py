@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `shard` module"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from array import array
+
+from cellmaps_utils import constants
+
+from cellmaps_ppidownloader import shard
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+
+class TestShard(unittest.TestCase):
+    """Tests for `shard` module"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_file(self, name, rows):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w') as f:
+            for row in rows:
+                f.write('\t'.join(row) + '\n')
+        return path
+
+    def read_file(self, path):
+        with open(path, 'r') as f:
+            return [line.rstrip('\r\n').split('\t') for line in f]
+
+    def test_check_shard(self):
+        shard.check_shard()
+        shard.check_shard(shard_index=0, shard_count=1)
+        for index, count in [(0, None), (None, 2), (2, 2), (-1, 2), (0, 0)]:
+            try:
+                shard.check_shard(shard_index=index, shard_count=count)
+                self.fail('Expected exception for ' + str((index, count)))
+            except CellMapsPPIDownloaderError:
+                pass
+
+    def test_get_edge_shard(self):
+        self.assertEqual(shard.get_edge_shard('A', 'B', 5),
+                         shard.get_edge_shard('B', 'A', 5))
+        for i in range(100):
+            self.assertTrue(0 <= shard.get_edge_shard(str(i), 'A', 3) < 3)
+
+    def test_filter_edges_for_shard(self):
+        edgelist = [{'GeneID1': str(i), 'GeneID2': str(i + 1)} for i in range(50)]
+        edgelist.append({'GeneID1': '11', 'GeneID2': '10'})
+        edge_scores = {'score': array('f', range(len(edgelist)))}
+        seen = []
+        for index in range(3):
+            edges, scores = shard.filter_edges_for_shard(edgelist, index, 3,
+                                                         edge_scores=edge_scores)
+            self.assertEqual(len(edges), len(scores['score']))
+            for edge, score in zip(edges, scores['score']):
+                self.assertEqual(edgelist.index(edge), int(score))
+            pairs = [(e['GeneID1'], e['GeneID2']) for e in edges]
+            self.assertEqual(('10', '11') in pairs, ('11', '10') in pairs)
+            seen.extend(pairs)
+        self.assertEqual(sorted((e['GeneID1'], e['GeneID2']) for e in edgelist),
+                         sorted(seen))
+
+        edges, scores = shard.filter_edges_for_shard([{'Bait': 'A', 'Prey': 'B'}],
+                                                     0, 1, cols=('Bait', 'Prey'))
+        self.assertEqual([{'Bait': 'A', 'Prey': 'B'}], edges)
+        self.assertIsNone(scores)
+
+    def test_merge_gene_node_attributes(self):
+        header = constants.PPI_GENE_NODE_COLS
+        one = self.write_file('one.tsv', [header,
+                                          ['A', 'ensembl:ENSG1', '', 'False'],
+                                          ['C', 'ensembl:ENSG3', '', 'True']])
+        two = self.write_file('two.tsv', [header,
+                                          ['A', 'ensembl:ENSG1', '', 'True'],
+                                          ['B', 'ensembl:ENSG2', '', 'False']])
+        outfile = os.path.join(self.temp_dir, 'out.tsv')
+        self.assertEqual(3, shard.merge_gene_node_attributes([one, two], outfile))
+        self.assertEqual([header,
+                          ['A', 'ensembl:ENSG1', '', 'True'],
+                          ['B', 'ensembl:ENSG2', '', 'False'],
+                          ['C', 'ensembl:ENSG3', '', 'True']],
+                         self.read_file(outfile))
+
+    def test_merge_gene_node_attributes_keeps_distinct_genes_sharing_name(self):
+        header = constants.PPI_GENE_NODE_COLS
+        one = self.write_file('one.tsv', [header,
+                                          ['A', 'ensembl:ENSG1', '', 'False'],
+                                          ['A', 'ensembl:ENSG9', '', 'False']])
+        two = self.write_file('two.tsv', [header,
+                                          ['A', 'ensembl:ENSG9', '', 'True']])
+        outfile = os.path.join(self.temp_dir, 'out.tsv')
+        self.assertEqual(2, shard.merge_gene_node_attributes([one, two], outfile))
+        self.assertEqual([header,
+                          ['A', 'ensembl:ENSG1', '', 'False'],
+                          ['A', 'ensembl:ENSG9', '', 'True']],
+                         self.read_file(outfile))
+
+    def test_merge_edgelists_with_score_merge(self):
+        # reciprocal CM4AI edges, DNMT3A bait to SAP18 prey and SAP18 bait
+        # to DNMT3A prey, are split on raw bait symbol and prey UniProt id
+        self.assertNotEqual(shard.get_edge_shard('DNMT3A', 'O00422', 3),
+                            shard.get_edge_shard('SAP18', 'Q9Y6K1', 3))
+        header = constants.PPI_EDGELIST_COLS + ['score', 'source']
+        one = self.write_file('one.tsv', [header, ['DNMT3A', 'SAP18', '1', 'a'],
+                                          ['HDAC2', 'SAP18', '5', 'a']])
+        two = self.write_file('two.tsv', [header, ['DNMT3A', 'SAP18', '3', 'b']])
+        for score_merge, score in [('max', '3'), ('mean', '2'), ('first', '1')]:
+            outfile = os.path.join(self.temp_dir, 'out.tsv')
+            self.assertEqual(2, shard.merge_edgelists([one, two], outfile,
+                                                      score_merge=score_merge,
+                                                      union_cols=['source']))
+            self.assertEqual([header, ['DNMT3A', 'SAP18', score, 'a;b'],
+                              ['HDAC2', 'SAP18', '5', 'a']],
+                             self.read_file(outfile))
+        self.assertEqual(3, shard.merge_edgelists([one, two], outfile))
+
+    def test_merge_edgelists(self):
+        header = constants.PPI_EDGELIST_COLS + ['score']
+        one = self.write_file('one.tsv', [header, ['A', 'B', '1'], ['C', 'D', '2']])
+        two = self.write_file('two.tsv', [header, ['A', 'C', '3']])
+        outfile = os.path.join(self.temp_dir, 'out.tsv')
+        self.assertEqual(3, shard.merge_edgelists([one, two], outfile))
+        self.assertEqual([header, ['A', 'B', '1'], ['A', 'C', '3'], ['C', 'D', '2']],
+                         self.read_file(outfile))
+
+        bad = self.write_file('bad.tsv', [constants.PPI_EDGELIST_COLS, ['A', 'B']])
+        try:
+            shard.merge_edgelists([one, bad], outfile)
+            self.fail('Expected CellMapsPPIDownloaderError')
+        except CellMapsPPIDownloaderError as ce:
+            self.assertTrue('does not match' in str(ce))
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `sources` module"""
+
+import unittest
+
+from cellmaps_ppidownloader import sources
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+
+class TestSources(unittest.TestCase):
+    """Tests for `sources` module"""
+
+    def test_parse_source_edgelist(self):
+        source = sources.parse_source('name=hek293t, edgelist=/data/293T.tsv,'
+                                      'baitlist=baits.tsv,geneid_one_col=GeneA,'
+                                      'baitlist_geneid_col=Id')
+        self.assertEqual({'name': 'hek293t', 'edgelist': '/data/293T.tsv',
+                          'baitlist': 'baits.tsv', 'geneid_one_col': 'GeneA',
+                          'baitlist_geneid_col': 'Id'}, source)
+        self.assertEqual({'geneid_one_col': 'GeneA'},
+                         sources.get_source_kwargs(source))
+        self.assertEqual({'geneid_col': 'Id'},
+                         sources.get_source_kwargs(source, prefix='baitlist_'))
+
+    def test_parse_source_cm4ai_default_name(self):
+        source = sources.parse_source('cm4ai_table=/data/u2os.tsv,'
+                                      'bfdr_col=BFDR.x,bfdr_maxcutoff=0.01')
+        self.assertEqual('u2os', source['name'])
+        self.assertEqual(0.01, source['bfdr_maxcutoff'])
+        self.assertEqual({'bfdr_col': 'BFDR.x', 'bfdr_maxcutoff': 0.01},
+                         sources.get_source_kwargs(source))
+
+    def test_parse_source_invalid(self):
+        for spec in ['', 'name=x', 'edgelist=a.tsv,cm4ai_table=b.tsv',
+                     'edgelist=a.tsv,bait_col=Bait', 'cm4ai_table=a.tsv,foo',
+                     'cm4ai_table=a.tsv,bfdr_maxcutoff=x',
+                     'edgelist=a.tsv,edgelist=b.tsv']:
+            with self.assertRaises(CellMapsPPIDownloaderError):
+                sources.parse_source(spec)
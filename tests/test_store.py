@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `store` module"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from cellmaps_ppidownloader.store import GeneNodeAttributeStore
+from cellmaps_ppidownloader.gene import CM4AIGeneNodeAttributeGenerator
+from cellmaps_ppidownloader.gene import MultiSourceGeneNodeAttributeGenerator
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+
+class TestGeneNodeAttributeStore(unittest.TestCase):
+    """Tests for `store` module"""
+
+    def setUp(self):
+        self._temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._temp_dir)
+
+    def get_attrs(self, num=5):
+        return [('G' + str(i), {'name': 'S' + str(i),
+                                'represents': 'ensembl:E' + str(i),
+                                'ambiguous': '',
+                                'bait': i % 2 == 0}) for i in range(num)]
+
+    def test_constructor_invalid(self):
+        with self.assertRaises(CellMapsPPIDownloaderError):
+            GeneNodeAttributeStore(max_in_memory=0)
+
+    def test_matches_dict(self):
+        for max_in_memory in [None, 1, 3, 100]:
+            store = GeneNodeAttributeStore(max_in_memory=max_in_memory,
+                                           tmpdir=self._temp_dir)
+            expected = {}
+            for key, value in self.get_attrs():
+                store[key] = value
+                expected[key] = value
+            store['G1'] = {'name': 'X1', 'represents': '', 'ambiguous': 'G1', 'bait': True}
+            expected['G1'] = {'name': 'X1', 'represents': '', 'ambiguous': 'G1', 'bait': True}
+            del store['G3']
+            del expected['G3']
+            self.assertEqual(max_in_memory is not None and max_in_memory < 5,
+                             store.is_spilled())
+            self.assertEqual(len(expected), len(store))
+            self.assertEqual(list(expected.keys()), list(store.keys()))
+            self.assertEqual(expected, dict(store.items()))
+            self.assertTrue('G0' in store)
+            self.assertFalse('G3' in store)
+            with self.assertRaises(KeyError):
+                store['G3']
+            with self.assertRaises(KeyError):
+                del store['G3']
+            store.close()
+
+    def test_values_are_copies(self):
+        store = GeneNodeAttributeStore(max_in_memory=1, tmpdir=self._temp_dir)
+        for key, value in self.get_attrs(2):
+            store[key] = value
+        store['G1']['bait'] = True
+        self.assertFalse(store['G1']['bait'])
+
+    def test_unsupported_attribute(self):
+        store = GeneNodeAttributeStore()
+        with self.assertRaises(CellMapsPPIDownloaderError):
+            store['G1'] = {'name': 'S1', 'foo': 'bar'}
+
+    def test_close_deletes_database(self):
+        store = GeneNodeAttributeStore(max_in_memory=1, tmpdir=self._temp_dir)
+        for key, value in self.get_attrs(3):
+            store[key] = value
+        self.assertEqual(1, len(os.listdir(self._temp_dir)))
+        store.close()
+        self.assertEqual(0, len(os.listdir(self._temp_dir)))
+        self.assertEqual(0, len(store))
+        store = GeneNodeAttributeStore(max_in_memory=1, tmpdir=self._temp_dir)
+        for key, value in self.get_attrs(3):
+            store[key] = value
+        del store
+        self.assertEqual(0, len(os.listdir(self._temp_dir)))
+
+    def test_generators_with_max_in_memory(self):
+        edgelist = [{'GeneID1': 'A', 'Symbol1': 'SA', 'Ensembl1': 'EA',
+                     'GeneID2': 'B', 'Symbol2': 'SB', 'Ensembl2': 'EB'},
+                    {'GeneID1': 'C', 'Symbol1': 'SC', 'Ensembl1': 'EC',
+                     'GeneID2': 'A', 'Symbol2': 'SA', 'Ensembl2': 'EA'}]
+        one = CM4AIGeneNodeAttributeGenerator(apms_edgelist=[],
+                                              gene_node_attrs_max_in_memory=1)
+        one._apms_edgelist = edgelist
+        two = CM4AIGeneNodeAttributeGenerator(apms_edgelist=[],
+                                              gene_node_attrs_max_in_memory=1)
+        two._apms_edgelist = [{'GeneID1': 'B', 'Symbol1': 'SB', 'Ensembl1': 'EB',
+                               'GeneID2': 'D', 'Symbol2': 'SD', 'Ensembl2': 'ED'}]
+        attrs, errors = one.get_gene_node_attributes()
+        self.assertTrue(isinstance(attrs, GeneNodeAttributeStore))
+        self.assertEqual(['A', 'C', 'B'], list(attrs.keys()))
+        self.assertEqual({'name': 'SB', 'represents': 'ensembl:EB',
+                          'ambiguous': '', 'bait': False}, attrs['B'])
+        attrs.close()
+
+        gen = MultiSourceGeneNodeAttributeGenerator(generators=[('one', one), ('two', two)],
+                                                    gene_node_attrs_max_in_memory=2)
+        attrs, errors = gen.get_gene_node_attributes()
+        self.assertTrue(attrs.is_spilled())
+        self.assertEqual(['A', 'C', 'B', 'D'], list(attrs.keys()))
+        # B is a bait in source two
+        self.assertTrue(attrs['B']['bait'])
+        attrs.close()
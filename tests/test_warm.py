@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `warm` module"""
+
+import os
+import csv
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from cellmaps_utils import constants
+
+from cellmaps_ppidownloader.warm import CacheWarmer
+from cellmaps_ppidownloader.exceptions import CellMapsPPIDownloaderError
+
+
+class TestCacheWarmer(unittest.TestCase):
+    """Tests for `warm` module"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_constructor_invalid_batch_size(self):
+        with self.assertRaises(CellMapsPPIDownloaderError):
+            CacheWarmer(batch_size=0)
+
+    def test_read_genes(self):
+        path = os.path.join(self.temp_dir, 'genes.tsv')
+        with open(path, 'w') as f:
+            f.write('# comment\nTP53\textra\n\nBRCA1\nTP53\n')
+        self.assertEqual(['TP53', 'BRCA1'], CacheWarmer.read_genes(path))
+
+    def test_fetch_all_genes(self):
+        mg = MagicMock()
+        mg.query.return_value = iter([{'_id': 7157}, {'_id': '672'}])
+        self.assertEqual(['7157', '672'],
+                         CacheWarmer.fetch_all_genes(mg, query='q', species='human'))
+        mg.query.assert_called_once_with('q', species='human', fields='_id',
+                                         fetch_all=True)
+
+    def test_warm_coverage_and_write(self):
+        genequery = MagicMock()
+        genequery.get_symbols_for_genes.side_effect = [
+            [{'query': '7157', 'symbol': 'TP53',
+              'ensembl': {'gene': 'ENSG00000141510'}},
+             {'query': '672', 'symbol': 'BRCA1',
+              'ensembl': [{'gene': 'ENSG00000012048'},
+                          {'gene': 'ENSG00000XXXXXX'}]}],
+            [{'query': '999', 'notfound': True}]]
+        warmer = CacheWarmer(genequery=genequery, batch_size=2)
+        self.assertEqual(2, warmer.warm(['7157', '672', '999']))
+        self.assertEqual(2, genequery.get_symbols_for_genes.call_count)
+        genequery.get_symbols_for_genes.assert_called_with(genelist=['999'],
+                                                           scopes='_id')
+        self.assertEqual({'requested': 3, 'resolved': 2, 'missing': 1,
+                          'coverage': 2 / 3}, warmer.get_coverage())
+        self.assertEqual(['999'], warmer.get_missing())
+
+        path = os.path.join(self.temp_dir, 'index.tsv')
+        self.assertEqual(2, warmer.write_gene_node_attributes(path))
+        with open(path, 'r') as f:
+            rows = list(csv.DictReader(f, delimiter='\t'))
+        self.assertEqual(constants.PPI_GENE_NODE_COLS, list(rows[0].keys()))
+        self.assertEqual('TP53', rows[0]['name'])
+        self.assertEqual('ensembl:ENSG00000141510', rows[0]['represents'])
+        self.assertEqual('ensembl:ENSG00000012048;ENSG00000XXXXXX',
+                         rows[1]['represents'])
+
+    def test_fetch_all_terms(self):
+        mg = MagicMock()
+        mg.query.return_value = iter([{'_id': 7157, 'symbol': 'TP53',
+                                       'uniprot': {'Swiss-Prot': 'P04637'}},
+                                      {'_id': '672', 'symbol': 'BRCA1',
+                                       'uniprot': {'Swiss-Prot': ['P38398', 'X']}},
+                                      {'_id': '9', 'symbol': 'TP53'}])
+        self.assertEqual({'_id': ['7157', '672', '9'],
+                          'symbol': ['TP53', 'BRCA1'],
+                          'uniprot': ['P04637', 'P38398', 'X']},
+                         CacheWarmer.fetch_all_terms(mg, query='q', species='human',
+                                                     scopes=CacheWarmer.ALL_GENES_SCOPES))
+        mg.query.assert_called_once_with('q', species='human',
+                                         fields='_id,symbol,uniprot.Swiss-Prot',
+                                         fetch_all=True)
+
+    def test_warm_coverage_per_scope(self):
+        genequery = MagicMock()
+        genequery.get_symbols_for_genes.side_effect = [
+            [{'query': 'TP53', 'symbol': 'TP53',
+              'ensembl': {'gene': 'ENSG00000141510'}},
+             {'query': 'FOO', 'notfound': True}],
+            [{'query': 'P04637', 'symbol': 'TP53',
+              'ensembl': {'gene': 'ENSG00000141510'}}]]
+        warmer = CacheWarmer(genequery=genequery)
+        self.assertEqual(1, warmer.warm(['TP53', 'FOO'], scopes='symbol'))
+        self.assertEqual(1, warmer.warm(['P04637'], scopes='uniprot'))
+        genequery.get_symbols_for_genes.assert_called_with(genelist=['P04637'],
+                                                           scopes='uniprot')
+        self.assertEqual(['symbol', 'uniprot'], warmer.get_scopes())
+        self.assertEqual({'requested': 2, 'resolved': 1, 'missing': 1,
+                          'coverage': 0.5}, warmer.get_coverage(scopes='symbol'))
+        self.assertEqual({'requested': 1, 'resolved': 1, 'missing': 0,
+                          'coverage': 1.0}, warmer.get_coverage(scopes='uniprot'))
+        self.assertEqual(3, warmer.get_coverage()['requested'])
+        self.assertEqual(['FOO'], warmer.get_missing())
+        self.assertEqual([], warmer.get_missing(scopes='uniprot'))
+
+        path = os.path.join(self.temp_dir, 'index.tsv')
+        self.assertEqual(1, warmer.write_gene_node_attributes(path))
+
+    def test_get_coverage_nothing_requested(self):
+        self.assertEqual(0.0, CacheWarmer().get_coverage()['coverage'])